@@ -0,0 +1,4 @@
+TRACE_ENABLED = False
+SUPER_DEBUG_ENABLED = False
+DIFF_DEBUG_ENABLED = False
+OP_GRAPH_DEBUG_ENABLED = True
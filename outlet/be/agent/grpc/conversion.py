@@ -474,16 +474,16 @@ class GRPCConverter:
         kwargs = {}
         # TODO: convert this long conditional list into an action dict
         if signal == Signal.DISPLAY_TREE_CHANGED or signal == Signal.GENERATE_MERGE_TREE_DONE:
-            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal.display_tree_ui_state)
+            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal_msg.display_tree_ui_state)
             tree: DisplayTree = display_tree_ui_state.to_display_tree(backend=self.backend)
             kwargs['tree'] = tree
         elif signal == Signal.DIFF_TREES_DONE or signal == Signal.DIFF_TREES_CANCELLED:
-            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal.dual_display_tree.left_tree)
+            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal_msg.dual_display_tree.left_tree)
             tree: DisplayTree = display_tree_ui_state.to_display_tree(backend=self.backend)
             kwargs['tree_left'] = tree
-            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal.dual_display_tree.right_tree)
+            display_tree_ui_state = self.display_tree_ui_state_from_grpc(signal_msg.dual_display_tree.right_tree)
             tree: DisplayTree = display_tree_ui_state.to_display_tree(backend=self.backend)
-            kwargs['right_tree'] = tree
+            kwargs['tree_right'] = tree
         elif signal == Signal.EXECUTE_ACTION:
             kwargs['action_list'] = self.tree_action_list_from_grpc(signal_msg.tree_action_request)
         elif signal == Signal.OP_EXECUTION_PLAY_STATE_CHANGED:
@@ -492,7 +492,7 @@ class GRPCConverter:
             kwargs['enable'] = signal_msg.ui_enablement.enable
         elif signal == Signal.SET_SELECTED_ROWS:
             guid_set = set()
-            for guid in signal.guid_set.guid_set:
+            for guid in signal_msg.guid_set.guid_set:
                 guid_set.add(guid)
             kwargs['selected_rows'] = guid_set
         elif signal == Signal.ERROR_OCCURRED:
@@ -500,7 +500,6 @@ class GRPCConverter:
             kwargs['secondary_msg'] = signal_msg.error_occurred.secondary_msg
         elif signal == Signal.NODE_UPSERTED or signal == Signal.NODE_REMOVED:
             kwargs['sn'] = self.sn_from_grpc(signal_msg.sn)
-            kwargs['parent_guid'] = signal_msg.parent_guid
         elif signal == Signal.SUBTREE_NODES_CHANGED:
             kwargs['subtree_root_spid'] = self.node_identifier_from_grpc(signal_msg.subtree.subtree_root_spid)
             kwargs['upserted_sn_list'] = self.sn_list_from_grpc(signal_msg.subtree.upserted_sn_list)
@@ -0,0 +1,135 @@
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Callable, Deque, Dict, Hashable, List, Optional
+
+from be.agent.grpc.generated.Outlet_pb2 import SignalMsg
+from logging_constants import SUPER_DEBUG_ENABLED
+from signal_constants import Signal
+
+logger = logging.getLogger(__name__)
+
+# Signals which only describe the contents or state of display trees. A resync (see ClientSignalQueue) sends the current state of every
+# display tree, so on overflow, these can be dropped:
+RESYNC_SUPERSEDED_SIGNAL_SET = frozenset({Signal.NODE_UPSERTED, Signal.NODE_REMOVED, Signal.SUBTREE_NODES_CHANGED,
+                                          Signal.TREE_LOAD_STATE_UPDATED, Signal.DISPLAY_TREE_CHANGED})
+
+
+class ClientSignalQueue:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS ClientSignalQueue
+
+    The queue of SignalMsgs waiting to be streamed to a single gRPC client, with its own lock & condition, so that enqueuing a signal only
+    wakes the threads which are waiting on it.
+
+    Coalescing: a signal may be put with a coalesce_key. If a signal with the same key is still queued, it is dropped, and the new one is
+    appended at the end. Callers should only share a key between signals where the newer one makes the older one redundant (e.g. upserts
+    of the same node); dropping only older duplicates preserves the relative order of everything else.
+
+    Overflow: if the queue reaches max_size, the client is assumed to be falling behind. All of its queued signals which are superseded by
+    a resync (see RESYNC_SUPERSEDED_SIGNAL_SET) are dropped, and before it receives anything else the client is sent the signals returned
+    by resync_signal_func, which are built at that point (so that they describe the most current state). Signals of those types which are
+    put before then are dropped too, since the resync will include their changes; if they were kept, they would be sent after it and
+    replay changes which the client already has (e.g. upserting a node whose parent the resync has already removed).
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, client_id: str, max_size: int, resync_signal_func: Callable[[], List[SignalMsg]]):
+        self.client_id: str = client_id
+        self._max_size: int = max_size
+        self._resync_signal_func: Callable[[], List[SignalMsg]] = resync_signal_func
+
+        self._cv_has_signal = threading.Condition(threading.Lock())
+        # Key is either the coalesce_key, or a unique int for signals which can't be coalesced:
+        self._signal_dict: Dict[Hashable, SignalMsg] = OrderedDict()
+        self._next_seq: int = 0
+        self._resync_queue: Deque[SignalMsg] = deque()
+        self._needs_resync: bool = False
+        self._is_closed: bool = False
+
+        self.coalesced_count: int = 0
+        self.overflow_count: int = 0
+        self.max_len_seen: int = 0
+
+    def __len__(self):
+        with self._cv_has_signal:
+            return len(self._signal_dict) + len(self._resync_queue)
+
+    def put(self, signal_msg: SignalMsg, coalesce_key: Optional[Hashable] = None):
+        with self._cv_has_signal:
+            if self._is_closed:
+                return
+
+            is_superseded_by_resync = signal_msg.sig_int in RESYNC_SUPERSEDED_SIGNAL_SET
+            if self._needs_resync and is_superseded_by_resync:
+                return
+
+            if coalesce_key is None:
+                coalesce_key = self._next_seq
+                self._next_seq += 1
+            elif self._signal_dict.pop(coalesce_key, None) is not None:
+                self.coalesced_count += 1
+
+            if len(self._signal_dict) >= self._max_size:
+                self._handle_overflow()
+                if is_superseded_by_resync:
+                    self._cv_has_signal.notify()
+                    return
+
+            self._signal_dict[coalesce_key] = signal_msg
+            self.max_len_seen = max(self.max_len_seen, len(self._signal_dict))
+            self._cv_has_signal.notify()
+
+    def _handle_overflow(self):
+        # Lock must be held by caller
+        self.overflow_count += 1
+        queue_len = len(self._signal_dict)
+        self._signal_dict = OrderedDict((key, msg) for key, msg in self._signal_dict.items() if msg.sig_int not in RESYNC_SUPERSEDED_SIGNAL_SET)
+        self._needs_resync = True
+        logger.warning(f'[{self.client_id}] Signal queue is full ({queue_len} signals): dropped {queue_len - len(self._signal_dict)} tree updates. '
+                       f'Client will be resynced')
+
+    def get(self) -> Optional[SignalMsg]:
+        """Blocks until a signal is available, and returns it. Returns None if the queue has been closed."""
+        while True:
+            with self._cv_has_signal:
+                while True:
+                    if self._is_closed:
+                        return None
+                    if self._resync_queue:
+                        return self._resync_queue.popleft()
+                    if self._needs_resync:
+                        self._needs_resync = False
+                        break
+                    if self._signal_dict:
+                        return self._signal_dict.popitem(last=False)[1]
+                    self._cv_has_signal.wait()
+
+            # Build these outside the lock, so that the producer is never blocked by it:
+            resync_signal_list = self._resync_signal_func()
+            logger.info(f'[{self.client_id}] Resyncing client with {len(resync_signal_list)} signals')
+            with self._cv_has_signal:
+                self._resync_queue.extend(resync_signal_list)
+
+    def transfer_to(self, other):
+        """Moves all of this queue's signals (and its need for a resync, if any) to the end of the other queue"""
+        with self._cv_has_signal:
+            signal_list = list(self._signal_dict.values())
+            self._signal_dict.clear()
+            needs_resync = self._needs_resync
+            self._needs_resync = False
+
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'[{self.client_id}] Moving {len(signal_list)} signals to queue for {other.client_id}')
+        for signal_msg in signal_list:
+            other.put(signal_msg)
+        if needs_resync:
+            with other._cv_has_signal:
+                other._needs_resync = True
+                other._cv_has_signal.notify()
+
+    def close(self):
+        """Wakes the consumer, which will get None"""
+        with self._cv_has_signal:
+            self._is_closed = True
+            self._cv_has_signal.notify_all()
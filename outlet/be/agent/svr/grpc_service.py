@@ -1,8 +1,7 @@
 import io
 import logging
 import threading
-from collections import deque
-from typing import Deque, Dict, List, Optional, Set
+from typing import Deque, Dict, Hashable, List, Optional, Set
 
 from pydispatch import dispatcher
 
@@ -19,6 +18,8 @@ from be.agent.grpc.generated.Outlet_pb2 import ConfigEntry, DeleteSubtree_Reques
     SingleNode_Response, StartDiffTrees_Request, StartDiffTrees_Response, StartSubtreeLoad_Request, StartSubtreeLoad_Response, Subscribe_Request, \
     TreeAction, UpdateFilter_Request, UpdateFilter_Response
 from be.agent.grpc.generated.Outlet_pb2_grpc import OutletServicer
+from be.agent.svr.client_signal_queue import ClientSignalQueue
+from be.agent.svr.node_signal_batcher import NodeSignalBatcher
 from be.backend_integrated import BackendIntegrated
 from be.cache_manager import CacheManager
 from be.exec.central import CentralExecutor
@@ -35,6 +36,7 @@ from model.node_identifier import GUID, NodeIdentifier
 from model.uid import UID
 from model.user_op import UserOp
 from signal_constants import ID_GLOBAL_CACHE, Signal
+from util.ensure import ensure_int
 from util.has_lifecycle import HasLifecycle
 
 logger = logging.getLogger(__name__)
@@ -58,11 +60,16 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
         self.executor: CentralExecutor = backend.executor
 
         self._queue_lock = threading.Lock()
-        self._cv_has_signal = threading.Condition(self._queue_lock)
-        self._thread_signal_queues: Dict[int, Deque[SignalMsg]] = {}
-        self._outbox_signal_queue: Deque[SignalMsg] = deque()
+        self._max_queued_signals_per_client: int = ensure_int(backend.get_config('agent.grpc.max_queued_signals_per_client'))
+        self._thread_signal_queues: Dict[int, ClientSignalQueue] = {}
+        self._outbox_signal_queue = ClientSignalQueue('outbox', self._max_queued_signals_per_client, self._build_resync_signal_list)
         self._shutdown: bool = False
 
+        # NODE_UPSERTED & NODE_REMOVED are sent to clients in batches, as SUBTREE_NODES_CHANGED:
+        self._node_signal_batcher = NodeSignalBatcher(window_ms=ensure_int(backend.get_config('agent.grpc.node_signal_batch_window_ms')),
+                                                      max_batch_size=ensure_int(backend.get_config('agent.grpc.node_signal_max_batch_size')),
+                                                      flush_func=self._send_node_batch_to_all_clients)
+
         self._converter = GRPCConverter(self.backend)
 
     def start(self):
@@ -105,6 +112,14 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
     def shutdown(self):
         HasLifecycle.shutdown(self)
         self._shutdown = True
+        self._node_signal_batcher.shutdown()
+
+        # Wake each subscriber's thread, so that it will end its stream:
+        with self._queue_lock:
+            queue_list = list(self._thread_signal_queues.values())
+            self._thread_signal_queues.clear()
+        for queue in queue_list:
+            queue.close()
 
     # Server -> client signaling via always-open gRPC stream
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
@@ -117,25 +132,44 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
 
         self._send_grpc_signal_to_all_clients(SignalMsg(sig_int=signal, sender=sender))
 
-    def _send_grpc_signal_to_all_clients(self, signal_grpc: SignalMsg):
+    def _send_grpc_signal_to_all_clients(self, signal_grpc: SignalMsg, coalesce_key: Optional[Hashable] = None):
         """Sends the gRPC signal to all connected clients (well, it actually passively enqueues it to be picked up by each of their threads,
-        but the whole process should happen very quickly)"""
+        but the whole process should happen very quickly). If coalesce_key is given, any signal with the same key which is still waiting
+        to be sent to a client is dropped (see ClientSignalQueue)."""
         if self._shutdown and signal_grpc != Signal.SHUTDOWN_APP:
             return
 
-        with self._cv_has_signal:
+        # Any node changes which were gathered before this signal must be sent before it:
+        self._node_signal_batcher.flush()
+        self._enqueue_grpc_signal_for_all_clients(signal_grpc, coalesce_key)
+
+    def _enqueue_grpc_signal_for_all_clients(self, signal_grpc: SignalMsg, coalesce_key: Optional[Hashable] = None):
+        with self._queue_lock:
             if len(self._thread_signal_queues) == 0:
                 logger.debug(f'No clients connected! Enqueuing signal="{Signal(signal_grpc.sig_int).name}" with sender="'
                              f'{signal_grpc.sender}" in outbox; will send to first client which appears')
-                self._outbox_signal_queue.append(signal_grpc)
-            else:
-                if SUPER_DEBUG_ENABLED:
-                    logger.debug(f'Queuing signal="{Signal(signal_grpc.sig_int).name}" with sender="'
-                                 f'{signal_grpc.sender}" to {len(self._thread_signal_queues)} connected clients')
-                for queue in self._thread_signal_queues.values():
-                    queue.append(signal_grpc)
+                # Must be put while the lock is held, or a client could connect & take the outbox's signals before this one is added:
+                self._outbox_signal_queue.put(signal_grpc, coalesce_key)
+                return
 
-            self._cv_has_signal.notifyAll()
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'Queuing signal="{Signal(signal_grpc.sig_int).name}" with sender="'
+                             f'{signal_grpc.sender}" to {len(self._thread_signal_queues)} connected clients')
+            queue_list = list(self._thread_signal_queues.values())
+
+        # Each queue has its own lock, and only wakes its own client's thread:
+        for queue in queue_list:
+            queue.put(signal_grpc, coalesce_key)
+
+    def _build_resync_signal_list(self) -> List[SignalMsg]:
+        """Called for a client which fell too far behind & had its queued tree updates dropped. Sends the current state of each active
+        display tree, as if it had just been requested: the client will reload each tree in response."""
+        signal_list: List[SignalMsg] = []
+        for tree_meta in self.cacheman.get_active_display_tree_meta_list():
+            signal = SignalMsg(sig_int=Signal.DISPLAY_TREE_CHANGED, sender=tree_meta.tree_id)
+            self._converter.display_tree_ui_state_to_grpc(tree_meta.state, signal.display_tree_ui_state)
+            signal_list.append(signal)
+        return signal_list
 
     def subscribe_to_signals(self, request: Subscribe_Request, context):
         """This method should be called by gRPC when it is handling a request. The calling thread will be used to process the stream
@@ -144,55 +178,44 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
             def on_rpc_done():
                 logger.info(f'Client cancelled signal subscription (ThreadID {thread_id})')
                 # remove data structs for client:
-                with self._cv_has_signal:
-                    del self._thread_signal_queues[thread_id]
-
+                with self._queue_lock:
+                    queue = self._thread_signal_queues.pop(thread_id, None)
+                if queue is not None:
                     # notify the thread so it will stop waiting
-                    self._cv_has_signal.notifyAll()
+                    queue.close()
 
             context.add_callback(on_rpc_done)
             thread_id: int = threading.get_ident()
             logger.info(f'Adding a signal subscriber with ThreadID {thread_id}')
 
+            signal_queue = ClientSignalQueue(f'ThreadID:{thread_id}', self._max_queued_signals_per_client, self._build_resync_signal_list)
+            # Send welcome msg to new client (no gift basket, however)
+            signal_queue.put(SignalMsg(sig_int=Signal.WELCOME, sender=ID_GLOBAL_CACHE))
+
             with self._queue_lock:
-                signal_queue = self._thread_signal_queues.get(thread_id, None)
-                if signal_queue:
+                old_queue = self._thread_signal_queues.get(thread_id, None)
+                if old_queue:
                     logger.warning(f'Found an existing gRPC signal queue for ThreadID: {thread_id} Will overwrite')
-                signal_queue = deque()
+                    old_queue.close()
+                if not self._thread_signal_queues:
+                    logger.debug(f'Moving signals from outbox to signal queue for ThreadID {thread_id}')
+                    self._outbox_signal_queue.transfer_to(signal_queue)
                 self._thread_signal_queues[thread_id] = signal_queue
-                # Send welcome msg to new client (no gift basket, however)
-                signal_queue.append(SignalMsg(sig_int=Signal.WELCOME, sender=ID_GLOBAL_CACHE))
-
-                while self._outbox_signal_queue:
-                    old_signal = self._outbox_signal_queue.popleft()
-                    logger.debug(f'Moving signal from outbox to signal queue for ThreadID {thread_id}')
-                    signal_queue.append(old_signal)
 
             while not self._shutdown:
+                if TRACE_ENABLED:
+                    logger.debug(f'Waiting for next signal for ThreadID {thread_id}')
+                signal: Optional[SignalMsg] = signal_queue.get()
+                if signal is None:
+                    logger.debug(f'Looks like ThreadID {thread_id} signal subscription ended (queue was closed). Cleaning up our end.')
+                    return
 
-                while True:  # empty the queue
-                    with self._cv_has_signal:
-                        if TRACE_ENABLED:
-                            logger.debug(f'Checking signal queue for ThreadID {thread_id}')
-                        signal_queue: Optional[Deque] = self._thread_signal_queues.get(thread_id, None)
-                        if signal_queue is None:
-                            logger.debug(f'Looks like  ThreadID {thread_id} signal subscription ended (queue is not there). Cleaning up our end.')
-                            return
-
-                        if len(signal_queue) > 0:
-                            signal: Optional[SignalMsg] = signal_queue.popleft()
-                        else:
-                            if TRACE_ENABLED:
-                                logger.debug(f'Signal queue emptied for ThreadID {thread_id}. Will wait for more signals')
-                            signal = None
-                            self._cv_has_signal.wait()
-
-                    if signal:
-                        logger.info(f'[ThreadID:{thread_id}] Sending gRPC signal="{Signal(signal.sig_int).name}" with sender="{signal.sender}"')
-                        yield signal
+                logger.info(f'[ThreadID:{thread_id}] Sending gRPC signal="{Signal(signal.sig_int).name}" with sender="{signal.sender}"')
+                yield signal
 
             with self._queue_lock:
-                del self._thread_signal_queues[thread_id]
+                if self._thread_signal_queues.get(thread_id, None) is signal_queue:
+                    del self._thread_signal_queues[thread_id]
         except RuntimeError:
             logger.exception('Unexpected error processing signal subscription')
 
@@ -212,7 +235,9 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
             if dir_stats_dict_by_uid is None:
                 dir_stats_dict_by_uid = {}  # for safety
             logger.debug(f'[{sender}] Pushing DirStats update across gRPC for {len(dir_stats_dict_by_guid)} GUIDs, {len(dir_stats_dict_by_uid)} UIDs')
-        self._send_grpc_signal_to_all_clients(signal)
+        # Each update contains the complete stats, so only the latest for each load state needs to be sent. (Updates with a different load
+        # state are never coalesced, because the client acts on each state transition)
+        self._send_grpc_signal_to_all_clients(signal, coalesce_key=(Signal.TREE_LOAD_STATE_UPDATED, sender, tree_load_state))
 
     def _on_batch_failed(self, sender: str, msg: str, secondary_msg: str, batch_uid: UID):
         signal = SignalMsg(sig_int=Signal.BATCH_FAILED, sender=sender)
@@ -238,14 +263,28 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
         self._send_grpc_signal_to_all_clients(signal)
 
     def _on_node_upserted(self, sender: str, sn: SPIDNodePair):
-        signal = SignalMsg(sig_int=Signal.NODE_UPSERTED, sender=sender)
-        self._converter.sn_to_grpc(sn, signal.sn)
-        self._send_grpc_signal_to_all_clients(signal)
+        if not self._shutdown:
+            self._node_signal_batcher.add_upserted(sender, sn)
 
     def _on_node_removed(self, sender: str, sn: SPIDNodePair):
-        signal = SignalMsg(sig_int=Signal.NODE_REMOVED, sender=sender)
-        self._converter.sn_to_grpc(sn, signal.sn)
-        self._send_grpc_signal_to_all_clients(signal)
+        if not self._shutdown:
+            self._node_signal_batcher.add_removed(sender, sn)
+
+    def _send_node_batch_to_all_clients(self, tree_id: str, upserted_sn_list: List[SPIDNodePair], removed_sn_list: List[SPIDNodePair]):
+        """Called by the NodeSignalBatcher with the nodes upserted into & removed from the given tree since its last batch"""
+        tree_meta = self.cacheman.get_active_display_tree_meta(tree_id)
+        if not tree_meta:
+            logger.debug(f'[{tree_id}] Dropping batch of {len(upserted_sn_list)} upserted & {len(removed_sn_list)} removed nodes: '
+                         f'tree is no longer active')
+            return
+
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'[{tree_id}] Relaying batch of {len(upserted_sn_list)} upserted & {len(removed_sn_list)} removed nodes')
+        signal = SignalMsg(sig_int=Signal.SUBTREE_NODES_CHANGED, sender=tree_id)
+        self._converter.node_identifier_to_grpc(tree_meta.root_sn.spid, signal.subtree.subtree_root_spid)
+        self._converter.sn_list_to_grpc(upserted_sn_list, signal.subtree.upserted_sn_list)
+        self._converter.sn_list_to_grpc(removed_sn_list, signal.subtree.removed_sn_list)
+        self._enqueue_grpc_signal_for_all_clients(signal)
 
     def _on_subtree_nodes_changed(self, sender: str, subtree_root_spid: NodeIdentifier, upserted_sn_list: List[SPIDNodePair],
                                   removed_sn_list: List[SPIDNodePair]):
@@ -279,7 +318,7 @@ class OutletGRPCService(OutletServicer, HasLifecycle):
         self._converter.display_tree_ui_state_to_grpc(tree.state, signal.display_tree_ui_state)
 
         logger.debug(f'Relaying signal across gRPC: "{Signal.DISPLAY_TREE_CHANGED.name}", sender={sender}, tree={tree}')
-        self._send_grpc_signal_to_all_clients(signal)
+        self._send_grpc_signal_to_all_clients(signal, coalesce_key=(Signal.DISPLAY_TREE_CHANGED, sender))
 
     def _on_diff_trees_done(self, sender: str, tree_left: DisplayTree, tree_right: DisplayTree):
         signal = SignalMsg(sig_int=Signal.DIFF_TREES_DONE, sender=sender)
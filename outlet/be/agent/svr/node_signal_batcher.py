@@ -0,0 +1,111 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from model.node.node import SPIDNodePair
+from model.node_identifier import GUID
+from util.stopwatch_sec import Stopwatch
+
+logger = logging.getLogger(__name__)
+
+
+class _TreeNodeBatch:
+    def __init__(self):
+        # Each GUID is in at most one of these, according to its latest change. Insertion order is kept, so that a new dir is upserted
+        # before its children:
+        self.upserted_sn_dict: Dict[GUID, SPIDNodePair] = OrderedDict()
+        self.removed_sn_dict: Dict[GUID, SPIDNodePair] = OrderedDict()
+
+    def __len__(self):
+        return len(self.upserted_sn_dict) + len(self.removed_sn_dict)
+
+
+class NodeSignalBatcher:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS NodeSignalBatcher
+
+    Gathers the nodes upserted into & removed from each display tree over a short window (starting with the first change after the last
+    flush), then passes them to flush_func as a single batch per tree. A node which changes more than once in the same window is only
+    sent once, as its latest change. The batch is flushed early if it reaches max_batch_size nodes, or if flush() is called.
+
+    To preserve the order of a batch relative to other signals, the owner must call flush() before sending any other signal.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, window_ms: int, max_batch_size: int, flush_func: Callable[[str, List[SPIDNodePair], List[SPIDNodePair]], None]):
+        self._window_ms: int = window_ms
+        self._max_batch_size: int = max_batch_size
+        self._flush_func: Callable[[str, List[SPIDNodePair], List[SPIDNodePair]], None] = flush_func
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        """Held while sending batches, so that they are sent in the order they were gathered. Never acquire it while holding _lock"""
+        self._batch_dict: Dict[str, _TreeNodeBatch] = {}
+        self._node_count: int = 0
+        self._timer: Optional[threading.Timer] = None
+        """Started by the first change after each flush (and not delayed by later ones), so that a batch is never held for longer than the
+        window. Protected by _lock. It calls flush() on its own thread without holding any lock, so that a producer is never blocked
+        by a batch being sent, except when the producer has to flush a full batch itself."""
+
+    def add_upserted(self, tree_id: str, sn: SPIDNodePair):
+        self._add(tree_id, sn, is_removed=False)
+
+    def add_removed(self, tree_id: str, sn: SPIDNodePair):
+        self._add(tree_id, sn, is_removed=True)
+
+    def _add(self, tree_id: str, sn: SPIDNodePair, is_removed: bool):
+        guid = sn.spid.guid
+        with self._lock:
+            batch = self._batch_dict.get(tree_id, None)
+            if not batch:
+                batch = self._batch_dict[tree_id] = _TreeNodeBatch()
+
+            is_first_change = self._node_count == 0
+            count_before = len(batch)
+            if is_removed:
+                batch.upserted_sn_dict.pop(guid, None)
+                batch.removed_sn_dict[guid] = sn
+            else:
+                batch.removed_sn_dict.pop(guid, None)
+                batch.upserted_sn_dict[guid] = sn
+            self._node_count += len(batch) - count_before
+
+            is_flush_needed = self._window_ms <= 0 or self._node_count >= self._max_batch_size
+            if is_first_change and not is_flush_needed:
+                self._timer = threading.Timer(self._window_ms / 1000.0, self.flush)
+                self._timer.name = 'NodeSignalBatcher-timer'
+                self._timer.daemon = True
+                self._timer.start()
+
+        if is_flush_needed:
+            self.flush()
+
+    def flush(self):
+        """Sends all the changes gathered so far. Called by the timer, or by the owner before it sends any other signal"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._batch_dict:
+                    return
+                self._cancel_timer()
+                batch_dict = self._batch_dict
+                node_count = self._node_count
+                self._batch_dict = {}
+                self._node_count = 0
+
+            sw = Stopwatch()
+            for tree_id, batch in batch_dict.items():
+                self._flush_func(tree_id, list(batch.upserted_sn_dict.values()), list(batch.removed_sn_dict.values()))
+            logger.debug(f'{sw} Sent {node_count} node changes in {len(batch_dict)} batches')
+
+    def _cancel_timer(self):
+        """Caller must hold _lock. Harmless if called by the timer itself"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def shutdown(self):
+        with self._lock:
+            self._cancel_timer()
+            self._batch_dict = {}
+            self._node_count = 0
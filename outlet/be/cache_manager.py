@@ -4,7 +4,7 @@ import os
 import pathlib
 import threading
 from collections import deque
-from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+from typing import Callable, Deque, Iterable, List, Optional, Set, Tuple
 
 from pydispatch import dispatcher
 
@@ -19,7 +19,7 @@ from be.disp_tree.row_state_tracking import RowStateTracking
 from be.exec.central import ExecPriority
 from be.exec.cmd.cmd_interface import Command
 from be.exec.user_op.op_manager import OpManager
-from be.sqlite.content_meta_db import ContentMeta
+from be.sqlite.content_meta_db import ContentMeta, DuplicateContentGroup
 from be.tree_store.gdrive.gdrive import GDriveMasterStore
 from be.tree_store.gdrive.op_cache_load import GDCacheLoadOp
 from be.tree_store.locald import sig_calc
@@ -366,6 +366,36 @@ class CacheManager(HasLifecycle):
         logger.debug(f'[{tree_meta.tree_id}] New summary: "{tree_meta.summary_msg}"')
         return TreeLoadState.COMPLETELY_LOADED
 
+    def update_dir_stats_for_tree(self, tree_meta: ActiveDisplayTreeMeta, changed_dir_uid_set: Set[UID]) -> TreeLoadState:
+        """
+        BE-internal. NOT A CLIENT API
+        Like repopulate_dir_stats_for_tree(), but only updates the stats affected by changes to the children of the given dirs (and their
+        ancestors). Falls back to repopulate_dir_stats_for_tree() if there are no existing stats to update.
+        """
+        if not tree_meta.root_exists or not tree_meta.is_first_order() or not tree_meta.dir_stats_unfiltered_by_uid:
+            return self.repopulate_dir_stats_for_tree(tree_meta)
+
+        spid = tree_meta.root_sn.spid
+        store = self._cache_registry.get_store_for_device_uid(spid.device_uid)
+        root_node = self.get_node_for_node_identifier(tree_meta.root_sn.node.node_identifier)
+        if not root_node:
+            logger.debug(f'[{tree_meta.tree_id}] Root node not found while updating dir stats; will repopulate all stats')
+            return self.repopulate_dir_stats_for_tree(tree_meta)
+
+        logger.debug(f'[{tree_meta.tree_id}] Updating stats for {len(changed_dir_uid_set)} changed dirs in subtree: {spid}')
+        # The current dict may still be read by other threads (it is sent with TREE_LOAD_STATE_UPDATED), so update a copy & swap it in:
+        dir_stats_dict = dict(tree_meta.dir_stats_unfiltered_by_uid)
+        try:
+            store.update_dir_stats(root_node, dir_stats_dict, changed_dir_uid_set, tree_meta.tree_id)
+        except NodeNotPresentError as error:
+            logger.debug(f'[{tree_meta.tree_id}] Caught NodeNotPresentError while updating dir stats ({error}); will repopulate all stats')
+            return self.repopulate_dir_stats_for_tree(tree_meta)
+        tree_meta.dir_stats_unfiltered_by_uid = dir_stats_dict
+
+        tree_meta.summary_msg = TreeSummarizer.build_tree_summary(tree_meta, self.get_device_list())
+        logger.debug(f'[{tree_meta.tree_id}] New summary: "{tree_meta.summary_msg}"')
+        return TreeLoadState.COMPLETELY_LOADED
+
     def request_display_tree(self, request: DisplayTreeRequest) -> Optional[DisplayTree]:
         """The FE needs to first call this to ensure the given tree_id has a ActiveDisplayTreeMeta loaded into memory.
         Afterwards, the FE should call backend.start_subtree_load(), which will call enqueue_load_tree_task(),
@@ -386,6 +416,10 @@ class CacheManager(HasLifecycle):
         """Gets an existing ActiveDisplayTreeMeta. The FE should not call this directly."""
         return self._active_tree_manager.get_active_display_tree_meta(tree_id)
 
+    def get_active_display_tree_meta_list(self) -> List[ActiveDisplayTreeMeta]:
+        """Gets all existing ActiveDisplayTreeMetas. The FE should not call this directly."""
+        return self._active_tree_manager.get_active_display_tree_meta_list()
+
     # used by the filter panel:
     def get_filter_criteria(self, tree_id: TreeID) -> Optional[FilterCriteria]:
         return self._active_tree_manager.get_filter_criteria(tree_id)
@@ -736,12 +770,15 @@ class CacheManager(HasLifecycle):
             raise RuntimeError('get_node_for_local_path(): full_path not specified!')
         return self._cache_registry.get_this_disk_local_store().read_node_for_path(full_path)
 
-    def build_local_file_node(self, full_path: str, staging_path=None, must_scan_signature=False, is_live: bool = True) \
-            -> Optional[LocalFileNode]:
-        return self._cache_registry.get_this_disk_local_store().build_local_file_node(full_path, staging_path, must_scan_signature, is_live)
+    def build_local_file_node(self, full_path: str, staging_path=None, must_scan_signature=False, is_live: bool = True,
+                              dir_entry: Optional[os.DirEntry] = None) -> Optional[LocalFileNode]:
+        return self._cache_registry.get_this_disk_local_store().build_local_file_node(full_path, staging_path, must_scan_signature, is_live,
+                                                                                      dir_entry=dir_entry)
 
-    def build_local_dir_node(self, full_path: str, is_live: bool = True, all_children_fetched: bool = False) -> LocalDirNode:
-        return self._cache_registry.get_this_disk_local_store().build_local_dir_node(full_path, is_live, all_children_fetched=all_children_fetched)
+    def build_local_dir_node(self, full_path: str, is_live: bool = True, all_children_fetched: bool = False,
+                             dir_entry: Optional[os.DirEntry] = None) -> LocalDirNode:
+        return self._cache_registry.get_this_disk_local_store().build_local_dir_node(full_path, is_live, all_children_fetched=all_children_fetched,
+                                                                                     dir_entry=dir_entry)
 
     # Drag & drop
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
@@ -868,6 +905,36 @@ class CacheManager(HasLifecycle):
     def get_content_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None):
         return self._cache_registry.get_content_meta_for(size_bytes, md5, sha256)
 
+    def flush_content_meta_inserts(self):
+        """New ContentMetas are written to disk in batches. Must be called before persisting anything which references a content UID."""
+        self._cache_registry.flush_content_meta_inserts()
+
+    def update_content_refs(self, device_uid: UID, file_node_list: Iterable[TNode], removed_node_uid_list: Iterable[UID] = ()):
+        """Updates the content reverse index for the given file nodes, which are about to be written to a cache, and for the file nodes with
+        the given UIDs, which are about to be removed from it, in a single write. This also flushes any pending ContentMeta inserts.
+        Called once per CacheWriteOp (see CacheWriteOp.update_content_refs()), and for bulk writes which bypass the ops."""
+        self._cache_registry.update_content_refs(device_uid, file_node_list, removed_node_uid_list)
+
+    def remove_all_content_refs_for_device(self, device_uid: UID):
+        self._cache_registry.remove_all_content_refs_for_device(device_uid)
+
+    def get_content_refs_for_content_uid(self, content_uid: UID) -> List[Tuple[UID, UID]]:
+        """Returns the (device_uid, node_uid) of every file node in every cache with the given content. Unlike get_all_files_with_content(),
+        this is cheap: it does not need to load any caches."""
+        return self._cache_registry.get_content_refs_for_content_uid(content_uid)
+
+    def get_duplicate_content_group_list(self, min_size_bytes: int = 0) -> List[DuplicateContentGroup]:
+        """Returns each content which is shared by more than one file node across all caches, with its size and the bytes which
+        would be freed by keeping only one copy, largest first. Does not need to load any caches."""
+        return self._cache_registry.get_duplicate_content_group_list(min_size_bytes)
+
+    def get_sig_calc_throughput(self) -> Optional[Tuple[int, int, float]]:
+        """Returns (files hashed, bytes hashed, seconds spent hashing) for the local disk SigCalcBatchingThread, or None if it is not
+        running"""
+        if self._local_disk_sig_calc_thread:
+            return self._local_disk_sig_calc_thread.get_throughput()
+        return None
+
     def calculate_signature_for_local_file(self, device_uid: UID, full_path: str) -> Optional[ContentMeta]:
         """Returns None on failure (usually file not found or link problem).
         If successful, use """
@@ -883,13 +950,13 @@ class CacheManager(HasLifecycle):
                 logger.debug(f'[device_uid={device_uid}] Calculating sig for local file: "{full_path}"')
 
             md5, sha256 = sig_calc.calculate_signatures(full_path)
-            if not md5 or sha256:
+            if not md5 and not sha256:
                 logger.info(f'[device_uid={device_uid}] Failed to calculate sig for local file: "{full_path}"; '
                             f'assuming it was deleted from disk')
                 return None
 
             if SUPER_DEBUG_ENABLED or is_large:
-                logger.debug(f'[device_uid={device_uid}] Calculated MD5: {md5} for local file: "{full_path}"')
+                logger.debug(f'[device_uid={device_uid}] Calculated MD5: {md5}, SHA-256: {sha256} for local file: "{full_path}"')
 
             return self.get_content_meta_for(size_bytes, md5, sha256)
         except FileNotFoundError as err:
@@ -901,6 +968,14 @@ class CacheManager(HasLifecycle):
             logger.error(f'[device_uid={device_uid}] Failed to calculate sig for local file: "{full_path}": {repr(err)}')
             return None
 
+    def copy_local_file_and_calculate_signature(self, device_uid: UID, src_path: str, dst_path: str) -> ContentMeta:
+        """Copies the contents of src_path to dst_path, calculating the signature of the content as it is copied (so that the file is read
+        only once). Returns the ContentMeta of the copied content. Unlike calculate_signature_for_local_file(), raises an error on failure."""
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'[device_uid={device_uid}] Copying local file and calculating its sig: "{src_path}" -> "{dst_path}"')
+        size_bytes, md5, sha256 = sig_calc.copy_file_computing_digests(src_path, dst_path)
+        return self.get_content_meta_for(size_bytes, md5, sha256)
+
     def get_all_files_with_content(self, content_uid: UID) -> List[TNode]:
         """
         Very expensive: Requires loading ALL the stores + ALL the nodes!
@@ -917,12 +992,6 @@ class CacheManager(HasLifecycle):
         logger.debug(f'get_all_files_with_content(): found total of {len(global_file_list)} files with content_uid={content_uid}')
         return global_file_list
 
-    def get_content_meta_dict(self) -> Dict[UID, List[TNode]]:
-        for device_uid, cache_info_list in self._cache_registry.get_all_cache_info_by_device_uid().items():
-            store = self._cache_registry.get_store_for_device_uid(device_uid)
-
-        # TODO!
-
     # OpGraph
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
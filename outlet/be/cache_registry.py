@@ -4,13 +4,14 @@ import subprocess
 import threading
 import uuid
 from pathlib import PurePosixPath
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from pydispatch import dispatcher
 
 from be.content_meta_manager import ContentMetaManager
 from be.exec.central import ExecPriority
 from be.sqlite.cache_registry_db import CacheRegistryDatabase
+from be.sqlite.content_meta_db import DuplicateContentGroup
 from be.tree_store.gdrive.gdrive import GDriveMasterStore
 from be.tree_store.locald.locald import LocalDiskMasterStore
 from be.tree_store.tree_store import TreeStore
@@ -109,6 +110,10 @@ class CacheRegistry(HasLifecycle):
         for store in self._store_dict.values():
             store.start()
 
+        if self.content_meta_manager.needs_content_ref_rebuild():
+            # Do this before any caches are loaded, so that no cache writes can race with it:
+            self._rebuild_content_refs()
+
         # Now load all caches (if configured):
         if self.backend.cacheman.load_all_caches_on_startup:
             load_all_caches_sw = Stopwatch()
@@ -129,12 +134,6 @@ class CacheRegistry(HasLifecycle):
     def shutdown(self):
         logger.debug(f'[CacheRegistry] Shutdown started')
 
-        try:
-            if self.content_meta_manager:
-                self.content_meta_manager.shutdown()
-        except (AttributeError, NameError):
-            pass
-
         try:
             if self._uid_path_mapper:
                 self._uid_path_mapper.shutdown()
@@ -155,6 +154,14 @@ class CacheRegistry(HasLifecycle):
         except (AttributeError, NameError):
             pass
 
+        # After the stores, since they write content refs along with their file nodes, and the content ref index is only marked as clean
+        # if this is reached:
+        try:
+            if self.content_meta_manager:
+                self.content_meta_manager.shutdown()
+        except (AttributeError, NameError):
+            pass
+
         logger.debug(f'[CacheRegistry] Shutdown done')
 
     # Init
@@ -663,3 +670,31 @@ class CacheRegistry(HasLifecycle):
 
     def get_content_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None):
         return self.content_meta_manager.get_or_create_content_meta_for(size_bytes, md5, sha256)
+
+    def flush_content_meta_inserts(self):
+        self.content_meta_manager.flush_pending_inserts()
+
+    def update_content_refs(self, device_uid: UID, file_node_list: Iterable[TNode], removed_node_uid_list: Iterable[UID] = ()):
+        self.content_meta_manager.update_content_refs(device_uid, file_node_list, removed_node_uid_list)
+
+    def remove_all_content_refs_for_device(self, device_uid: UID):
+        self.content_meta_manager.remove_all_content_refs_for_device(device_uid)
+
+    def get_content_refs_for_content_uid(self, content_uid: UID) -> List[Tuple[UID, UID]]:
+        return self.content_meta_manager.get_content_refs_for_content_uid(content_uid)
+
+    def get_duplicate_content_group_list(self, min_size_bytes: int = 0) -> List[DuplicateContentGroup]:
+        return self.content_meta_manager.get_duplicate_content_group_list(min_size_bytes)
+
+    def _rebuild_content_refs(self):
+        """Builds the content reverse index from the file tables of every cache on disk, without loading any of them"""
+        sw = Stopwatch()
+        ref_list_by_device: Dict[UID, List[Tuple[UID, UID]]] = {}
+        for device_uid, cache_info_list in self.get_all_cache_info_by_device_uid().items():
+            store = self._store_dict.get(device_uid, None)
+            if not store:
+                logger.warning(f'Cannot index content refs for device_uid={device_uid}: no store found')
+                continue
+            ref_list_by_device[device_uid] = store.get_content_ref_list(cache_info_list)
+        self.content_meta_manager.rebuild_content_refs(ref_list_by_device)
+        logger.info(f'{sw} Rebuilt content ref index from {len(ref_list_by_device)} devices')
@@ -1,12 +1,15 @@
 import threading
-from typing import Dict, List, Optional
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
 import logging
 
-from be.sqlite.content_meta_db import ContentMeta, ContentMetaDatabase
+from be.sqlite.content_meta_db import ContentMeta, ContentMetaDatabase, DuplicateContentGroup
 from constants import NULL_UID
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from model.uid import UID
+from util.ensure import ensure_int
 from util.has_lifecycle import HasLifecycle, start_func, stop_func
+from util.holdoff_timer import HoldOffTimer
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,21 @@ class ContentMetaManager(HasLifecycle):
     """
     ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
     CLASS ContentMetaManager
+
+    Holds every ContentMeta in memory, keyed by UID, plus secondary indexes keyed by MD5 and by SHA-256 so that a signature can be looked
+    up without a scan. All three dicts are only modified together, under _struct_lock (see _add_to_dicts()).
+
+    New ContentMetas are not written to disk one at a time, but are buffered & written in batches: when the buffer reaches
+    cache.content_meta.insert_batch_size, when no new ContentMeta has been created for cache.content_meta.insert_holdoff_ms, or at
+    shutdown. Anything which persists a reference to a content UID must first call flush_pending_inserts(), so that a crash can never
+    leave a reference to a ContentMeta which was not persisted.
+
+    Also maintains a persisted reverse index of content UID -> (device_uid, node_uid) for every file node in every cache, so that
+    questions like "where else does this content live" can be answered without loading any cache. The index is updated once per cache
+    write op, just before the op writes its file nodes to disk (see CacheWriteOp.update_content_refs()). Because it is committed separately
+    from the cache DBs, it is only known to agree with them after a clean shutdown; so it is rebuilt from the cache DBs at startup if it did
+    not exist, or if the last run did not shut down cleanly, and whenever rebuild_content_refs() is called. Reads of the index also hold
+    _db_write_lock, so that they never see it part way through a rebuild.
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
 
@@ -25,24 +43,48 @@ class ContentMetaManager(HasLifecycle):
 
         self._struct_lock = threading.Lock()
         self.meta_dict: Dict[UID, ContentMeta] = {}
+        self._md5_dict: Dict[str, ContentMeta] = {}
+        self._sha256_dict: Dict[str, ContentMeta] = {}
+
+        self._db_write_lock = threading.Lock()
+        """Held for the whole of each write to content_meta_db, so that flush_pending_inserts() cannot return while another thread is still
+        writing a batch. Also held for each read of the content ref index: the connection is shared, so a read would otherwise see the
+        uncommitted, partly rebuilt index during rebuild_content_refs(). Always acquire this before _struct_lock, never after."""
+        self._pending_insert_list: List[ContentMeta] = []
+        """ContentMetas which are in meta_dict but have not yet been written to disk. Protected by _struct_lock"""
+        self._insert_batch_size: int = ensure_int(backend.get_config('cache.content_meta.insert_batch_size'))
+        self._insert_timer = HoldOffTimer(holdoff_time_ms=ensure_int(backend.get_config('cache.content_meta.insert_holdoff_ms')),
+                                          task_func=self.flush_pending_inserts)
+        self._needs_content_ref_rebuild: bool = False
 
     @start_func
     def start(self):
         meta_list: List[ContentMeta] = self.content_meta_db.get_all()
         if meta_list:
-            meta_dict = {}
-            for meta in meta_list:
-                meta_dict[meta.uid] = meta
-            self.meta_dict = meta_dict
-            logger.debug(f'Size of ContentMeta dict: {len(self.meta_dict)}')
+            with self._struct_lock:
+                for meta in meta_list:
+                    self._add_to_dicts(meta)
+            logger.debug(f'Size of ContentMeta dict: {len(self.meta_dict)} (distinct MD5s: {len(self._md5_dict)}, '
+                         f'distinct SHA-256s: {len(self._sha256_dict)})')
         else:
             logger.debug(f'No ContentMeta in diskstore; assuming we are starting fresh')
             self.content_meta_db.create_table_if_not_exist()
 
+        is_new_table = self.content_meta_db.create_content_ref_table_if_not_exist()
+        is_clean = self.content_meta_db.is_content_ref_clean()
+        if not is_new_table and not is_clean:
+            logger.warning('Content ref index may be out of sync with the caches (last shutdown was not clean): it will be rebuilt')
+        self._needs_content_ref_rebuild = is_new_table or not is_clean
+        # Cleared again at shutdown. If we never get there, the next startup will know not to trust the index:
+        self.content_meta_db.set_content_ref_clean(False)
+
     @stop_func
     def shutdown(self):
         try:
+            self._insert_timer.cancel()
             if self.content_meta_db:
+                self.flush_pending_inserts()
+                self.content_meta_db.set_content_ref_clean(True)
                 self.content_meta_db.close()
                 self.content_meta_db = None
         except (AttributeError, NameError):
@@ -50,6 +92,8 @@ class ContentMetaManager(HasLifecycle):
 
         try:
             self.meta_dict = None
+            self._md5_dict = None
+            self._sha256_dict = None
             self.backend = None
         except (AttributeError, NameError):
             pass
@@ -74,24 +118,132 @@ class ContentMetaManager(HasLifecycle):
     def get_or_create_content_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None) -> ContentMeta:
         with self._struct_lock:
             if md5:
-                for meta in self.meta_dict.values():
-                    if meta.md5 == md5:
-                        return meta
+                meta = self._md5_dict.get(md5)
+                if meta:
+                    return meta
 
-                return self._insert_new_content_meta(size_bytes, md5, sha256)
+                meta = self._insert_new_content_meta(size_bytes, md5, sha256)
             elif sha256:
-                for meta in self.meta_dict.values():
-                    if meta.sha256 == sha256:
-                        return meta
+                meta = self._sha256_dict.get(sha256)
+                if meta:
+                    return meta
 
-                return self._insert_new_content_meta(size_bytes, md5, sha256)
+                meta = self._insert_new_content_meta(size_bytes, md5, sha256)
             else:
                 # faux-ContentMeta
                 return ContentMeta(uid=NULL_UID, md5=None, sha256=None, size_bytes=size_bytes)
 
+            pending_count = len(self._pending_insert_list)
+
+        if pending_count >= self._insert_batch_size:
+            self.flush_pending_inserts()
+        else:
+            self._insert_timer.start_or_delay()
+        return meta
+
     def _insert_new_content_meta(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None) -> ContentMeta:
+        """Caller must hold _struct_lock"""
         uid = self.backend.uid_generator.next_uid()
         meta = ContentMeta(uid=uid, md5=md5, sha256=sha256, size_bytes=size_bytes)
-        self.content_meta_db.insert_content_meta(meta)
-        self.meta_dict[uid] = meta
+        self._pending_insert_list.append(meta)
+        self._add_to_dicts(meta)
         return meta
+
+    def flush_pending_inserts(self):
+        """Writes any ContentMetas which have been created but not yet written to disk, in a single transaction. Returns only after every
+        ContentMeta created before it was called has been committed (possibly by another thread)."""
+        with self._db_write_lock:
+            self._write_pending_inserts(commit=True)
+
+    def _write_pending_inserts(self, commit: bool):
+        """Caller must hold _db_write_lock"""
+        with self._struct_lock:
+            if not self._pending_insert_list:
+                return
+            to_insert = self._pending_insert_list
+            self._pending_insert_list = []
+
+        # Lookups are not blocked while writing, since _struct_lock has been released:
+        try:
+            self.content_meta_db.insert_content_meta_list(to_insert, commit=commit)
+        except Exception:
+            # Put them back ahead of any added since, so that they are not lost & are still written in order of creation
+            with self._struct_lock:
+                self._pending_insert_list = to_insert + self._pending_insert_list
+            raise
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'Wrote {len(to_insert)} new ContentMetas to disk')
+
+    def _add_to_dicts(self, meta: ContentMeta):
+        """Caller must hold _struct_lock. If more than one ContentMeta has the same signature (which should not happen), the earliest one
+        added keeps the index entry, which matches what the scan that the indexes replaced would have returned."""
+        self.meta_dict[meta.uid] = meta
+        if meta.md5:
+            self._md5_dict.setdefault(meta.md5, meta)
+        if meta.sha256:
+            self._sha256_dict.setdefault(meta.sha256, meta)
+
+    # Content refs (reverse index)
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def needs_content_ref_rebuild(self) -> bool:
+        """True if the reverse index did not exist at startup or was not known to be in sync with the caches, and rebuild_content_refs()
+        has not been called since"""
+        return self._needs_content_ref_rebuild
+
+    def update_content_refs(self, device_uid: UID, file_node_list: Iterable, removed_node_uid_list: Iterable[UID] = ()):
+        """Call this before writing the given file nodes to a cache and/or removing the file nodes with the given UIDs from it. All changes are
+        written in a single transaction, along with any pending ContentMetas, so that the caller can then safely persist the nodes' content UIDs."""
+        upsert_list: List[Tuple[UID, UID, UID]] = []
+        remove_list: List[UID] = list(removed_node_uid_list)
+        for node in file_node_list:
+            if node.content_meta_uid:
+                upsert_list.append((device_uid, node.uid, node.content_meta_uid))
+            else:
+                remove_list.append(node.uid)
+
+        with self._db_write_lock:
+            self._write_pending_inserts(commit=False)
+            if remove_list:
+                self.content_meta_db.delete_content_refs_for_node_uid_list(device_uid, remove_list, commit=False)
+            self.content_meta_db.upsert_content_ref_list(upsert_list, commit=True)
+
+    def remove_all_content_refs_for_device(self, device_uid: UID):
+        with self._db_write_lock:
+            self.content_meta_db.delete_content_refs_for_device(device_uid)
+
+    def rebuild_content_refs(self, ref_list_by_device: Dict[UID, Iterable[Tuple[UID, UID]]]):
+        """Replaces the whole reverse index. Param ref_list_by_device maps each device_uid to (node_uid, content_uid) for every file node
+        with content in that device's caches."""
+        ref_count = 0
+        with self._db_write_lock:
+            self._write_pending_inserts(commit=False)
+            self.content_meta_db.truncate_content_refs(commit=False)
+            for device_uid, ref_list in ref_list_by_device.items():
+                upsert_list = [(device_uid, node_uid, content_uid) for node_uid, content_uid in ref_list if content_uid]
+                self.content_meta_db.upsert_content_ref_list(upsert_list, commit=False)
+                ref_count += len(upsert_list)
+            self.content_meta_db.commit()
+            self._needs_content_ref_rebuild = False
+        logger.info(f'Rebuilt content ref index: {ref_count} file nodes on {len(ref_list_by_device)} devices')
+
+    def get_content_refs_for_content_uid(self, content_uid: UID) -> List[Tuple[UID, UID]]:
+        """Returns the (device_uid, node_uid) of every file node in every cache which has the given content"""
+        with self._db_write_lock:
+            return self.content_meta_db.get_content_refs_for_content_uid(content_uid)
+
+    def get_duplicate_content_group_list(self, min_size_bytes: int = 0) -> List[DuplicateContentGroup]:
+        """Returns a group for each content which is shared by more than one file node (across all devices), largest wasted bytes first.
+        Content which is smaller than min_size_bytes is ignored."""
+        with self._db_write_lock:
+            dup_ref_list = self.content_meta_db.get_duplicate_content_ref_list(min_size_bytes)
+
+        ref_list_by_content: Dict[UID, List[Tuple[UID, UID]]] = defaultdict(list)
+        for content_uid, device_uid, node_uid in dup_ref_list:
+            ref_list_by_content[content_uid].append((device_uid, node_uid))
+
+        with self._struct_lock:
+            group_list = [DuplicateContentGroup(self.meta_dict[content_uid], ref_list) for content_uid, ref_list in ref_list_by_content.items()
+                          if content_uid in self.meta_dict]
+        group_list.sort(key=lambda group: group.get_wasted_bytes(), reverse=True)
+        return group_list
@@ -22,7 +22,7 @@ from model.disp_tree.build_struct import DisplayTreeRequest
 from model.disp_tree.display_tree import DisplayTree, DisplayTreeUiState
 from model.disp_tree.filter_criteria import FilterCriteria
 from model.node.node import TNode, NonexistentDirNode, SPIDNodePair
-from model.node_identifier import GDriveSPID, GUID, LocalNodeIdentifier, NodeIdentifier, SinglePathNodeIdentifier
+from model.node_identifier import GDriveSPID, LocalNodeIdentifier, NodeIdentifier, SinglePathNodeIdentifier
 from model.node_identifier_factory import NodeIdentifierFactory
 from model.uid import UID
 from model.user_op import Batch
@@ -64,7 +64,8 @@ class ActiveTreeManager(HasLifecycle):
         # FIXME: this is a bad solution. Having a single global timer like this can result in stats never getting refreshed if there is frequent
         # updates going on anywhere
         self._stats_refresh_timer = HoldOffTimer(holdoff_time_ms=STATS_REFRESH_HOLDOFF_TIME_MS, task_func=self._process_queued_stats)
-        self._tree_stats_refresh_queue_dict: Dict[TreeID, Set[GUID]] = {}
+        self._tree_stats_refresh_queue_dict: Dict[TreeID, Set[UID]] = {}
+        """For each display tree, the UIDs of the dirs whose children have changed since the last stats refresh"""
         self._stat_dict_lock = threading.Lock()
 
         # simple-as-can-be hook for
@@ -107,7 +108,7 @@ class ActiveTreeManager(HasLifecycle):
     # SignalDispatcher callbacks
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
-    def _get_filtered_sn(self, node: TNode, full_path: str, tree_meta: ActiveDisplayTreeMeta) -> Optional[SPIDNodePair]:
+    def _get_filtered_sn(self, node: TNode, full_path: str, tree_meta: ActiveDisplayTreeMeta, is_removed: bool) -> Optional[SPIDNodePair]:
         filter_state: FilterState = tree_meta.filter_state
 
         sn = SPIDNodePair(self.backend.cacheman.make_spid_for(node_uid=node.uid, device_uid=node.device_uid, full_path=full_path), node)
@@ -129,7 +130,14 @@ class ActiveTreeManager(HasLifecycle):
         sn.spid.parent_guid = parent_sn.spid.guid
         assert sn.spid.parent_guid != sn.spid.guid, f'Parent GUID ({sn.spid.parent_guid}) should not be the same as: {sn.spid}'
         # Will need to refresh stats for parent, even if the node is filtered out:
-        self._enqueue_stat_refresh_for_dir(sn.spid.parent_guid, tree_meta.tree_id)
+        self._enqueue_stat_refresh_for_dir(parent_sn.spid.node_uid, tree_meta.tree_id)
+
+        if filter_state.has_criteria():
+            # Patch the filter cache in place, so that it doesn't need to be rebuilt:
+            if is_removed:
+                filter_state.on_node_removed(sn, parent_sn, self.backend.cacheman.get_parent_for_sn)
+            else:
+                filter_state.on_node_upserted(sn, parent_sn, self.backend.cacheman.get_parent_for_sn)
 
         if filter_state.has_criteria() and not filter_state.matches(sn):
             if TRACE_ENABLED:
@@ -144,37 +152,37 @@ class ActiveTreeManager(HasLifecycle):
 
         return sn
 
-    def _enqueue_stat_refresh_for_dir(self, dir_guid: GUID, tree_id: TreeID):
+    def _enqueue_stat_refresh_for_dir(self, dir_uid: UID, tree_id: TreeID):
         with self._stat_dict_lock:
-            guid_set = self._tree_stats_refresh_queue_dict.get(tree_id, None)
-            if not guid_set:
-                guid_set: Set[GUID] = set()
-                self._tree_stats_refresh_queue_dict[tree_id] = guid_set
-            is_new: bool = dir_guid not in guid_set
+            uid_set = self._tree_stats_refresh_queue_dict.get(tree_id, None)
+            if not uid_set:
+                uid_set: Set[UID] = set()
+                self._tree_stats_refresh_queue_dict[tree_id] = uid_set
+            is_new: bool = dir_uid not in uid_set
             if is_new:
-                guid_set.add(dir_guid)
+                uid_set.add(dir_uid)
 
         if SUPER_DEBUG_ENABLED:
             if is_new:
-                logger.debug(f'[{tree_id}] Added dir {dir_guid} to stats queue; giving the stats refresh timer a kick')
+                logger.debug(f'[{tree_id}] Added dir {dir_uid} to stats queue; giving the stats refresh timer a kick')
             else:
-                logger.debug(f'[{tree_id}] Dir {dir_guid} already present in stats queue')
+                logger.debug(f'[{tree_id}] Dir {dir_uid} already present in stats queue')
 
         if is_new:
             self._stats_refresh_timer.start_or_delay()
 
     def _process_queued_stats(self):
         with self._stat_dict_lock:
-            # For each display tree in the dict, need to regenerate stats for the given GUIDs and their descendants AND direct ancestors.
-            # To simplify things and avoid possible errors, let's just regenerate the stats for the entire tree and see how that performs.
-            for tree_id, guid_set in self._tree_stats_refresh_queue_dict.items():
-                logger.debug(f'Recomputed stats for tree_id: {tree_id}')
+            # For each display tree in the dict, need to update the stats for the given dirs AND their ancestors. CacheManager will fall back
+            # to regenerating the stats for the entire tree if needed.
+            for tree_id, uid_set in self._tree_stats_refresh_queue_dict.items():
+                logger.debug(f'Recomputing stats for {len(uid_set)} changed dirs in tree_id: {tree_id}')
 
                 meta: ActiveDisplayTreeMeta = self.get_active_display_tree_meta(tree_id)
                 if meta:
                     if meta.load_state == TreeLoadState.COMPLETELY_LOADED:
-                        # Regenerate all the stats (+ status msg) and store the updates in the tree_meta:
-                        meta.load_state = self.backend.cacheman.repopulate_dir_stats_for_tree(meta)
+                        # Update the stats (+ status msg) and store the updates in the tree_meta:
+                        meta.load_state = self.backend.cacheman.update_dir_stats_for_tree(meta, uid_set)
 
                         # Push out the updates to all affected clients:
                         dispatcher.send(signal=Signal.TREE_LOAD_STATE_UPDATED, sender=meta.tree_id, tree_load_state=meta.load_state,
@@ -204,7 +212,7 @@ class ActiveTreeManager(HasLifecycle):
             if not ancestor_list:
                 return False
 
-    def _to_subtree_sn_list(self, node: TNode, tree_meta: ActiveDisplayTreeMeta) -> List[SPIDNodePair]:
+    def _to_subtree_sn_list(self, node: TNode, tree_meta: ActiveDisplayTreeMeta, is_removed: bool) -> List[SPIDNodePair]:
         subtree_root_spid: SinglePathNodeIdentifier = tree_meta.root_sn.spid
 
         if node.device_uid != subtree_root_spid.device_uid:
@@ -212,7 +220,7 @@ class ActiveTreeManager(HasLifecycle):
 
         # LocalDisk: easy: check path
         if node.tree_type == TreeType.LOCAL_DISK and node.node_identifier.has_path_in_subtree(subtree_root_spid.get_single_path()):
-            sn = self._get_filtered_sn(node, node.get_single_path(), tree_meta)
+            sn = self._get_filtered_sn(node, node.get_single_path(), tree_meta, is_removed)
             if sn:
                 return [sn]
             else:
@@ -228,7 +236,7 @@ class ActiveTreeManager(HasLifecycle):
             for path in node.get_path_list():
                 if pathlib.PurePosixPath(path).is_relative_to(subtree_root_path):
                     found = True
-                    sn = self._get_filtered_sn(node, path, tree_meta)
+                    sn = self._get_filtered_sn(node, path, tree_meta, is_removed)
                     if sn:
                         return_list.append(sn)
 
@@ -238,14 +246,20 @@ class ActiveTreeManager(HasLifecycle):
 
         return []
 
-    def _on_node_upserted(self, sender: str, node: TNode):
+    def _on_node_upserted(self, sender: str, node: TNode, prev_parent_uid_list: Optional[List[UID]] = None):
+        # If the node was moved (e.g. a GDrive node whose parents changed), the parents it was moved from also need their stats updated:
+        moved_from_parent_uid_list = [uid for uid in prev_parent_uid_list if uid not in node.get_parent_uids()] if prev_parent_uid_list else []
+
         with self._display_tree_dict_lock:
             for tree_id, tree_meta in self._display_tree_dict.items():
                 if not tree_meta.is_first_order():
                     if TRACE_ENABLED:
                         logger.debug(f'[{tree_id}] Tree is not first-order; ignoring upserted node {node.device_uid}:{node.uid}')
                     continue
-                subtree_sn_list = self._to_subtree_sn_list(node, tree_meta)
+                if tree_meta.root_sn.spid.device_uid == node.device_uid:
+                    for parent_uid in moved_from_parent_uid_list:
+                        self._enqueue_stat_refresh_for_dir(parent_uid, tree_id)
+                subtree_sn_list = self._to_subtree_sn_list(node, tree_meta, is_removed=False)
                 if TRACE_ENABLED:
                     logger.debug(f'[{tree_id}] Upserted node {node.device_uid}:{node.uid} resolved to {len(subtree_sn_list)} SPIDs')
 
@@ -261,7 +275,7 @@ class ActiveTreeManager(HasLifecycle):
                     if TRACE_ENABLED:
                         logger.debug(f'[{tree_id}] Tree is not first-order; ignoring removed node {node.device_uid}:{node.uid}')
                     continue
-                subtree_sn_list = self._to_subtree_sn_list(node, tree_meta)
+                subtree_sn_list = self._to_subtree_sn_list(node, tree_meta, is_removed=True)
                 if TRACE_ENABLED:
                     logger.debug(f'Removed node {node.device_uid}:{node.uid} resolved to {len(subtree_sn_list)} SPIDs in {tree_id}')
 
@@ -309,10 +323,10 @@ class ActiveTreeManager(HasLifecycle):
 
                     # Just do the easiest and least-error prone thing for now:
                     for node in upserted_node_list:
-                        upserted_sn_list = upserted_sn_list + self._to_subtree_sn_list(node, tree_meta)
+                        upserted_sn_list = upserted_sn_list + self._to_subtree_sn_list(node, tree_meta, is_removed=False)
 
                     for node in removed_node_list:
-                        removed_sn_list = removed_sn_list + self._to_subtree_sn_list(node, tree_meta)
+                        removed_sn_list = removed_sn_list + self._to_subtree_sn_list(node, tree_meta, is_removed=True)
 
                     if upserted_sn_list or removed_sn_list:
                         if SUPER_DEBUG_ENABLED:
@@ -665,6 +679,10 @@ class ActiveTreeManager(HasLifecycle):
     def get_active_display_tree_meta(self, tree_id: TreeID) -> ActiveDisplayTreeMeta:
         return self._display_tree_dict.get(tree_id, None)
 
+    def get_active_display_tree_meta_list(self) -> List[ActiveDisplayTreeMeta]:
+        with self._display_tree_dict_lock:
+            return list(self._display_tree_dict.values())
+
     def get_filter_criteria(self, tree_id: TreeID) -> Optional[FilterCriteria]:
         meta = self.get_active_display_tree_meta(tree_id)
         if not meta:
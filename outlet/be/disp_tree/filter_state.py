@@ -1,18 +1,25 @@
 import logging
+import threading
 from collections import deque
-from typing import Deque, Dict, List
+from typing import Callable, Deque, Dict, List, Optional, Set
 
+from be.tree_store.name_index import NodeNameIndex
 from constants import TrashStatus, TreeID, TreeType, UI_STATE_CFG_SEGMENT
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from model.disp_tree.filter_criteria import FilterCriteria, Ternary
 from model.node.dir_stats import DirStats
 from model.node.node import SPIDNodePair
 from model.node_identifier import GUID, SinglePathNodeIdentifier
+from model.uid import UID
 from util.ensure import ensure_bool
 from util.stopwatch_sec import Stopwatch
 
 logger = logging.getLogger(__name__)
 
+NAME_INDEX_MAX_MATCH_RATIO = 0.2
+"""If the name index matches more than this fraction of all nodes on the device, walking the subtree is cheaper than starting from
+each match and linking its ancestors"""
+
 
 class FilterState:
     """
@@ -29,6 +36,8 @@ class FilterState:
         self.root_sn: SPIDNodePair = root_sn
         self.cached_node_dict: Dict[GUID, List[SPIDNodePair]] = {}
         self.cached_dir_stats: Dict[GUID, DirStats] = {}
+        self._is_cache_populated: bool = False
+        self._cache_lock = threading.RLock()
 
     def __repr__(self):
         return f'FilterState(root={self.root_sn.spid}, cached_node_dict size={len(self.cached_node_dict)} ' \
@@ -39,9 +48,11 @@ class FilterState:
 
     def update_root_sn(self, new_root_sn: SPIDNodePair):
         if new_root_sn.spid != self.root_sn.spid:
-            self.root_sn = new_root_sn
-            self.cached_node_dict.clear()
-            self.cached_dir_stats.clear()
+            with self._cache_lock:
+                self.root_sn = new_root_sn
+                self.cached_node_dict.clear()
+                self.cached_dir_stats.clear()
+                self._is_cache_populated = False
 
     def _matches_search_query(self, sn: SPIDNodePair) -> bool:
         return not self.filter.search_query or (self.filter.ignore_case and self.filter.search_query.lower() in sn.node.name.lower()) \
@@ -106,34 +117,12 @@ class FilterState:
             child_list = parent_tree.get_child_list_for_spid(parent_sn.spid)
             filtered_child_list = []
 
-            # Calculate DirStats also. Compare with BaseTree.generate_dir_stats()
-            dir_stats = dir_stats_dict.get(parent_guid, None)
-            if not dir_stats:
-                dir_stats = DirStats()
-                dir_stats_dict[parent_guid] = dir_stats
-
             for child_sn in child_list:
-                child_guid = child_sn.spid.guid
                 # Include dirs if any of their children are included, or if they match. Include non-dirs only if they match:
-                if (child_sn.node.is_dir() and child_guid in node_dict) or self.matches(child_sn):
+                if (child_sn.node.is_dir() and child_sn.spid.guid in node_dict) or self.matches(child_sn):
                     filtered_child_list.append(child_sn)
 
-                    if child_sn.node.is_dir():
-                        child_stats = dir_stats_dict.get(child_guid, None)
-                        if not child_stats:
-                            # should never happen
-                            logger.error(f'DirStatsDict contents: {dir_stats_dict}')
-                            raise RuntimeError(f'Internal error: no child stats in dict for dir node: {child_guid} ({child_sn.spid})')
-                        dir_stats.add_dir_stats(child_stats)
-
-                        # Do not count container nodes in dir count
-                        if not child_sn.node.is_container_node():
-                            if child_sn.node.get_trashed_status() != TrashStatus.NOT_TRASHED:
-                                dir_stats.trashed_dir_count += 1
-                            else:
-                                dir_stats.dir_count += 1
-                    else:
-                        dir_stats.add_file_node(child_sn.node)
+            dir_stats_dict[parent_guid] = FilterState._build_dir_stats_for_filtered_child_list(filtered_child_list, dir_stats_dict)
             if filtered_child_list:
                 node_dict[parent_guid] = filtered_child_list
 
@@ -141,6 +130,43 @@ class FilterState:
         self.cached_node_dict = node_dict
         self.cached_dir_stats = dir_stats_dict
 
+    @staticmethod
+    def _build_dir_stats_for_filtered_child_list(filtered_child_list: List[SPIDNodePair], dir_stats_dict: Dict[GUID, DirStats]) -> DirStats:
+        """Calculates the DirStats for a dir, given its filtered children. Compare with BaseTree.generate_dir_stats()"""
+        dir_stats = DirStats()
+        for child_sn in filtered_child_list:
+            if child_sn.node.is_dir():
+                child_guid = child_sn.spid.guid
+                child_stats = dir_stats_dict.get(child_guid, None)
+                if not child_stats:
+                    # should never happen
+                    logger.error(f'DirStatsDict contents: {dir_stats_dict}')
+                    raise RuntimeError(f'Internal error: no child stats in dict for dir node: {child_guid} ({child_sn.spid})')
+                dir_stats.add_dir_stats(child_stats)
+
+                # Do not count container nodes in dir count
+                if not child_sn.node.is_container_node():
+                    if child_sn.node.get_trashed_status() != TrashStatus.NOT_TRASHED:
+                        dir_stats.trashed_dir_count += 1
+                    else:
+                        dir_stats.dir_count += 1
+            else:
+                dir_stats.add_file_node(child_sn.node)
+        return dir_stats
+
+    @staticmethod
+    def _build_dir_stats_for_flat_list_entry(sn: SPIDNodePair) -> DirStats:
+        """Returns the contribution of a single matching node to the DirStats of the flat list"""
+        dir_stats = DirStats()
+        if sn.node.is_dir():
+            if sn.node.get_trashed_status() == TrashStatus.NOT_TRASHED:
+                dir_stats.dir_count += 1
+            else:
+                dir_stats.trashed_dir_count += 1
+        else:
+            dir_stats.add_file_node(sn.node)
+        return dir_stats
+
     def _build_cache_for_flat_list(self, parent_tree):
         """
         If not showing ancestors, then search results will be a big flat list.
@@ -161,13 +187,7 @@ class FilterState:
                 filtered_list.append(sn)
 
                 # Add to dir_stats (Compare with BaseTree.generate_dir_stats())
-                if sn.node.is_dir():
-                    if sn.node.get_trashed_status() == TrashStatus.NOT_TRASHED:
-                        dir_stats.dir_count += 1
-                    else:
-                        dir_stats.trashed_dir_count += 1
-                else:
-                    dir_stats.add_file_node(sn.node)
+                dir_stats.add_dir_stats(FilterState._build_dir_stats_for_flat_list_entry(sn))
 
             # Add next level to the queue:
             if sn.node.is_dir():
@@ -180,32 +200,254 @@ class FilterState:
         self.cached_node_dict[root_guid] = filtered_list
         self.cached_dir_stats[root_guid] = dir_stats
 
-    def ensure_cache_populated(self, parent_tree):
-        if self.cached_node_dict or self.root_sn.node is None:
+    def _build_cache_from_name_matches(self, parent_tree, uid_set: Set[UID]):
+        """
+        Builds the same cache as _build_cache_with_ancestors() / _build_cache_for_flat_list(), but starts from the nodes whose names
+        match the search query (looked up in the name index) rather than walking the whole subtree. Only the ancestors of matches are visited.
+        """
+        root_guid: GUID = self.root_sn.spid.guid
+        root_path: str = self.root_sn.spid.get_single_path()
+
+        match_sn_list: List[SPIDNodePair] = []
+        for uid in uid_set:
+            node = parent_tree.get_node_for_uid(uid)
+            if node:
+                for sn in parent_tree.to_sn_list_in_subtree(node, root_path):
+                    # Still need to check the other criteria
+                    if sn.spid.guid != root_guid and self.matches(sn):
+                        match_sn_list.append(sn)
+        logger.debug(f'Name index returned {len(uid_set)} nodes for query "{self.filter.search_query}", of which {len(match_sn_list)} '
+                     f'are in subtree and match all criteria')
+
+        if not self.filter.show_ancestors_of_matches:
+            dir_stats = DirStats()
+            for sn in match_sn_list:
+                dir_stats.add_dir_stats(FilterState._build_dir_stats_for_flat_list_entry(sn))
+            self.cached_node_dict[root_guid] = match_sn_list
+            self.cached_dir_stats[root_guid] = dir_stats
+            return
+
+        # Link each match into its parent's list, then each ancestor into its own parent's list, until reaching an ancestor which
+        # has already been linked (or the root):
+        node_dict: Dict[GUID, List[SPIDNodePair]] = {}
+        linked_guid_set: Set[GUID] = set()
+        for sn in match_sn_list:
+            child_sn = sn
+            while child_sn.spid.guid not in linked_guid_set:
+                parent_sn = parent_tree.get_parent_for_sn(child_sn)
+                if not parent_sn:
+                    logger.warning(f'Could not find parent of {child_sn.spid} while building filter cache (root={self.root_sn.spid})')
+                    break
+                linked_guid_set.add(child_sn.spid.guid)
+                child_list = node_dict.get(parent_sn.spid.guid)
+                if child_list is None:
+                    child_list = []
+                    node_dict[parent_sn.spid.guid] = child_list
+                child_list.append(child_sn)
+                if parent_sn.spid.guid == root_guid:
+                    break
+                child_sn = parent_sn
+
+        # Calculate DirStats bottom-up: reversed pre-order guarantees that each dir comes after all its descendants
+        dir_guid_list: List[GUID] = []
+        dir_guid_stack: List[GUID] = [root_guid]
+        while dir_guid_stack:
+            dir_guid = dir_guid_stack.pop()
+            dir_guid_list.append(dir_guid)
+            for child_sn in node_dict.get(dir_guid, []):
+                if child_sn.node.is_dir():
+                    dir_guid_stack.append(child_sn.spid.guid)
+
+        dir_stats_dict: Dict[GUID, DirStats] = {}
+        for dir_guid in reversed(dir_guid_list):
+            dir_stats_dict[dir_guid] = FilterState._build_dir_stats_for_filtered_child_list(node_dict.get(dir_guid, []), dir_stats_dict)
+
+        logger.debug(f'Built filtered node dict with {len(node_dict)} entries from name index')
+        self.cached_node_dict = node_dict
+        self.cached_dir_stats = dir_stats_dict
+
+    def ensure_cache_populated(self, parent_tree, name_index: Optional[NodeNameIndex] = None):
+        if self._is_cache_populated or self.root_sn.node is None:
             if SUPER_DEBUG_ENABLED:
                 logger.debug(f'ensure_cache_populated(): cached_dict size={len(self.cached_node_dict)}; has_root={self.root_sn.node is not None}')
             return
 
-        self.rebuild_cache(parent_tree)
+        self.rebuild_cache(parent_tree, name_index)
 
-    def rebuild_cache(self, parent_tree):
+    def rebuild_cache(self, parent_tree, name_index: Optional[NodeNameIndex] = None):
+        """If a NodeNameIndex is supplied and there is a search query, the cache is built from the index's matches instead of walking
+        the whole subtree."""
         stopwatch = Stopwatch()
-        logger.debug(f'Rebuilding filter cache for root: {self.root_sn.spid}')
-        self.cached_node_dict.clear()
-        self.cached_dir_stats.clear()
+        logger.debug(f'Rebuilding filter cache for root: {self.root_sn.spid} (use_name_index={name_index is not None})')
+        with self._cache_lock:
+            self.cached_node_dict.clear()
+            self.cached_dir_stats.clear()
 
-        if self.filter.show_ancestors_of_matches:
-            self._build_cache_with_ancestors(parent_tree)
-        else:
-            self._build_cache_for_flat_list(parent_tree)
+            name_match_uid_set: Optional[Set[UID]] = None
+            if name_index is not None and self.filter.search_query and self.root_sn.node.is_dir():
+                name_match_uid_set = name_index.search(self.filter.search_query, self.filter.ignore_case)
+                if len(name_match_uid_set) > name_index.get_node_count() * NAME_INDEX_MAX_MATCH_RATIO:
+                    logger.debug(f'Name index matched {len(name_match_uid_set)} of {name_index.get_node_count()} nodes: will walk subtree instead')
+                    name_match_uid_set = None
+
+            if name_match_uid_set is not None:
+                self._build_cache_from_name_matches(parent_tree, name_match_uid_set)
+            elif self.filter.show_ancestors_of_matches:
+                self._build_cache_with_ancestors(parent_tree)
+            else:
+                self._build_cache_for_flat_list(parent_tree)
+            self._is_cache_populated = True
 
         logger.debug(f'{stopwatch} Finished rebuilding cache')
 
+    # Incremental cache updates
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def on_node_upserted(self, sn: SPIDNodePair, parent_sn: SPIDNodePair, get_parent_sn_func: Callable[[SPIDNodePair], Optional[SPIDNodePair]]):
+        """
+        Patches the cache for the given upserted node, rather than rebuilding it. The node must be inside the subtree of root_sn,
+        and its parent_guid must be set. get_parent_sn_func is used to walk up from parent_sn to the root, updating the ancestors' stats
+        and adding any ancestors which now have a matching descendant.
+        """
+        with self._cache_lock:
+            if not self._should_patch_cache(sn):
+                return
+
+            if self.filter.show_ancestors_of_matches:
+                guid = sn.spid.guid
+                if sn.node.is_dir() and guid not in self.cached_node_dict:
+                    # Dir has no included children (yet). Any children will arrive in their own upserts
+                    self.cached_dir_stats[guid] = DirStats()
+                is_included = guid in self.cached_node_dict or self.matches(sn)
+                self._set_child_in_cache(parent_sn.spid.guid, sn, is_included, replace_existing=True)
+                self._refresh_ancestor_chain(parent_sn, get_parent_sn_func)
+            else:
+                self._remove_from_flat_list(sn)
+                if self.matches(sn):
+                    root_guid = self.root_sn.spid.guid
+                    self.cached_node_dict[root_guid] = self.cached_node_dict.get(root_guid, []) + [sn]
+                    self.cached_dir_stats[root_guid].add_dir_stats(FilterState._build_dir_stats_for_flat_list_entry(sn))
+
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'Patched filter cache for upserted node {sn.spid}: {self}')
+
+    def on_node_removed(self, sn: SPIDNodePair, parent_sn: SPIDNodePair, get_parent_sn_func: Callable[[SPIDNodePair], Optional[SPIDNodePair]]):
+        """
+        Patches the cache for the given removed node, rather than rebuilding it. Ancestors which no longer have any matching
+        descendants (and which do not match themselves) are pruned. See on_node_upserted().
+        """
+        with self._cache_lock:
+            if not self._should_patch_cache(sn):
+                return
+
+            if self.filter.show_ancestors_of_matches:
+                if sn.node.is_dir():
+                    self._prune_subtree_from_cache(sn.spid.guid)
+                self._set_child_in_cache(parent_sn.spid.guid, sn, is_included=False, replace_existing=True)
+                self._refresh_ancestor_chain(parent_sn, get_parent_sn_func)
+            else:
+                self._remove_from_flat_list(sn)
+                if sn.node.is_dir():
+                    self._remove_descendants_from_flat_list(sn)
+
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'Patched filter cache for removed node {sn.spid}: {self}')
+
+    def _should_patch_cache(self, sn: SPIDNodePair) -> bool:
+        if not self._is_cache_populated or not self.filter.has_criteria():
+            # Nothing to patch: cache will be built from scratch when it is needed
+            return False
+        if sn.spid.guid == self.root_sn.spid.guid:
+            # The root is not part of any child list
+            return False
+        assert sn.spid.parent_guid, f'No parent_guid for: {sn.spid}'
+        return True
+
+    @staticmethod
+    def _is_same_spid(sn: SPIDNodePair, other_sn: SPIDNodePair) -> bool:
+        # Compare UIDs first: GUIDs are built on demand and are much more expensive to compare
+        return sn.spid.node_uid == other_sn.spid.node_uid and sn.spid.guid == other_sn.spid.guid
+
+    def _set_child_in_cache(self, parent_guid: GUID, sn: SPIDNodePair, is_included: bool, replace_existing: bool) -> bool:
+        """Adds/removes/replaces the given node in its parent's filtered child list. Returns True if the list was changed.
+
+        Lists are copied rather than modified in place, because they may currently be in the hands of a reader."""
+        old_child_list: List[SPIDNodePair] = self.cached_node_dict.get(parent_guid, [])
+        new_child_list: List[SPIDNodePair] = [child_sn for child_sn in old_child_list if not FilterState._is_same_spid(child_sn, sn)]
+        was_included = len(new_child_list) != len(old_child_list)
+        if was_included == is_included and not (is_included and replace_existing):
+            return False
+
+        if is_included:
+            new_child_list.append(sn)
+
+        if new_child_list:
+            self.cached_node_dict[parent_guid] = new_child_list
+        else:
+            self.cached_node_dict.pop(parent_guid, None)
+        return True
+
+    def _refresh_ancestor_chain(self, dir_sn: SPIDNodePair, get_parent_sn_func: Callable[[SPIDNodePair], Optional[SPIDNodePair]]):
+        """Recalculates the DirStats for dir_sn and each of its ancestors up to root_sn (from their filtered child lists), and adds or
+        prunes each ancestor in its own parent's child list depending on whether it still has matching descendants."""
+        root_guid: GUID = self.root_sn.spid.guid
+        while dir_sn:
+            guid = dir_sn.spid.guid
+            self.cached_dir_stats[guid] = FilterState._build_dir_stats_for_filtered_child_list(self.cached_node_dict.get(guid, []),
+                                                                                                self.cached_dir_stats)
+            if guid == root_guid:
+                return
+
+            parent_sn = get_parent_sn_func(dir_sn)
+            if not parent_sn:
+                logger.warning(f'Could not find parent of {dir_sn.spid} while updating filter cache (root={self.root_sn.spid})')
+                return
+
+            is_included = guid in self.cached_node_dict or self.matches(dir_sn)
+            self._set_child_in_cache(parent_sn.spid.guid, dir_sn, is_included, replace_existing=False)
+            dir_sn = parent_sn
+
+    def _prune_subtree_from_cache(self, subtree_root_guid: GUID):
+        guid_queue: Deque[GUID] = deque()
+        guid_queue.append(subtree_root_guid)
+        while len(guid_queue) > 0:
+            guid = guid_queue.popleft()
+            self.cached_dir_stats.pop(guid, None)
+            for child_sn in self.cached_node_dict.pop(guid, []):
+                if child_sn.node.is_dir():
+                    guid_queue.append(child_sn.spid.guid)
+
+    def _remove_from_flat_list(self, sn: SPIDNodePair):
+        root_guid: GUID = self.root_sn.spid.guid
+        old_list: List[SPIDNodePair] = self.cached_node_dict.get(root_guid, [])
+        new_list: List[SPIDNodePair] = []
+        for existing_sn in old_list:
+            if FilterState._is_same_spid(existing_sn, sn):
+                # Remove the old version's contribution to the stats
+                self.cached_dir_stats[root_guid].subtract_dir_stats(FilterState._build_dir_stats_for_flat_list_entry(existing_sn))
+            else:
+                new_list.append(existing_sn)
+        if len(new_list) != len(old_list):
+            self.cached_node_dict[root_guid] = new_list
+
+    def _remove_descendants_from_flat_list(self, dir_sn: SPIDNodePair):
+        root_guid: GUID = self.root_sn.spid.guid
+        dir_path: str = dir_sn.spid.get_single_path()
+        new_list: List[SPIDNodePair] = []
+        dir_stats = DirStats()
+        for existing_sn in self.cached_node_dict.get(root_guid, []):
+            if not existing_sn.spid.get_single_path().startswith(dir_path + '/'):
+                new_list.append(existing_sn)
+                dir_stats.add_dir_stats(FilterState._build_dir_stats_for_flat_list_entry(existing_sn))
+        self.cached_node_dict[root_guid] = new_list
+        self.cached_dir_stats[root_guid] = dir_stats
+
     def _hash_current_filter(self) -> str:
         return f'{int(self.filter.show_ancestors_of_matches)}:{int(self.filter.ignore_case)}:{int(self.filter.is_trashed)}:' \
                f'{int(self.filter.is_shared)}:{self.filter.search_query}'
 
-    def get_filtered_child_list(self, parent_spid: SinglePathNodeIdentifier, parent_tree) -> List[SPIDNodePair]:
+    def get_filtered_child_list(self, parent_spid: SinglePathNodeIdentifier, parent_tree, name_index: Optional[NodeNameIndex] = None) \
+            -> List[SPIDNodePair]:
         assert parent_tree, 'parent_tree cannot be None!'
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'get_filtered_child_list(has_criteria={self.filter.has_criteria()}, spid={parent_spid})')
@@ -213,7 +455,7 @@ class FilterState:
             # logger.debug(f'No FilterCriteria selected; returning unfiltered list')
             return parent_tree.get_child_list_for_spid(parent_spid)
 
-        self.ensure_cache_populated(parent_tree)
+        self.ensure_cache_populated(parent_tree, name_index)
 
         guid = parent_spid.guid
         sn_list = self.cached_node_dict.get(guid, [])
@@ -11,13 +11,13 @@ from uuid import UUID
 from pydispatch import dispatcher
 
 from be.exec.cmd.cmd_executor import CommandExecutor
-from constants import CENTRAL_EXEC_THREAD_NAME, CFG_ENABLE_OP_EXECUTION, EngineSummaryState, OP_EXECUTION_THREAD_NAME, \
-    TASK_EXEC_IMEOUT_SEC, TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS, TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS, \
+from constants import CENTRAL_EXEC_THREAD_NAME, CFG_ENABLE_OP_EXECUTION, CFG_MAX_CONCURRENT_USER_OPS, EngineSummaryState, \
+    OP_EXECUTION_THREAD_NAME, TASK_EXEC_IMEOUT_SEC, TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS, TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS, \
     TASK_TIME_WARNING_THRESHOLD_SEC
 from global_actions import GlobalActions
 from signal_constants import ID_CENTRAL_EXEC, Signal
 from util import time_util
-from util.ensure import ensure_bool
+from util.ensure import ensure_bool, ensure_int
 from util.has_lifecycle import HasLifecycle
 from util.task_runner import Task, TaskRunner
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
@@ -63,7 +63,10 @@ class CentralExecutor(HasLifecycle):
         self.backend = backend
         self._command_executor = CommandExecutor(self.backend)
         self._global_actions = GlobalActions(self.backend)
-        self._max_workers: int = TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS + TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS
+        self._max_concurrent_user_op_tasks: int = max(1, ensure_int(backend.get_config(CFG_MAX_CONCURRENT_USER_OPS,
+                                                                                        TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS,
+                                                                                        required=False)))
+        self._max_workers: int = TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS + self._max_concurrent_user_op_tasks
         self._be_task_runner = TaskRunner(max_workers=self._max_workers)
         self.enable_op_execution = ensure_bool(backend.get_config(CFG_ENABLE_OP_EXECUTION))
         self._struct_lock = threading.Lock()
@@ -154,6 +157,16 @@ class CentralExecutor(HasLifecycle):
 
         logger.debug('[CentralExecutor] Shutdown done')
 
+    def set_max_concurrent_user_ops(self, max_concurrent_ops: int):
+        """Changes the number of user ops which can execute at the same time. Cannot be raised above the configured value, which determines
+        the number of workers"""
+        max_allowed = self._max_workers - TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS
+        if not 1 <= max_concurrent_ops <= max_allowed:
+            raise RuntimeError(f'Invalid value for max concurrent user ops: {max_concurrent_ops} (must be between 1 and {max_allowed})')
+        logger.info(f'Setting max concurrent user ops = {max_concurrent_ops}')
+        self._max_concurrent_user_op_tasks = max_concurrent_ops
+        self.notify()
+
     def get_engine_summary_state(self) -> EngineSummaryState:
         with self._struct_lock:
             # FIXME: need to revisit these categories
@@ -345,9 +358,9 @@ class CentralExecutor(HasLifecycle):
                 logger.debug(f'[{CENTRAL_EXEC_THREAD_NAME}] Op execution is disabled; ignoring op grapph')
                 return None
 
-        if user_op_count >= TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS:
+        if user_op_count >= self._max_concurrent_user_op_tasks:
             logger.debug(f'[{CENTRAL_EXEC_THREAD_NAME}] CheckForQueuedTasks(): Running max OpGraph tasks '
-                         f'({TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS}) - OpExecutionEnabled={self.enable_op_execution}')
+                         f'({self._max_concurrent_user_op_tasks}) - OpExecutionEnabled={self.enable_op_execution}')
             return None
 
         try:
@@ -51,10 +51,12 @@ class CopyFileLocalToLocalCommand(CopyNodeCommand):
         local_file_util = LocalFileUtil(cxt.cacheman)
         src_path = self.op.src_node.get_single_path()
         dst_path = self.op.dst_node.get_single_path()
-        src_node = local_file_util.ensure_up_to_date(self.op.src_node)
-        to_upsert = [src_node]
+        # If src has no signature yet, it will be calculated during the copy:
+        src_node = local_file_util.ensure_up_to_date(self.op.src_node, require_signature=False)
 
-        staging_path = os.path.join(cxt.get_staging_dir_path(dst_path), src_node.md5)
+        # Prefix with op UID so that ops executing at the same time never share a staging file (e.g. 2 copies of the same content):
+        staging_file_name = f'{self.op.op_uid}-{src_node.md5}' if src_node.md5 else f'{self.op.op_uid}-{src_node.device_uid}-{src_node.uid}'
+        staging_path = os.path.join(cxt.get_staging_dir_path(dst_path), staging_file_name)
         logger.debug(f'CP: src="{src_path}" stg="{staging_path}" dst="{dst_path}"')
 
         try:
@@ -62,24 +64,27 @@ class CopyFileLocalToLocalCommand(CopyNodeCommand):
                 node_dst_old = cxt.cacheman.get_node_for_uid(self.op.dst_node.uid, self.op.dst_node.device_uid)
                 node_dst_old = local_file_util.ensure_up_to_date(node_dst_old)
 
-                local_file_util.copy_file_update(src_node=src_node, dst_node=node_dst_old, staging_path=staging_path,
-                                                 verify=True, update_meta_also=cxt.update_meta_also)
+                src_node = local_file_util.copy_file_update(src_node=src_node, dst_node=node_dst_old, staging_path=staging_path,
+                                                            verify=True, update_meta_also=cxt.update_meta_also)
             else:
-                local_file_util.copy_file_new(src_node=src_node, dst_node=self.op.dst_node, staging_path=staging_path,
-                                              verify=True, copy_meta_also=cxt.update_meta_also)
+                src_node = local_file_util.copy_file_new(src_node=src_node, dst_node=self.op.dst_node, staging_path=staging_path,
+                                                         verify=True, copy_meta_also=cxt.update_meta_also)
 
-            result = UserOpResult(UserOpStatus.COMPLETED_OK, to_upsert=to_upsert)
+            result = UserOpResult(UserOpStatus.COMPLETED_OK, to_upsert=[src_node])
         except IdenticalFileExistsError:
             # This is thrown if the file to be copied is already at the dst. Nothing to do.
-            result = UserOpResult(UserOpStatus.COMPLETED_NO_OP, to_upsert=to_upsert)
+            if not src_node.has_signature():
+                src_node = local_file_util.try_calculating_signature(src_node)
+            result = UserOpResult(UserOpStatus.COMPLETED_NO_OP, to_upsert=[src_node])
             # However, make sure we still keep the cache manager in the loop - it's likely out of date. Calculate fresh stats (below)
 
-        # update cache:
-        dst_node = cxt.cacheman.build_local_file_node(full_path=dst_path, is_live=True, must_scan_signature=True)
+        # update cache. The content at dst has been verified to be identical to src, so no need to read it again for its signature:
+        dst_node = cxt.cacheman.build_local_file_node(full_path=dst_path, is_live=True, must_scan_signature=False)
         if not dst_node:
             raise RuntimeError(f'Failed to build new LocalFileNode after copy for path "{dst_path}"')
         assert dst_node.uid == self.op.dst_node.uid, f'LocalNode={dst_node}, DstNode={self.op.dst_node}'
-        to_upsert.append(dst_node)
+        dst_node.content_meta = src_node.content_meta
+        result.nodes_to_upsert.append(dst_node)
 
         return result
 
@@ -132,7 +137,7 @@ class MoveFileLocalToLocalCommand(CopyNodeCommand):
 
         # will be None if staging dir not needed
         staging_dir: Optional[str] = cxt.get_staging_dir_path(self.op.dst_node.get_single_path(), only_if_not_primary=True)
-        staging_path: Optional[str] = os.path.join(staging_dir, src_node.md5) if staging_dir else None
+        staging_path: Optional[str] = os.path.join(staging_dir, f'{self.op.op_uid}-{src_node.md5}') if staging_dir else None
         logger.debug(f'MV: src="{src_node.get_single_path()}" stg="{staging_path}" dst="{self.op.dst_node.get_single_path()}"')
 
         # Do the move:
@@ -460,8 +465,8 @@ class CopyFileGDriveToLocalCommand(CopyNodeCommand):
             else:
                 logger.warning(f'Cmd has "overwrite" specified for a local file which does not exist: {dst_path}')
 
-        # Set up staging path:
-        staging_path = os.path.join(cxt.get_staging_dir_path(dst_path), self.op.src_node.md5)
+        # Set up staging path. Prefixed with op UID so that it is not shared with concurrent ops, but can be found again if this op is resumed:
+        staging_path = os.path.join(cxt.get_staging_dir_path(dst_path), f'{self.op.op_uid}-{self.op.src_node.md5}')
 
         # File already exists in staging with the given content?
         if os.path.exists(staging_path):
@@ -1,6 +1,7 @@
 import logging
 import os
 import pathlib
+import threading
 from abc import ABC, abstractmethod
 from typing import Optional, Set, Union
 
@@ -37,6 +38,8 @@ class CommandContext:
 
         # TODO: Store these in a DB on disk so that we can track them across crashes/restarts and clean them up
         self._secondary_cache_set: Set[str] = set()
+        self._secondary_cache_lock = threading.Lock()
+        """Commands can execute concurrently, and all share this context"""
 
     def get_staging_dir_path(self, dst_path: str, only_if_not_primary: bool = False) -> Optional[str]:
         """
@@ -53,34 +56,35 @@ class CommandContext:
         if IS_WINDOWS:
             raise RuntimeError(f'get_staging_dir_path(): TODO: add Windows support!')
 
-        # see if we already found relevant staging dir:
-        for staging_dir in self._secondary_cache_set:
-            if pathlib.PurePosixPath(dst_path).is_relative_to(pathlib.Path(staging_dir).parent):
+        with self._secondary_cache_lock:
+            # see if we already found relevant staging dir:
+            for staging_dir in self._secondary_cache_set:
+                if pathlib.PurePosixPath(dst_path).is_relative_to(pathlib.Path(staging_dir).parent):
+                    if SUPER_DEBUG_ENABLED:
+                        logger.debug(f'Found previously established secondary staging dir: "{staging_dir}"')
+                    return staging_dir
+
+            ancestor = pathlib.Path(dst_path).parent
+            while not ancestor.is_mount() and ancestor != LOCAL_DISK_ROOT_PATH:
+                ancestor = pathlib.Path(ancestor).parent
+
+            if ancestor == LOCAL_DISK_ROOT_PATH:
+                if only_if_not_primary:
+                    return None
+                else:
+                    staging_dir = self.primary_staging_dir
+            else:
                 if SUPER_DEBUG_ENABLED:
-                    logger.debug(f'Found previously established secondary staging dir: "{staging_dir}"')
-                return staging_dir
-
-        ancestor = pathlib.Path(dst_path).parent
-        while not ancestor.is_mount() and ancestor != LOCAL_DISK_ROOT_PATH:
-            ancestor = pathlib.Path(ancestor).parent
+                    logger.debug(f'Found mount point: "{ancestor}"')
+                assert not os.path.isabs(self.secondary_mount_staging_dir_name), f'Should not be absolute: {self.secondary_mount_staging_dir_name}'
+                staging_dir = os.path.join(ancestor, self.secondary_mount_staging_dir_name)
+                self._mkdir_if_not_exist(staging_dir)
+                self._secondary_cache_set.add(staging_dir)
 
-        if ancestor == LOCAL_DISK_ROOT_PATH:
-            if only_if_not_primary:
-                return None
-            else:
-                staging_dir = self.primary_staging_dir
-        else:
             if SUPER_DEBUG_ENABLED:
-                logger.debug(f'Found mount point: "{ancestor}"')
-            assert not os.path.isabs(self.secondary_mount_staging_dir_name), f'Should not be absolute: {self.secondary_mount_staging_dir_name}'
-            staging_dir = os.path.join(ancestor, self.secondary_mount_staging_dir_name)
-            self._mkdir_if_not_exist(staging_dir)
-            self._secondary_cache_set.add(staging_dir)
-
-        if SUPER_DEBUG_ENABLED:
-            logger.debug(f'Staging dir for dst "{dst_path}" = "{staging_dir}"')
+                logger.debug(f'Staging dir for dst "{dst_path}" = "{staging_dir}"')
 
-        return staging_dir
+            return staging_dir
 
     @staticmethod
     def _mkdir_if_not_exist(staging_dir: str):
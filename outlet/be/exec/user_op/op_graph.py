@@ -1,11 +1,12 @@
 import collections
 import copy
+import heapq
 import logging
 import threading
-from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 
 from be.exec.user_op.op_graph_node import OpGraphNode, RootNode
-from constants import IconId, NULL_UID, OP_GRAPH_VALIDATE_AFTER_BATCH_INSERT
+from constants import IconId, NULL_UID, OP_GRAPH_VALIDATE_AFTER_BATCH_INSERT, TreeType
 from logging_constants import OP_GRAPH_DEBUG_ENABLED, SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from error import InvalidInsertOpGraphError, OpGraphError, UnsuccessfulBatchInsertError
 from model.node.node import TNode
@@ -43,7 +44,7 @@ class OpGraph(HasLifecycle):
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
 
-    def __init__(self, name):
+    def __init__(self, name, max_concurrent_ops_per_device_dict: Optional[Dict[TreeType, int]] = None):
         HasLifecycle.__init__(self)
         self.name = name
         self._ogn_count: int = 0
@@ -55,12 +56,34 @@ class OpGraph(HasLifecycle):
         self._node_ogn_q_dict: Dict[UID, Dict[UID, Deque[OpGraphNode]]] = {}
         """Contains entries for all nodes associated with UserOps. Each entry contains a queue of all UserOps for that target node"""
 
+        self._queued_child_uid_dict: Dict[Tuple[UID, UID], Set[UID]] = {}
+        """Secondary index into _node_ogn_q_dict: (device_uid, parent_uid) -> UIDs of the nodes under that parent which have a node queue.
+        Used by _find_ogn_list_for_children_of() so that inserting an RM doesn't need to visit every queue in the graph"""
+        self._queued_parent_uid_dict: Dict[Tuple[UID, UID], Set[UID]] = {}
+        """(device_uid, node_uid) -> the parent UIDs under which the node was indexed in _queued_child_uid_dict, so that it can be un-indexed
+        even if the parents of the node's later OGNs differ from those of its earlier ones"""
+
         self.root: RootNode = RootNode()
         """Root of graph. Has no useful internal data; we value it for its children"""
 
         self._outstanding_op_dict: Dict[UID, UserOp] = {}
         """Contains entries for all UserOps which have running operations. Keyed by action UID"""
 
+        self._max_concurrent_ops_per_device_dict: Dict[TreeType, int] = max_concurrent_ops_per_device_dict or {}
+        """The max number of outstanding ops which can touch any one device, by the device's tree type. No limit for tree types not in here"""
+        self._outstanding_op_count_by_device_dict: Dict[UID, int] = {}
+        """device_uid -> number of ops in _outstanding_op_dict which touch that device"""
+
+        self._ready_ogn_heap: List[Tuple[UID, UID]] = []
+        """Ready queue for _try_get(): (op_uid, node_uid) of each OGN which may be ready to run, in op order (i.e. earliest inserted first).
+        An OGN is pushed whenever it may have become a child of root or the front of its node queue, or its op's status is reset. Entries are
+        checked when popped and dropped if not ready, since one of those events will push them again when they become ready"""
+        self._ready_ogn_dict: Dict[UID, OpGraphNode] = {}
+        """node_uid -> OGN for each entry in _ready_ogn_heap or _held_back_ogn_dict, so that no OGN is queued more than once"""
+        self._held_back_ogn_dict: Dict[UID, List[OpGraphNode]] = {}
+        """device_uid -> ready OGNs taken off _ready_ogn_heap because that device was running its max number of ops. They are pushed back
+        onto the heap when one of the device's ops is done, so that _try_get() doesn't need to pop & re-push them on every call"""
+
         self._max_added_op_uid: UID = NULL_UID
         """Sanity check. Keep track of what's been added to the graph, and disallow duplicate or past inserts"""
 
@@ -261,6 +284,33 @@ class OpGraph(HasLifecycle):
             return ogn_list[0]
         return None
 
+    def _index_queued_node(self, tgt_node: TNode):
+        node_key = (tgt_node.device_uid, tgt_node.uid)
+        indexed_parent_uid_set = self._queued_parent_uid_dict.get(node_key)
+        if indexed_parent_uid_set is None:
+            indexed_parent_uid_set = set()
+            self._queued_parent_uid_dict[node_key] = indexed_parent_uid_set
+
+        for parent_uid in tgt_node.get_parent_uids():
+            if parent_uid not in indexed_parent_uid_set:
+                indexed_parent_uid_set.add(parent_uid)
+                parent_key = (tgt_node.device_uid, parent_uid)
+                child_uid_set = self._queued_child_uid_dict.get(parent_key)
+                if child_uid_set is None:
+                    child_uid_set = set()
+                    self._queued_child_uid_dict[parent_key] = child_uid_set
+                child_uid_set.add(tgt_node.uid)
+
+    def _unindex_queued_node(self, device_uid: UID, node_uid: UID):
+        """Call this when the node's queue is removed"""
+        for parent_uid in self._queued_parent_uid_dict.pop((device_uid, node_uid), []):
+            parent_key = (device_uid, parent_uid)
+            child_uid_set = self._queued_child_uid_dict.get(parent_key)
+            if child_uid_set is not None:
+                child_uid_set.discard(node_uid)
+                if not child_uid_set:
+                    del self._queued_child_uid_dict[parent_key]
+
     def get_last_pending_op_for_node(self, device_uid: UID, node_uid: UID) -> Optional[UserOp]:
         """This is a public method."""
         with self._cv_can_get:
@@ -294,10 +344,14 @@ class OpGraph(HasLifecycle):
         # Iterate through graph using a queue, using ogn_coverage_dict to avoid doing duplicate analysis:
         ogn_queue: Deque[OpGraphNode] = collections.deque()
 
+        ready_op_uid_set: Set[UID] = {ogn.op.op_uid for ogn in self._ready_ogn_dict.values()}
         for child_of_root in self.root.get_child_list():
             if not child_of_root.is_child_of_root():
                 error_count += 1
                 logger.error(f'[{self.name}] ValidateGraph: OGN is a child of root but is_child_of_root()==False: {child_of_root}')
+            if self._is_ogn_ready(child_of_root) and child_of_root.op.op_uid not in ready_op_uid_set:
+                error_count += 1
+                logger.error(f'[{self.name}] ValidateGraph: OGN is ready to run but its op is missing from the ready queue: {child_of_root}')
             ogn_queue.append(child_of_root)
 
         while len(ogn_queue) > 0:
@@ -470,6 +524,20 @@ class OpGraph(HasLifecycle):
                 error_count += 1
                 logger.error(f'[{self.name}] ValidateGraph: OGN found in graph which is not present in NodeQueues: {ogn}')
 
+        # Check the index of queued nodes by parent against NodeQueues:
+        for device_uid, node_dict in self._node_ogn_q_dict.items():
+            for node_uid, node_queue in node_dict.items():
+                for ogn in node_queue:
+                    for parent_uid in ogn.get_tgt_node().get_parent_uids():
+                        if node_uid not in self._queued_child_uid_dict.get((device_uid, parent_uid), set()):
+                            error_count += 1
+                            logger.error(f'[{self.name}] ValidateGraph: Node {device_uid}:{node_uid} has a NodeQueue but is not indexed '
+                                         f'under its parent {parent_uid}')
+        for (device_uid, node_uid) in self._queued_parent_uid_dict.keys():
+            if not self._get_ogn_queue_for_node(device_uid, node_uid):
+                error_count += 1
+                logger.error(f'[{self.name}] ValidateGraph: Node {device_uid}:{node_uid} is indexed by parent but has no NodeQueue')
+
         if error_count > 0:
             raise OpGraphError(f'Validation for OpGraph failed with {error_count} errors!')
         else:
@@ -481,13 +549,16 @@ class OpGraph(HasLifecycle):
     def _find_ogn_list_for_children_of(self, potential_parent: TNode) -> List[OpGraphNode]:
         """When adding an RM OGnode, we need to locate its parent OGNs (which relate to the child nodes of its target node).
         We must make sure that all the child nodes are going to be removed before the parent is removed"""
-        # TODO: probably could optimize a bit more...maybe make use of the central cache?
         sw_total = Stopwatch()
 
         ogn_child_list = []
 
-        for node_dict in self._node_ogn_q_dict.values():
-            for node_queue in node_dict.values():
+        # Only the queues of nodes indexed under the potential parent need to be checked. The last OGN of each is still confirmed with
+        # is_parent_of(), which remains the authority on what counts as a child:
+        child_uid_set = self._queued_child_uid_dict.get((potential_parent.device_uid, potential_parent.uid), None)
+        if child_uid_set:
+            for child_uid in child_uid_set:
+                node_queue = self._get_ogn_queue_for_node(potential_parent.device_uid, child_uid)
                 if node_queue:
                     existing_ogn = node_queue[-1]
                     potential_child: TNode = existing_ogn.get_tgt_node()
@@ -828,6 +899,8 @@ class OpGraph(HasLifecycle):
             pending_ogn_queue = collections.deque()
             node_dict[target_node.uid] = pending_ogn_queue
         pending_ogn_queue.append(ogn_new)
+        self._index_queued_node(target_node)
+        self._enqueue_if_child_of_root(ogn_new)
 
         # Add to ancestor_dict:
         logger.debug(f'[{self.name}] InsertOGN({ogn_new.node_uid}) Tgt node {ogn_new.get_tgt_node().node_identifier}'
@@ -946,43 +1019,106 @@ class OpGraph(HasLifecycle):
 
         return True
 
-    def _try_get(self) -> Optional[UserOp]:
-        # We can optimize this later
+    def _enqueue_if_child_of_root(self, ogn: OpGraphNode):
+        """Pushes the OGN onto the ready queue if it is a child of root. Call this whenever an OGN may have become a child of root or the
+        front of its node queue, or its op's status may have been reset."""
+        if ogn.is_child_of_root() and ogn.node_uid not in self._ready_ogn_dict:
+            self._ready_ogn_dict[ogn.node_uid] = ogn
+            heapq.heappush(self._ready_ogn_heap, (ogn.op.op_uid, ogn.node_uid))
 
-        for ogn in self.root.get_child_list():
+    def _is_ogn_ready(self, ogn: OpGraphNode) -> bool:
+        if not ogn.is_child_of_root():
+            # No longer (or not yet) runnable, or was removed from the graph since it was queued
             if OP_GRAPH_DEBUG_ENABLED:
-                logger.debug(f'[{self.name}] TryGet(): Examining {ogn}')
+                logger.debug(f'[{self.name}] TryGet(): Skipping OGN {ogn.node_uid} because it is not a child of root')
+            return False
 
-            if ogn.op.get_status() != UserOpStatus.NOT_STARTED:
+        if ogn.op.get_status() != UserOpStatus.NOT_STARTED:
+            if OP_GRAPH_DEBUG_ENABLED:
+                logger.debug(f'[{self.name}] TryGet(): Skipping OGN {ogn.node_uid} because it has status {ogn.op.get_status().name}')
+            return False
+
+        if ogn.op.has_dst():
+            # If the UserOp has both src and dst nodes, *both* must be next in their queues, and also be just below root.
+            if ogn.is_dst():
+                # Dst node is child of root. But verify corresponding src node is also child of root
+                is_other_node_ready = self._is_node_ready(ogn.op, ogn.op.src_node, 'src', fail_if_not_found=True)
+            else:
+                # Src node is child of root. But verify corresponding dst node is also child of root.
+                is_other_node_ready = self._is_node_ready(ogn.op, ogn.op.dst_node, 'dst', fail_if_not_found=True)
+
+            if not is_other_node_ready:
                 if OP_GRAPH_DEBUG_ENABLED:
-                    logger.debug(f'[{self.name}] TryGet(): Skipping OGN {ogn.node_uid} because it has status {ogn.op.get_status().name}')
-                continue
+                    logger.debug(f'[{self.name}] TryGet(): Skipping OGN {ogn.node_uid} (is_dst={ogn.is_dst()}) because its partner OGN '
+                                 f'is not ready')
+                return False
 
-            if ogn.op.has_dst():
-                # If the UserOp has both src and dst nodes, *both* must be next in their queues, and also be just below root.
-                if ogn.is_dst():
-                    # Dst node is child of root. But verify corresponding src node is also child of root
-                    is_other_node_ready = self._is_node_ready(ogn.op, ogn.op.src_node, 'src', fail_if_not_found=True)
-                else:
-                    # Src node is child of root. But verify corresponding dst node is also child of root.
-                    is_other_node_ready = self._is_node_ready(ogn.op, ogn.op.dst_node, 'dst', fail_if_not_found=True)
+        # Make sure the node has not already been checked out:
+        if self._outstanding_op_dict.get(ogn.op.op_uid, None):
+            if OP_GRAPH_DEBUG_ENABLED:
+                logger.debug(f'[{self.name}] TryGet(): Skipping op {ogn.op.op_uid} because it is already outstanding')
+            return False
 
-                if not is_other_node_ready:
-                    if OP_GRAPH_DEBUG_ENABLED:
-                        logger.debug(f'[{self.name}] TryGet(): Skipping OGN {ogn.node_uid} (is_dst={ogn.is_dst()}) because its partner OGN '
-                                     f'is not ready')
-                    continue
+        return True
 
-            # Make sure the node has not already been checked out:
-            if self._outstanding_op_dict.get(ogn.op.op_uid, None):
+    @staticmethod
+    def _get_device_node_list(op: UserOp) -> List[TNode]:
+        """Returns one node from the op for each distinct device the op touches"""
+        if op.has_dst() and op.dst_node.device_uid != op.src_node.device_uid:
+            return [op.src_node, op.dst_node]
+        return [op.src_node]
+
+    def _get_device_at_limit(self, op: UserOp) -> Optional[UID]:
+        """Returns the UID of a device touched by the op which is already running its max number of ops, or None if there is none"""
+        for node in self._get_device_node_list(op):
+            max_concurrent_ops = self._max_concurrent_ops_per_device_dict.get(node.tree_type, None)
+            if max_concurrent_ops and self._outstanding_op_count_by_device_dict.get(node.device_uid, 0) >= max_concurrent_ops:
                 if OP_GRAPH_DEBUG_ENABLED:
-                    logger.debug(f'[{self.name}] TryGet(): Skipping op {ogn.op.op_uid} because it is already outstanding')
-            else:
+                    logger.debug(f'[{self.name}] TryGet(): Holding back op {op.op_uid}: device {node.device_uid} already has '
+                                 f'{max_concurrent_ops} ops outstanding')
+                return node.device_uid
+        return None
+
+    def _add_outstanding_op(self, op: UserOp):
+        self._outstanding_op_dict[op.op_uid] = op
+        for node in self._get_device_node_list(op):
+            self._outstanding_op_count_by_device_dict[node.device_uid] = self._outstanding_op_count_by_device_dict.get(node.device_uid, 0) + 1
+
+    def _remove_outstanding_op(self, op_uid: UID) -> Optional[UserOp]:
+        op = self._outstanding_op_dict.pop(op_uid, None)
+        if op:
+            for node in self._get_device_node_list(op):
+                count = self._outstanding_op_count_by_device_dict.pop(node.device_uid) - 1
+                if count:
+                    self._outstanding_op_count_by_device_dict[node.device_uid] = count
+
+                # The device is below its limit now, so the ops held back for it can be tried again:
+                for ogn in self._held_back_ogn_dict.pop(node.device_uid, []):
+                    heapq.heappush(self._ready_ogn_heap, (ogn.op.op_uid, ogn.node_uid))
+        return op
+
+    def _try_get(self) -> Optional[UserOp]:
+        while self._ready_ogn_heap:
+            op_uid, node_uid = heapq.heappop(self._ready_ogn_heap)
+            ogn = self._ready_ogn_dict[node_uid]
+            if OP_GRAPH_DEBUG_ENABLED:
+                logger.debug(f'[{self.name}] TryGet(): Examining {ogn}')
+
+            if self._is_ogn_ready(ogn):
+                device_uid_at_limit = self._get_device_at_limit(ogn.op)
+                if device_uid_at_limit is not None:
+                    # Stays in _ready_ogn_dict. Goes back on the heap when the device has room (see _remove_outstanding_op()):
+                    self._held_back_ogn_dict.setdefault(device_uid_at_limit, []).append(ogn)
+                    continue
+
+                del self._ready_ogn_dict[node_uid]
                 if OP_GRAPH_DEBUG_ENABLED:
                     logger.debug(f'[{self.name}] TryGet(): Returning op for OGN {ogn}')
-                self._outstanding_op_dict[ogn.op.op_uid] = ogn.op
+                self._add_outstanding_op(ogn.op)
                 return ogn.op
 
+            del self._ready_ogn_dict[node_uid]
+
         if TRACE_ENABLED:
             logger.debug(f'[{self.name}] TryGet(): Returning None')
         return None
@@ -1034,7 +1170,7 @@ class OpGraph(HasLifecycle):
         logger.debug(f'[{self.name}] Entered pop_completed_op() for op {op_uid}')
 
         with self._cv_can_get:
-            op = self._outstanding_op_dict.pop(op_uid, None)
+            op = self._remove_outstanding_op(op_uid)
             if not op:
                 raise RuntimeError(f'Complated op (UID {op_uid}) not found in outstanding op list!')
 
@@ -1097,6 +1233,16 @@ class OpGraph(HasLifecycle):
             logger.debug(f'[{self.name}] Backing out insert of OGN {-(len(ogn_list) - ogn_count)} of {ogn_count}: {ogn}')
             self._uninsert_ogn(ogn)
 
+        # _uninsert_ogn() took the OGNs out of _ready_ogn_dict. Now drop their entries from the heap & the held-back lists:
+        self._ready_ogn_heap = [entry for entry in self._ready_ogn_heap if entry[1] in self._ready_ogn_dict]
+        heapq.heapify(self._ready_ogn_heap)
+        for device_uid, held_back_ogn_list in list(self._held_back_ogn_dict.items()):
+            held_back_ogn_list = [ogn for ogn in held_back_ogn_list if ogn.node_uid in self._ready_ogn_dict]
+            if held_back_ogn_list:
+                self._held_back_ogn_dict[device_uid] = held_back_ogn_list
+            else:
+                del self._held_back_ogn_dict[device_uid]
+
         logger.info(f'[{self.name}] {sw} Rolled back insert of {ogn_count} OGNs')
 
     def _uninsert_ogn(self, ogn_to_remove: OpGraphNode):
@@ -1110,6 +1256,7 @@ class OpGraph(HasLifecycle):
             return last_ogn
 
         self._remove_ogn_from_node_queue(tgt_node=ogn_to_remove.get_tgt_node(), label='', remove_func=_remove_last)
+        self._ready_ogn_dict.pop(ogn_to_remove.node_uid, None)
 
         self._decrement_icon_update_counts(ogn_to_remove)
 
@@ -1187,17 +1334,20 @@ class OpGraph(HasLifecycle):
             raise RuntimeError(f'{label}: node ({tgt_node.dn_uid}) not found in master dict!')
 
         tgt_ogn: OpGraphNode = remove_func(tgt_ogn_queue)
-        if not tgt_ogn_queue:
+        if tgt_ogn_queue:
+            # The next OGN in the queue may now be ready:
+            self._enqueue_if_child_of_root(tgt_ogn_queue[0])
+        else:
             # Remove queue if it is empty:
             node_dict_for_device.pop(tgt_node.uid, None)
+            self._unindex_queued_node(tgt_node.device_uid, tgt_node.uid)
         if not node_dict_for_device:
             # Remove device dict if it is empty:
             self._node_ogn_q_dict.pop(tgt_node.device_uid, None)
 
         return tgt_ogn
 
-    @staticmethod
-    def _unlink_ogn_from_graph(tgt_ogn: OpGraphNode):
+    def _unlink_ogn_from_graph(self, tgt_ogn: OpGraphNode):
         ogn_former_parent_list = [] + tgt_ogn.get_parent_list()
 
         for ogn_parent in tgt_ogn.get_parent_list():
@@ -1210,6 +1360,7 @@ class OpGraph(HasLifecycle):
             if not ogn_child.get_parent_list():
                 for ogn_parent in ogn_former_parent_list:
                     ogn_parent.link_child(ogn_child)
+                self._enqueue_if_child_of_root(ogn_child)
 
     # RETRY logic
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
@@ -1278,6 +1429,7 @@ class OpGraph(HasLifecycle):
     def _reset_status(self, ogn):
         ogn.op.reset_result()
         self._add_tgt_node_to_icon_changes_dict(ogn.get_tgt_node())  # icon changed
+        self._enqueue_if_child_of_root(ogn)
 
     def _find_blocking_op_list(self, ogn: OpGraphNode) -> Iterable[UserOp]:
         found_op_dict: Dict[UID, UserOp] = {}
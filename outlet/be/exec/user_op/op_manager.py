@@ -13,13 +13,14 @@ from be.exec.user_op.batch_graph_builder import BatchGraphBuilder
 from be.exec.user_op.op_disk_store import OpDiskStore
 from be.exec.user_op.op_graph import OpGraph
 from be.exec.user_op.op_graph_node import RootNode
-from constants import DEFAULT_ERROR_HANDLING_STRATEGY, ErrorHandlingStrategy, IconId
+from constants import CFG_MAX_CONCURRENT_USER_OPS_PER_DEVICE, DEFAULT_ERROR_HANDLING_STRATEGY, ErrorHandlingStrategy, IconId, TreeType
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from error import UnsuccessfulBatchInsertError
 from model.node.node import TNode
 from model.uid import UID
 from model.user_op import Batch, UserOp, UserOpStatus
 from signal_constants import ID_OP_MANAGER, Signal
+from util.ensure import ensure_int
 from util.has_lifecycle import HasLifecycle
 from util.stopwatch_sec import Stopwatch
 from util.task_runner import Task
@@ -50,17 +51,29 @@ class OpManager(HasLifecycle):
         self.backend = backend
         self._cmd_builder: CommandBuilder = CommandBuilder(self.backend.uid_generator)
         self._disk_store: OpDiskStore = OpDiskStore(self.backend, op_db_path=op_db_path)
-        self._op_graph: OpGraph = OpGraph('MainGraph')
+        self._op_graph: OpGraph = OpGraph('MainGraph', self._get_max_concurrent_ops_per_device_dict(backend))
         """Present and future batches, kept in insertion order. Each batch is removed after it is completed."""
 
         self._batch_graph_builder: BatchGraphBuilder = BatchGraphBuilder(self.backend)
         self._are_batches_loaded_from_last_run: bool = False
 
         self._lock = threading.Lock()
+        self._finish_lock = threading.Lock()
+        """Ops can complete on different threads: this makes sure that each op is popped from the OpGraph & saved to disk as one step, so that
+        an op which is not the last in its batch cannot be saved as pending after its batch was archived"""
         self._pending_batch_dict: Dict[UID, Batch] = {}
         self._error_handling_batch_override_dict: Dict[UID, ErrorHandlingStrategy] = {}  # if a batch is not represented here, use default
         self._default_error_handling_strategy: ErrorHandlingStrategy = DEFAULT_ERROR_HANDLING_STRATEGY
 
+    @staticmethod
+    def _get_max_concurrent_ops_per_device_dict(backend) -> Dict[TreeType, int]:
+        max_concurrent_ops_per_device_dict: Dict[TreeType, int] = {}
+        for tree_type, cfg_name in ((TreeType.LOCAL_DISK, 'local_disk'), (TreeType.GDRIVE, 'gdrive')):
+            max_concurrent_ops = backend.get_config(f'{CFG_MAX_CONCURRENT_USER_OPS_PER_DEVICE}.{cfg_name}', required=False)
+            if max_concurrent_ops is not None:
+                max_concurrent_ops_per_device_dict[tree_type] = ensure_int(max_concurrent_ops)
+        return max_concurrent_ops_per_device_dict
+
     def start(self):
         logger.debug(f'[OpManager] Startup started')
         HasLifecycle.start(self)
@@ -500,22 +513,23 @@ class OpManager(HasLifecycle):
             for removed_node in result.nodes_to_remove:
                 self.backend.cacheman.remove_node(removed_node, to_trash=False)
 
-        # Ensure command is one that we are expecting.
-        # Important: wait until after we have finished updating cacheman, as popping here will cause the next op to immediately execute:
-        is_batch_complete: bool = self._op_graph.pop_completed_op(command.op.op_uid)
+        with self._finish_lock:
+            # Ensure command is one that we are expecting.
+            # Important: wait until after we have finished updating cacheman, as popping here will cause the next op to immediately execute:
+            is_batch_complete: bool = self._op_graph.pop_completed_op(command.op.op_uid)
 
-        # If batch complete, archive all ops in the batch. Otherwise, at least update status of op:
-        if result.status == UserOpStatus.STOPPED_ON_ERROR:
-            logger.info(f'Command (op uid={command.op.op_uid} type={command.op.op_type.name}) stopped on error')
-        elif not (result.status == UserOpStatus.COMPLETED_OK or result.status == UserOpStatus.COMPLETED_NO_OP):
-            raise RuntimeError(f'Command completed but status ({result.status}) is invalid: {command}')
+            # If batch complete, archive all ops in the batch. Otherwise, at least update status of op:
+            if result.status == UserOpStatus.STOPPED_ON_ERROR:
+                logger.info(f'Command (op uid={command.op.op_uid} type={command.op.op_type.name}) stopped on error')
+            elif not (result.status == UserOpStatus.COMPLETED_OK or result.status == UserOpStatus.COMPLETED_NO_OP):
+                raise RuntimeError(f'Command completed but status ({result.status}) is invalid: {command}')
 
-        if is_batch_complete:
-            logger.debug(f'Batch complete! Archiving op and all in its batch: {command.op}')
-            self._disk_store.archive_completed_op_and_batch(command.op)
-        else:
-            logger.debug(f'Saving op: {command.op}')
-            self._disk_store.upsert_pending_op_list([command.op])
+            if is_batch_complete:
+                logger.debug(f'Batch complete! Archiving op and all in its batch: {command.op}')
+                self._disk_store.archive_completed_op_and_batch(command.op)
+            else:
+                logger.debug(f'Saving op: {command.op}')
+                self._disk_store.upsert_pending_op_list([command.op])
 
         # Do this after popping the op:
         self._update_icons_for_nodes()
@@ -1,13 +1,22 @@
 import itertools
 import sqlite3
 import logging
-from typing import Any, Callable, Iterable, List, Optional, OrderedDict, Tuple, Union
+from typing import Any, Callable, Iterable, Iterator, List, Optional, OrderedDict, Tuple, Union
 
 from logging_constants import TRACE_ENABLED
 from model.uid import UID
+from util.ensure import ensure_int
 
 logger = logging.getLogger(__name__)
 
+# Database roles. Each role gets its own connection settings (see SqliteSettings):
+DB_ROLE_NODE_CACHE = 'node_cache'  # Local disk & GDrive node caches: large, read-heavy
+DB_ROLE_OP_LOG = 'op_log'  # Pending & archived user ops: small, write-heavy, and must survive a crash
+DB_ROLE_META = 'meta'  # Everything else: the cache registry, UID mappers, content meta
+
+# Number of rows fetched from SQLite at a time by the streaming selects (see LiveTable.select_iter()), unless overridden by SqliteSettings
+DEFAULT_FETCH_ARRAY_SIZE = 1000
+
 
 class Table:
     """
@@ -64,6 +73,8 @@ class LiveTable(Table):
         self.conn = conn
         self.obj_to_tuple_func: Optional[Callable[[Any], Tuple]] = obj_to_tuple_func
         self.tuple_to_obj_func: Optional[Callable[[Tuple], Any]] = tuple_to_obj_func
+        # Only a positive result is cached, since the table can only go away via drop_table_if_exists()
+        self._is_table_cached: bool = False
 
     def __repr__(self):
         return f'LiveTable(name="{self.name}" cols={self.cols} obj_to_tuple_func={self.obj_to_tuple_func} ' \
@@ -78,6 +89,7 @@ class LiveTable(Table):
         sql = self.build_create_table()
         logger.debug('Executing SQL: ' + sql)
         self.conn.execute(sql)
+        self._is_table_cached = True
         if commit:
             self.commit()
 
@@ -86,10 +98,13 @@ class LiveTable(Table):
             self.create_table(commit)
 
     def is_table(self):
+        if self._is_table_cached:
+            return True
         query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{self.name}';"
         cursor = self.conn.execute(query)
         result = cursor.fetchone()
-        return result is not None
+        self._is_table_cached = result is not None
+        return self._is_table_cached
 
     def has_rows(self):
         if not self.is_table():
@@ -113,6 +128,30 @@ class LiveTable(Table):
             cursor.execute(sql)
         return cursor.fetchall()
 
+    def select_iter(self, where_clause: str = '', where_tuple: Tuple = None, array_size: Optional[int] = None) -> Iterator[Tuple]:
+        """Like select(), but yields the rows as they are fetched from SQLite, array_size rows at a time, rather than fetching the whole
+        result set into a list first. The cursor is held open until the iterator is exhausted or closed."""
+        assert not where_clause or (where_clause and where_tuple)
+        if not array_size:
+            settings = getattr(self.conn, 'settings', None)
+            array_size = settings.fetch_array_size if settings else DEFAULT_FETCH_ARRAY_SIZE
+
+        sql = self.build_select() + where_clause
+        cursor = self.conn.cursor()
+        cursor.arraysize = array_size
+        if where_tuple:
+            cursor.execute(sql, where_tuple)
+        else:
+            cursor.execute(sql)
+        try:
+            while True:
+                row_batch = cursor.fetchmany()
+                if not row_batch:
+                    return
+                yield from row_batch
+        finally:
+            cursor.close()
+
     def get_all_rows(self) -> List[Tuple]:
         return self.select()
 
@@ -170,6 +209,7 @@ class LiveTable(Table):
         sql = f"DROP TABLE IF EXISTS {self.name}"
         logger.debug('Executing SQL: ' + sql)
         self.conn.execute(sql)
+        self._is_table_cached = False
         if commit:
             self.commit()
 
@@ -247,24 +287,25 @@ class LiveTable(Table):
             assert isinstance(item, Tuple)
         self.upsert_one(item, commit=commit)
 
+    def select_object_iter(self, where_clause: str = '', where_tuple: Tuple = None,
+                           tuple_to_obj_func_override: Optional[Callable[[Tuple], Any]] = None,
+                           array_size: Optional[int] = None) -> Iterator[Any]:
+        """Like select_object_list(), but converts & yields each object as its row is fetched (see select_iter()), so that a large table never
+        has to be held in memory as rows and as objects at the same time."""
+        if not self.is_table():
+            return
+
+        tuple_to_obj_func = tuple_to_obj_func_override if tuple_to_obj_func_override else self.tuple_to_obj_func
+        if tuple_to_obj_func:
+            for row in self.select_iter(where_clause, where_tuple, array_size):
+                yield tuple_to_obj_func(row)
+        else:
+            yield from self.select_iter(where_clause, where_tuple, array_size)
+
     def select_object_list(self, where_clause: str = '', where_tuple: Tuple = None,
                            tuple_to_obj_func_override: Optional[Callable[[Tuple], Any]] = None) -> List[Any]:
         """ Gets all changes in the table. If 'where_clause' is used, 'where_tuple' supplies the arguments to it """
-
-        entries: List[Any] = []
-
-        if not self.is_table():
-            return entries
-
-        rows = self.select(where_clause, where_tuple)
-        if tuple_to_obj_func_override:
-            for row in rows:
-                entries.append(tuple_to_obj_func_override(row))
-        elif self.tuple_to_obj_func:
-            for row in rows:
-                entries.append(self.tuple_to_obj_func(row))
-        else:
-            entries = rows
+        entries: List[Any] = list(self.select_object_iter(where_clause, where_tuple, tuple_to_obj_func_override))
         logger.debug(f'Retrieved {len(entries)} objects from table {self.name}')
         return entries
 
@@ -321,6 +362,78 @@ class LiveTable(Table):
         return ",".join(list(itertools.repeat('?', size)))
 
 
+class SqliteSettings:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS SqliteSettings
+
+    Connection settings (journal mode & pragmas) for a MetaDatabase.
+    Defaults come from the DB's role; each can be overridden in config under "cache.sqlite.<role>".
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, journal_mode: str = 'WAL', synchronous: str = 'NORMAL', cache_size_kb: int = 16384, mmap_size_mb: int = 0,
+                 temp_store: str = 'MEMORY', fetch_array_size: int = DEFAULT_FETCH_ARRAY_SIZE):
+        self.journal_mode: str = journal_mode
+        self.synchronous: str = synchronous
+        self.cache_size_kb: int = cache_size_kb
+        self.mmap_size_mb: int = mmap_size_mb
+        self.temp_store: str = temp_store
+        # Number of rows per fetchmany() when streaming the results of a select
+        self.fetch_array_size: int = fetch_array_size
+
+    def __repr__(self):
+        return f'SqliteSettings(journal_mode={self.journal_mode} synchronous={self.synchronous} cache_size_kb={self.cache_size_kb} ' \
+               f'mmap_size_mb={self.mmap_size_mb} temp_store={self.temp_store} ' \
+               f'fetch_array_size={self.fetch_array_size})'
+
+    def is_wal(self) -> bool:
+        return self.journal_mode.upper() == 'WAL'
+
+    @staticmethod
+    def for_role(role: str, backend=None) -> 'SqliteSettings':
+        default = ROLE_DEFAULT_SETTINGS_DICT.get(role)
+        if not default:
+            raise RuntimeError(f'Unrecognized DB role: "{role}"')
+        if not backend:
+            return default
+
+        def _get(setting_name: str, default_val):
+            return backend.get_config(f'cache.sqlite.{role}.{setting_name}', default_val=default_val, required=False)
+
+        return SqliteSettings(journal_mode=_get('journal_mode', default.journal_mode),
+                              synchronous=_get('synchronous', default.synchronous),
+                              cache_size_kb=ensure_int(_get('cache_size_kb', default.cache_size_kb)),
+                              mmap_size_mb=ensure_int(_get('mmap_size_mb', default.mmap_size_mb)),
+                              temp_store=_get('temp_store', default.temp_store),
+                              fetch_array_size=ensure_int(_get('fetch_array_size', default.fetch_array_size)))
+
+    def get_pragma_list(self) -> List[str]:
+        return [f'PRAGMA cache_size = -{self.cache_size_kb}',  # negative value = size in KiB, rather than in pages
+                f'PRAGMA mmap_size = {self.mmap_size_mb * 1024 * 1024}',
+                f'PRAGMA temp_store = {self.temp_store}']
+
+
+ROLE_DEFAULT_SETTINGS_DICT = {
+    DB_ROLE_NODE_CACHE: SqliteSettings(synchronous='NORMAL', cache_size_kb=65536, mmap_size_mb=256, fetch_array_size=5000),
+    # The op log is the record of what the user asked us to do, so don't skimp on durability here:
+    DB_ROLE_OP_LOG: SqliteSettings(synchronous='FULL', cache_size_kb=8192, mmap_size_mb=0),
+    DB_ROLE_META: SqliteSettings(synchronous='NORMAL', cache_size_kb=16384, mmap_size_mb=64),
+}
+
+
+class SettingsConnection(sqlite3.Connection):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS SettingsConnection
+
+    The connection of a MetaDatabase. Carries the DB's SqliteSettings, so that each LiveTable can get at them (e.g. for fetch_array_size).
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.settings: Optional[SqliteSettings] = None
+
+
 class MetaDatabase:
     """
     ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
@@ -337,12 +450,26 @@ class MetaDatabase:
                                                       'full_path': 'TEXT'})
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
-    def __init__(self, db_path: str):
-        logger.debug(f'Opening database: {db_path}')
+    def __init__(self, db_path: str, role: str = DB_ROLE_META, backend=None, settings: Optional[SqliteSettings] = None):
+        logger.debug(f'Opening database: {db_path} (role={role})')
+        self.db_path = db_path
+        self.settings: SqliteSettings = settings if settings else SqliteSettings.for_role(role, backend)
         # Use check_same_thread=False to tell SQLite that we are grownups and can handle multi-threading
         # 'DEFERRED' means to disable auto-commit mode
-        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level='DEFERRED')
-        self.db_path = db_path
+        self.conn: SettingsConnection = sqlite3.connect(db_path, check_same_thread=False, isolation_level='DEFERRED', factory=SettingsConnection)
+        self._configure_conn()
+
+    def _configure_conn(self):
+        self.conn.settings = self.settings
+        is_in_memory = self.db_path == ':memory:' or not self.db_path
+        journal_mode = 'MEMORY' if is_in_memory else self.settings.journal_mode
+        journal_mode = self.conn.execute(f'PRAGMA journal_mode = {journal_mode}').fetchone()[0]
+        if not is_in_memory and self.settings.is_wal() and journal_mode.upper() != 'WAL':
+            # e.g. some network filesystems do not support WAL
+            logger.warning(f'Could not enable WAL for "{self.db_path}": using journal_mode={journal_mode}')
+        self.conn.execute(f'PRAGMA synchronous = {self.settings.synchronous}')
+        for pragma in self.settings.get_pragma_list():
+            self.conn.execute(pragma)
 
     def __enter__(self):
         assert self.conn is not None
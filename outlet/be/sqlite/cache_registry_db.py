@@ -35,7 +35,8 @@ class CacheRegistryDatabase(MetaDatabase):
         ('subtree_root_path', 'TEXT'),
         ('subtree_root_uid', 'INTEGER'),
         ('sync_ts', 'INTEGER'),
-        ('complete', 'INTEGER')
+        ('complete', 'INTEGER'),
+        ('file_count', 'INTEGER')
     ]))
 
     TABLE_DEVICE = Table(name='device', cols=OrderedDict([
@@ -64,6 +65,17 @@ class CacheRegistryDatabase(MetaDatabase):
         self.table_cache_registry = LiveTable(CacheRegistryDatabase.TABLE_CACHE_REGISTRY, self.conn,
                                               self._cache_info_to_tuple, self._tuple_to_cache_info)
         self.table_device = LiveTable(CacheRegistryDatabase.TABLE_DEVICE, self.conn, _device_to_tuple, _tuple_to_device)
+        self._add_file_count_col_if_missing()
+
+    def _add_file_count_col_if_missing(self):
+        """Registries written by older versions have no file_count column. Add it (as NULL for every existing row)"""
+        if not self.table_cache_registry.is_table():
+            return
+        col_name_list = [row[1] for row in self.conn.execute(f'PRAGMA table_info({self.table_cache_registry.name})')]
+        if 'file_count' not in col_name_list:
+            logger.info(f'Adding missing column "file_count" to table {self.table_cache_registry.name}')
+            self.conn.execute(f'ALTER TABLE {self.table_cache_registry.name} ADD COLUMN file_count INTEGER')
+            self.conn.commit()
 
     def _cache_info_to_tuple(self, d: CacheInfoEntry) -> Tuple:
         assert isinstance(d, CacheInfoEntry), f'Expected CacheInfoEntry; got instead: {d}'
@@ -71,9 +83,9 @@ class CacheRegistryDatabase(MetaDatabase):
 
     def _tuple_to_cache_info(self, a_tuple: Tuple) -> CacheInfoEntry:
         assert isinstance(a_tuple, Tuple), f'Expected Tuple; got instead: {a_tuple}'
-        cache_location, subtree_root, sync_ts, is_complete = a_tuple
+        cache_location, subtree_root, sync_ts, is_complete, file_count = a_tuple
         cache_location = CacheInfoEntry.convert_relative_path_to_abs(cache_location, self.cache_dir_path)
-        return CacheInfoEntry(cache_location, subtree_root, sync_ts, is_complete)
+        return CacheInfoEntry(cache_location, subtree_root, sync_ts, is_complete, file_count)
 
     def has_cache_info(self):
         return self.table_cache_registry.has_rows()
@@ -93,14 +105,14 @@ class CacheRegistryDatabase(MetaDatabase):
         rows = self.table_cache_registry.get_all_rows()
         entries = []
         for row in rows:
-            cache_location, device_uid, subtree_root_path, subtree_root_uid, sync_ts, is_complete = row
+            cache_location, device_uid, subtree_root_path, subtree_root_uid, sync_ts, is_complete, file_count = row
             subtree_root_path = file_util.normalize_path(subtree_root_path)
             node_identifier = self.node_identifier_factory.build_spid(node_uid=subtree_root_uid, device_uid=device_uid,
                                                                       single_path=subtree_root_path)
             assert node_identifier.is_spid(), f'Not a SPID: {node_identifier}'
             cache_location = CacheInfoEntry.convert_relative_path_to_abs(cache_location, self.cache_dir_path)
             entries.append(CacheInfoEntry(cache_location=cache_location, subtree_root=node_identifier,
-                                          sync_ts=sync_ts, is_complete=is_complete))
+                                          sync_ts=sync_ts, is_complete=is_complete, file_count=file_count))
         return entries
 
     # Takes a list of CacheInfoEntry objects:
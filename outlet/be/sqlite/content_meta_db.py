@@ -1,8 +1,8 @@
 import logging
 from collections import OrderedDict
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
 
-from be.sqlite.base_db import LiveTable, MetaDatabase, Table
+from be.sqlite.base_db import DB_ROLE_META, LiveTable, MetaDatabase, Table
 from model.uid import UID
 from util import time_util
 
@@ -39,6 +39,21 @@ class ContentMeta:
         return f'ContentMeta(uid={self.uid} size_bytes={self.size_bytes} md5={self.md5} sha256={self.sha256})'
 
 
+class DuplicateContentGroup:
+    """A ContentMeta which is referenced by more than one file node, and the (device_uid, node_uid) of each of those nodes"""
+    def __init__(self, content_meta: ContentMeta, node_ref_list: List[Tuple[UID, UID]]):
+        self.content_meta: ContentMeta = content_meta
+        self.node_ref_list: List[Tuple[UID, UID]] = node_ref_list
+
+    def get_wasted_bytes(self) -> int:
+        """Bytes which would be freed if all but one copy were removed"""
+        return self.content_meta.size_bytes * (len(self.node_ref_list) - 1)
+
+    def __repr__(self):
+        return f'DuplicateContentGroup(content_uid={self.content_meta.uid} size_bytes={self.content_meta.size_bytes} ' \
+               f'copies={len(self.node_ref_list)} wasted_bytes={self.get_wasted_bytes()})'
+
+
 class ContentMetaDatabase(MetaDatabase):
     """
     ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
@@ -53,10 +68,25 @@ class ContentMetaDatabase(MetaDatabase):
         ('sync_ts', 'INTEGER')  # this is actually the insert_ts, since we never update
     ]))
 
+    # Reverse index of content_uid -> file nodes, across every device & cache. Unique on (device_uid, node_uid): see _create_content_ref_table()
+    TABLE_CONTENT_REF = Table(name='content_ref', cols=OrderedDict([
+        ('device_uid', 'INTEGER'),
+        ('node_uid', 'INTEGER'),
+        ('content_uid', 'INTEGER')
+    ]))
+
+    # Has at most one row. is_clean is 0 for as long as the backend is running, and is only set to 1 at a clean shutdown: content_ref is
+    # committed separately from the node caches it indexes, so if it is 0 at startup, the two may disagree & content_ref must be rebuilt.
+    TABLE_CONTENT_REF_STATE = Table(name='content_ref_state', cols=OrderedDict([
+        ('is_clean', 'INTEGER')
+    ]))
+
     def __init__(self, backend, db_path: str):
-        super().__init__(db_path)
+        super().__init__(db_path, DB_ROLE_META, backend)
         self.table_content = LiveTable(ContentMetaDatabase.TABLE_CONTENT, self.conn, obj_to_tuple_func=self._content_to_tuple,
                                        tuple_to_obj_func=self._tuple_to_content)
+        self.table_content_ref = LiveTable(ContentMetaDatabase.TABLE_CONTENT_REF, self.conn)
+        self.table_content_ref_state = LiveTable(ContentMetaDatabase.TABLE_CONTENT_REF_STATE, self.conn)
 
     @staticmethod
     def _content_to_tuple(o: ContentMeta) -> Tuple:
@@ -84,6 +114,9 @@ class ContentMetaDatabase(MetaDatabase):
     def insert_content_meta(self, content_meta: ContentMeta, commit=True):
         self.table_content.insert_object(content_meta, commit=commit)
 
+    def insert_content_meta_list(self, content_meta_list: List[ContentMeta], commit=True):
+        self.table_content.insert_object_list(content_meta_list, overwrite=False, commit=commit)
+
     def delete_content_meta_with_uid(self, uid: UID, commit=True):
         self.table_content.delete_for_uid(uid, commit=commit)
 
@@ -111,6 +144,69 @@ class ContentMetaDatabase(MetaDatabase):
         """Raises RuntimeEerror if no meta is found with given UID"""
         return self.table_content.select_object_for_uid(uid=content_uid)
 
+    # CONTENT_REF operations
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def create_content_ref_table_if_not_exist(self) -> bool:
+        """Returns True if the table had to be created (i.e. the index is empty and needs to be built from the node caches)"""
+        if self.table_content_ref.is_table():
+            return False
+        self._create_content_ref_table(commit=True)
+        return True
+
+    def _create_content_ref_table(self, commit: bool):
+        # Table has no composite primary key support, so the uniqueness of (device_uid, node_uid) which upserts rely on is given by an index:
+        self.table_content_ref.create_table(commit=False)
+        self.conn.execute(f'CREATE UNIQUE INDEX {self.table_content_ref.name}_node ON {self.table_content_ref.name}(device_uid, node_uid)')
+        self.conn.execute(f'CREATE INDEX {self.table_content_ref.name}_content ON {self.table_content_ref.name}(content_uid)')
+        if commit:
+            self.commit()
+
+    def is_content_ref_clean(self) -> bool:
+        """Returns True if the backend was shut down cleanly after it last wrote content_ref (see TABLE_CONTENT_REF_STATE)"""
+        if not self.table_content_ref_state.is_table():
+            return False
+        rows = self.table_content_ref_state.select()
+        return bool(rows and rows[0][0])
+
+    def set_content_ref_clean(self, is_clean: bool, commit=True):
+        self.table_content_ref_state.create_table_if_not_exist(commit=False)
+        self.table_content_ref_state.truncate_table(commit=False)
+        self.table_content_ref_state.insert_one((int(is_clean),), commit=commit)
+
+    def truncate_content_refs(self, commit=True):
+        self.table_content_ref.drop_table_if_exists(commit=False)
+        self._create_content_ref_table(commit=commit)
+
+    def upsert_content_ref_list(self, ref_list: List[Tuple[UID, UID, UID]], commit=True):
+        """Each item in ref_list is (device_uid, node_uid, content_uid)"""
+        self.table_content_ref.upsert_many(ref_list, commit=commit)
+
+    def delete_content_refs_for_node_uid_list(self, device_uid: UID, node_uid_list: Iterable[UID], commit=True):
+        sql = self.table_content_ref.build_delete() + ' WHERE device_uid = ? AND node_uid = ?'
+        self.conn.executemany(sql, ((device_uid, node_uid) for node_uid in node_uid_list))
+        if commit:
+            self.commit()
+
+    def delete_content_refs_for_device(self, device_uid: UID, commit=True):
+        self.table_content_ref.delete_for_uid(device_uid, uid_col_name='device_uid', commit=commit)
+
+    def get_content_refs_for_content_uid(self, content_uid: UID) -> List[Tuple[UID, UID]]:
+        """Returns the (device_uid, node_uid) of every file node with the given content"""
+        return [(UID(device_uid), UID(node_uid)) for device_uid, node_uid, _
+                in self.table_content_ref.select(where_clause='WHERE content_uid = ?', where_tuple=(content_uid,))]
+
+    def get_duplicate_content_ref_list(self, min_size_bytes: int = 0) -> List[Tuple[UID, UID, UID]]:
+        """Returns (content_uid, device_uid, node_uid) for every file node whose content is shared with at least one other file node and
+        is at least min_size_bytes in size, ordered by content_uid"""
+        ref = self.table_content_ref.name
+        sql = f'SELECT r.content_uid, r.device_uid, r.node_uid FROM {ref} r ' \
+              f'JOIN (SELECT content_uid FROM {ref} GROUP BY content_uid HAVING COUNT(*) > 1) d ON d.content_uid = r.content_uid ' \
+              f'JOIN {self.table_content.name} c ON c.uid = r.content_uid ' \
+              f'WHERE c.size_bytes >= ? ORDER BY r.content_uid'
+        return [(UID(content_uid), UID(device_uid), UID(node_uid)) for content_uid, device_uid, node_uid
+                in self.conn.execute(sql, (min_size_bytes,))]
+
     def get_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None) -> Optional[ContentMeta]:
         """If either md5 or sha256 are supplied, this method returns either None or a single object. If only size_bytes is supplied,
         this method will likewise return either None or a single ContentMeta, based on whether an actual entry exists with the given
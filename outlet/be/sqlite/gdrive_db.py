@@ -1,9 +1,9 @@
 import logging
 from collections import OrderedDict
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 from constants import GDRIVE_DOWNLOAD_STATE_COMPLETE, GDRIVE_DOWNLOAD_TYPE_CHANGES, GDRIVE_ME_USER_UID
-from be.sqlite.base_db import LiveTable, MetaDatabase, Table
+from be.sqlite.base_db import DB_ROLE_NODE_CACHE, LiveTable, MetaDatabase, Table
 from error import GDriveError
 from model.uid import UID
 from model.gdrive_meta import GDriveUser, MimeType
@@ -148,7 +148,7 @@ class GDriveDatabase(MetaDatabase):
                                            ]))
 
     def __init__(self, db_path, backend, device_uid: UID):
-        super().__init__(db_path)
+        super().__init__(db_path, DB_ROLE_NODE_CACHE, backend)
         self.cacheman = backend.cacheman
         self.uid_generator = backend.uid_generator
         self.device_uid: UID = device_uid
@@ -196,6 +196,9 @@ class GDriveDatabase(MetaDatabase):
     def get_gdrive_folder_object_list(self) -> List[GDriveFolder]:
         return self.table_gdrive_folder.select_object_list()
 
+    def iter_gdrive_folder_objects(self) -> Iterator[GDriveFolder]:
+        return self.table_gdrive_folder.select_object_iter()
+
     def update_folder_fetched_status(self, commit=True):
         self.table_gdrive_folder.update(stmt_vars=(True,), col_names=['all_children_fetched'], commit=commit)
 
@@ -209,18 +212,30 @@ class GDriveDatabase(MetaDatabase):
         return self.table_gdrive_file.has_rows()
 
     def insert_gdrive_files(self, file_list: List[GDriveFile], overwrite=False, commit=True):
+        self.cacheman.flush_content_meta_inserts()
         self.table_gdrive_file.insert_object_list(file_list, overwrite, commit)
 
     def upsert_gdrive_file_list(self, file_list: List[GDriveFile], commit=True):
+        self.cacheman.flush_content_meta_inserts()
         self.table_gdrive_file.create_table_if_not_exist(commit=False)
         self.table_gdrive_file.upsert_object_list(file_list, commit=commit)
 
     def get_gdrive_file_object_list(self):
         return self.table_gdrive_file.select_object_list()
 
+    def iter_gdrive_file_objects(self) -> Iterator[GDriveFile]:
+        return self.table_gdrive_file.select_object_iter()
+
     def delete_gdrive_file_with_uid(self, uid: UID, commit=True):
         self.table_gdrive_file.delete_for_uid(uid, commit=commit)
 
+    def get_content_ref_list(self) -> List[Tuple[UID, UID]]:
+        """Returns (node_uid, content_uid) for every file which has content. Reads only those 2 columns, without building any nodes"""
+        if not self.table_gdrive_file.is_table():
+            return []
+        sql = f'SELECT uid, content_uid FROM {self.table_gdrive_file.name} WHERE content_uid IS NOT NULL AND content_uid != 0'
+        return [(UID(uid), UID(content_uid)) for uid, content_uid in self.conn.execute(sql)]
+
     # gdrive_id_parent_mappings operations
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
@@ -1,9 +1,10 @@
 import logging
 import pathlib
+import uuid
 from collections import OrderedDict
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 
-from be.sqlite.base_db import LiveTable, MetaDatabase, Table
+from be.sqlite.base_db import DB_ROLE_NODE_CACHE, LiveTable, MetaDatabase, Table
 from model.uid import UID
 from model.node.locald_node import LocalDirNode, LocalFileNode, LocalNode
 from model.node_identifier import LocalNodeIdentifier
@@ -45,17 +46,57 @@ class LocalDiskDatabase(MetaDatabase):
         ('all_children_fetched', 'INTEGER')
     ]))
 
+    # Identifies the current contents of the cache, for validating snapshots of it (see LocalDiskSnapshot). Has at most one row.
+    # cache_id is random, and is created along with the row; generation is incremented on the first write after each snapshot.
+    TABLE_CACHE_GENERATION = Table(name='cache_generation', cols=OrderedDict([
+        ('cache_id', 'TEXT'),
+        ('generation', 'INTEGER')
+    ]))
+
     def __init__(self, db_path, backend, device_uid: UID):
-        super().__init__(db_path)
+        super().__init__(db_path, DB_ROLE_NODE_CACHE, backend)
         self.cacheman = backend.cacheman
         self.device_uid: UID = device_uid
         self.table_local_file = LiveTable(LocalDiskDatabase.TABLE_LOCAL_FILE, self.conn, self._file_to_tuple, self._tuple_to_file)
         self.table_local_dir = LiveTable(LocalDiskDatabase.TABLE_LOCAL_DIR, self.conn, self._dir_to_tuple, self._tuple_to_dir)
+        self.table_cache_generation = LiveTable(LocalDiskDatabase.TABLE_CACHE_GENERATION, self.conn)
+        self._has_writes_since_snapshot: bool = False
+        """True if the generation has been bumped since the DB was opened or a snapshot was last taken"""
 
     def _get_parent_uid(self, full_path: str) -> UID:
         parent_path = str(pathlib.Path(full_path).parent)
         return self.cacheman.get_uid_for_local_path(parent_path)
 
+    # CACHE_GENERATION operations
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def get_cache_generation(self) -> Optional[Tuple[str, int]]:
+        """Returns (cache_id, generation), or None if no snapshot has ever been taken of this DB"""
+        if not self.table_cache_generation.is_table():
+            return None
+        rows = self.table_cache_generation.select()
+        if not rows:
+            return None
+        return rows[0]
+
+    def get_or_create_cache_generation(self) -> Tuple[str, int]:
+        """Call this to get the cache_id & generation to stamp on a new snapshot. Any write after this will bump the generation."""
+        cache_generation = self.get_cache_generation()
+        if not cache_generation:
+            cache_generation = (uuid.uuid4().hex, 0)
+            self.table_cache_generation.create_table_if_not_exist(commit=False)
+            self.table_cache_generation.insert_one(cache_generation, commit=True)
+        self._has_writes_since_snapshot = False
+        return cache_generation
+
+    def _bump_cache_generation(self):
+        """Must be called before each write which changes the table contents. Only the first write after the DB is opened (or after a
+        snapshot is taken) actually does anything, so that it shares a transaction with that write."""
+        if not self._has_writes_since_snapshot:
+            if self.table_cache_generation.is_table():
+                self.conn.execute(f'UPDATE {self.table_cache_generation.name} SET generation = generation + 1')
+            self._has_writes_since_snapshot = True
+
     # LOCAL_FILE operations
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
@@ -84,29 +125,60 @@ class LocalDiskDatabase(MetaDatabase):
     def get_local_files(self) -> List[LocalFileNode]:
         return self.table_local_file.select_object_list()
 
+    def iter_local_files(self) -> Iterator[LocalFileNode]:
+        return self.table_local_file.select_object_iter()
+
+    def iter_local_file_rows(self) -> Iterator[Tuple]:
+        if not self.table_local_file.is_table():
+            return iter(())
+        return self.table_local_file.select_iter()
+
     def insert_local_files(self, entries: List[LocalFileNode], overwrite, commit=True):
+        self.cacheman.flush_content_meta_inserts()
+        self._bump_cache_generation()
         self.table_local_file.insert_object_list(entries, overwrite=overwrite, commit=commit)
 
     def upsert_local_file(self, node: LocalFileNode, commit=True):
+        self.cacheman.flush_content_meta_inserts()
+        self._bump_cache_generation()
         if not node.is_live():
             # These don't belong here; they belong in the op DB
             logger.warning(f'Saving node with is_live=False! Check code for bug: {node}')
         self.table_local_file.upsert_object(node, commit=commit)
 
     def upsert_local_file_list(self, file_list: List[LocalFileNode], commit=True):
+        self.cacheman.flush_content_meta_inserts()
+        if file_list:
+            self._bump_cache_generation()
         self.table_local_file.create_table_if_not_exist(commit=False)
         self.table_local_file.upsert_object_list(file_list, commit=commit)
 
     def delete_local_file_with_uid(self, uid: UID, commit=True):
+        self._bump_cache_generation()
         self.table_local_file.delete_for_uid(uid, commit=commit)
 
     def delete_local_files_for_uid_list(self, uid_list: List[UID], commit=True):
+        if uid_list:
+            self._bump_cache_generation()
         uid_tuple_list = list(map(lambda uid: (uid,), uid_list))
         self.table_local_file.delete_for_uid_list(uid_tuple_list, commit=commit)
 
     def truncate_local_files(self, commit=True):
+        self._bump_cache_generation()
         self.table_local_file.truncate_table(commit=commit)
 
+    def get_local_file_uid_list(self) -> List[UID]:
+        if not self.table_local_file.is_table():
+            return []
+        return [UID(row[0]) for row in self.conn.execute(f'SELECT uid FROM {self.table_local_file.name}')]
+
+    def get_content_ref_list(self) -> List[Tuple[UID, UID]]:
+        """Returns (node_uid, content_uid) for every file which has content. Reads only those 2 columns, without building any nodes"""
+        if not self.table_local_file.is_table():
+            return []
+        sql = f'SELECT uid, content_uid FROM {self.table_local_file.name} WHERE content_uid IS NOT NULL AND content_uid != 0'
+        return [(UID(uid), UID(content_uid)) for uid, content_uid in self.conn.execute(sql)]
+
     # LOCAL_DIR operations
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
@@ -133,27 +205,43 @@ class LocalDiskDatabase(MetaDatabase):
     def get_local_dirs(self) -> List[LocalDirNode]:
         return self.table_local_dir.select_object_list()
 
+    def iter_local_dirs(self) -> Iterator[LocalDirNode]:
+        return self.table_local_dir.select_object_iter()
+
+    def iter_local_dir_rows(self) -> Iterator[Tuple]:
+        if not self.table_local_dir.is_table():
+            return iter(())
+        return self.table_local_dir.select_iter()
+
     def insert_local_dirs(self, entries: List[LocalDirNode], overwrite, commit=True):
+        self._bump_cache_generation()
         self.table_local_dir.insert_object_list(entries, overwrite=overwrite, commit=commit)
 
     def upsert_local_dir(self, node: LocalDirNode, commit=True):
+        self._bump_cache_generation()
         if not node.is_live():
             # These don't belong here; they belong in the op DB
             logger.warning(f'Saving node with is_live=False! Check code for bug: {node}')
         self.table_local_dir.upsert_object(node, commit=commit)
 
     def upsert_local_dir_list(self, dir_list: List[LocalDirNode], commit=True):
+        if dir_list:
+            self._bump_cache_generation()
         self.table_local_dir.create_table_if_not_exist(commit=False)
         self.table_local_dir.upsert_object_list(dir_list, commit=commit)
 
     def delete_local_dir_with_uid(self, uid: UID, commit=True):
+        self._bump_cache_generation()
         self.table_local_dir.delete_for_uid(uid, commit=commit)
 
     def delete_local_dirs_for_uid_list(self, uid_list: List[UID], commit=True):
+        if uid_list:
+            self._bump_cache_generation()
         uid_tuple_list = list(map(lambda uid: (uid,), uid_list))
         self.table_local_dir.delete_for_uid_list(uid_tuple_list, commit=commit)
 
     def truncate_local_dirs(self, commit=True):
+        self._bump_cache_generation()
         self.table_local_dir.truncate_table(commit=commit)
 
     # Mixed type operations
@@ -223,4 +311,4 @@ class LocalDiskDatabase(MetaDatabase):
         return child_dir_list + child_file_list
 
     def get_all_files_with_content(self, content_uid: UID) -> List[LocalFileNode]:
-        return self.table_local_dir.select_object_list(where_clause='WHERE content_uid = ?', where_tuple=(content_uid,))
+        return self.table_local_file.select_object_list(where_clause='WHERE content_uid = ?', where_tuple=(content_uid,))
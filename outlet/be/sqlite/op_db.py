@@ -5,7 +5,7 @@ from collections import OrderedDict
 from functools import partial
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from be.sqlite.base_db import LiveTable, MetaDatabase, Table
+from be.sqlite.base_db import DB_ROLE_OP_LOG, LiveTable, MetaDatabase, Table
 from be.sqlite.gdrive_db import GDriveDatabase
 from be.sqlite.local_db import LocalDiskDatabase
 from constants import OBJ_TYPE_DIR, OBJ_TYPE_FILE, TreeType
@@ -239,7 +239,7 @@ class OpDatabase(MetaDatabase):
                                ]))
 
     def __init__(self, db_path, backend):
-        super().__init__(db_path)
+        super().__init__(db_path, DB_ROLE_OP_LOG, backend)
         self.cacheman = backend.cacheman
 
         self.table_lists: TableListCollection = TableListCollection()
@@ -508,6 +508,7 @@ class OpDatabase(MetaDatabase):
         return tuple_list_multimap
 
     def _upsert_nodes_without_commit(self, entries: Iterable[UserOp], lifecycle_state: str):
+        self.cacheman.flush_content_meta_inserts()
         tuple_list_multimap = self._make_tuple_list(entries, lifecycle_state)
         for lifecycle_state, src_or_dst, tree_type, obj_type, tuple_list in tuple_list_multimap.entries():
             table: LiveTable = self.table_lists.get_table(lifecycle_state, src_or_dst, tree_type, obj_type)
@@ -2,7 +2,7 @@ import logging
 from collections import OrderedDict
 from typing import List, Tuple
 
-from be.sqlite.base_db import LiveTable, MetaDatabase, Table
+from be.sqlite.base_db import DB_ROLE_META, LiveTable, MetaDatabase, Table
 from model.uid import UID
 
 logger = logging.getLogger(__name__)
@@ -25,7 +25,7 @@ class UidMapperDb(MetaDatabase):
     ]))
 
     def __init__(self, db_path, backend, table: Table):
-        super().__init__(db_path)
+        super().__init__(db_path, DB_ROLE_META, backend)
         self.cacheman = backend.cacheman
         self.table = LiveTable(table, self.conn)
 
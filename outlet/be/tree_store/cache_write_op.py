@@ -1,14 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import List, Optional
 
 from model.node.node import TNode
+from model.uid import UID
 
 
 class NodeUpdateInfo:
-    def __init__(self, node: Optional[TNode], needs_disk_update: bool, has_icon_update: bool):
+    def __init__(self, node: Optional[TNode], needs_disk_update: bool, has_icon_update: bool, prev_parent_uid_list: Optional[List[UID]] = None):
         self.node: Optional[TNode] = node
         self.needs_disk_update: bool = needs_disk_update
         self.has_icon_update: bool = has_icon_update
+        self.prev_parent_uid_list: Optional[List[UID]] = prev_parent_uid_list
+        """Parent UIDs of the node which was replaced, if any. (Needed so that the stats of parents it was moved from can be updated)"""
 
 
 class NodeUpdateInfoFactory:
@@ -30,6 +33,12 @@ class CacheWriteOp(ABC):
     def update_memstore(self, memstore):
         pass
 
+    def update_content_refs(self, cacheman):
+        """Called after update_memstore() & before update_diskstore(). Ops which write or remove file nodes should override this to update the
+        content reverse index for all of them with a single call to cacheman.update_content_refs(), which also persists any pending
+        ContentMetas before the nodes which reference them are written."""
+        pass
+
     @abstractmethod
     def update_diskstore(self, diskstore):
         pass
@@ -4,6 +4,7 @@ import logging
 import os.path
 import pickle
 import socket
+import threading
 import time
 from collections import deque
 from functools import partial
@@ -19,6 +20,7 @@ from pydispatch import dispatcher
 
 from be.tree_store.gdrive.client.change_observer import GDriveChangeObserver, GDriveNodeChange, GDriveRM
 from be.tree_store.gdrive.client.conversion import GDriveAPIConverter
+from be.tree_store.gdrive.client.partitioned_query import PartitionedQueryFetcher
 from be.tree_store.gdrive.client.query_observer import GDriveQueryObserver, SimpleNodeCollector
 from constants import GDRIVE_AUTH_SCOPES, GDRIVE_CLIENT_REQUEST_MAX_RETRIES, GDRIVE_CLIENT_SLEEP_ON_FAILURE_SEC, GDRIVE_FILE_FIELDS, \
     GDRIVE_FOLDER_FIELDS, \
@@ -30,6 +32,7 @@ from model.node.gdrive_node import GDriveFile, GDriveFolder, GDriveNode
 from model.uid import UID
 from signal_constants import Signal
 from util import file_util, time_util
+from util.ensure import ensure_int
 from util.has_lifecycle import HasLifecycle
 from util.stopwatch_sec import Stopwatch
 from util.task_runner import Task
@@ -79,13 +82,30 @@ class GDriveClient(HasLifecycle):
         self.gdrive_store = gdrive_store
         self.tree_id: Optional[TreeID] = None
         self.page_size: int = self.backend.get_config('gdrive.page_size')
-        self.service: Optional[Resource] = None
+        self._service_factory: Optional[Callable[[], Resource]] = None
+        self._thread_local = threading.local()
+        """Holds the Resource of each thread. See service"""
         self._converter = GDriveAPIConverter(self.gdrive_store)
 
+        self._max_concurrent_requests: int = ensure_int(self.backend.get_config('gdrive.initial_load.max_concurrent_requests', 1,
+                                                                                required=False))
+        self._partition_count: int = ensure_int(self.backend.get_config('gdrive.initial_load.partition_count', 1, required=False))
+        self._max_buffered_pages: int = ensure_int(self.backend.get_config('gdrive.initial_load.max_buffered_pages', 1, required=False))
+
     @property
     def device_uid(self) -> UID:
         return self.gdrive_store.device_uid
 
+    @property
+    def service(self) -> Resource:
+        """The Resource for the current thread. A Resource is not thread-safe (each one wraps a single HTTP connection), and several user ops
+        & query partitions can send requests at once, so each thread gets its own, built from the same credentials"""
+        service = getattr(self._thread_local, 'service', None)
+        if not service:
+            service = self._service_factory()
+            self._thread_local.service = service
+        return service
+
     def start(self):
         logger.debug(f'Starting GDriveClient')
         HasLifecycle.start(self)
@@ -95,16 +115,18 @@ class GDriveClient(HasLifecycle):
         # time.
         token_file_path = file_util.get_resource_path(self.backend.get_config('gdrive.auth.token_file_path'))
         creds_file_path = file_util.get_resource_path(self.backend.get_config('gdrive.auth.credentials_file_path'))
-        self.service = GDriveClient._load_google_client_service(token_file_path, creds_file_path)
+        credentials = GDriveClient._load_google_credentials(token_file_path, creds_file_path)
+        self._service_factory = partial(GDriveClient._build_google_client_service, credentials)
 
     def shutdown(self):
         HasLifecycle.shutdown(self)
 
-        if self.service:
-            self.service = None
+        # Drops the Resource of every thread:
+        self._thread_local = threading.local()
+        self._service_factory = None
 
     @staticmethod
-    def _load_google_client_service(token_file_path: str, creds_file_path: str):
+    def _load_google_credentials(token_file_path: str, creds_file_path: str):
         def request():
             logger.debug('Trying to authenticate against GDrive API...')
             creds = None
@@ -124,13 +146,19 @@ class GDriveClient(HasLifecycle):
                 with open(token_file_path, 'wb') as token:
                     pickle.dump(creds, token)
 
-            service: Resource = build('drive', 'v3', credentials=creds, cache=MemoryCache())
-            return service
+            return creds
 
         result = GDriveClient._try_repeatedly(request)
         logger.debug('Authentication done!')
         return result
 
+    @staticmethod
+    def _build_google_client_service(credentials) -> Resource:
+        def request():
+            return build('drive', 'v3', credentials=credentials, cache=MemoryCache())
+
+        return GDriveClient._try_repeatedly(request)
+
     @staticmethod
     def _try_repeatedly(request_func):
         retries_remaining = GDRIVE_CLIENT_REQUEST_MAX_RETRIES
@@ -184,6 +212,20 @@ class GDriveClient(HasLifecycle):
             logger.debug('Request returned no files')
             return
 
+        self._process_page_items(items, request_state)
+
+        request_state.page_token = results.get('nextPageToken')
+
+        request_state.observer.end_of_page(request_state.page_token)
+
+        if not request_state.page_token:
+            logger.debug(f'{request_state.stopwatch_retrieval} Done. Query returned {request_state.item_count} nodes')
+        elif request_state.parent_task:
+            # essentially loop, with each loop being scheduled through the Central Executor as a child task of the parent:
+            next_child_task = request_state.parent_task.create_child_task(self._exec_single_page_request, make_request_func, request_state)
+            self.backend.executor.submit_async_task(next_child_task)
+
+    def _process_page_items(self, items: list, request_state: QueryRequestState):
         msg = f'Received {len(items)} items'
         logger.debug(msg)
         if self.tree_id:
@@ -199,17 +241,6 @@ class GDriveClient(HasLifecycle):
             request_state.observer.node_received(goog_node, item)
             request_state.item_count += 1
 
-        request_state.page_token = results.get('nextPageToken')
-
-        request_state.observer.end_of_page(request_state.page_token)
-
-        if not request_state.page_token:
-            logger.debug(f'{request_state.stopwatch_retrieval} Done. Query returned {request_state.item_count} nodes')
-        elif request_state.parent_task:
-            # essentially loop, with each loop being scheduled through the Central Executor as a child task of the parent:
-            next_child_task = request_state.parent_task.create_child_task(self._exec_single_page_request, make_request_func, request_state)
-            self.backend.executor.submit_async_task(next_child_task)
-
     def _execute_files_query(self, query: str, fields: str, initial_page_token: Optional[str], sync_ts: int, observer: GDriveQueryObserver,
                              this_task: Optional[Task] = None):
         """Gets a list of files and/or folders which match the query criteria."""
@@ -247,6 +278,50 @@ class GDriveClient(HasLifecycle):
                     logger.debug('Done!')
                     break
 
+    def _execute_partitioned_files_query(self, query: str, fields: str, resume_token: Optional[str], sync_ts: int,
+                                         observer: GDriveQueryObserver):
+        """Like _execute_files_query(), but splits the query into partitions by modifiedTime and fetches pages of each concurrently
+        (see PartitionedQueryFetcher). Blocks until all pages have been received by the observer. The page token passed to
+        observer.end_of_page() is a resume token for the whole partitioned query, to be passed back in as resume_token."""
+        spaces = 'drive'
+
+        def request_page(partition_query: str, page_token: Optional[str]) -> dict:
+            def request():
+                logger.debug(f'Sending request for GDrive items (q="{partition_query}")')
+                return self.service.files().list(q=partition_query, fields=fields, spaces=spaces, pageSize=self.page_size,
+                                                 includeItemsFromAllDrives=True, supportsAllDrives=True, pageToken=page_token).execute()
+            return GDriveClient._try_repeatedly(request)
+
+        request_state = QueryRequestState(resume_token, sync_ts, observer)
+
+        def on_page_received(results: dict, next_resume_token: Optional[str]):
+            if results.get('incompleteSearch', False):
+                raise RuntimeError(f'Results are incomplete! (page {request_state.page_count})')
+            request_state.page_count += 1
+
+            items: list = results.get('files', [])
+            if items:
+                self._process_page_items(items, request_state)
+            request_state.page_token = next_resume_token
+            observer.end_of_page(next_resume_token)
+
+        if resume_token:
+            logger.info('Found a page token. Attempting to resume previous download')
+
+        fetcher = PartitionedQueryFetcher(query, request_page, self._max_concurrent_requests, self._max_buffered_pages)
+        fetcher.fetch_all(resume_token, sync_ts, self._partition_count, on_page_received)
+        logger.debug(f'{request_state.stopwatch_retrieval} Done. Query returned {request_state.item_count} nodes '
+                     f'in {request_state.page_count} pages')
+
+    def _execute_whole_drive_query(self, query: str, fields: str, initial_page_token: Optional[str], sync_ts: int,
+                                   observer: GDriveQueryObserver, this_task: Optional[Task]):
+        """For the initial download of all meta: uses a partitioned query if configured for concurrent requests. A download which was
+        started one way must be resumed the same way, since the page token for one is meaningless to the other."""
+        if PartitionedQueryFetcher.is_resume_token(initial_page_token) or (not initial_page_token and self._max_concurrent_requests > 1):
+            self._execute_partitioned_files_query(query, fields, initial_page_token, sync_ts, observer)
+        else:
+            self._execute_files_query(query, fields, initial_page_token, sync_ts, observer, this_task)
+
     # VARIOUS GETTERS
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
@@ -457,7 +532,7 @@ class GDriveClient(HasLifecycle):
 
         logger.info('Getting list of ALL NON DIRS in Google Drive...')
 
-        return self._execute_files_query(query, fields, initial_page_token, sync_ts, observer, this_task)
+        return self._execute_whole_drive_query(query, fields, initial_page_token, sync_ts, observer, this_task)
 
     def copy_existing_file(self, src_goog_id: str, new_name: str, new_parent_goog_ids: List[str], uid: Optional[UID] = None) \
             -> Optional[GDriveNode]:
@@ -502,7 +577,7 @@ class GDriveClient(HasLifecycle):
         """
         fields = f'nextPageToken, incompleteSearch, files({GDRIVE_FOLDER_FIELDS}, parents)'
 
-        self._execute_files_query(QUERY_FOLDERS_ONLY, fields, initial_page_token, sync_ts, observer, this_task)
+        self._execute_whole_drive_query(QUERY_FOLDERS_ONLY, fields, initial_page_token, sync_ts, observer, this_task)
 
     def get_folders_with_parent_and_name(self, parent_goog_id: str, name: str) -> SimpleNodeCollector:
         query = f"{QUERY_FOLDERS_ONLY} AND name='{name}' AND '{parent_goog_id}' in parents"
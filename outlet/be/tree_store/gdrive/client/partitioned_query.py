@@ -0,0 +1,175 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from queue import Empty, Full, Queue
+from typing import Callable, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_PAGE_TOKEN_PREFIX = 'partitioned:'
+
+# Lower bound of the first modifiedTime range which is split into partitions. Items modified before this all land in the first partition
+PARTITION_START_TS_SEC = int(datetime(2008, 1, 1, tzinfo=timezone.utc).timestamp())
+
+_PUT_TIMEOUT_SEC = 0.1
+
+# Partition state, as stored in the resume token: None = not started; str = page token of next page; True = done
+PartitionState = Union[None, str, bool]
+
+
+def _to_rfc_3339(ts_sec: int) -> str:
+    return datetime.fromtimestamp(ts_sec, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class _FetchError:
+    def __init__(self, partition_index: int, error: Exception):
+        self.partition_index: int = partition_index
+        self.error: Exception = error
+
+
+class PartitionedQueryFetcher:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS PartitionedQueryFetcher
+
+    Fetches all the results of a GDrive files query as several queries, each covering a disjoint range of modifiedTime, which are paged
+    through concurrently (up to max_concurrent_requests requests in flight at once). Each partition's worker requests its next page as soon
+    as it has the token for it, so that pages are prefetched while the caller is busy with earlier ones; up to max_buffered_pages received
+    pages are held before the workers must wait.
+
+    Pages are handed to page_func one at a time, on the calling thread, in the order they arrive. Each is accompanied by a resume token
+    which encodes the progress of every partition as of the end of that page (or None for the last page), so that a download interrupted
+    after any page can be resumed from that page's token without fetching any page twice.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, base_query: str, request_page_func: Callable[[str, Optional[str]], dict], max_concurrent_requests: int,
+                 max_buffered_pages: int):
+        self._base_query: str = base_query
+        self._request_page_func: Callable[[str, Optional[str]], dict] = request_page_func
+        """Takes (query, page_token) and returns the response dict for that page"""
+        self._max_concurrent_requests: int = max(1, max_concurrent_requests)
+        self._max_buffered_pages: int = max(1, max_buffered_pages)
+
+        self._boundary_list: List[int] = []
+        self._state_list: List[PartitionState] = []
+        self._page_queue: Queue = Queue(maxsize=self._max_buffered_pages)
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def is_resume_token(page_token: Optional[str]) -> bool:
+        return bool(page_token) and page_token.startswith(PARTITIONED_PAGE_TOKEN_PREFIX)
+
+    @staticmethod
+    def build_boundary_list(end_ts_sec: int, partition_count: int) -> List[int]:
+        """Splits the time from PARTITION_START_TS_SEC to end_ts_sec into partition_count ranges, returning the (partition_count - 1)
+        boundaries between them. Most items in a typical drive were modified recently, so the ranges get narrower towards end_ts_sec
+        (quadratically) to keep the partitions closer in size. The first & last ranges are open-ended, so that every item falls into
+        exactly one."""
+        partition_count = max(1, partition_count)
+        span_sec = max(0, end_ts_sec - PARTITION_START_TS_SEC)
+        return [end_ts_sec - (span_sec * (partition_count - i) ** 2) // (partition_count ** 2) for i in range(1, partition_count)]
+
+    def get_partition_query(self, partition_index: int) -> str:
+        clause_list = [f'({self._base_query})']
+        if partition_index > 0:
+            clause_list.append(f"modifiedTime >= '{_to_rfc_3339(self._boundary_list[partition_index - 1])}'")
+        if partition_index < len(self._boundary_list):
+            clause_list.append(f"modifiedTime < '{_to_rfc_3339(self._boundary_list[partition_index])}'")
+        return ' AND '.join(clause_list)
+
+    def _encode_resume_token(self) -> str:
+        return PARTITIONED_PAGE_TOKEN_PREFIX + json.dumps({'boundaries': self._boundary_list, 'states': self._state_list})
+
+    def _decode_resume_token(self, resume_token: str):
+        try:
+            token_dict = json.loads(resume_token[len(PARTITIONED_PAGE_TOKEN_PREFIX):])
+            self._boundary_list = [int(b) for b in token_dict['boundaries']]
+            self._state_list = list(token_dict['states'])
+        except (ValueError, KeyError, TypeError) as err:
+            raise RuntimeError(f'Invalid resume token for partitioned query: "{resume_token}": {err}')
+
+        if len(self._state_list) != len(self._boundary_list) + 1:
+            raise RuntimeError(f'Invalid resume token for partitioned query: {len(self._state_list)} partition states for '
+                               f'{len(self._boundary_list)} boundaries')
+
+    def fetch_all(self, resume_token: Optional[str], end_ts_sec: int, partition_count: int,
+                  page_func: Callable[[dict, Optional[str]], None]):
+        """Fetches every page of every partition, starting fresh (if resume_token is None) or from where resume_token left off.
+        Blocks until all pages have been passed to page_func, or until either a request or page_func raises an error."""
+        if resume_token:
+            self._decode_resume_token(resume_token)
+        else:
+            self._boundary_list = PartitionedQueryFetcher.build_boundary_list(end_ts_sec, partition_count)
+            self._state_list = [None] * (len(self._boundary_list) + 1)
+
+        pending_index_set: Set[int] = {i for i, state in enumerate(self._state_list) if state is not True}
+        logger.debug(f'Fetching "{self._base_query}" as {len(self._state_list)} partitions ({len(pending_index_set)} remaining), '
+                     f'max {self._max_concurrent_requests} requests at once')
+        if not pending_index_set:
+            page_func({}, None)
+            return
+
+        # An item which is modified while the download is underway can move to a later partition, and be returned by both:
+        seen_goog_id_set: Set[str] = set()
+
+        executor = ThreadPoolExecutor(max_workers=self._max_concurrent_requests, thread_name_prefix='GDriveQueryFetcher-')
+        try:
+            for partition_index in sorted(pending_index_set):
+                executor.submit(self._fetch_partition, partition_index, self._state_list[partition_index])
+
+            while pending_index_set:
+                page = self._page_queue.get()
+                if isinstance(page, _FetchError):
+                    raise page.error
+
+                partition_index, results = page
+                next_page_token = results.get('nextPageToken')
+                self._state_list[partition_index] = next_page_token or True
+                if not next_page_token:
+                    pending_index_set.discard(partition_index)
+
+                item_list = []
+                for item in results.get('files', []):
+                    if item['id'] in seen_goog_id_set:
+                        logger.debug(f'Skipping item which was already returned by another partition: {item["id"]}')
+                    else:
+                        seen_goog_id_set.add(item['id'])
+                        item_list.append(item)
+                results['files'] = item_list
+
+                page_func(results, self._encode_resume_token() if pending_index_set else None)
+        finally:
+            self._stop_event.set()
+            executor.shutdown(wait=False)
+            # Unblock any workers waiting to hand off a page:
+            while True:
+                try:
+                    self._page_queue.get_nowait()
+                except Empty:
+                    break
+
+    def _fetch_partition(self, partition_index: int, page_token: Optional[str]):
+        query = self.get_partition_query(partition_index)
+        try:
+            while not self._stop_event.is_set():
+                results: dict = self._request_page_func(query, page_token)
+                if not self._put((partition_index, results)):
+                    return
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    return
+        except Exception as err:
+            logger.error(f'Request for partition {partition_index} failed: {repr(err)}')
+            self._put(_FetchError(partition_index, err))
+
+    def _put(self, page) -> bool:
+        """Returns False if the fetch was stopped before the page could be handed off"""
+        while not self._stop_event.is_set():
+            try:
+                self._page_queue.put(page, timeout=_PUT_TIMEOUT_SEC)
+                return True
+            except Full:
+                pass
+        return False
@@ -92,12 +92,9 @@ class GDriveDiskStore(HasLifecycle):
 
         # DIRs:
         sw = Stopwatch()
-        folder_list: List[GDriveFolder] = self._db.get_gdrive_folder_object_list()
-
-        dispatcher.send(Signal.SET_PROGRESS_TEXT, sender=tree_id, msg=f'Retrieved {len(folder_list):n} Google Drive folders')
-
         count_folders_loaded = 0
-        for folder in folder_list:
+        folder: GDriveFolder
+        for folder in self._db.iter_gdrive_folder_objects():
             if folder.goog_id:
                 uid = self.backend.cacheman.get_uid_for_goog_id(folder.device_uid, folder.goog_id, folder.uid)
                 if folder.uid != uid:
@@ -119,15 +116,13 @@ class GDriveDiskStore(HasLifecycle):
                 max_uid = folder.uid
 
         logger.debug(f'{sw} Loaded {count_folders_loaded} Google Drive folders')
+        dispatcher.send(Signal.SET_PROGRESS_TEXT, sender=tree_id, msg=f'Retrieved {count_folders_loaded:n} Google Drive folders')
 
         # FILES:
         sw = Stopwatch()
-        file_list: List[GDriveFile] = self._db.get_gdrive_file_object_list()
-
-        dispatcher.send(Signal.SET_PROGRESS_TEXT, sender=tree_id, msg=f'Retreived {len(file_list):n} Google Drive files')
-
         count_files_loaded = 0
-        for file in file_list:
+        file: GDriveFile
+        for file in self._db.iter_gdrive_file_objects():
             if file.goog_id:
                 uid = self.backend.cacheman.get_uid_for_goog_id(file.device_uid, file.goog_id, file.uid)
                 if file.uid != uid:
@@ -148,6 +143,7 @@ class GDriveDiskStore(HasLifecycle):
                 max_uid = file.uid
 
         logger.debug(f'{sw} Loaded {count_files_loaded} Google Drive files')
+        dispatcher.send(Signal.SET_PROGRESS_TEXT, sender=tree_id, msg=f'Retrieved {count_files_loaded:n} Google Drive files')
 
         if is_complete:
             # CHILD-PARENT MAPPINGS:
@@ -206,6 +202,8 @@ class GDriveDiskStore(HasLifecycle):
 
     def insert_gdrive_files_and_parents(self, file_list: List[GDriveFile], parent_mappings: List[Tuple],
                                         current_download: GDriveMetaDownload, commit: bool = True):
+        # This bypasses the cache write ops, so must update the content ref index itself:
+        self.backend.cacheman.update_content_refs(self.device_uid, file_list)
         self._db.insert_gdrive_files(file_list=file_list, commit=False)
         self._db.insert_id_parent_mappings(parent_mappings, commit=False)
         self._db.upsert_download(current_download, commit=commit)
@@ -231,5 +229,8 @@ class GDriveDiskStore(HasLifecycle):
     def delete_nodes(self, file_uid_list: List[UID], folder_uid_list: List[UID], commit=True):
         self._db.delete_nodes(file_uid_list, folder_uid_list, commit=commit)
 
+    def get_content_ref_list(self) -> List[Tuple[UID, UID]]:
+        return self._db.get_content_ref_list()
+
     def get_child_list_for_parent_uid(self, node_uid: UID) -> List[GDriveNode]:
         return self._db.get_child_list_for_parent_uid(node_uid)
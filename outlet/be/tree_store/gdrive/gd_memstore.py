@@ -3,6 +3,7 @@ from typing import Dict, List, Optional, Tuple
 
 from be.tree_store.cache_write_op import NodeUpdateInfo, NodeUpdateInfoFactory
 from be.tree_store.gdrive.gd_tree import GDriveWholeTree
+from be.tree_store.name_index import NodeNameIndex
 from be.uid.uid_mapper import UidGoogIdMapper
 from constants import GDRIVE_FOLDER_MIME_TYPE_UID, GDRIVE_ME_USER_UID
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
@@ -33,9 +34,34 @@ class GDriveMemoryStore:
         self._user_for_uid_dict: Dict[UID, GDriveUser] = {}
         self._user_uid_nextval: int = GDRIVE_ME_USER_UID + 1
 
+        if backend.get_config('cache.name_index.enabled'):
+            self.name_index: Optional[NodeNameIndex] = NodeNameIndex(device_uid)
+        else:
+            self.name_index: Optional[NodeNameIndex] = None
+
     def is_loaded(self) -> bool:
         return self.master_tree is not None
 
+    def get_name_index(self) -> Optional[NodeNameIndex]:
+        """Returns the name index, brought up to date with master_tree; or None if the name index is disabled"""
+        if self.name_index:
+            assert self.master_tree
+            self.name_index.ensure_in_sync(self.master_tree.for_each_node)
+        return self.name_index
+
+    def on_master_tree_bulk_update(self):
+        """Call this after replacing master_tree, or after making changes to it which bypass upsert_single_node() & remove_single_node()"""
+        if self.name_index:
+            self.name_index.mark_out_of_sync()
+
+    def on_node_upserted_in_tree(self, node: GDriveNode):
+        if self.name_index:
+            self.name_index.upsert_node(node)
+
+    def on_node_removed_from_tree(self, node: GDriveNode):
+        if self.name_index:
+            self.name_index.remove_node(node)
+
     def upsert_single_node(self, node: GDriveNode, update_only: bool = False) -> NodeUpdateInfo:
 
         if SUPER_DEBUG_ENABLED:
@@ -55,8 +81,10 @@ class GDriveMemoryStore:
         if TRACE_ENABLED:
             logger.debug(f'TNode {node.device_uid}:{node.uid} has icon: {node.get_icon().name}, custom_icon: {node.get_custom_icon()}')
 
+        prev_parent_uid_list: Optional[List[UID]] = None
         cached_node: GDriveNode = self.master_tree.get_node_for_uid(node.uid)
         if cached_node:
+            prev_parent_uid_list = list(cached_node.get_parent_uids())
             if cached_node.is_dir() and not node.is_dir():
                 # This should never happen, because GDrive does not allow a node's type to be changed:
                 raise RuntimeError(f'Invalid request: cannot replace a GDrive folder with a file: "{node.get_path_list()}"')
@@ -102,8 +130,9 @@ class GDriveMemoryStore:
         # Finally, update in-memory cache (tree). If an existing node is found with the same UID, it will update and return that instead:
         # FIXME: determine if nodes were removed from parents. If so, send notifications to ATM
         node = self.master_tree.upsert_node(node)
+        self.on_node_upserted_in_tree(node)
 
-        return NodeUpdateInfo(node, True, True)
+        return NodeUpdateInfo(node, True, True, prev_parent_uid_list)
 
     def remove_single_node(self, node: GDriveNode, to_trash: bool = False):
         """Note: this is not allowed for non-empty directories."""
@@ -122,6 +151,7 @@ class GDriveMemoryStore:
         cached_node = self.master_tree.get_node_for_uid(node.uid)
         if cached_node:
             self.master_tree.remove_node(cached_node)
+            self.on_node_removed_from_tree(cached_node)
 
     # Meta operations:
 
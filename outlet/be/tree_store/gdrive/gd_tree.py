@@ -405,6 +405,9 @@ class GDriveWholeTree(BaseTree):
             return resolved_parents
         return []
 
+    def get_parent_list_for_dir_stats(self, node: GDriveNode) -> List[GDriveNode]:
+        return self.get_parent_list_for_node(node)
+
     def to_sn(self, node, single_path) -> SPIDNodePair:
         spid = self.backend.node_identifier_factory.build_spid(node_uid=node.uid, device_uid=node.device_uid,
                                                                single_path=single_path, identifier_type=NodeIdentifierType.GDRIVE_SPID)
@@ -416,6 +419,10 @@ class GDriveWholeTree(BaseTree):
         # Yuck...this is more expensive than preferred... at least there's no network call
         return self.to_sn(node, child_path)
 
+    def to_sn_list_in_subtree(self, node: GDriveNode, subtree_root_path: str) -> List[SPIDNodePair]:
+        """Returns one SN for each of the node's paths which falls inside the given subtree"""
+        return [self.to_sn(node, path) for path in node.get_path_list() if file_util.is_in_subtree(path, subtree_root_path)]
+
     def get_parent_for_sn(self, sn: SPIDNodePair) -> Optional[SPIDNodePair]:
         parent_uids = sn.node.get_parent_uids()
         if parent_uids:
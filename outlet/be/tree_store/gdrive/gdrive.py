@@ -2,7 +2,7 @@ import logging
 import os
 import threading
 from collections import deque
-from typing import Deque, Dict, List, Optional, Tuple
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
 from uuid import UUID
 
 from pydispatch import dispatcher
@@ -119,6 +119,9 @@ class GDriveMasterStore(TreeStore):
         logger.debug(f'Starting GDriveMasterStore(device_uid={self.device_uid})')
         TreeStore.start(self)
         self._diskstore.start()
+        if self._is_name_index_persisted():
+            name_index = self._memstore.name_index
+            name_index.load_from_file(name_index.get_file_path(self.backend.cacheman.cache_dir_path))
         self.gdrive_client.start()
         self.connect_dispatch_listener(signal=Signal.SYNC_GDRIVE_CHANGES, receiver=self._on_gdrive_sync_changes_requested)
 
@@ -143,6 +146,8 @@ class GDriveMasterStore(TreeStore):
         except (AttributeError, NameError):
             pass
 
+        self._save_name_index()
+
         try:
             self.backend = None
         except (AttributeError, NameError):
@@ -150,6 +155,20 @@ class GDriveMasterStore(TreeStore):
 
         logger.debug(f'GDriveMasterStore(device_uid={self.device_uid}) shutdown done')
 
+    def _is_name_index_persisted(self) -> bool:
+        return self._memstore.name_index is not None and self.backend.get_config('cache.name_index.persist')
+
+    def _save_name_index(self):
+        # Can be called via __del__() for a store which was never fully constructed, so don't assume that any of these exist:
+        if not getattr(self, 'backend', None) or not getattr(self, '_memstore', None) or not self._is_name_index_persisted():
+            return
+
+        try:
+            name_index = self._memstore.name_index
+            name_index.save_to_file(name_index.get_file_path(self.backend.cacheman.cache_dir_path))
+        except Exception as err:
+            logger.exception(f'Failed to save name index for device_uid={self.device_uid}: {repr(err)}')
+
     def is_gdrive(self) -> bool:
         return True
 
@@ -166,15 +185,18 @@ class GDriveMasterStore(TreeStore):
         operation.update_memstore(self._memstore)
 
     def _execute_write_op(self, operation: GDCacheWriteOp):
-        """Executes a single GDCacheWriteOp ({start}->memory->disk->UI)"""
+        """Executes a single GDCacheWriteOp ({start}->memory->content refs->disk->UI)"""
 
         # 1. Update memory store
         operation.update_memstore(self._memstore)
 
-        # 2. Update disk store
+        # 2. Update content ref index (which also persists any new ContentMetas, before the nodes which reference them)
+        operation.update_content_refs(self.backend.cacheman)
+
+        # 3. Update disk store
         self._diskstore.execute_write_op(operation)
 
-        # 3. Send signals
+        # 4. Send signals
         operation.send_signals()
 
     # Tree-wide stuff
@@ -241,6 +263,7 @@ class GDriveMasterStore(TreeStore):
                 def _after_tree_loaded(tree):
                     assert tree
                     self._memstore.master_tree = tree
+                    self._memstore.on_master_tree_bulk_update()
                     logger.debug(f'GDrive master tree completely loaded; device_uid={self._memstore.master_tree.device_uid}')
 
                     logger.info(f'{stopwatch_total} GDrive master tree loaded')
@@ -306,10 +329,14 @@ class GDriveMasterStore(TreeStore):
             logger.debug(f'Entered generate_dir_stats(): tree_id={tree_id}, subtree_root_node={subtree_root_node}')
         return self._memstore.master_tree.generate_dir_stats(tree_id=tree_id, subtree_root_node=subtree_root_node)
 
+    def update_dir_stats(self, subtree_root_node: GDriveFolder, dir_stats_dict: Dict[UID, DirStats], changed_dir_uid_list: Iterable[UID],
+                         tree_id: TreeID):
+        self._memstore.master_tree.update_dir_stats(tree_id, dir_stats_dict, changed_dir_uid_list, subtree_root_node.uid)
+
     def populate_filter(self, filter_state: FilterState):
         if not self._memstore.is_loaded():
             raise CacheNotLoadedError(f'populate_filter(): GDrive cache not loaded!')
-        filter_state.ensure_cache_populated(self._memstore.master_tree)
+        filter_state.ensure_cache_populated(self._memstore.master_tree, self._memstore.get_name_index())
 
     def submit_batch_of_changes(self, subtree_root: GDriveIdentifier,  upsert_node_list: List[GDriveNode] = None,
                                 remove_node_list: List[GDriveNode] = None):
@@ -612,7 +639,7 @@ class GDriveMasterStore(TreeStore):
                 # Attempt to load GDrive cache if not loaded:
                 if not self._load_cache_synchronously():
                     raise CacheNotLoadedError(f'Cannot load filtered child list: Timed out waiting for Google Drive cache load!')
-            return filter_state.get_filtered_child_list(parent_spid, self._memstore.master_tree)
+            return filter_state.get_filtered_child_list(parent_spid, self._memstore.master_tree, self._memstore.get_name_index())
 
         # ------------------------------------------------------------------------------------
         # I. PARENT:
@@ -730,6 +757,10 @@ class GDriveMasterStore(TreeStore):
 
         return matching_file_list
 
+    def get_content_ref_list(self, cache_info_list: List) -> List[Tuple[UID, UID]]:
+        """Param "cache_info_list" is not used for GDrive because each GDrive has only one cache"""
+        return self._diskstore.get_content_ref_list()
+
     def get_gdrive_user_for_permission_id(self, permission_id: str) -> GDriveUser:
         if TRACE_ENABLED:
             logger.debug(f'Entered get_gdrive_user_for_permission_id()')
@@ -763,4 +794,4 @@ class GDriveMasterStore(TreeStore):
     def delete_all_gdrive_data(self):
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Entered delete_all_gdrive_data()')
-        self._execute_write_op(DeleteAllDataOp())
+        self._execute_write_op(DeleteAllDataOp(self.device_uid))
@@ -1,7 +1,7 @@
 import logging
 from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import DefaultDict, List, Optional, Tuple
+from typing import DefaultDict, Dict, List, Optional, Tuple
 
 from pydispatch import dispatcher
 
@@ -73,6 +73,11 @@ class GDUpsertSingleNodeOp(GDCacheWriteOp):
             else:
                 logger.debug(f'TNode has no parents; assuming it is a root node: {self.node}')
 
+    def update_content_refs(self, cacheman):
+        node = self.update_info.node
+        if self.update_info.needs_disk_update and node.is_live() and not node.is_dir():
+            cacheman.update_content_refs(node.device_uid, [node])
+
     def update_diskstore(self, cache: GDriveDatabase):
         if not self.update_info.needs_disk_update:
             if SUPER_DEBUG_ENABLED:
@@ -116,7 +121,8 @@ class GDUpsertSingleNodeOp(GDCacheWriteOp):
         if self.update_info.needs_disk_update or self.update_info.has_icon_update:
             if SUPER_DEBUG_ENABLED:
                 logger.debug(f'Sending signal {Signal.NODE_UPSERTED_IN_CACHE.name} with node: {self.node}')
-            dispatcher.send(signal=Signal.NODE_UPSERTED_IN_CACHE, sender=ID_GLOBAL_CACHE, node=self.node)
+            dispatcher.send(signal=Signal.NODE_UPSERTED_IN_CACHE, sender=ID_GLOBAL_CACHE, node=self.node,
+                            prev_parent_uid_list=self.update_info.prev_parent_uid_list)
 
 
 class GDRemoveSingleNodeOp(GDCacheWriteOp):
@@ -134,6 +140,10 @@ class GDRemoveSingleNodeOp(GDCacheWriteOp):
     def update_memstore(self, memstore: GDriveMemoryStore):
         memstore.remove_single_node(self.node, self.to_trash)
 
+    def update_content_refs(self, cacheman):
+        if not self.node.is_dir():
+            cacheman.update_content_refs(self.node.device_uid, [], removed_node_uid_list=[self.node.uid])
+
     def update_diskstore(self, cache: GDriveDatabase):
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Removing GDriveNode from disk cache: {self.node}')
@@ -162,6 +172,11 @@ class GDRemoveSubtreeOp(GDCacheWriteOp):
             memstore.remove_single_node(node, self.to_trash)
         logger.debug(f'GDRemoveSubtreeOp: done removing nodes from memory cache')
 
+    def update_content_refs(self, cacheman):
+        removed_file_uid_list = [node.uid for node in self.node_list if not node.is_dir()]
+        if removed_file_uid_list:
+            cacheman.update_content_refs(self.subtree_root_node.device_uid, [], removed_file_uid_list)
+
     def update_diskstore(self, cache: GDriveDatabase):
         # TODO: bulk remove
         logger.debug(f'GDRemoveSubtreeOp: removing {len(self.node_list)} nodes from disk cache')
@@ -185,6 +200,8 @@ class BatchChangesOp(GDCacheWriteOp):
         super().__init__()
         self.backend = backend
         self.change_list = BatchChangesOp._reduce_changes(change_list)
+        self._prev_parent_uid_list_dict: Dict[UID, List[UID]] = {}
+        """For each upserted node which replaced a node in the cache, the parent UIDs of the node it replaced"""
 
     @staticmethod
     def _reduce_changes(change_list: List[GDriveChange]) -> List[GDriveChange]:
@@ -211,6 +228,7 @@ class BatchChangesOp(GDCacheWriteOp):
                 # Some GDrive deletes (such as a hard delete of a folder) will cause a parent to be deleted before its descendants.
                 removed_node = memstore.master_tree.remove_node(change.node, fail_if_children_present=False)
                 if removed_node:
+                    memstore.on_node_removed_from_tree(removed_node)
                     change.node = removed_node
                 else:
                     # ensure full_path is populated:
@@ -220,6 +238,22 @@ class BatchChangesOp(GDCacheWriteOp):
                 # need to use existing object if available to fulfill our contract (node will be sent via signals below)
                 update_info = memstore.upsert_single_node(change.node)
                 change.node = update_info.node
+                if update_info.prev_parent_uid_list:
+                    self._prev_parent_uid_list_dict[change.node.uid] = update_info.prev_parent_uid_list
+
+    def update_content_refs(self, cacheman):
+        removed_file_uid_list: List[UID] = []
+        upserted_file_list: List[GDriveFile] = []
+        for change in self.change_list:
+            if change.node.is_dir():
+                continue
+            if change.is_removed():
+                removed_file_uid_list.append(change.node.uid)
+            else:
+                upserted_file_list.append(change.node)
+
+        if removed_file_uid_list or upserted_file_list:
+            cacheman.update_content_refs(self.change_list[0].node.device_uid, upserted_file_list, removed_file_uid_list)
 
     def update_diskstore(self, cache: GDriveDatabase):
         mappings_list_list: List[List[Tuple]] = []
@@ -276,7 +310,8 @@ class BatchChangesOp(GDCacheWriteOp):
             if change.is_removed():
                 dispatcher.send(signal=Signal.NODE_REMOVED_IN_CACHE, sender=ID_GLOBAL_CACHE, node=change.node)
             else:
-                dispatcher.send(signal=Signal.NODE_UPSERTED_IN_CACHE, sender=ID_GLOBAL_CACHE, node=change.node)
+                dispatcher.send(signal=Signal.NODE_UPSERTED_IN_CACHE, sender=ID_GLOBAL_CACHE, node=change.node,
+                                prev_parent_uid_list=self._prev_parent_uid_list_dict.get(change.node.uid))
 
 
 class RefreshFolderOp(GDCacheWriteOp):
@@ -303,8 +338,15 @@ class RefreshFolderOp(GDCacheWriteOp):
         # FIXME: determine if nodes were removed from parents. If so, send notifications to ATM
         # TODO: only update what we was changed
         self._upserted_node_list = memstore.master_tree.upsert_folder_and_children(self.parent_folder, self.child_list)
+        for node in self._upserted_node_list:
+            memstore.on_node_upserted_in_tree(node)
         logger.debug(f'RefreshFolderOp: done upserting nodes to memory cache')
 
+    def update_content_refs(self, cacheman):
+        upserted_file_list = [node for node in self._upserted_node_list if node.is_live() and not node.is_dir()]
+        if upserted_file_list:
+            cacheman.update_content_refs(self.parent_folder.device_uid, upserted_file_list)
+
     def update_diskstore(self, cache: GDriveDatabase):
         logger.debug(f'RefreshFolderOp: upserting {len(self._upserted_node_list)} nodes in disk cache')
 
@@ -410,10 +452,16 @@ class DeleteAllDataOp(GDCacheWriteOp):
     CLASS DeleteAllDataOp
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
+    def __init__(self, device_uid: UID):
+        super().__init__()
+        self.device_uid: UID = device_uid
 
     def update_memstore(self, memstore: GDriveMemoryStore):
         memstore.delete_all_gdrive_data()
 
+    def update_content_refs(self, cacheman):
+        cacheman.remove_all_content_refs_for_device(self.device_uid)
+
     def update_diskstore(self, cache: GDriveDatabase):
         cache.delete_all_gdrive_data()
 
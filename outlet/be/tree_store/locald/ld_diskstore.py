@@ -1,13 +1,16 @@
 import logging
+import os
 import threading
 from collections import deque
-from typing import Deque, Dict, List, Optional
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
 
 from pydispatch import dispatcher
 
 from be.sqlite.local_db import LocalDiskDatabase
+from be.tree_store.locald.ld_snapshot import LocalDiskSnapshot
 from be.tree_store.locald.ld_tree import LocalDiskTree
 from be.tree_store.locald.op_cache_write import LDMultiNodeOp, LDSingleNodeOp
+from be.uid.uid_mapper import UidPathMapper
 from constants import TreeType
 from logging_constants import TRACE_ENABLED
 from model.cache_info import PersistedCacheInfo
@@ -16,6 +19,7 @@ from model.node.node import SPIDNodePair
 from model.node_identifier import LocalNodeIdentifier, SinglePathNodeIdentifier
 from model.uid import UID
 from signal_constants import Signal
+from util import file_util
 from util.has_lifecycle import HasLifecycle
 from util.stopwatch_sec import Stopwatch
 
@@ -31,16 +35,21 @@ class LocalDiskDiskStore(HasLifecycle):
     possibly complex logic.
 
     An instance of this class should be encapsulated within a LocalDiskMasterStore for the same device.
+
+    If enabled, each DB also gets a LocalDiskSnapshot, which is used instead of the DB to load the cache whenever it is still current.
+    At shutdown, the snapshot of each open DB is rewritten if it is missing or was not taken of the DB's current generation.
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
-    def __init__(self, backend, device_uid: UID):
+    def __init__(self, backend, device_uid: UID, uid_path_mapper: UidPathMapper):
         HasLifecycle.__init__(self)
         self.backend = backend
         self.device_uid: UID = device_uid
+        self.uid_path_mapper: UidPathMapper = uid_path_mapper
         self._struct_lock = threading.Lock()
         """Just use one big lock for now"""
         self._open_db_dict: Dict[str, LocalDiskDatabase] = {}
         """Dict of [cache_location -> LocalDiskDatabase] containing open connetions"""
+        self._is_snapshot_enabled: bool = self.backend.get_config('cache.local_disk.snapshot.enabled')
 
     def start(self):
         HasLifecycle.start(self)
@@ -48,14 +57,20 @@ class LocalDiskDiskStore(HasLifecycle):
     def shutdown(self):
         HasLifecycle.shutdown(self)
         if self._open_db_dict:
-            open_db_dict = self._open_db_dict
-            self._open_db_dict = None
-
-            for cache_location, db in open_db_dict.items():
-                try:
-                    db.close()
-                except RuntimeError:
-                    logger.exception(f'Failed to close database "{cache_location}"')
+            with self._struct_lock:
+                open_db_dict = self._open_db_dict
+                self._open_db_dict = None
+
+                for cache_location, db in open_db_dict.items():
+                    if self._is_snapshot_enabled:
+                        try:
+                            self._write_snapshot_if_stale(cache_location, db)
+                        except Exception as err:
+                            logger.exception(f'Failed to write snapshot for "{cache_location}": {repr(err)}')
+                    try:
+                        db.close()
+                    except RuntimeError:
+                        logger.exception(f'Failed to close database "{cache_location}"')
 
     # NOTE: This should be the ONLY place LocalDiskDatabase is instantiated!
     def _get_or_open_db(self, cache_info: PersistedCacheInfo) -> LocalDiskDatabase:
@@ -110,7 +125,7 @@ class LocalDiskDiskStore(HasLifecycle):
         new_uid = self.backend.cacheman.get_uid_for_local_path(subtree_root.get_single_path(), existing_uid)
         if existing_uid != new_uid:
             logger.warning(f'Requested UID "{existing_uid}" is invalid for given path; changing it to "{new_uid}"')
-        subtree_root.uid = new_uid
+        subtree_root.node_uid = new_uid
 
     def load_subtree(self, cache_info: PersistedCacheInfo, tree_id) -> Optional[LocalDiskTree]:
         """Loads the given subtree disk cache from disk."""
@@ -129,39 +144,24 @@ class LocalDiskDiskStore(HasLifecycle):
 
             self._ensure_uid_consistency(cache_info.subtree_root)
 
-            tree: LocalDiskTree = LocalDiskTree(self.backend)
-            root_node = self.backend.cacheman.build_local_dir_node(full_path=cache_info.subtree_root.get_single_path(),
-                                                                   is_live=True, all_children_fetched=True)
-            tree.add_node(node=root_node, parent=None)
-
             missing_nodes: List[LocalNode] = []
+            loaded = self._load_tree_from_snapshot(cache_info, db, missing_nodes) if self._is_snapshot_enabled else None
+            if loaded:
+                tree, dir_count, file_count = loaded
+            else:
+                # Nodes are streamed from the DB & added to the tree as they are read, so that the whole table is never in memory at once.
+                tree = self._build_tree_with_root(cache_info)
+                missing_nodes.clear()
+                dir_count = self._add_nodes_to_tree(tree, db.iter_local_dirs(), missing_nodes)
+                file_count = self._add_nodes_to_tree(tree, db.iter_local_files(), missing_nodes)
 
-            # Dirs first
-            dir_list: List[LocalDirNode] = db.get_local_dirs()
-            if len(dir_list) == 0:
+            if dir_count == 0:
                 logger.debug('No dirs found in disk cache')
-            for dir_node in dir_list:
-                if dir_node.is_live():
-                    tree.add_to_tree(dir_node)
-                else:
-                    missing_nodes.append(dir_node)
-
-            # Files next
-            file_list: List[LocalFileNode] = db.get_local_files()
-            if len(file_list) == 0:
+            if file_count == 0:
                 logger.debug('No files found in disk cache')
 
-            for file_node in file_list:
-                if not file_node.content_meta_uid:
-                    if TRACE_ENABLED:
-                        logger.debug(f'load_subtree(): loaded node is missing signature: {file_node}')
-                if file_node.is_live():
-                    tree.add_to_tree(file_node)
-                else:
-                    missing_nodes.append(file_node)
-
             # logger.debug(f'Reduced {str(len(db_file_changes))} disk cache entries into {str(count_from_disk)} unique entries')
-            logger.debug(f'{stopwatch_load} [{tree_id}] Loaded {len(file_list)} files and {len(dir_list)} dirs from disk')
+            logger.debug(f'{stopwatch_load} [{tree_id}] Loaded {file_count} files and {dir_count} dirs from disk')
 
             if len(missing_nodes) > 0:
                 # TODO: add code for adjudicator
@@ -171,6 +171,88 @@ class LocalDiskDiskStore(HasLifecycle):
 
             return tree
 
+    # Snapshots
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def _build_tree_with_root(self, cache_info: PersistedCacheInfo) -> LocalDiskTree:
+        tree: LocalDiskTree = LocalDiskTree(self.backend)
+        root_node = self.backend.cacheman.build_local_dir_node(full_path=cache_info.subtree_root.get_single_path(),
+                                                               is_live=True, all_children_fetched=True)
+        tree.add_node(node=root_node, parent=None)
+        return tree
+
+    @staticmethod
+    def _add_nodes_to_tree(tree: LocalDiskTree, node_iter: Iterable[LocalNode], missing_nodes: List[LocalNode]) -> int:
+        """Adds each live node to the tree, and each non-live node to missing_nodes. Dirs must be added before files.
+        Returns the number of nodes read from node_iter."""
+        count = 0
+        for node in node_iter:
+            count += 1
+            if TRACE_ENABLED and node.is_file() and not node.content_meta_uid:
+                logger.debug(f'load_subtree(): loaded node is missing signature: {node}')
+            if node.is_live():
+                tree.add_to_tree(node)
+            else:
+                missing_nodes.append(node)
+        return count
+
+    def _load_tree_from_snapshot(self, cache_info: PersistedCacheInfo, db: LocalDiskDatabase, missing_nodes: List[LocalNode]) \
+            -> Optional[Tuple[LocalDiskTree, int, int]]:
+        """Builds the tree from the cache's snapshot, one chunk at a time, so that the snapshot is never in memory all at once.
+        Returns (tree, dir_count, file_count), or None if the cache has no snapshot which is current, or if its snapshot could not be
+        loaded. In the latter case the snapshot is deleted, and the caller should load from the DB instead."""
+        cache_generation = db.get_cache_generation()
+        if not cache_generation:
+            logger.debug(f'No snapshot has been taken of cache "{cache_info.cache_location}"')
+            return None
+        cache_id, generation = cache_generation
+        snapshot = LocalDiskSnapshot(LocalDiskSnapshot.get_file_path(cache_info.cache_location), self.device_uid)
+        chunk_iter = snapshot.read(cache_id, generation, [LocalDiskDatabase.TABLE_LOCAL_DIR, LocalDiskDatabase.TABLE_LOCAL_FILE])
+        if not chunk_iter:
+            return None
+
+        tree = self._build_tree_with_root(cache_info)
+        dir_count = 0
+        file_count = 0
+        try:
+            for table, row_list in chunk_iter:
+                # Dir chunks all come before file chunks
+                if table.name == LocalDiskDatabase.TABLE_LOCAL_DIR.name:
+                    self.uid_path_mapper.ensure_mapping_list((row[0], row[2]) for row in row_list)
+                    dir_count += self._add_nodes_to_tree(tree, LocalDiskSnapshot.iter_dir_nodes(row_list, self.device_uid), missing_nodes)
+                else:
+                    self.uid_path_mapper.ensure_mapping_list((row[0], row[8]) for row in row_list)
+                    file_iter = LocalDiskSnapshot.iter_file_nodes(row_list, self.device_uid, self.backend.cacheman.get_content_meta_for_uid)
+                    file_count += self._add_nodes_to_tree(tree, file_iter, missing_nodes)
+        except (RuntimeError, ValueError) as err:
+            chunk_iter.close()
+            logger.warning(f'Discarding snapshot of cache "{cache_info.cache_location}" (will load from DB instead): {repr(err)}')
+            snapshot.delete()
+            return None
+
+        return tree, dir_count, file_count
+
+    def _write_snapshot_if_stale(self, cache_location: str, db: LocalDiskDatabase):
+        """Writes a new snapshot of the DB, unless its existing snapshot was taken of the DB's current generation"""
+        snapshot = LocalDiskSnapshot(LocalDiskSnapshot.get_file_path(cache_location), self.device_uid)
+        cache_generation = db.get_cache_generation()
+        if cache_generation and cache_generation == snapshot.read_cache_generation():
+            logger.debug(f'Snapshot of cache "{cache_location}" is current: no need to rewrite it')
+            return
+
+        cache_id, generation = db.get_or_create_cache_generation()
+        snapshot.write(cache_id, generation, [(LocalDiskDatabase.TABLE_LOCAL_DIR, db.iter_local_dir_rows()),
+                                              (LocalDiskDatabase.TABLE_LOCAL_FILE, db.iter_local_file_rows())])
+
+    def delete_cache_files(self, cache_location: str):
+        """Deletes the given cache's DB and its snapshot (if any)"""
+        with self._struct_lock:
+            db = self._open_db_dict.pop(cache_location, None) if self._open_db_dict else None
+            if db:
+                db.close()
+            file_util.delete_file(cache_location)
+            LocalDiskSnapshot(LocalDiskSnapshot.get_file_path(cache_location), self.device_uid).delete()
+
     def save_subtree(self, cache_info: PersistedCacheInfo, file_list, dir_list, tree_id):
         assert isinstance(cache_info.subtree_root, LocalNodeIdentifier)
         with self._struct_lock:
@@ -178,7 +260,8 @@ class LocalDiskDiskStore(HasLifecycle):
 
             db: LocalDiskDatabase = self._get_or_open_db(cache_info)
 
-            # Overwrite cache:
+            # Overwrite cache. The content ref index is updated first, since this bypasses the cache write ops:
+            self.backend.cacheman.update_content_refs(self.device_uid, file_list, removed_node_uid_list=db.get_local_file_uid_list())
             db.truncate_local_files(commit=False)
             db.truncate_local_dirs(commit=False)
             db.insert_local_files(file_list, overwrite=False, commit=False)
@@ -198,6 +281,13 @@ class LocalDiskDiskStore(HasLifecycle):
             db: LocalDiskDatabase = self._get_or_open_db(cache_info)
             return db.get_all_files_with_content(content_uid)
 
+    def get_content_ref_list(self, cache_info: PersistedCacheInfo) -> List[Tuple[UID, UID]]:
+        if not os.path.exists(cache_info.cache_location):
+            return []
+        with self._struct_lock:
+            db: LocalDiskDatabase = self._get_or_open_db(cache_info)
+            return db.get_content_ref_list()
+
     def get_subtree_bfs_from_cache(self, cache_info, node_uid: UID):
         assert isinstance(cache_info.subtree_root, LocalNodeIdentifier)
         with self._struct_lock:
@@ -1,19 +1,22 @@
 import errno
+import itertools
 import logging
+import math
 import os
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import PurePosixPath
 from typing import Callable, Deque, List, Optional, Tuple
 
 from pydispatch import dispatcher
 
 from be.tree_store.locald.ld_tree import LocalDiskTree
-from be.tree_store.locald.ld_tree_recurser import FileCounter
 from constants import DISK_SCAN_MAX_ITEMS_PER_TASK
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from model.node.locald_node import LocalNode
 from model.node_identifier import LocalNodeIdentifier
 from signal_constants import Signal
+from util.ensure import ensure_int
 from util.task_runner import Task
 
 logger = logging.getLogger(__name__)
@@ -39,6 +42,10 @@ class LocalDiskTreeScanner:
         self.tree_id = tree_id  # For sending progress updates
         self.progress = 0
         self.total = 0
+        """An estimate only. Seeded from what we already know about the subtree, and increased as dirs are discovered (see
+        _update_total_estimate())"""
+        self._dirs_discovered: int = 1  # include the root
+        self._dirs_scanned: int = 0
 
         self._dir_queue: Deque[str] = deque()
         # Put first entry in queue. We will iterate top-down
@@ -46,20 +53,36 @@ class LocalDiskTreeScanner:
 
         self._local_tree: Optional[LocalDiskTree] = None
 
-    def _find_total_files_to_scan(self):
-        # First survey our local files:
-        root_path = self.root_node_identifier.get_single_path()
-        # TODO: this can be long-running: convert this to tasks
-        logger.info(f'[{self.tree_id}] Preparing to scan. Counting files in path: {root_path}')
-        file_counter = FileCounter(root_path, self.project_dir)
-        file_counter.recurse_through_dir_tree()
+        # Only used for multi-worker scans (see start_tree_scan()):
+        self._scan_worker_count: int = 1
+        self._listing_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_listing_queue: Deque[Tuple[str, Future]] = deque()
+        """Dirs which have been submitted to _listing_executor, in the order they were dequeued from _dir_queue"""
+
+    def _update_total_estimate(self):
+        """Progress estimation without a separate counting walk: once some dirs have been scanned, assume that each dir which has been
+        discovered but not yet scanned will have the same number of files as the average so far. The total is only ever increased, never
+        decreased, so that the progress bar never goes backwards."""
+        if not self._dirs_scanned:
+            return
 
-        logger.debug(f'[{self.tree_id}] Found {file_counter.files_to_scan} files and {file_counter.dirs_to_scan} dirs to scan.')
-        return file_counter.files_to_scan
+        dirs_remaining = self._dirs_discovered - self._dirs_scanned
+        avg_files_per_dir = self.progress / self._dirs_scanned
+        estimated_total = self.progress + math.ceil(avg_files_per_dir * dirs_remaining)
+        if estimated_total > self.total:
+            if self.tree_id:
+                if TRACE_ENABLED:
+                    logger.debug(f'[{self.tree_id}] Increasing estimated total from {self.total} to {estimated_total} '
+                                 f'(dirs scanned: {self._dirs_scanned} of {self._dirs_discovered})')
+                dispatcher.send(Signal.PROGRESS_TOTAL_INCREASED, sender=self.tree_id, amount=estimated_total - self.total)
+            self.total = estimated_total
 
     @staticmethod
-    def _list_dir_entries(target_dir: str, skip_tree_path: str, onerror: Optional[Callable] = None) -> Tuple[List[str], List[str]]:
-        """Yanked from os._walk() and simplified"""
+    def _list_dir_entries(target_dir: str, skip_tree_path: str, onerror: Optional[Callable] = None) \
+            -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """Yanked from os._walk() and simplified.
+        Returns the DirEntry objects themselves (rather than just their paths), so that their cached type info & stat results can be
+        carried through to node construction without stat'ing each entry again."""
         dirs = []
         nondirs = []
 
@@ -89,10 +112,9 @@ class LocalDiskTreeScanner:
                         onerror(error)
                     return [], []
 
-                path = os.path.join(target_dir, entry.name)
-                if PurePosixPath(path).is_relative_to(skip_tree_path):
+                if PurePosixPath(entry.path).is_relative_to(skip_tree_path):
                     if SUPER_DEBUG_ENABLED:
-                        logger.debug(f'Ignoring path: {path}')
+                        logger.debug(f'Ignoring path: {entry.path}')
                 else:
                     try:
                         is_dir = entry.is_dir()
@@ -102,9 +124,9 @@ class LocalDiskTreeScanner:
                         is_dir = False
 
                     if is_dir:
-                        dirs.append(path)
+                        dirs.append(entry)
                     else:
-                        nondirs.append(path)
+                        nondirs.append(entry)
 
         if TRACE_ENABLED:
             logger.debug(f'_list_dir_entries(): returning {len(dirs)} dirs, {len(nondirs)} nondirs')
@@ -120,28 +142,57 @@ class LocalDiskTreeScanner:
             self.master_local.overwrite_dir_entries_list(parent_full_path=self.root_node_identifier.get_single_path(), child_list=[])
             return
 
-        self.total = self._find_total_files_to_scan()
+        self.total = self.master_local.get_estimated_file_count_for_subtree(self.root_node_identifier)
+        logger.debug(f'[{self.tree_id}] Starting scan of {self.root_node_identifier.get_single_path()} with estimated file count {self.total}')
         if self.tree_id:
             logger.debug(f'[{self.tree_id}] Sending START_PROGRESS with total={self.total}')
             dispatcher.send(signal=Signal.START_PROGRESS, sender=self.tree_id, total=self.total)
 
+        self._scan_worker_count = ensure_int(self.backend.get_config('cache.local_disk.scan.worker_count'))
+        if self._scan_worker_count > 1:
+            logger.debug(f'[{self.tree_id}] Will list dirs using {self._scan_worker_count} worker threads')
+            self._listing_executor = ThreadPoolExecutor(max_workers=self._scan_worker_count, thread_name_prefix='LocalDiskScanner-')
+
         this_task.add_next_task(self.scan_next_batch_of_dirs)
 
+    def _on_scan_complete(self):
+        logger.debug(f'Dir scan complete: found {self.progress} files in {self._dirs_scanned} dirs (estimated total was {self.total})')
+
+        self.master_local.set_last_scan_file_count_for_subtree(self.root_node_identifier, self.progress)
+
+        self._shutdown_listing_executor()
+
+        if self.tree_id:
+            logger.debug(f'Sending STOP_PROGRESS for tree_id: {self.tree_id}')
+            dispatcher.send(Signal.STOP_PROGRESS, sender=self.tree_id)
+
+    def _shutdown_listing_executor(self):
+        if self._listing_executor:
+            for _, future in self._pending_listing_queue:
+                future.cancel()
+            self._pending_listing_queue.clear()
+            self._listing_executor.shutdown(wait=False)
+            self._listing_executor = None
+
     def scan_next_batch_of_dirs(self, this_task: Task):
         """
         TASK: scan_next_batch_of_dirs
         This a sub-task of
         """
+        if self._listing_executor:
+            try:
+                self._scan_next_batch_of_dirs_in_parallel(this_task)
+            except Exception:
+                self._shutdown_listing_executor()
+                raise
+            return
+
         nodes_scanned_this_task = 0
         dirs_scanned_this_task = 0
 
         while True:
             if len(self._dir_queue) == 0:
-                logger.debug(f'Dir scan complete')
-
-                if self.tree_id:
-                    logger.debug(f'Sending STOP_PROGRESS for tree_id: {self.tree_id}')
-                    dispatcher.send(Signal.STOP_PROGRESS, sender=self.tree_id)
+                self._on_scan_complete()
                 return
 
             target_dir: str = self._dir_queue.popleft()
@@ -162,10 +213,45 @@ class LocalDiskTreeScanner:
         # Run next iteration next:
         this_task.add_next_task(self.scan_next_batch_of_dirs)
 
-    def scan_single_dir(self, target_dir: str) -> List[LocalNode]:
-        if SUPER_DEBUG_ENABLED:
-            logger.debug(f'Scanning & building nodes for dir: "{target_dir}"')
+    def _scan_next_batch_of_dirs_in_parallel(self, this_task: Task):
+        """Same as the serial loop in scan_next_batch_of_dirs(), except that the listing (and stat'ing) of dirs is done ahead of time by
+        the worker threads of _listing_executor. Building the nodes and updating the cache is still done here, one dir at a time, in the same
+        (top-down) order in which the dirs were dequeued - so that a parent's entries are always written before its children's."""
+        nodes_scanned_this_task = 0
+        dirs_scanned_this_task = 0
+        # Keep a few dirs queued up for each worker, so that none of them sits idle while we are building nodes:
+        max_pending_count = self._scan_worker_count * 2
+
+        while True:
+            while self._dir_queue and len(self._pending_listing_queue) < max_pending_count:
+                next_dir: str = self._dir_queue.popleft()
+                future = self._listing_executor.submit(self._list_and_stat_dir_entries, next_dir)
+                self._pending_listing_queue.append((next_dir, future))
+
+            if not self._pending_listing_queue:
+                self._on_scan_complete()
+                return
 
+            target_dir, future = self._pending_listing_queue.popleft()
+            dir_entry_list, nondir_entry_list = future.result()  # this will re-raise any error from the worker thread
+
+            dirs_scanned_this_task += 1
+            items_scanned_in_dir = len(self._build_and_store_child_nodes(target_dir, dir_entry_list, nondir_entry_list))
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'Scanned {items_scanned_in_dir} items from dir "{target_dir}". DirQueueSize: {len(self._dir_queue)} '
+                             f'PendingListingCount: {len(self._pending_listing_queue)}')
+            nodes_scanned_this_task += items_scanned_in_dir
+
+            if nodes_scanned_this_task >= DISK_SCAN_MAX_ITEMS_PER_TASK:
+                logger.debug(f'Scanned {nodes_scanned_this_task} nodes from {dirs_scanned_this_task} dirs. '
+                             f'DirQueueSize: {len(self._dir_queue)} PendingListingCount: {len(self._pending_listing_queue)} '
+                             f'BatchSize: {DISK_SCAN_MAX_ITEMS_PER_TASK} Progress: {self.progress} of {self.total}')
+                break
+
+        # Run next iteration next. Any listings still pending will continue in the background
+        this_task.add_next_task(self.scan_next_batch_of_dirs)
+
+    def _list_dir_entries_or_raise(self, target_dir: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
         def on_error(error):
             logger.error(f'While listing dir entries for "{target_dir}": {repr(error)}')
             # self.backend.report_error(ID_GLOBAL_CACHE, f'An error occurred listing dir entries', f'{error}')
@@ -173,41 +259,73 @@ class LocalDiskTreeScanner:
 
         on_error.err = None
 
-        (dir_list, nondir_list) = LocalDiskTreeScanner._list_dir_entries(target_dir, self.project_dir, onerror=on_error)
+        (dir_entry_list, nondir_entry_list) = LocalDiskTreeScanner._list_dir_entries(target_dir, self.project_dir, onerror=on_error)
         if on_error.err:
             # FIXME: display error in tree
             raise on_error.err
 
+        return dir_entry_list, nondir_entry_list
+
+    def _list_and_stat_dir_entries(self, target_dir: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """Runs in a worker thread of _listing_executor. DirEntry caches the result of its stat() call, so by calling it here, the
+        latency of stat'ing each entry is paid by the worker instead of the task thread when the nodes are built."""
+        dir_entry_list, nondir_entry_list = self._list_dir_entries_or_raise(target_dir)
+
+        for entry in itertools.chain(dir_entry_list, nondir_entry_list):
+            try:
+                entry.stat()
+            except OSError:
+                # Deleted since listing, or a broken link. build_local_dir_node() / build_local_file_node() will deal with it
+                pass
+
+        return dir_entry_list, nondir_entry_list
+
+    def scan_single_dir(self, target_dir: str) -> List[LocalNode]:
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'Scanning & building nodes for dir: "{target_dir}"')
+
+        (dir_entry_list, nondir_entry_list) = self._list_dir_entries_or_raise(target_dir)
+
+        return self._build_and_store_child_nodes(target_dir, dir_entry_list, nondir_entry_list)
+
+    def _build_and_store_child_nodes(self, target_dir: str, dir_entry_list: List[os.DirEntry], nondir_entry_list: List[os.DirEntry]) \
+            -> List[LocalNode]:
         child_node_list = []
 
         # FIXME: decide how to handle symlinks
 
         # DIRS
-        self._dir_queue += dir_list
-        for child_dir_path in dir_list:
+        self._dirs_scanned += 1
+        for child_dir_entry in dir_entry_list:
+            child_dir_path = child_dir_entry.path
+            self._dir_queue.append(child_dir_path)
+            self._dirs_discovered += 1
             if child_dir_path != target_dir:  # Do not include parent dir in child list
                 if TRACE_ENABLED:
                     logger.debug(f'[{self.tree_id}] Adding scanned dir: {child_dir_path}')
 
-                dir_node = self.cacheman.build_local_dir_node(child_dir_path, is_live=True, all_children_fetched=True)
+                dir_node = self.cacheman.build_local_dir_node(child_dir_path, is_live=True, all_children_fetched=True, dir_entry=child_dir_entry)
                 if dir_node:
                     child_node_list.append(dir_node)
 
         # FILES
-        for child_file_path in nondir_list:
+        for child_file_entry in nondir_entry_list:
+            child_file_path = child_file_entry.path
             if child_file_path != target_dir:   # Do not include parent dir in child list (if it was actually a file)
                 if TRACE_ENABLED:
                     logger.debug(f'[{self.tree_id}] Adding scanned file: {child_file_path}')
-                file_node = self.cacheman.build_local_file_node(full_path=child_file_path)
+                file_node = self.cacheman.build_local_file_node(full_path=child_file_path, dir_entry=child_file_entry)
                 if file_node:
                     child_node_list.append(file_node)
 
+                self.progress += 1
                 if self.tree_id:
                     dispatcher.send(Signal.PROGRESS_MADE, sender=self.tree_id, progress=1)
-                    self.progress += 1
-                    msg = f'Scanning file {self.progress} of {self.total}'
+                    msg = f'Scanning file {self.progress} of ~{max(self.total, self.progress)}'
                     dispatcher.send(Signal.SET_PROGRESS_TEXT, sender=self.tree_id, msg=msg)
 
+        self._update_total_estimate()
+
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'[{self.tree_id}] scan_single_dir(): calling overwrite_dir_entries_list() with {len(child_node_list)} children')
         self.master_local.overwrite_dir_entries_list(parent_full_path=target_dir, child_list=child_node_list)
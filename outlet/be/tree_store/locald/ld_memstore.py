@@ -4,6 +4,7 @@ from typing import Optional, Tuple
 from be.tree_store import cache_write_op
 from be.tree_store.cache_write_op import NodeUpdateInfo, NodeUpdateInfoFactory
 from be.tree_store.locald.ld_tree import LocalDiskTree
+from be.tree_store.name_index import NodeNameIndex
 from constants import LOCAL_ROOT_UID, ROOT_PATH
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from model.node.container_node import RootTypeNode
@@ -44,6 +45,22 @@ class LocalDiskMemoryStore:
         root_node = RootTypeNode(node_identifier=LocalNodeIdentifier(full_path=ROOT_PATH, uid=LOCAL_ROOT_UID, device_uid=self.device_uid))
         self.master_tree.add_node(node=root_node, parent=None)
 
+        if backend.get_config('cache.name_index.enabled'):
+            self.name_index: Optional[NodeNameIndex] = NodeNameIndex(device_uid)
+        else:
+            self.name_index: Optional[NodeNameIndex] = None
+
+    def get_name_index(self) -> Optional[NodeNameIndex]:
+        """Returns the name index, brought up to date with master_tree; or None if the name index is disabled"""
+        if self.name_index:
+            self.name_index.ensure_in_sync(self.master_tree.for_each_node)
+        return self.name_index
+
+    def on_master_tree_bulk_update(self):
+        """Call this after making changes to master_tree which bypass upsert_single_node() & remove_single_node()"""
+        if self.name_index:
+            self.name_index.mark_out_of_sync()
+
     def remove_single_node(self, node: LocalNode):
         """Removes the given node from all in-memory structs (does nothing if it is not found in some or any of them).
         Will raise an exception if trying to remove a non-empty directory."""
@@ -59,6 +76,8 @@ class LocalDiskMemoryStore:
 
             count_removed = self.master_tree.remove_node(node.uid)
             assert count_removed <= 1, f'Deleted {count_removed} nodes at {node.node_identifier}'
+            if self.name_index:
+                self.name_index.remove_node(cached_node)
         else:
             logger.warning(f'Cannot remove node because it has already been removed from cache: {node}')
 
@@ -142,6 +161,9 @@ class LocalDiskMemoryStore:
             # new file or directory insert
             self.master_tree.add_to_tree(node)
 
+        if self.name_index:
+            self.name_index.upsert_node(node)
+
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'TNode {node.node_identifier.guid} was upserted into memstore')
         return NodeUpdateInfo(node, True, True)
@@ -0,0 +1,221 @@
+import itertools
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from be.sqlite.base_db import Table
+from be.sqlite.content_meta_db import ContentMeta
+from model.node.locald_node import LocalDirNode, LocalFileNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from util.stopwatch_sec import Stopwatch
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE_MAGIC = b'OUTLETSS'
+SNAPSHOT_FILE_FORMAT_VERSION = 2
+SNAPSHOT_FILE_SUFFIX = '.snapshot'
+
+# Rows are written & read in chunks of up to this many, so that neither needs a whole table in memory at once
+SNAPSHOT_CHUNK_ROW_COUNT = 10_000
+
+# Fastest level: most of the savings come from the repetition within each column (path prefixes, timestamps)
+_COMPRESS_LEVEL = 1
+
+# magic, format version, cache_id (ASCII, null-padded), generation, device_uid
+_HEADER = struct.Struct('<8sI32sqQ')
+_LENGTH = struct.Struct('<Q')
+
+# Stands in for NULL in an INTEGER column
+_NULL_INT = -2 ** 63
+
+_IS_BYTE_SWAP_NEEDED = sys.byteorder != 'little'
+
+
+class LocalDiskSnapshot:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS LocalDiskSnapshot
+
+    A copy of the rows of a LocalDiskDatabase, in a file next to it, in a columnar binary layout which can be read back far faster than
+    SQLite can return the same rows. The DB remains the source of truth: the snapshot is stamped with the DB's cache ID & generation
+    (see LocalDiskDatabase.get_cache_generation()), and is ignored unless both still match when it is read.
+
+    Layout: header, then for each table: a series of chunks of up to SNAPSHOT_CHUNK_ROW_COUNT rows, ending with an empty one. Each chunk is
+    its row count, then each column in table order, as a byte length followed by the zlib-compressed column data. INTEGER columns are
+    packed little-endian int64 (NULL = -2^63); TEXT columns are UTF-8, with values separated by NUL.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, file_path: str, device_uid: UID):
+        self.file_path: str = file_path
+        self.device_uid: UID = device_uid
+
+    @staticmethod
+    def get_file_path(cache_location: str) -> str:
+        return f'{cache_location}{SNAPSHOT_FILE_SUFFIX}'
+
+    def delete(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def read_cache_generation(self) -> Optional[Tuple[str, int]]:
+        """Returns the (cache_id, generation) which the snapshot was taken of, or None if it does not exist or is unreadable"""
+        if not os.path.exists(self.file_path):
+            return None
+        try:
+            with open(self.file_path, 'rb') as f:
+                return self._read_header(f)
+        except (OSError, ValueError, struct.error) as err:
+            logger.warning(f'Failed to read snapshot "{self.file_path}": {repr(err)}')
+            return None
+
+    def read(self, cache_id: str, generation: int, table_list: List[Table]) -> Optional[Iterator[Tuple[Table, List[Tuple]]]]:
+        """Returns an iterator over the rows of each of the given tables, in chunks of (table, rows), with rows in the same form as
+        LiveTable.select() would return them. Returns None if the snapshot does not exist, is unreadable, or was not taken of the given
+        generation of the cache. The file is held open until the iterator is exhausted or closed. The iterator raises ValueError if the
+        snapshot turns out to be corrupt partway through."""
+        if not os.path.exists(self.file_path):
+            logger.debug(f'No snapshot found at "{self.file_path}"')
+            return None
+
+        try:
+            f = open(self.file_path, 'rb')
+        except OSError as err:
+            logger.warning(f'Failed to open snapshot "{self.file_path}": {repr(err)}')
+            return None
+
+        try:
+            snapshot_cache_generation = self._read_header(f)
+        except (OSError, ValueError, struct.error) as err:
+            f.close()
+            logger.warning(f'Ignoring snapshot "{self.file_path}": {repr(err)}')
+            return None
+
+        if snapshot_cache_generation != (cache_id, generation):
+            f.close()
+            logger.debug(f'Ignoring stale snapshot "{self.file_path}" (cache_id={snapshot_cache_generation[0]} generation='
+                         f'{snapshot_cache_generation[1]}; DB has cache_id={cache_id} generation={generation})')
+            return None
+
+        return self._iter_chunks(f, table_list)
+
+    def _read_header(self, f: BinaryIO) -> Tuple[str, int]:
+        magic, version, snapshot_cache_id, snapshot_generation, device_uid = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != SNAPSHOT_FILE_MAGIC or version != SNAPSHOT_FILE_FORMAT_VERSION or device_uid != self.device_uid:
+            raise ValueError('unexpected format version or device_uid')
+        return snapshot_cache_id.rstrip(b'\0').decode('ascii'), snapshot_generation
+
+    def _iter_chunks(self, f: BinaryIO, table_list: List[Table]) -> Iterator[Tuple[Table, List[Tuple]]]:
+        stopwatch = Stopwatch()
+        row_count = 0
+        with f:
+            try:
+                for table in table_list:
+                    while True:
+                        row_list = LocalDiskSnapshot._read_chunk(f, table)
+                        if not row_list:
+                            break
+                        row_count += len(row_list)
+                        yield table, row_list
+            except (OSError, struct.error, zlib.error) as err:
+                raise ValueError(f'Failed to read snapshot "{self.file_path}": {repr(err)}')
+
+        logger.debug(f'{stopwatch} Read {row_count} rows from snapshot "{self.file_path}"')
+
+    def write(self, cache_id: str, generation: int, table_row_iter_list: List[Tuple[Table, Iterable[Tuple]]]):
+        stopwatch = Stopwatch()
+        # Write to a temp file first, so that a crash mid-write can't leave a truncated snapshot behind:
+        tmp_file_path = f'{self.file_path}.tmp'
+        row_count = 0
+        with open(tmp_file_path, 'wb') as f:
+            f.write(_HEADER.pack(SNAPSHOT_FILE_MAGIC, SNAPSHOT_FILE_FORMAT_VERSION, cache_id.encode('ascii'), generation, self.device_uid))
+            for table, row_iter in table_row_iter_list:
+                row_iter = iter(row_iter)
+                while True:
+                    chunk_row_count = LocalDiskSnapshot._write_chunk(f, table, itertools.islice(row_iter, SNAPSHOT_CHUNK_ROW_COUNT))
+                    if not chunk_row_count:
+                        break
+                    row_count += chunk_row_count
+        os.replace(tmp_file_path, self.file_path)
+        logger.debug(f'{stopwatch} Wrote {row_count} rows to snapshot "{self.file_path}" (generation={generation})')
+
+    @staticmethod
+    def iter_dir_nodes(row_list: List[Tuple], device_uid: UID) -> Iterator[LocalDirNode]:
+        """Builds nodes from rows of LocalDiskDatabase.TABLE_LOCAL_DIR. Unlike LocalDiskDatabase._tuple_to_dir(), this does not look up each
+        row's UIDs in the UidPathMapper: they were already checked when the snapshot's generation of the DB was written"""
+        for uid, parent_uid, full_path, trashed, is_live, sync_ts, create_ts, modify_ts, change_ts, all_children_fetched in row_list:
+            yield LocalDirNode(LocalNodeIdentifier(uid=UID(uid), device_uid=device_uid, full_path=full_path), parent_uid=UID(parent_uid),
+                               trashed=trashed, is_live=bool(is_live), sync_ts=sync_ts, create_ts=create_ts, modify_ts=modify_ts,
+                               change_ts=change_ts, all_children_fetched=bool(all_children_fetched))
+
+    @staticmethod
+    def iter_file_nodes(row_list: List[Tuple], device_uid: UID, get_content_meta_for_uid: Callable[[UID], ContentMeta]) \
+            -> Iterator[LocalFileNode]:
+        """Builds nodes from rows of LocalDiskDatabase.TABLE_LOCAL_FILE. See iter_dir_nodes()"""
+        for uid, parent_uid, content_uid, size_bytes, sync_ts, create_ts, modify_ts, change_ts, full_path, trashed, is_live in row_list:
+            yield LocalFileNode(LocalNodeIdentifier(uid=UID(uid), device_uid=device_uid, full_path=full_path), UID(parent_uid),
+                                get_content_meta_for_uid(content_uid), size_bytes, sync_ts, create_ts, modify_ts, change_ts, trashed, is_live)
+
+    @staticmethod
+    def _is_text_col(col_type: str) -> bool:
+        return col_type.startswith('TEXT')
+
+    @staticmethod
+    def _write_chunk(f: BinaryIO, table: Table, row_iter: Iterable[Tuple]) -> int:
+        col_list: List[list] = [[] for _ in table.cols]
+        for row in row_iter:
+            for col, val in zip(col_list, row):
+                col.append(val)
+        row_count = len(col_list[0])
+
+        f.write(_LENGTH.pack(row_count))
+        if not row_count:
+            # End of table
+            return 0
+        for col, col_type in zip(col_list, table.cols.values()):
+            if LocalDiskSnapshot._is_text_col(col_type):
+                data = '\0'.join(col).encode('utf-8', 'surrogateescape')
+            else:
+                packed = array('q', [_NULL_INT if val is None else int(val) for val in col])
+                if _IS_BYTE_SWAP_NEEDED:
+                    packed.byteswap()
+                data = packed.tobytes()
+            data = zlib.compress(data, _COMPRESS_LEVEL)
+            f.write(_LENGTH.pack(len(data)))
+            f.write(data)
+        return row_count
+
+    @staticmethod
+    def _read_chunk(f: BinaryIO, table: Table) -> List[Tuple]:
+        row_count = _LENGTH.unpack(f.read(_LENGTH.size))[0]
+        if not row_count:
+            # End of table
+            return []
+        col_list: List[list] = []
+        for col_type in table.cols.values():
+            data_len = _LENGTH.unpack(f.read(_LENGTH.size))[0]
+            data = f.read(data_len)
+            if len(data) != data_len:
+                raise ValueError(f'Snapshot is truncated (table "{table.name}")')
+            data = zlib.decompress(data)
+
+            if LocalDiskSnapshot._is_text_col(col_type):
+                col = data.decode('utf-8', 'surrogateescape').split('\0')
+            else:
+                packed = array('q')
+                packed.frombytes(data)
+                if _IS_BYTE_SWAP_NEEDED:
+                    packed.byteswap()
+                col = packed.tolist()
+                if _NULL_INT in packed:
+                    col = [None if val == _NULL_INT else val for val in col]
+
+            if len(col) != row_count:
+                raise ValueError(f'Snapshot column has {len(col)} values but expected {row_count} (table "{table.name}")')
+            col_list.append(col)
+
+        return list(zip(*col_list))
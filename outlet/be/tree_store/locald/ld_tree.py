@@ -129,6 +129,18 @@ class LocalDiskTree(SimpleTree[UID, LocalNode]):
         logger.debug(f'Returning {len(file_list)} files and {len(dir_list)} dirs')
         return file_list, dir_list
 
+    def get_parent_for_sn(self, sn: SPIDNodePair) -> Optional[SPIDNodePair]:
+        parent_node = self.get_parent(sn.node.uid)
+        if parent_node:
+            return SPIDNodePair(parent_node.node_identifier, parent_node)
+        return None
+
+    @staticmethod
+    def to_sn_list_in_subtree(node: LocalNode, subtree_root_path: str) -> List[SPIDNodePair]:
+        if file_util.is_in_subtree(node.get_single_path(), subtree_root_path):
+            return [SPIDNodePair(node.node_identifier, node)]
+        return []
+
     def get_child_list_for_spid(self, spid: LocalNodeIdentifier) -> List[SPIDNodePair]:
         sn_list = []
         for node in self.get_child_list_for_identifier(spid.node_uid):
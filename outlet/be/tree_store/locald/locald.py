@@ -4,7 +4,7 @@ import math
 import os
 import pathlib
 import threading
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from pydispatch import dispatcher
 
@@ -50,14 +50,18 @@ class LocalDiskMasterStore(TreeStore):
         self.uid_path_mapper: UidPathMapper = uid_path_mapper
 
         self._memstore: LocalDiskMemoryStore = LocalDiskMemoryStore(backend, self.device.uid)
-        self._diskstore: LocalDiskDiskStore = LocalDiskDiskStore(backend, self.device.uid)
+        self._diskstore: LocalDiskDiskStore = LocalDiskDiskStore(backend, self.device.uid, uid_path_mapper)
 
     def start(self):
         TreeStore.start(self)
         self._diskstore.start()
+        if self._is_name_index_persisted():
+            name_index = self._memstore.name_index
+            name_index.load_from_file(name_index.get_file_path(self.backend.cacheman.cache_dir_path))
 
     def shutdown(self):
         TreeStore.shutdown(self)
+        self._save_name_index()
         try:
             self.backend = None
             self._memstore = None
@@ -65,23 +69,40 @@ class LocalDiskMasterStore(TreeStore):
         except (AttributeError, NameError):
             pass
 
+    def _is_name_index_persisted(self) -> bool:
+        return self._memstore.name_index is not None and self.backend.get_config('cache.name_index.persist')
+
+    def _save_name_index(self):
+        # Can be called via __del__() for a store which was never fully constructed, so don't assume that any of these exist:
+        if not getattr(self, 'backend', None) or not getattr(self, '_memstore', None) or not self._is_name_index_persisted():
+            return
+
+        try:
+            name_index = self._memstore.name_index
+            name_index.save_to_file(name_index.get_file_path(self.backend.cacheman.cache_dir_path))
+        except Exception as err:
+            logger.exception(f'Failed to save name index for device_uid={self.device_uid}: {repr(err)}')
+
     def is_gdrive(self) -> bool:
         return False
 
     def _execute_write_op(self, operation: LDCacheWriteOp):
-        # 3 stages. Failure at one stage cancels the stages after
+        # 4 stages. Failure at one stage cancels the stages after
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Executing operation: {operation}')
 
         # 1. Update memory
         operation.update_memstore(self._memstore)
 
-        # 2. Update disk
+        # 2. Update content ref index (which also persists any new ContentMetas, before the nodes which reference them)
+        operation.update_content_refs(self.backend.cacheman)
+
+        # 3. Update disk
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Updating diskstore for operation {operation}')
         self._diskstore.execute_op(operation)
 
-        # 3. Send signals
+        # 4. Send signals
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Sending signals for operation {operation}')
         operation.send_signals()
@@ -241,6 +262,7 @@ class LocalDiskMasterStore(TreeStore):
                     logger.debug(f'[{tree_id}] Loaded cached tree: \n{tree.show()}')
 
                 self._memstore.master_tree.replace_subtree(tree)
+                self._memstore.on_master_tree_bulk_update()
                 # Only set this once we are completely finished bringing the memstore up to date. Other tasks will depend on it
                 # to choose whether to query memory or disk
                 cache_info.is_loaded = True
@@ -316,7 +338,7 @@ class LocalDiskMasterStore(TreeStore):
                 logger.info(f'Cache for supertree (root={supertree_cache.subtree_root.get_single_path()}, ts={supertree_cache.sync_ts}) '
                             f'is newer than for subtree (root={subtree_cache.subtree_root.get_single_path()}, ts={subtree_cache.sync_ts}): '
                             f'it will be deleted')
-                file_util.delete_file(subtree_cache.cache_location)
+                self._diskstore.delete_cache_files(subtree_cache.cache_location)
             else:
                 logger.info(f'Cache for subtree (root={subtree_cache.subtree_root.get_single_path()}, ts={subtree_cache.sync_ts}) '
                             f'is newer than for supertree (root={supertree_cache.subtree_root.get_single_path()}, ts={supertree_cache.sync_ts}): '
@@ -334,6 +356,7 @@ class LocalDiskMasterStore(TreeStore):
 
                 # 5. We already loaded it into memory; add it to the in-memory cache:
                 self._memstore.master_tree.replace_subtree(super_tree)
+                self._memstore.on_master_tree_bulk_update()
                 super_tree.is_loaded = True
 
                 # 6. This will resync with file system and re-save
@@ -343,7 +366,7 @@ class LocalDiskMasterStore(TreeStore):
 
                 # 7. Now it is safe to delete the subtree cache:
                 def _delete_cache_file(_this_task2: Task):
-                    file_util.delete_file(subtree_cache.cache_location)
+                    self._diskstore.delete_cache_files(subtree_cache.cache_location)
 
                 delete_cache_file_child_task = _this_task.create_child_task(_delete_cache_file)
                 self.backend.executor.submit_async_task(delete_cache_file_child_task)
@@ -380,8 +403,39 @@ class LocalDiskMasterStore(TreeStore):
         """Generate DirStatsDict for the given subtree, with no filter applied"""
         return self._memstore.master_tree.generate_dir_stats(tree_id, subtree_root_node)
 
+    def update_dir_stats(self, subtree_root_node: LocalNode, dir_stats_dict: Dict[UID, DirStats], changed_dir_uid_list: Iterable[UID],
+                         tree_id: TreeID):
+        self._memstore.master_tree.update_dir_stats(tree_id, dir_stats_dict, changed_dir_uid_list, subtree_root_node.uid)
+
+    def get_estimated_file_count_for_subtree(self, subtree_root: LocalNodeIdentifier) -> int:
+        """Best guess at the number of files in the given subtree, for progress reporting, without touching the disk. Prefers the count
+        from the last scan of the subtree, which is persisted with the cache info if the subtree is the root of its cache; otherwise
+        uses DirStats if they have been generated. Returns 0 if we know neither."""
+        cache_info = self._get_cache_info_with_root(subtree_root)
+        if cache_info and cache_info.file_count is not None:
+            return cache_info.file_count
+
+        subtree_root_node = self._memstore.master_tree.get_node_for_uid(subtree_root.node_uid)
+        if subtree_root_node and subtree_root_node.is_dir() and subtree_root_node.dir_stats:
+            return subtree_root_node.dir_stats.file_count + subtree_root_node.dir_stats.trashed_file_count
+
+        return 0
+
+    def set_last_scan_file_count_for_subtree(self, subtree_root: LocalNodeIdentifier, file_count: int):
+        """Only the count for the root of a cache is kept. It is written to disk along with the rest of the cache info"""
+        cache_info = self._get_cache_info_with_root(subtree_root)
+        if cache_info:
+            cache_info.file_count = file_count
+
+    def _get_cache_info_with_root(self, subtree_root: LocalNodeIdentifier) -> Optional[PersistedCacheInfo]:
+        cache_info: Optional[PersistedCacheInfo] = \
+            self.backend.cacheman.get_existing_cache_info_for_local_path(self.device.uid, subtree_root.get_single_path())
+        if cache_info and cache_info.subtree_root.node_uid == subtree_root.node_uid:
+            return cache_info
+        return None
+
     def populate_filter(self, filter_state: FilterState):
-        filter_state.ensure_cache_populated(self._memstore.master_tree)
+        filter_state.ensure_cache_populated(self._memstore.master_tree, self._memstore.get_name_index())
 
     # Cache CRUD operations
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
@@ -613,6 +667,12 @@ class LocalDiskMasterStore(TreeStore):
 
         return matching_file_list
 
+    def get_content_ref_list(self, cache_info_list: List[PersistedCacheInfo]) -> List[Tuple[UID, UID]]:
+        ref_list: List[Tuple[UID, UID]] = []
+        for cache_info in cache_info_list:
+            ref_list += self._diskstore.get_content_ref_list(cache_info)
+        return ref_list
+
     def get_node_list_for_path_list(self, path_list: List[str]) -> List[LocalNode]:
         """
         Checks (1) memstore, (2) diskstore, (3) live disk
@@ -751,7 +811,7 @@ class LocalDiskMasterStore(TreeStore):
             if not self._load_cache_synchronously_for(parent_spid, tree_id):
                 raise RuntimeError(f'Cannot load filtered child list: timed out waiting for cache to load for: {parent_spid}')
 
-            child_list = filter_state.get_filtered_child_list(parent_spid, self._memstore.master_tree)
+            child_list = filter_state.get_filtered_child_list(parent_spid, self._memstore.master_tree, self._memstore.get_name_index())
             logger.debug(f'[{tree_id}] get_child_list_for_spid(): Returning {len(child_list)} filtered children for parent {parent_spid.guid}')
         else:
             child_list = self._get_child_list_from_cache_for_spid(parent_spid, only_if_all_children_fetched=True)
@@ -832,13 +892,16 @@ class LocalDiskMasterStore(TreeStore):
             logger.error(f'Error getting parent for node: {node}, required_path: {required_subtree_path}')
             raise
 
-    def _get_stats(self, full_path: str, staging_path: Optional[str] = None):
+    def _get_stats(self, full_path: str, staging_path: Optional[str] = None, stat: Optional[os.stat_result] = None):
+        """If param "stat" is provided (e.g. from a DirEntry which was already stat'ed during a scan), it is used in place of calling
+        os.stat() again."""
         if staging_path:
             path = staging_path
         else:
             path = full_path
 
-        stat = os.stat(path)
+        if stat is None:
+            stat = os.stat(path)
 
         size_bytes = int(stat.st_size)
 
@@ -873,20 +936,25 @@ class LocalDiskMasterStore(TreeStore):
 
         return size_bytes, sync_ts, create_ts, modify_ts, change_ts
 
-    def build_local_dir_node(self, full_path: str, is_live: bool, all_children_fetched: bool) -> Optional[LocalDirNode]:
+    def build_local_dir_node(self, full_path: str, is_live: bool, all_children_fetched: bool, dir_entry: Optional[os.DirEntry] = None) \
+            -> Optional[LocalDirNode]:
+        """If param "dir_entry" is provided, it is assumed to come from a scandir() of the parent dir and to already be known to be a dir:
+        the existence checks are skipped and its (cached) stat is used, so that the dir is stat'ed at most once."""
         if TRACE_ENABLED:
             logger.debug(f'build_local_dir_node() called for path "{full_path}", is_live={is_live}, all_children_fetched={all_children_fetched}')
         uid = self.get_uid_for_path(full_path)
 
         if is_live:
-            if not os.path.exists(full_path):
-                logger.debug(f'build_local_dir_node(): path does not exist: "{full_path}"')
-                return None
-            elif not os.path.isdir(full_path):
-                raise RuntimeError(f'build_local_dir_node(): path is not a dir: "{full_path}"')
+            if dir_entry is None:
+                if not os.path.exists(full_path):
+                    logger.debug(f'build_local_dir_node(): path does not exist: "{full_path}"')
+                    return None
+                elif not os.path.isdir(full_path):
+                    raise RuntimeError(f'build_local_dir_node(): path is not a dir: "{full_path}"')
 
             try:
-                size_bytes, sync_ts, create_ts, modify_ts, change_ts = self._get_stats(full_path)
+                stat = dir_entry.stat() if dir_entry is not None else None
+                size_bytes, sync_ts, create_ts, modify_ts, change_ts = self._get_stats(full_path, stat=stat)
             except FileNotFoundError:
                 # Caller didn't check whether file existed (may also be a missing dir). Let them know:
                 logger.info(f'build_local_dir_node(): dir not found (returning None): "{full_path}" ')
@@ -905,15 +973,19 @@ class LocalDiskMasterStore(TreeStore):
                             trashed=TrashStatus.NOT_TRASHED, is_live=is_live, sync_ts=sync_ts, create_ts=create_ts,
                             modify_ts=modify_ts, change_ts=change_ts, all_children_fetched=all_children_fetched)
 
-    def build_local_file_node(self, full_path: str, staging_path: str = None, must_scan_signature=False, is_live: bool = True) \
-            -> Optional[LocalFileNode]:
+    def build_local_file_node(self, full_path: str, staging_path: str = None, must_scan_signature=False, is_live: bool = True,
+                              dir_entry: Optional[os.DirEntry] = None) -> Optional[LocalFileNode]:
+        """If param "dir_entry" is provided, it is assumed to come from a scandir() of the parent dir (and to correspond to full_path, with
+        no staging_path): the existence & type checks are skipped and its cached type info & stat are used instead, so that a scanned file
+        is stat'ed at most once."""
         if TRACE_ENABLED:
             logger.debug(f'build_local_file_node() called for path "{full_path}", staging_path={staging_path}, '
-                         f'must_scan_signature={must_scan_signature}, is_live={is_live}')
+                         f'must_scan_signature={must_scan_signature}, is_live={is_live}, has_dir_entry={dir_entry is not None}')
 
+        assert dir_entry is None or staging_path is None, f'Cannot specify both dir_entry and staging_path ("{staging_path}")'
         effective_path = full_path if staging_path is None else staging_path
 
-        if is_live:
+        if is_live and dir_entry is None:
             if not os.path.exists(effective_path):
                 logger.debug(f'build_local_file_node(): path does not exist: "{effective_path}"')
                 return None
@@ -922,7 +994,8 @@ class LocalDiskMasterStore(TreeStore):
                 raise RuntimeError(f'build_local_file_node(): path is actually a dir: {effective_path}')
 
         # Check for broken links:
-        if os.path.islink(full_path):
+        is_link = dir_entry.is_symlink() if dir_entry is not None else os.path.islink(full_path)
+        if is_link:
             pointer = full_path
             # Links can be nested too (can there be cycles? Use max depth just in case):
             count_attempt = 0
@@ -941,7 +1014,8 @@ class LocalDiskMasterStore(TreeStore):
                 pointer = target
 
         try:
-            size_bytes, sync_ts, create_ts, modify_ts, change_ts = self._get_stats(full_path, staging_path)
+            stat = dir_entry.stat() if dir_entry is not None else None
+            size_bytes, sync_ts, create_ts, modify_ts, change_ts = self._get_stats(full_path, staging_path, stat)
         except FileNotFoundError:
             # Caller didn't check whether file existed (may also be a missing dir). Let them know:
             logger.debug(f'build_local_file_node(): file not found when getting stats (returning None): "{effective_path}" ')
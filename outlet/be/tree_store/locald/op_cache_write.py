@@ -94,6 +94,10 @@ class LDUpsertSingleNodeOp(LDSingleNodeOp):
         if SUPER_DEBUG_ENABLED and not self.update_info.node:
             logger.debug(f'LDUpsertSingleNodeOp: upsert_single_node() returned None for input node: {self.node}')
 
+    def update_content_refs(self, cacheman):
+        if self.update_info.needs_disk_update and self.node.is_file():
+            cacheman.update_content_refs(self.node.device_uid, [self.node])
+
     def update_diskstore(self, cache: LocalDiskDatabase):
         if not self.update_info.needs_disk_update:
             if SUPER_DEBUG_ENABLED:
@@ -135,6 +139,10 @@ class LDRemoveSingleNodeOp(LDUpsertSingleNodeOp):
     def update_memstore(self, memstore: LocalDiskMemoryStore):
         memstore.remove_single_node(self.node)
 
+    def update_content_refs(self, cacheman):
+        if self.node.is_file():
+            cacheman.update_content_refs(self.node.device_uid, [], removed_node_uid_list=[self.node.uid])
+
     def update_diskstore(self, cache: LocalDiskDatabase):
         cache.delete_single_node(self.node, commit=False)
 
@@ -212,6 +220,13 @@ class LDBatchWriteOp(LDMultiNodeOp):
 
                 subtree.upsert_node_list = new_upsert_node_list
 
+    def update_content_refs(self, cacheman):
+        """One update for all subtrees, covering the same file nodes as update_diskstore() will write or remove"""
+        removed_file_uid_list = [node.uid for subtree in self.subtree_list for node in subtree.remove_node_list if node.is_file()]
+        upserted_file_list = [node for subtree in self.subtree_list for node in subtree.upsert_node_list if node.is_file() and node.is_live()]
+        if removed_file_uid_list or upserted_file_list:
+            cacheman.update_content_refs(self.subtree_list[0].subtree_root.device_uid, upserted_file_list, removed_file_uid_list)
+
     def update_diskstore(self, cache: LocalDiskDatabase, subtree: LocalSubtree):
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'Removing {len(subtree.remove_node_list)} & upserting {len(subtree.upsert_node_list)} nodes in diskstore')
@@ -14,29 +14,13 @@ import hashlib
 import logging
 import os
 import pathlib
-import subprocess
+import threading
 from typing import Optional, Tuple
-from constants import IS_MACOS, IS_WINDOWS, MAX_FS_LINK_DEPTH, READ_CHUNK_SIZE, USE_LOW_PRIORITY_FOR_MD5_PROC
+from constants import MAX_FS_LINK_DEPTH, READ_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
 
-def _compute_md5_via_external_proc(filename):
-    try:
-        cmd_line = ['/sbin/md5', '-q', filename]
-        # Run cmd and block until it returns (collect output too). Execute at low priority
-        if IS_WINDOWS and USE_LOW_PRIORITY_FOR_MD5_PROC:
-            output_bytes = subprocess.check_output(cmd_line, creationflags=subprocess.BELOW_NORMAL_PRIORITY_CLASS)
-        else:
-            output_bytes = subprocess.check_output(cmd_line)
-        output = output_bytes.decode().split('\n')[0]
-    except (subprocess.CalledProcessError, RuntimeError) as err:
-        logger.error(f'While computing MD5 via native proc for file "{filename}": {repr(err)}')
-        output = None
-
-    return output
-
-
 def _compute_md5_in_python(filename):
     hash_md5 = hashlib.md5()
     with open(filename, "rb") as f:
@@ -45,16 +29,51 @@ def _compute_md5_in_python(filename):
     return hash_md5.hexdigest()
 
 
-def _compute_md5(filename):
-    if IS_MACOS:
-        output = _compute_md5_via_external_proc(filename)
-        if not output:
-            logger.warning(f'Failed to compute MD5 using Mac cmdlkne tool; falling back to Python')
-            return _compute_md5_in_python(filename)
+_thread_local = threading.local()
+
 
-        return output
-    else:
-        return _compute_md5_in_python(filename)
+def _get_read_buffer(chunk_size: int) -> bytearray:
+    """Returns a read buffer of the given size which is reused by all calls from the current thread"""
+    buf = getattr(_thread_local, 'read_buffer', None)
+    if buf is None or len(buf) != chunk_size:
+        buf = bytearray(chunk_size)
+        _thread_local.read_buffer = buf
+    return buf
+
+
+def compute_digests(filename, include_dropbox_hash: bool = False, chunk_size: int = READ_CHUNK_SIZE) \
+        -> Tuple[str, str, Optional[str]]:
+    """Reads the given file exactly once and returns its (MD5, SHA-256, Dropbox content hash) as hex strings. The Dropbox hash is only
+    computed if include_dropbox_hash is true; otherwise it is None."""
+    hasher = MultiDigestHasher(include_dropbox_hash)
+    buf = _get_read_buffer(chunk_size)
+    view = memoryview(buf)
+    with open(filename, 'rb', buffering=0) as f:
+        while True:
+            bytes_read = f.readinto(buf)
+            if not bytes_read:
+                break
+            hasher.update(view[:bytes_read])
+    return hasher.hexdigests()
+
+
+def copy_file_computing_digests(src_path: str, dst_path: str, chunk_size: int = READ_CHUNK_SIZE) -> Tuple[int, str, str]:
+    """Copies the contents of src_path to dst_path (overwriting it if it exists), and computes the MD5 & SHA-256 of the data as it is
+    copied, so that the data is read only once. Returns (bytes copied, MD5, SHA-256). Does not copy any file meta."""
+    hasher = MultiDigestHasher()
+    buf = _get_read_buffer(chunk_size)
+    view = memoryview(buf)
+    byte_count = 0
+    with open(src_path, 'rb', buffering=0) as f_src, open(dst_path, 'wb') as f_dst:
+        f_dst_hashed = StreamHasher(f_dst, hasher)
+        while True:
+            bytes_read = f_src.readinto(buf)
+            if not bytes_read:
+                break
+            f_dst_hashed.write(view[:bytes_read])
+            byte_count += bytes_read
+    md5, sha256, dropbox_hash = hasher.hexdigests()
+    return byte_count, md5, sha256
 
 
 def compute_dropbox_hash(filename):
@@ -69,15 +88,13 @@ def compute_dropbox_hash(filename):
 
 
 def calculate_signatures(full_path: str, staging_path: str = None) -> Tuple[Optional[str], Optional[str]]:
+    """Returns (MD5, SHA-256) for the given file, computed from a single read of the file"""
     try:
         # Open,close, read file and calculate hash of its contents
         if staging_path:
-            md5: Optional[str] = _compute_md5(staging_path)
+            md5, sha256, dropbox_hash = compute_digests(staging_path)
         else:
-            md5: Optional[str] = _compute_md5(full_path)
-
-        # TODO: compute SHA-256 at the same time. See: compute_dropbox_hash()
-        sha256: Optional[str] = None
+            md5, sha256, dropbox_hash = compute_digests(full_path)
 
         return md5, sha256
     except FileNotFoundError:
@@ -92,9 +109,7 @@ def calculate_signatures(full_path: str, staging_path: str = None) -> Tuple[Opti
                 logger.debug(f'Resolved link (depth {count_attempt}): "{full_path}" -> "{target}"')
                 full_path = target
                 try:
-                    md5: Optional[str] = _compute_md5(full_path)
-                    # sha256 = local.sig_calc.dropbox_hash(full_path)
-                    sha256: Optional[str] = None
+                    md5, sha256, dropbox_hash = compute_digests(full_path)
                     return md5, sha256
                 except FileNotFoundError:
                     count_attempt += 1
@@ -108,6 +123,33 @@ def calculate_signatures(full_path: str, staging_path: str = None) -> Tuple[Opti
         return None, None
 
 
+class MultiDigestHasher:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS MultiDigestHasher
+
+    Feeds each chunk of data to an MD5, a SHA-256 and (optionally) a DropboxContentHasher, so that all of them can be computed from a
+    single pass over the data. Accepts any bytes-like object, including memoryview slices of a reused read buffer.
+    Can be wrapped by StreamHasher like any other hasher.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, include_dropbox_hash: bool = False):
+        self._md5_hasher = hashlib.md5()
+        self._sha256_hasher = hashlib.sha256()
+        self._dropbox_hasher: Optional[DropboxContentHasher] = DropboxContentHasher() if include_dropbox_hash else None
+
+    def update(self, new_data):
+        self._md5_hasher.update(new_data)
+        self._sha256_hasher.update(new_data)
+        if self._dropbox_hasher:
+            self._dropbox_hasher.update(new_data)
+
+    def hexdigests(self) -> Tuple[str, str, Optional[str]]:
+        """Returns (MD5, SHA-256, Dropbox content hash). The last is None if it was not requested"""
+        dropbox_hash = self._dropbox_hasher.hexdigest() if self._dropbox_hasher else None
+        return self._md5_hasher.hexdigest(), self._sha256_hasher.hexdigest(), dropbox_hash
+
+
 class DropboxContentHasher(object):
     """
     ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
@@ -145,8 +187,8 @@ class DropboxContentHasher(object):
             raise AssertionError(
                 "can't use this object anymore; you already called digest()")
 
-        assert isinstance(new_data, bytes), (
-            "Expecting a byte string, got {!r}".format(new_data))
+        assert isinstance(new_data, (bytes, bytearray, memoryview)), (
+            "Expecting a bytes-like object, got {!r}".format(new_data))
 
         new_data_pos = 0
         while new_data_pos < len(new_data):
@@ -3,10 +3,12 @@ import logging
 import threading
 import time
 from collections import deque
-from typing import Deque, List, Set
-from uuid import UUID
+from concurrent.futures import as_completed, Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
 
 from be.exec.central import ExecPriority
+from be.sqlite.content_meta_db import ContentMeta
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
 from model.node.locald_node import LocalFileNode, LocalNode
 from model.node_identifier import NodeIdentifier
@@ -19,6 +21,10 @@ from util.task_runner import Task
 
 logger = logging.getLogger(__name__)
 
+# When hashing in parallel, each P7 task handles at most this many files per worker before yielding back to the CentralExecutor, so that
+# higher-priority tasks do not have to wait for an entire batch to finish:
+FILES_PER_WORKER_PER_TASK = 4
+
 
 class SigCalcBatchingThread(HasLifecycle, threading.Thread):
     """
@@ -26,6 +32,8 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
     CLASS SigCalcBatchingThread
 
     Listens for upserted local disk nodes, and enqueues them so that they can have their MD5/SHA256 signatures calculated in batches.
+    If worker_count > 1, the files of each batch are hashed concurrently on a dedicated thread pool (hashlib releases the GIL while
+    digesting); the batch itself is split across a chain of P7 tasks so that the CentralExecutor can run higher-priority work in between.
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
 
@@ -38,8 +46,20 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
         self.batch_interval_ms: int = ensure_int(self.backend.get_config('cache.local_disk.signatures.batch_interval_ms'))
         self.bytes_per_batch_high_watermark: int = ensure_int(self.backend.get_config('cache.local_disk.signatures.bytes_per_batch_high_watermark'))
         logger.debug(f'[{self.name}] Bytes per batch high watermark = {self.bytes_per_batch_high_watermark}')
+        self.worker_count: int = max(1, ensure_int(self.backend.get_config('cache.local_disk.signatures.worker_count')))
         self._node_queue: Deque[LocalFileNode] = deque()
         self._running_task_set: Set[UUID] = set()
+        """Contains the UUID of the batch which is currently in flight, if any. (A batch may span several tasks; see
+        batch_calculate_signatures())"""
+        self._hash_executor: Optional[ThreadPoolExecutor] = None
+        self._hash_executor_lock = threading.Lock()
+        """Guards _hash_executor, which is set to None by shutdown() while a task may be about to use it"""
+
+        # Throughput counters (see get_throughput()):
+        self._stats_lock = threading.Lock()
+        self._total_files_hashed: int = 0
+        self._total_bytes_hashed: int = 0
+        self._total_hash_time_sec: float = 0.0
 
     def _enqueue_node(self, node: LocalFileNode):
         with self._cv_can_get:
@@ -55,6 +75,9 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
         self.connect_dispatch_listener(signal=Signal.NODE_NEEDS_SIG_CALC, receiver=self._on_node_upserted_in_cache)
         self.connect_dispatch_listener(signal=Signal.NODE_UPSERTED_IN_CACHE, receiver=self._on_node_upserted_in_cache)
         self.connect_dispatch_listener(signal=Signal.SUBTREE_NODES_CHANGED_IN_CACHE, receiver=self._on_subtree_nodes_changed_in_cache)
+        if self.worker_count > 1:
+            logger.debug(f'[{self.name}] Will calculate signatures using {self.worker_count} workers')
+            self._hash_executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix='SigCalcWorker-')
         threading.Thread.start(self)
         logger.debug(f'[{self.name}] Startup done')
 
@@ -65,8 +88,27 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
         with self._cv_can_get:
             # unblock thread:
             self._cv_can_get.notifyAll()
+
+        with self._hash_executor_lock:
+            hash_executor = self._hash_executor
+            self._hash_executor = None
+        if hash_executor:
+            hash_executor.shutdown(wait=False)
         logger.debug(f'[{self.name}] Shutdown done')
 
+    def get_throughput(self) -> Tuple[int, int, float]:
+        """Returns (files hashed, bytes hashed, seconds spent hashing) since startup. Time is wall time spent in batches, so that
+        parallelism is reflected in the derived rates."""
+        with self._stats_lock:
+            return self._total_files_hashed, self._total_bytes_hashed, self._total_hash_time_sec
+
+    def get_throughput_str(self) -> str:
+        file_count, byte_count, elapsed_sec = self.get_throughput()
+        if not elapsed_sec:
+            return f'{file_count} files hashed'
+        return f'{file_count} files ({humanfriendlier_size(byte_count)}) hashed in {elapsed_sec:.1f}s: ' \
+               f'{file_count / elapsed_sec:.1f} files/s, {byte_count / elapsed_sec / 1_000_000:.1f} MB/s'
+
     def _run(self):
         logger.info(f'[{self.name}] Starting thread...')
         while not self.was_shutdown:
@@ -95,27 +137,66 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
 
                 logger.info(f'[{self.name}] Submitting batch calc task with {len(nodes_to_scan)} nodes and {humanfriendlier_size(bytes_to_scan)}'
                             f' total ({len(self._node_queue)} nodes still enqueued)')
-                calc_task = Task(ExecPriority.P7_SIGNATURE_CALC, self.batch_calculate_signatures, nodes_to_scan)
-                self._running_task_set.add(calc_task.task_uuid)
+                batch_uuid = uuid4()
+                calc_task = Task(ExecPriority.P7_SIGNATURE_CALC, self.batch_calculate_signatures, nodes_to_scan, batch_uuid)
+                self._running_task_set.add(batch_uuid)
             self.backend.executor.submit_async_task(calc_task)
 
-    def batch_calculate_signatures(self, this_task: Task, nodes_to_scan: List[LocalFileNode]):
-        """One task is created for each execution of this method."""
+    def batch_calculate_signatures(self, this_task: Task, nodes_to_scan: List[LocalFileNode], batch_uuid: UUID):
+        """One task is created for each execution of this method. If hashing in parallel, only a slice of the batch is handled by each
+        task, and the remainder is passed to the next task."""
         assert this_task.priority == ExecPriority.P7_SIGNATURE_CALC
 
         if len(nodes_to_scan) == 0:
             # indicates a bug in this file
             logger.warning(f'[{self.name}] Task launched with empty batch of zero nodes!')
+            self._on_batch_done(batch_uuid)
             return
 
-        logger.debug(f'[{self.name}] Starting a batch of {len(nodes_to_scan)} nodes')
-        for node in nodes_to_scan:
-            self._calculate_signature_for_local_node(node)
+        remaining_node_list: List[LocalFileNode] = []
+        try:
+            start_time = time.perf_counter()
+            with self._hash_executor_lock:
+                hash_executor = self._hash_executor
+            if hash_executor:
+                max_files_this_task = self.worker_count * FILES_PER_WORKER_PER_TASK
+                remaining_node_list = nodes_to_scan[max_files_this_task:]
+                nodes_to_scan = nodes_to_scan[:max_files_this_task]
+                logger.debug(f'[{self.name}] Hashing {len(nodes_to_scan)} nodes with {self.worker_count} workers '
+                             f'({len(remaining_node_list)} remaining in batch)')
+                hashed_node_list = self._calculate_signatures_in_parallel(hash_executor, nodes_to_scan)
+            else:
+                logger.debug(f'[{self.name}] Starting a batch of {len(nodes_to_scan)} nodes')
+                hashed_node_list = []
+                for node in nodes_to_scan:
+                    node = self._calculate_signature_for_local_node(node)
+                    if node:
+                        hashed_node_list.append(node)
+            self._add_to_throughput(hashed_node_list, time.perf_counter() - start_time)
+        finally:
+            if remaining_node_list and not self.was_shutdown:
+                this_task.add_next_task(self.batch_calculate_signatures, remaining_node_list, batch_uuid)
+            else:
+                logger.info(f'[{self.name}] Batch done. Totals: {self.get_throughput_str()}')
+                self._on_batch_done(batch_uuid)
 
+    def _on_batch_done(self, batch_uuid: UUID):
         with self._cv_can_get:
-            self._running_task_set.remove(this_task.task_uuid)
+            self._running_task_set.discard(batch_uuid)
             self._cv_can_get.notifyAll()
 
+    def _add_to_throughput(self, node_list: List[LocalFileNode], elapsed_sec: float):
+        byte_count = 0
+        for node in node_list:
+            size_bytes = node.get_size_bytes()
+            if size_bytes:
+                byte_count += size_bytes
+
+        with self._stats_lock:
+            self._total_files_hashed += len(node_list)
+            self._total_bytes_hashed += byte_count
+            self._total_hash_time_sec += elapsed_sec
+
     def _on_node_upserted_in_cache(self, sender: str, node: LocalNode):
         if node.device_uid == self.device_uid and node.is_file() and not node.has_signature():
             assert isinstance(node, LocalFileNode)
@@ -134,26 +215,64 @@ class SigCalcBatchingThread(HasLifecycle, threading.Thread):
     # Signature calculation
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
-    def _calculate_signature_for_local_node(self, node: LocalFileNode):
+    def _calculate_signatures_in_parallel(self, hash_executor: ThreadPoolExecutor, node_list: List[LocalFileNode]) -> List[LocalFileNode]:
+        """Hashes the given nodes on the worker pool. Cache updates are done from this thread, one node at a time, in the order the
+        hashes complete (so that one large file does not hold up the updates for the others). Returns the nodes which were hashed."""
+        future_dict: Dict[Future, LocalFileNode] = {}
+        for node in node_list:
+            node = self._get_node_needing_signature(node)
+            if node:
+                try:
+                    future = hash_executor.submit(self.backend.cacheman.calculate_signature_for_local_file,
+                                                  device_uid=node.device_uid, full_path=node.get_single_path())
+                except RuntimeError:
+                    # Executor was shut down after we got it
+                    logger.debug(f'[{self.name}] Hash workers were shut down; not submitting remaining nodes')
+                    break
+                future_dict[future] = node
+
+        hashed_node_list: List[LocalFileNode] = []
+        for future in as_completed(future_dict):
+            node = future_dict[future]
+            content_meta = future.result()
+            if content_meta and not self.was_shutdown:
+                self._update_node_with_content_meta(node, content_meta)
+                hashed_node_list.append(node)
+        return hashed_node_list
+
+    def _get_node_needing_signature(self, node: LocalFileNode) -> Optional[LocalFileNode]:
+        """Returns the up-to-date copy of the given node from the cache, or None if it does not need its signature calculated"""
         if self.was_shutdown:
-            return
+            return None
 
         # Get up-to-date copy:
         node = self.backend.cacheman.get_node_for_uid(node.uid, node.device_uid)
         if not node:
             logger.warning(f'[{self.name}] Skipping signature calculation: node is no longer present in the cache: {node}')
-            return
+            return None
 
         if node.has_signature():
             # Other threads, e.g., CommandExecutor, can also fill this in asynchronously
             logger.debug(f'[{self.name}] TNode already has signature; skipping; {node}')
-            return
+            return None
+
+        return node
+
+    def _calculate_signature_for_local_node(self, node: LocalFileNode) -> Optional[LocalFileNode]:
+        """Returns the node if it was hashed, or None if it was skipped"""
+        node = self._get_node_needing_signature(node)
+        if not node:
+            return None
 
         content_meta = self.backend.cacheman.calculate_signature_for_local_file(device_uid=node.device_uid, full_path=node.get_single_path())
         if not content_meta:
             # exceptional case should already have been logged; just return
-            return
+            return None
+
+        self._update_node_with_content_meta(node, content_meta)
+        return node
 
+    def _update_node_with_content_meta(self, node: LocalFileNode, content_meta: ContentMeta):
         updated_node: LocalFileNode = copy.deepcopy(node)
         updated_node.content_meta = content_meta
 
@@ -0,0 +1,198 @@
+import logging
+import os
+import pickle
+import threading
+from typing import Callable, Dict, Iterable, List, Set
+
+from logging_constants import SUPER_DEBUG_ENABLED
+from model.node.node import TNode
+from model.uid import UID
+from util.stopwatch_sec import Stopwatch
+
+logger = logging.getLogger(__name__)
+
+NGRAM_LENGTH = 3
+NAME_INDEX_FILE_FORMAT_VERSION = 1
+NAME_INDEX_FILE_PREFIX = 'name_index'
+
+
+class NodeNameIndex:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS NodeNameIndex
+
+    In-memory index of the names of all the nodes of a single device, so that FilterState can find the nodes whose names contain
+    a search query without visiting every node in the tree.
+
+    Each distinct name is indexed under the trigrams of its lower-cased form. A query is answered by intersecting the name sets of
+    the query's trigrams (smallest first), then confirming each candidate name with a real substring test, which is where ignore_case
+    is honoured. Queries shorter than a trigram fall back to testing each distinct name, which is still far cheaper than walking the tree.
+
+    Kept up to date node-by-node by the memstore. Bulk changes to the memstore's tree (e.g. loading a cache from disk) only mark the index as
+    out of sync; it is reconciled against the tree the next time it is needed.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, device_uid: UID):
+        self.device_uid: UID = device_uid
+        self._lock = threading.Lock()
+        self._is_in_sync: bool = False
+        self._name_by_uid: Dict[UID, str] = {}
+        self._uid_set_by_name: Dict[str, Set[UID]] = {}
+        self._name_set_by_ngram: Dict[str, Set[str]] = {}
+
+    def get_node_count(self) -> int:
+        return len(self._name_by_uid)
+
+    def __repr__(self):
+        return f'NodeNameIndex(device_uid={self.device_uid} nodes={len(self._name_by_uid)} names={len(self._uid_set_by_name)} ' \
+               f'ngrams={len(self._name_set_by_ngram)} in_sync={self._is_in_sync})'
+
+    @staticmethod
+    def _get_ngram_set(name_lower: str) -> Set[str]:
+        return {name_lower[i:i + NGRAM_LENGTH] for i in range(len(name_lower) - NGRAM_LENGTH + 1)}
+
+    def _add_name(self, uid: UID, name: str):
+        uid_set = self._uid_set_by_name.get(name)
+        if uid_set is None:
+            uid_set = set()
+            self._uid_set_by_name[name] = uid_set
+            for ngram in NodeNameIndex._get_ngram_set(name.lower()):
+                name_set = self._name_set_by_ngram.get(ngram)
+                if name_set is None:
+                    name_set = set()
+                    self._name_set_by_ngram[ngram] = name_set
+                name_set.add(name)
+        uid_set.add(uid)
+        self._name_by_uid[uid] = name
+
+    def _remove_name(self, uid: UID, name: str):
+        uid_set = self._uid_set_by_name.get(name)
+        if uid_set is not None:
+            uid_set.discard(uid)
+            if not uid_set:
+                # Last node with this name: un-index the name
+                del self._uid_set_by_name[name]
+                for ngram in NodeNameIndex._get_ngram_set(name.lower()):
+                    name_set = self._name_set_by_ngram.get(ngram)
+                    if name_set is not None:
+                        name_set.discard(name)
+                        if not name_set:
+                            del self._name_set_by_ngram[ngram]
+
+    def _upsert(self, uid: UID, name: str):
+        prev_name = self._name_by_uid.get(uid)
+        if prev_name == name:
+            return
+        if prev_name is not None:
+            self._remove_name(uid, prev_name)
+        self._add_name(uid, name)
+
+    def upsert_node(self, node: TNode):
+        with self._lock:
+            self._upsert(node.uid, node.name)
+
+    def remove_node(self, node: TNode):
+        with self._lock:
+            prev_name = self._name_by_uid.pop(node.uid, None)
+            if prev_name is not None:
+                self._remove_name(node.uid, prev_name)
+
+    def mark_out_of_sync(self):
+        """Call this after making bulk changes to the tree, bypassing upsert_node() & remove_node()"""
+        with self._lock:
+            self._is_in_sync = False
+
+    def ensure_in_sync(self, for_each_node_func: Callable[[Callable[[TNode], None]], None]):
+        """If out of sync, reconciles the index against the nodes visited by for_each_node_func. Only names which have changed are re-indexed,
+        so this is cheap compared to building the index from scratch (e.g. after loading it from disk)."""
+        with self._lock:
+            if self._is_in_sync:
+                return
+
+            stopwatch = Stopwatch()
+            seen_uid_set: Set[UID] = set()
+
+            def _reconcile(node: TNode):
+                seen_uid_set.add(node.uid)
+                self._upsert(node.uid, node.name)
+
+            for_each_node_func(_reconcile)
+
+            stale_uid_list: List[UID] = [uid for uid in self._name_by_uid.keys() if uid not in seen_uid_set]
+            for uid in stale_uid_list:
+                self._remove_name(uid, self._name_by_uid.pop(uid))
+
+            self._is_in_sync = True
+            logger.debug(f'{stopwatch} Reconciled name index for device_uid={self.device_uid} ({len(stale_uid_list)} stale nodes removed): {self}')
+
+    def search(self, query: str, ignore_case: bool) -> Set[UID]:
+        """Returns the UIDs of all indexed nodes whose names contain the given query. Matching is identical to FilterState's."""
+        if not query:
+            raise RuntimeError('NodeNameIndex.search(): query cannot be empty!')
+        query_lower = query.lower()
+
+        with self._lock:
+            if len(query_lower) < NGRAM_LENGTH:
+                candidate_name_iter: Iterable[str] = self._uid_set_by_name.keys()
+            else:
+                name_set_list: List[Set[str]] = []
+                for ngram in NodeNameIndex._get_ngram_set(query_lower):
+                    name_set = self._name_set_by_ngram.get(ngram)
+                    if not name_set:
+                        return set()
+                    name_set_list.append(name_set)
+                name_set_list.sort(key=len)
+                candidate_name_iter = name_set_list[0].intersection(*name_set_list[1:])
+
+            uid_set: Set[UID] = set()
+            for name in candidate_name_iter:
+                if (ignore_case and query_lower in name.lower()) or query in name:
+                    uid_set.update(self._uid_set_by_name[name])
+
+        if SUPER_DEBUG_ENABLED:
+            logger.debug(f'NodeNameIndex.search(): found {len(uid_set)} nodes matching "{query}" (ignore_case={ignore_case})')
+        return uid_set
+
+    # Persistence
+    # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+
+    def get_file_path(self, cache_dir_path: str) -> str:
+        return os.path.join(cache_dir_path, f'{NAME_INDEX_FILE_PREFIX}.{self.device_uid}.pickle')
+
+    def load_from_file(self, file_path: str) -> bool:
+        """Replaces the contents of the index with what was saved to the given file. The index will be reconciled against the tree
+        before it is next used. Returns False if the file does not exist or could not be read."""
+        if not os.path.exists(file_path):
+            logger.debug(f'No name index file found for device_uid={self.device_uid} at "{file_path}"')
+            return False
+
+        stopwatch = Stopwatch()
+        try:
+            with open(file_path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') != NAME_INDEX_FILE_FORMAT_VERSION or data.get('device_uid') != self.device_uid:
+                logger.warning(f'Ignoring name index file "{file_path}": unexpected version or device_uid')
+                return False
+        except Exception as err:
+            logger.warning(f'Failed to load name index file "{file_path}": {repr(err)}')
+            return False
+
+        with self._lock:
+            self._name_by_uid = data['name_by_uid']
+            self._uid_set_by_name = data['uid_set_by_name']
+            self._name_set_by_ngram = data['name_set_by_ngram']
+            self._is_in_sync = False
+        logger.debug(f'{stopwatch} Loaded name index from "{file_path}": {self}')
+        return True
+
+    def save_to_file(self, file_path: str):
+        stopwatch = Stopwatch()
+        with self._lock:
+            data = {'version': NAME_INDEX_FILE_FORMAT_VERSION, 'device_uid': self.device_uid, 'name_by_uid': self._name_by_uid,
+                    'uid_set_by_name': self._uid_set_by_name, 'name_set_by_ngram': self._name_set_by_ngram}
+            # Write to a temp file first, so that a crash mid-write can't leave a truncated index behind:
+            tmp_file_path = f'{file_path}.tmp'
+            with open(tmp_file_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_path, file_path)
+        logger.debug(f'{stopwatch} Saved name index to "{file_path}": {self}')
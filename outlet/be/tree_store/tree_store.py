@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from be.disp_tree.filter_state import FilterState
 from constants import TreeID
@@ -96,6 +96,12 @@ class TreeStore(HasLifecycle, ABC):
     def get_all_files_with_content(self, content_uid: UID, cache_info_list: List) -> List[TNode]:
         pass
 
+    @abstractmethod
+    def get_content_ref_list(self, cache_info_list: List) -> List[Tuple[UID, UID]]:
+        """Returns (node_uid, content_uid) for every file with content in the given caches, read directly from disk (for building the
+        content reverse index). Must not require the caches to be loaded."""
+        pass
+
     # Mutators
     # ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
 
@@ -124,6 +130,12 @@ class TreeStore(HasLifecycle, ABC):
     def generate_dir_stats(self, subtree_root_node: TNode, tree_id: TreeID) -> Dict[UID, DirStats]:
         pass
 
+    @abstractmethod
+    def update_dir_stats(self, subtree_root_node: TNode, dir_stats_dict: Dict[UID, DirStats], changed_dir_uid_list: Iterable[UID],
+                         tree_id: TreeID):
+        """Incrementally updates dir_stats_dict (previously returned by generate_dir_stats()) in place, for the given changed dirs"""
+        pass
+
     @abstractmethod
     def populate_filter(self, filter_state: FilterState):
         pass
@@ -2,7 +2,7 @@ import pathlib
 import threading
 import logging
 from abc import ABC
-from typing import Dict, Generic, List, Optional, Tuple, TypeVar
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
 
 from be.sqlite.base_db import Table
 from be.sqlite.uid_mapper_db import UidMapperDb
@@ -78,6 +78,42 @@ class UidPersistedMapper(HasLifecycle, Generic[MappingT], ABC):
             self._write_timer.start_or_delay()
         return uid
 
+    def _normalize_mapping(self, val: MappingT) -> MappingT:
+        """Validates a value given to ensure_mapping_list() and returns it in the form in which it is stored. Raises RuntimeError if invalid.
+        Subclasses should override this to do the same as their get_uid_for_xxx() methods do before calling get_uid_for_mapping()"""
+        if not val:
+            raise RuntimeError('Mapping value is empty!')
+        return val
+
+    def ensure_mapping_list(self, mapping_list: Iterable[Tuple[UID, MappingT]]):
+        """Bulk version of get_uid_for_mapping() with uid_suggestion, for mappings which should already be valid (e.g. read from a cache
+        snapshot). Adds any which are missing, under a single lock. Raises RuntimeError if any value is invalid, or if any value or UID is
+        already mapped to something else. All are checked before any is added, so that if this raises, the mapper is left unchanged."""
+        mapping_list = [(UID(uid), self._normalize_mapping(val)) for uid, val in mapping_list]
+
+        with self._uid_lock:
+            new_mapping_dict: Dict[MappingT, UID] = {}
+            new_uid_dict: Dict[UID, MappingT] = {}
+            for uid, val in mapping_list:
+                existing_uid = self._uid_forward_dict.get(val, None) or new_mapping_dict.get(val, None)
+                if existing_uid:
+                    if existing_uid != uid:
+                        raise RuntimeError(f'UID conflict for key "{val}": mapper has {existing_uid} but was given {uid}')
+                    continue
+
+                existing_val = self._uid_reverse_dict.get(uid, None) or new_uid_dict.get(uid, None)
+                if existing_val:
+                    raise RuntimeError(f'UID conflict for UID {uid}: mapper has key "{existing_val}" but was given "{val}"')
+
+                new_mapping_dict[val] = uid
+                new_uid_dict[uid] = val
+
+            for val, uid in new_mapping_dict.items():
+                self._add(val, uid)
+
+        if new_mapping_dict:
+            self._write_timer.start_or_delay()
+
     def get_mapping_for_uid(self, uid: UID) -> MappingT:
         if not uid:
             raise RuntimeError(f'get_mapping_for_uid(): UID is empty or zero!')
@@ -160,6 +196,12 @@ class UidPathMapper(UidPersistedMapper[str]):
     def get_path_for_uid(self, uid: UID) -> str:
         return self.get_mapping_for_uid(uid)
 
+    def _normalize_mapping(self, full_path: str) -> str:
+        if not full_path or not isinstance(full_path, str) or not pathlib.PurePosixPath(full_path).is_absolute():
+            raise RuntimeError(f'Not a valid path: "{full_path}"')
+
+        return file_util.normalize_path(full_path)
+
 
 class UidGoogIdMapper(UidPersistedMapper[GoogID]):
     """
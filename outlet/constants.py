@@ -11,8 +11,6 @@ IS_MACOS = _system == 'darwin'
 ENABLE_MACOS_FINDER_JUNK_FILE_WORKAROUND = True
 MAC_FINDER_JUNK_FILE_NAME = '.DS_Store'
 
-USE_LOW_PRIORITY_FOR_MD5_PROC = True
-
 MACOS_SETFILE_DATETIME_FMT = '%m/%d/%Y %H:%M:%S'
 
 TS_FORMAT_WITH_MILLIS = '%Y-%m-%d %H:%M:%S.%f'
@@ -49,7 +47,7 @@ GRPC_SERVER_MAX_WORKER_THREADS = 4
 
 # Add these two together to get the total possible number of concurrent workers:
 TASK_RUNNER_MAX_COCURRENT_NON_USER_OP_TASKS = 1  # number of ops running with P5_USER_OP_EXECUTION priority
-TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS = 1  # number of tasks running with P5_USER_OP_EXECUTION priority
+TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS = 1  # number of tasks running with P5_USER_OP_EXECUTION priority, if not set in config
 
 READ_CHUNK_SIZE = 1024 * 1024
 
@@ -95,6 +93,13 @@ when debugging"""
 
 CFG_LAST_UID = f'{UI_STATE_CFG_SEGMENT}.global.last_uid'
 
+CFG_MAX_CONCURRENT_USER_OPS = 'user_ops.max_concurrent_ops'
+"""The max number of user ops which can execute at the same time (see TASK_RUNNER_MAX_CONCURRENT_USER_OP_TASKS)"""
+
+CFG_MAX_CONCURRENT_USER_OPS_PER_DEVICE = 'user_ops.max_concurrent_ops_per_device'
+"""Prefix for the max number of executing user ops which can touch any single device, for each type of device (e.g.
+'user_ops.max_concurrent_ops_per_device.gdrive')"""
+
 
 FILE_META_CHANGE_TOKEN_PROGRESS_AMOUNT = 100
 
@@ -46,6 +46,7 @@ class ProgressBar(HasLifecycle):
             self.connect_dispatch_listener(signal=Signal.START_PROGRESS_INDETERMINATE, receiver=self.on_start_progress_indeterminate, sender=sender)
             self.connect_dispatch_listener(signal=Signal.START_PROGRESS, receiver=self.on_start_progress, sender=sender)
             self.connect_dispatch_listener(signal=Signal.PROGRESS_MADE, receiver=self.on_progress_made, sender=sender)
+            self.connect_dispatch_listener(signal=Signal.PROGRESS_TOTAL_INCREASED, receiver=self.on_progress_total_increased, sender=sender)
             self.connect_dispatch_listener(signal=Signal.STOP_PROGRESS, receiver=self.on_stop_progress, sender=sender)
             self.connect_dispatch_listener(signal=Signal.SET_PROGRESS_TEXT, receiver=self.on_set_progress_text, sender=sender)
 
@@ -87,6 +88,10 @@ class ProgressBar(HasLifecycle):
     def on_progress_made(self, sender, progress):
         self._progress += progress
 
+    def on_progress_total_increased(self, sender, amount):
+        with self._lock:
+            self._total += amount
+
     def on_stop_progress(self, sender):
         with self._lock:
             self._stop_request_count += 1
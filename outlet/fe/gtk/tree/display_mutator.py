@@ -2,7 +2,7 @@ import collections
 import logging
 import os
 import threading
-from typing import Deque, Dict, Iterable, List, Set
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
 
 import humanfriendly
 from pydispatch import dispatcher
@@ -21,6 +21,7 @@ from model.node_identifier import GUID, NodeIdentifier, SinglePathNodeIdentifier
 from model.uid import UID
 from signal_constants import Signal
 from util import time_util
+from util.ensure import ensure_int
 from util.has_lifecycle import HasLifecycle
 
 import gi
@@ -58,11 +59,18 @@ class DisplayMutator(HasLifecycle):
 
         self._is_shutdown = False
 
+        self._stats_redraw_interval_ms: int = 0
+        self._stats_redraw_lock = threading.Lock()
+        self._pending_stats_update: Optional[Tuple[str, Dict[GUID, DirStats], Dict[UID, DirStats]]] = None
+        """Latest stats received but not yet drawn. Each update holds the stats for the whole tree, so a newer one simply replaces an older one"""
+        self._is_stats_redraw_scheduled: bool = False
+
     def start(self):
         """Do post-wiring stuff like connect listeners."""
         HasLifecycle.start(self)
 
         self.use_empty_nodes = self.con.backend.get_config('display.treeview.use_empty_nodes')
+        self._stats_redraw_interval_ms = ensure_int(self.con.backend.get_config('display.treeview.stats_redraw_interval_ms', default_val=50))
         self._connect_node_listeners()
         logger.debug(f'[{self.con.tree_id}] DisplayMutator started')
 
@@ -487,49 +495,52 @@ class DisplayMutator(HasLifecycle):
                 logger.debug(f'[{self.con.tree_id}] Ignoring signal "{Signal.NODE_UPSERTED.name}": node listeners disabled')
             return
 
-        guid = sn.spid.guid
-        parent_guid = sn.spid.parent_guid
-
         def update_ui():
             with self._lock:
                 if logger.isEnabledFor(logging.DEBUG):
-                    logger.debug(f'[{self.con.tree_id}] Received signal {Signal.NODE_UPSERTED.name} for {sn.spid}, parent={parent_guid}')
+                    logger.debug(f'[{self.con.tree_id}] Received signal {Signal.NODE_UPSERTED.name} for {sn.spid}, parent={sn.spid.parent_guid}')
+                self._upsert_node_in_ui(sn)
 
-                if self.con.get_tree().get_root_spid().guid == parent_guid:
-                    logger.debug(f'[{self.con.tree_id}] TNode is topmost level: {sn.spid}')
-                    child_iter = self.con.display_store.find_guid_in_children(sn.spid.guid, None)
-                    self._update_or_append(sn, None, child_iter)
+        GLib.idle_add(update_ui)
+
+    def _upsert_node_in_ui(self, sn: SPIDNodePair):
+        # Caller must hold self._lock, and be on the UI thread
+        guid = sn.spid.guid
+        parent_guid = sn.spid.parent_guid
+
+        if self.con.get_tree().get_root_spid().guid == parent_guid:
+            logger.debug(f'[{self.con.tree_id}] TNode is topmost level: {sn.spid}')
+            child_iter = self.con.display_store.find_guid_in_children(sn.spid.guid, None)
+            self._update_or_append(sn, None, child_iter)
+        else:
+            # TNode is not topmost.
+            logger.debug(f'[{self.con.tree_id}] TNode is not topmost: {sn.spid}')
+            parent_iter = self.con.display_store.find_guid_in_tree(target_guid=parent_guid)
+            if parent_iter:
+                parent_tree_path = self.con.display_store.model.get_path(parent_iter)
+                if self.con.tree_view.row_expanded(parent_tree_path):
+                    # Parent is present and expanded. Now check whether the "upserted node" already exists:
+                    child_iter = self.con.display_store.find_guid_in_children(guid, parent_iter)
+                    self._update_or_append(sn, parent_iter, child_iter)
                 else:
-                    # TNode is not topmost.
-                    logger.debug(f'[{self.con.tree_id}] TNode is not topmost: {sn.spid}')
-                    parent_iter = self.con.display_store.find_guid_in_tree(target_guid=parent_guid)
-                    if parent_iter:
-                        parent_tree_path = self.con.display_store.model.get_path(parent_iter)
-                        if self.con.tree_view.row_expanded(parent_tree_path):
-                            # Parent is present and expanded. Now check whether the "upserted node" already exists:
-                            child_iter = self.con.display_store.find_guid_in_children(guid, parent_iter)
-                            self._update_or_append(sn, parent_iter, child_iter)
-                        else:
-                            # Parent present but not expanded. Make sure it has a loading node (which allows child toggle):
-                            if self.con.display_store.model.iter_has_child(parent_iter):
-                                logger.debug(f'[{self.con.tree_id}] Will not upsert node {guid}: Parent is not expanded: {parent_guid}')
-                            else:
-                                # May have added a child to formerly childless parent: add loading node
-                                logger.debug(f'[{self.con.tree_id}] Parent ({parent_guid}) is not expanded; adding loading node')
-                                self._append_loading_child(parent_iter)
+                    # Parent present but not expanded. Make sure it has a loading node (which allows child toggle):
+                    if self.con.display_store.model.iter_has_child(parent_iter):
+                        logger.debug(f'[{self.con.tree_id}] Will not upsert node {guid}: Parent is not expanded: {parent_guid}')
                     else:
-                        # Not even parent is displayed. Probably an ancestor isn't expanded. Just skip
-                        assert parent_guid not in self.con.display_store.displayed_guid_dict, \
-                            f'DisplayedRows ({self.con.display_store.displayed_guid_dict}) contains GUID ({parent_guid})!'
-                        logger.debug(f'[{self.con.tree_id}] Will not upsert node: Could not find parent GUID in display tree: {parent_guid}')
-
-                        # sanity check
-                        if guid in self.con.display_store.displayed_guid_dict:
-                            logger.warning(f'[{self.con.tree_id}] Received signal {Signal.NODE_UPSERTED.name} for node {sn.spid} '
-                                           f'but its parent is no longer in the tree; removing node from display store: {guid}')
-                            self.con.display_store.remove_node(guid)
+                        # May have added a child to formerly childless parent: add loading node
+                        logger.debug(f'[{self.con.tree_id}] Parent ({parent_guid}) is not expanded; adding loading node')
+                        self._append_loading_child(parent_iter)
+            else:
+                # Not even parent is displayed. Probably an ancestor isn't expanded. Just skip
+                assert parent_guid not in self.con.display_store.displayed_guid_dict, \
+                    f'DisplayedRows ({self.con.display_store.displayed_guid_dict}) contains GUID ({parent_guid})!'
+                logger.debug(f'[{self.con.tree_id}] Will not upsert node: Could not find parent GUID in display tree: {parent_guid}')
 
-        GLib.idle_add(update_ui)
+                # sanity check
+                if guid in self.con.display_store.displayed_guid_dict:
+                    logger.warning(f'[{self.con.tree_id}] Received upsert for node {sn.spid} '
+                                   f'but its parent is no longer in the tree; removing node from display store: {guid}')
+                    self.con.display_store.remove_node(guid)
 
     def _on_node_removed(self, sender: str, sn: SPIDNodePair):
         if sender != self.con.tree_id:
@@ -540,32 +551,35 @@ class DisplayMutator(HasLifecycle):
                 logger.debug(f'[{self.con.tree_id}] Ignoring signal "{Signal.NODE_REMOVED.name}": node listeners disabled')
             return
 
-        guid = sn.spid.guid
-
         def update_ui():
-            try:
-                with self._lock:
-                    displayed_item = self.con.display_store.displayed_guid_dict.get(guid, None)
+            with self._lock:
+                self._remove_node_from_ui(sn)
 
-                    if displayed_item:
-                        if SUPER_DEBUG_ENABLED:
-                            logger.debug(f'[{self.con.tree_id}] Received signal {Signal.NODE_REMOVED.name} for displayed node {sn.spid}')
+        GLib.idle_add(update_ui)
+
+    def _remove_node_from_ui(self, sn: SPIDNodePair):
+        # Caller must hold self._lock, and be on the UI thread
+        guid = sn.spid.guid
+        try:
+            displayed_item = self.con.display_store.displayed_guid_dict.get(guid, None)
 
-                        logger.debug(f'[{self.con.tree_id}] Removing node from display store: {guid}')
-                        self.con.display_store.remove_node(guid)
-                    elif self.con.get_tree().is_path_in_subtree(sn.spid.get_single_path()):
-                        # not visible, but stats still need refresh
-                        if logger.isEnabledFor(logging.DEBUG):
-                            logger.debug(f'[{self.con.tree_id}] Received signal {Signal.NODE_REMOVED.name} for node {sn.spid}')
+            if displayed_item:
+                if SUPER_DEBUG_ENABLED:
+                    logger.debug(f'[{self.con.tree_id}] Received removal of displayed node {sn.spid}')
 
-                    else:
-                        if logger.isEnabledFor(logging.DEBUG):
-                            logger.debug(f'[{self.con.tree_id}] Ignoring signal {Signal.NODE_REMOVED.name} for node {sn.spid}')
+                logger.debug(f'[{self.con.tree_id}] Removing node from display store: {guid}')
+                self.con.display_store.remove_node(guid)
+            elif self.con.get_tree().is_path_in_subtree(sn.spid.get_single_path()):
+                # not visible, but stats still need refresh
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f'[{self.con.tree_id}] Received removal of node {sn.spid}')
 
-            except RuntimeError:
-                logger.exception(f'While removing node {guid} ("{sn.node.name}") from UI')
+            else:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f'[{self.con.tree_id}] Ignoring removal of node {sn.spid}')
 
-        GLib.idle_add(update_ui)
+        except RuntimeError:
+            logger.exception(f'While removing node {guid} ("{sn.node.name}") from UI')
 
     def _on_subtree_nodes_changed(self, sender: str, subtree_root_spid: NodeIdentifier, upserted_sn_list: List[SPIDNodePair],
                                   removed_sn_list: List[SPIDNodePair]):
@@ -577,60 +591,99 @@ class DisplayMutator(HasLifecycle):
                 logger.debug(f'[{self.con.tree_id}] Ignoring signal "{Signal.SUBTREE_NODES_CHANGED.name}": node listeners disabled')
             return
 
-        raise NotImplementedError  # FIXME
+        def update_ui():
+            # Apply the whole batch in a single pass of the UI thread, sorting the model only once at the end. Each node appears in at most
+            # one of the lists, so removals can safely go first:
+            with self._lock:
+                logger.debug(f'[{self.con.tree_id}] Applying {Signal.SUBTREE_NODES_CHANGED.name} at {subtree_root_spid}: '
+                             f'{len(upserted_sn_list)} upserted, {len(removed_sn_list)} removed')
+                with self.con.display_store.sorting_suspended():
+                    for sn in removed_sn_list:
+                        self._remove_node_from_ui(sn)
+                    for sn in upserted_sn_list:
+                        self._upsert_node_in_ui(sn)
+
+        GLib.idle_add(update_ui)
 
     def _update_stats(self, sender: str, status_msg: str, dir_stats_dict_by_guid: Dict[GUID, DirStats],
                       dir_stats_dict_by_uid: Dict[UID, DirStats]):
-
-        def redraw_displayed_node(tree_iter):
-            if self._is_shutdown:
-                # try to prevent junk errors during shutdown
-                return
-
-            ds = self.con.display_store
-            sn: SPIDNodePair = ds.get_node_data(tree_iter)
-            if not sn:
-                par_iter = ds.model.iter_parent(tree_iter)
-                par_sn: SPIDNodePair = ds.get_node_data(par_iter)
-                logger.error(f'[{self.con.tree_id}] No node for child of {par_sn.spid}')
-                return
-            assert sn, f'For tree_id="{sender} and row={self.con.display_store.model[tree_iter]}'
-            if sn.node.is_ephemereal() or not sn.node.is_dir():
-                return
-
-            if dir_stats_dict_by_guid:
-                dir_stats_for_node = dir_stats_dict_by_guid.get(sn.spid.guid, None)
-            elif dir_stats_dict_by_uid:
-                dir_stats_for_node = dir_stats_dict_by_uid.get(sn.node.uid, None)
-            else:
-                dir_stats_for_node = None
-
-            if dir_stats_for_node:
+        """Schedules a redraw of the stats. Updates which arrive before the redraw happens are coalesced: only the latest one is drawn."""
+        with self._stats_redraw_lock:
+            self._pending_stats_update = (status_msg, dir_stats_dict_by_guid, dir_stats_dict_by_uid)
+            if self._is_stats_redraw_scheduled:
                 if SUPER_DEBUG_ENABLED:
-                    logger.debug(f'[{self.con.tree_id}] Redrawing stats for node: {sn.spid}; tree_path="{ds.model.get_path(tree_iter)}"; '
-                                 f'size={dir_stats_for_node.get_size_bytes()} etc={dir_stats_for_node.get_etc()}')
-                ds.model[tree_iter][self.con.treeview_meta.col_num_size] = _format_size_bytes(dir_stats_for_node)
-                ds.model[tree_iter][self.con.treeview_meta.col_num_etc] = dir_stats_for_node.get_etc()
+                    logger.debug(f'[{self.con.tree_id}] Stats redraw already scheduled: coalescing update')
+                return
+            self._is_stats_redraw_scheduled = True
 
-            redraw_displayed_node.nodes_redrawn += 1
+        if self._stats_redraw_interval_ms > 0:
+            GLib.timeout_add(interval=self._stats_redraw_interval_ms, function=self._redraw_pending_stats)
+        else:
+            GLib.idle_add(self._redraw_pending_stats)
 
-        redraw_displayed_node.nodes_redrawn = 0
+    def _redraw_pending_stats(self):
+        with self._stats_redraw_lock:
+            status_msg, dir_stats_dict_by_guid, dir_stats_dict_by_uid = self._pending_stats_update
+            self._pending_stats_update = None
+            self._is_stats_redraw_scheduled = False
 
-        def do_in_ui():
-            logger.debug(f'[{self.con.tree_id}] Redrawing display tree stats in UI')
-            if status_msg is None:
-                logger.error(f'Status msg is None!')
+        logger.debug(f'[{self.con.tree_id}] Redrawing display tree stats in UI')
+        if status_msg is None:
+            logger.error(f'Status msg is None!')
+        else:
+            self.con.status_bar.set_label(status_msg)
+        with self._lock:
+            if not self._is_shutdown:
+                nodes_redrawn = self._redraw_stats_for_displayed_dirs(dir_stats_dict_by_guid, dir_stats_dict_by_uid)
+                logger.debug(f'[{self.con.tree_id}] Done redrawing stats in UI (for {nodes_redrawn} nodes): '
+                             f'sending signal "{Signal.REFRESH_SUBTREE_STATS_COMPLETELY_DONE.name}"')
+                # currently this is only used for functional tests
+                dispatcher.send(signal=Signal.REFRESH_SUBTREE_STATS_COMPLETELY_DONE, sender=self.con.tree_id)
+
+        # Don't repeat the timer:
+        return False
+
+    def _redraw_stats_for_displayed_dirs(self, dir_stats_dict_by_guid: Dict[GUID, DirStats], dir_stats_dict_by_uid: Dict[UID, DirStats]) -> int:
+        """Updates the size & etc columns of each displayed dir which has stats, looking up each row by GUID rather than visiting every row
+        in the model. Cells whose text is unchanged are not written, so that GTK only redraws the rows which actually changed.
+        Returns the number of rows which were redrawn."""
+        ds = self.con.display_store
+        displayed_guid_dict = ds.displayed_guid_dict
+
+        if dir_stats_dict_by_guid:
+            if len(dir_stats_dict_by_guid) < len(displayed_guid_dict):
+                stats_list = [(guid, dir_stats) for guid, dir_stats in dir_stats_dict_by_guid.items() if guid in displayed_guid_dict]
             else:
-                self.con.status_bar.set_label(status_msg)
-            with self._lock:
-                if not self._is_shutdown:
-                    self.con.display_store.recurse_over_tree(action_func=redraw_displayed_node)
-                    logger.debug(f'[{self.con.tree_id}] Done redrawing stats in UI (for {redraw_displayed_node.nodes_redrawn} nodes): '
-                                 f'sending signal "{Signal.REFRESH_SUBTREE_STATS_COMPLETELY_DONE.name}"')
-                    # currently this is only used for functional tests
-                    dispatcher.send(signal=Signal.REFRESH_SUBTREE_STATS_COMPLETELY_DONE, sender=self.con.tree_id)
+                stats_list = [(guid, dir_stats_dict_by_guid[guid]) for guid in displayed_guid_dict.keys() if guid in dir_stats_dict_by_guid]
+        elif dir_stats_dict_by_uid:
+            stats_list = [(guid, dir_stats_dict_by_uid.get(sn.node.uid, None)) for guid, sn in displayed_guid_dict.items()]
+        else:
+            return 0
+
+        col_num_size = self.con.treeview_meta.col_num_size
+        col_num_etc = self.con.treeview_meta.col_num_etc
+        nodes_redrawn = 0
+        for guid, dir_stats_for_node in stats_list:
+            if not dir_stats_for_node or not displayed_guid_dict[guid].node.is_dir():
+                continue
+            tree_iter = ds.find_guid_in_tree(guid)
+            if not tree_iter:
+                continue
+
+            row = ds.model[tree_iter]
+            size_str = _format_size_bytes(dir_stats_for_node)
+            etc = dir_stats_for_node.get_etc()
+            if row[col_num_size] == size_str and row[col_num_etc] == etc:
+                continue
 
-        GLib.idle_add(do_in_ui)
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'[{self.con.tree_id}] Redrawing stats for node: {guid}; tree_path="{ds.model.get_path(tree_iter)}"; '
+                             f'size={dir_stats_for_node.get_size_bytes()} etc={etc}')
+            row[col_num_size] = size_str
+            row[col_num_etc] = etc
+            nodes_redrawn += 1
+
+        return nodes_redrawn
 
     # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
     # LISTENERS end
@@ -1,5 +1,5 @@
+import contextlib
 import logging
-from functools import partial
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 from constants import TreeID
@@ -49,6 +49,9 @@ class DisplayStore:
         self.inconsistent_guid_set: Set[GUID] = set()
         self.displayed_guid_dict: Dict[GUID, SPIDNodePair] = {}
         """Need to track these so that we can remove a node if its src node was removed"""
+        self._iter_by_guid: Dict[GUID, Gtk.TreeIter] = {}
+        """Row of each displayed (non-ephemereal) node, so that it can be found without scanning the model. TreeStore iters stay valid
+        (even across sorting) for as long as their row exists, so each entry must be dropped together with its row: see _forget_subtree()"""
 
     def get_node_data(self, tree_path: Union[TreeIter, TreePath]) -> SPIDNodePair:
         """
@@ -86,6 +89,7 @@ class DisplayStore:
         self.checked_guid_set.clear()
         self.inconsistent_guid_set.clear()
         self.displayed_guid_dict.clear()
+        self._iter_by_guid.clear()
         return self.model.get_iter_first()
 
     def _set_checked_state(self, tree_iter, is_checked, is_inconsistent):
@@ -208,9 +212,9 @@ class DisplayStore:
         return None
 
     def find_guid_in_tree(self, target_guid: GUID, tree_iter: Optional[Gtk.TreeIter] = None) -> Optional[Gtk.TreeIter]:
-        """Recurses over entire tree and visits every node until _uid_equals_func() returns True, then returns iter data at that node"""
-        bound_func: Callable = partial(self._guid_equals_func, target_guid)
-        return self.find_in_tree(bound_func, tree_iter)
+        """Returns the iter of the displayed row with the given GUID, or None if it is not displayed. This is a dict lookup: GUIDs are unique
+        within the tree, so tree_iter (where a scan would have started) does not need to be consulted."""
+        return self._iter_by_guid.get(target_guid, None)
 
     def find_in_children(self, parent_iter, equals_func: Callable[[SPIDNodePair], bool]) -> Optional[Gtk.TreeIter]:
         """Generic version:
@@ -232,9 +236,19 @@ class DisplayStore:
         return None
 
     def find_guid_in_children(self, target_guid: GUID, parent_iter) -> Optional[Gtk.TreeIter]:
-        """Searches the children of the given parent_iter for the given UID, then returns the iter at that node"""
-        bound_func: Callable = partial(self._guid_equals_func, target_guid)
-        return self.find_in_children(parent_iter, bound_func)
+        """Returns the iter of the row with the given GUID if it is displayed as a child of parent_iter (or at the top level, if parent_iter
+        is None); otherwise None"""
+        child_iter = self._iter_by_guid.get(target_guid, None)
+        if not child_iter:
+            return None
+
+        actual_parent_iter = self.model.iter_parent(child_iter)
+        if not parent_iter or not actual_parent_iter:
+            return child_iter if parent_iter == actual_parent_iter else None
+
+        if self.model.get_path(actual_parent_iter) == self.model.get_path(parent_iter):
+            return child_iter
+        return None
 
     def get_displayed_children_of(self, parent_guid: GUID) -> List[SPIDNodePair]:
         if not parent_guid:
@@ -303,33 +317,55 @@ class DisplayStore:
     def append_node(self, parent_node_iter, row_values: list):
         sn: SPIDNodePair = row_values[self.treeview_meta.col_num_data]
 
+        tree_iter = self.model.append(parent_node_iter, row_values)
+
         if not sn.node.is_ephemereal():
             self.displayed_guid_dict[sn.spid.guid] = sn
+            self._iter_by_guid[sn.spid.guid] = tree_iter
 
-        return self.model.append(parent_node_iter, row_values)
-
-    def remove_node(self, node_guid: GUID):
-        """Also removes itself and any descendents from the lists"""
-
-        # TODO: this can be optimized to search only the paths of the ancestors
-        initial_tree_iter = self.find_guid_in_tree(target_guid=node_guid)
-        if not initial_tree_iter:
-            raise RuntimeError(f'Could not find node in display tree with GUID: {node_guid}')
+        return tree_iter
 
-        def remove_node_from_lists(tree_iter):
+    def _forget_subtree(self, subtree_root_iter: Gtk.TreeIter, forget_checked_state: bool):
+        """Must be called for each row which is about to be removed from the model: drops the row & its descendants from displayed_guid_dict
+        & the row index (and optionally their checkbox state)"""
+        def forget_row(tree_iter):
             sn = self.get_node_data(tree_iter)
             if sn.node.is_ephemereal():
                 return
 
             guid = sn.spid.guid
 
-            self.checked_guid_set.discard(guid)
-            self.inconsistent_guid_set.discard(guid)
+            if forget_checked_state:
+                self.checked_guid_set.discard(guid)
+                self.inconsistent_guid_set.discard(guid)
 
-            if guid in self.displayed_guid_dict:
-                del self.displayed_guid_dict[guid]
+            self.displayed_guid_dict.pop(guid, None)
+            self._iter_by_guid.pop(guid, None)
 
-        self.do_for_self_and_descendants(initial_tree_iter, remove_node_from_lists)
+        self.do_for_self_and_descendants(subtree_root_iter, forget_row)
+
+    @contextlib.contextmanager
+    def sorting_suspended(self):
+        """Context manager for making many changes to the model at once: rows added or changed inside it are left where they are, and
+        the model is sorted once on exit, instead of once per row."""
+        sort_column_id, sort_order = self.model.get_sort_column_id()
+        if sort_column_id is None or sort_column_id == Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID:
+            yield
+            return
+
+        self.model.set_sort_column_id(Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, sort_order)
+        try:
+            yield
+        finally:
+            self.model.set_sort_column_id(sort_column_id, sort_order)
+
+    def remove_node(self, node_guid: GUID):
+        """Also removes itself and any descendents from the lists"""
+        initial_tree_iter = self.find_guid_in_tree(target_guid=node_guid)
+        if not initial_tree_iter:
+            raise RuntimeError(f'Could not find node in display tree with GUID: {node_guid}')
+
+        self._forget_subtree(initial_tree_iter, forget_checked_state=True)
 
         self.model.remove(initial_tree_iter)
 
@@ -360,8 +396,8 @@ class DisplayStore:
         if SUPER_DEBUG_ENABLED:
             logger.debug(f'[{self.tree_id}] Removing 1st child: {child_sn.spid}')
 
-        if not child_sn.node.is_ephemereal():
-            self.displayed_guid_dict.pop(child_sn.spid.guid)
+        # Checkbox state of the removed rows is kept, since it may not be implied by the state of the parent (see checked_guid_set)
+        self._forget_subtree(first_child_iter, forget_checked_state=False)
 
         # remove the first child
         self.model.remove(first_child_iter)
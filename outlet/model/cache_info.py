@@ -1,4 +1,5 @@
 import pathlib
+from typing import Optional
 
 from logging_constants import SUPER_DEBUG_ENABLED
 from model.node_identifier import SinglePathNodeIdentifier
@@ -13,17 +14,20 @@ class CacheInfoEntry:
     CLASS CacheInfoEntry
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
-    def __init__(self, cache_location, subtree_root: SinglePathNodeIdentifier, sync_ts, is_complete):
+    def __init__(self, cache_location, subtree_root: SinglePathNodeIdentifier, sync_ts, is_complete, file_count: Optional[int] = None):
         self.cache_location: str = cache_location
         self.subtree_root: SinglePathNodeIdentifier = subtree_root
         self.sync_ts = ensure_int(sync_ts)
         self.is_complete = is_complete
+        self.file_count: Optional[int] = file_count
+        """Number of files found by the most recent completed scan of the whole subtree, if any. Used only for estimating progress of
+        the next scan"""
 
     def to_tuple(self, cache_path_prefix: str):
         cache_location = self.convert_abs_path_to_relative(self.cache_location, cache_path_prefix)
 
         return cache_location, self.subtree_root.device_uid, self.subtree_root.get_single_path(), self.subtree_root.node_uid, \
-            self.sync_ts, self.is_complete
+            self.sync_ts, self.is_complete, self.file_count
 
     def __repr__(self):
         return f'CacheInfoEntry(location="{self.cache_location}" subtree_root={self.subtree_root} is_complete={self.is_complete})'
@@ -53,7 +57,7 @@ class PersistedCacheInfo(CacheInfoEntry):
     """
     def __init__(self, base: CacheInfoEntry):
         super().__init__(cache_location=base.cache_location, subtree_root=base.subtree_root,
-                         sync_ts=base.sync_ts, is_complete=base.is_complete)
+                         sync_ts=base.sync_ts, is_complete=base.is_complete, file_count=base.file_count)
         self.is_loaded = False
         """Indicates the data needs to be loaded from disk cache into memory cache"""
 
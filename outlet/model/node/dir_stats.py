@@ -50,6 +50,16 @@ class DirStats:
         self.trashed_file_count += child_dir_stats.trashed_file_count
         self.trashed_bytes += child_dir_stats.trashed_bytes
 
+    def subtract_dir_stats(self, other_dir_stats):
+        assert isinstance(other_dir_stats, DirStats)
+        self._size_bytes -= other_dir_stats._size_bytes
+        self.dir_count -= other_dir_stats.dir_count
+        self.file_count -= other_dir_stats.file_count
+
+        self.trashed_dir_count -= other_dir_stats.trashed_dir_count
+        self.trashed_file_count -= other_dir_stats.trashed_file_count
+        self.trashed_bytes -= other_dir_stats.trashed_bytes
+
     def add_file_node(self, child_node):
         if child_node.get_trashed_status() == TrashStatus.NOT_TRASHED:
             self.file_count += 1
@@ -20,6 +20,8 @@ class GDriveNode(TNode, ABC):
         CLASS GDriveNode
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('_trashed', 'goog_id', '_name', '_create_ts', '_modify_ts', 'owner_uid', 'drive_id', '_is_shared', 'shared_by_user_uid',
+                 '_sync_ts')
     # ▲▲ Remember, Method Resolution Order places greatest priority to the first in the list, then goes down ▲▲
     def __init__(self, node_identifier: GDriveIdentifier, goog_id: Optional[str], node_name: str, trashed: TrashStatus,
                  create_ts: Optional[int], modify_ts: Optional[int],
@@ -146,6 +148,7 @@ class GDriveFolder(GDriveNode):
         CLASS GDriveFolder
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('dir_stats', 'all_children_fetched')
     def __init__(self, node_identifier: GDriveIdentifier, goog_id, node_name, trashed, create_ts, modify_ts, owner_uid, drive_id,
                  is_shared, shared_by_user_uid, sync_ts, all_children_fetched):
         GDriveNode.__init__(self, node_identifier, goog_id, node_name, trashed, create_ts, modify_ts, owner_uid, drive_id, is_shared,
@@ -243,6 +246,7 @@ class GDriveFile(GDriveNode):
         CLASS GDriveFile
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('_mime_type_uid', 'version', 'content_meta', '_size_bytes')
     # TODO: handling of shortcuts... does a shortcut have an ID?
     # TODO: handling of special chars in file systems
 
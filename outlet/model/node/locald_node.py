@@ -21,6 +21,7 @@ class LocalNode(TNode, ABC):
     CLASS LocalNode
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
+    __slots__ = ('_trashed', '_is_live', '_sync_ts', '_create_ts', '_modify_ts', '_change_ts')
 
     def __init__(self, node_identifier: LocalNodeIdentifier, parent_uid: UID, trashed: TrashStatus, is_live: bool, sync_ts: int,
                  create_ts: int, modify_ts: int, change_ts: int):
@@ -100,6 +101,7 @@ class LocalDirNode(LocalNode):
     Represents a generic local directory.
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
+    __slots__ = ('dir_stats', 'all_children_fetched')
 
     def __init__(self, node_identifier: LocalNodeIdentifier, parent_uid, trashed: TrashStatus, is_live: bool, sync_ts: Optional[int],
                  create_ts: Optional[int], modify_ts: Optional[int], change_ts: Optional[int], all_children_fetched: bool):
@@ -187,6 +189,7 @@ class LocalFileNode(LocalNode):
     CLASS LocalFileNode
     ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
     """
+    __slots__ = ('content_meta', '_size_bytes')
 
     def __init__(self, node_identifier: LocalNodeIdentifier, parent_uid: UID, content_meta: ContentMeta, size_bytes: int, sync_ts: Optional[int],
                  create_ts: Optional[int], modify_ts: Optional[int], change_ts: Optional[int], trashed, is_live: bool):
@@ -26,6 +26,7 @@ class NodeIdentifier(ABC):
     Still a work in progress and may change greatly.
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('node_uid', 'device_uid', '_path_list')
     def __init__(self, node_uid: UID, device_uid: UID, path_list: Optional[Union[str, List[str]]]):
         assert node_uid is not None, 'NodeIdentifier(): node_uid is empty!'
         assert device_uid is not None, 'NodeIdentifier(): device_uid is empty!'
@@ -139,6 +140,7 @@ class SinglePathNodeIdentifier(NodeIdentifier, ABC):
     AKA "SPID"
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('parent_guid',)
     def __init__(self, node_uid: UID, device_uid: UID, full_path: str, parent_guid: Optional[GUID] = None):
         """Has only one path. We still name the variable 'path_list' for consistency with the class hierarchy."""
         super().__init__(node_uid, device_uid, full_path)
@@ -197,6 +199,7 @@ class GDriveIdentifier(NodeIdentifier):
         CLASS GDriveIdentifier
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ()
     def __init__(self, uid: UID, device_uid: UID, path_list: Optional[Union[str, List[str]]]):
         super().__init__(uid, device_uid, path_list)
 
@@ -225,6 +228,7 @@ class EphemeralNodeIdentifier(SinglePathNodeIdentifier):
     Used for EphemeralNodes.
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ()
     def __init__(self):
         # Note: GTK3 doesn't care about GUIDs, so we can just enter junk data here (unlike Mac version)
         super().__init__(NULL_UID, NULL_UID, ".")  # note: need to make this a non-None value
@@ -240,6 +244,7 @@ class GDriveSPID(SinglePathNodeIdentifier):
         CLASS GDriveSPID
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('_path_uid',)
     def __init__(self, node_uid: UID, device_uid: UID, path_uid: UID, full_path: str, parent_guid: Optional[GUID] = None):
         assert node_uid != path_uid, f'Invalid: node_uid ({node_uid}) cannot be the same as path_uid ({path_uid}) for GDriveSPID! ' \
                                      f'(full_path={full_path})'
@@ -276,6 +281,7 @@ class MixedTreeSPID(SinglePathNodeIdentifier):
         Currently only used for the super-root node in a ChangeTree.
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ('_path_uid',)
     def __init__(self, node_uid: UID, device_uid: UID, path_uid: UID, full_path: str, parent_guid: Optional[GUID] = None):
         super().__init__(node_uid, device_uid, full_path, parent_guid)
         self._path_uid: UID = path_uid
@@ -309,6 +315,7 @@ class LocalNodeIdentifier(SinglePathNodeIdentifier):
         TODO: change name to LocalDiskSPID
     ◣━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━◢
     """
+    __slots__ = ()
     def __init__(self, uid: UID, device_uid: UID, full_path: str, parent_guid: Optional[GUID] = None):
         super().__init__(uid, device_uid, full_path, parent_guid)
 
@@ -327,6 +334,7 @@ class ChangeTreeSPID(SinglePathNodeIdentifier):
     the underlying TNode. ChangeTreeSPIDs do not correspond to actual node_uids because their nodes are usually not live
     TODO: consider including tree_id in here so that global lookup is possible
     """
+    __slots__ = ('category',)
     def __init__(self, path_uid: UID, device_uid: UID, full_path: str, category: ChangeTreeCategory, parent_guid: Optional[GUID] = None):
         super().__init__(path_uid, device_uid, full_path, parent_guid)
         self.category: ChangeTreeCategory = category
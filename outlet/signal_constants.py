@@ -95,6 +95,8 @@ class Signal(IntEnum):
     SET_PROGRESS_TEXT = 102
     PROGRESS_MADE = 103
     STOP_PROGRESS = 104
+    PROGRESS_TOTAL_INCREASED = 105
+    """For tasks whose total is an estimate which is refined as they run. Param "amount" is added to the total sent with START_PROGRESS"""
 
     # gRPC, sent from server to client
     WELCOME = 200
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 import logging
 from collections import deque
-from typing import Callable, Deque, Dict, Generic, List, Optional, TypeVar
+from typing import Callable, Deque, Dict, Generic, Iterable, List, Optional, Set, TypeVar
 
 from util.stopwatch_sec import Stopwatch
 from model.node.dir_stats import DirStats
@@ -47,6 +47,11 @@ class BaseTree(Generic[IdentifierT, NodeT], ABC):
     def get_node_for_identifier(self, identifier: IdentifierT) -> Optional[NodeT]:
         pass
 
+    @abstractmethod
+    def get_parent_list_for_dir_stats(self, node: NodeT) -> List[NodeT]:
+        """Returns the parents whose DirStats include the given node. Used by update_dir_stats()"""
+        pass
+
     def get_child_list_for_root(self) -> List[NodeT]:
         return self.get_child_list_for_node(self.get_root_node())
 
@@ -80,24 +85,7 @@ class BaseTree(Generic[IdentifierT, NodeT], ABC):
             node = second_pass_stack.pop()
             assert self.extract_node_func(node).is_dir()
 
-            dir_stats = DirStats()
-
-            child_list = self.get_child_list_for_node(node)
-            if child_list:
-                for child in child_list:
-                    child_node = self.extract_node_func(child)
-                    if child_node.is_dir():
-                        child_stats = dir_stats_dict[self.extract_id(child)]
-                        dir_stats.add_dir_stats(child_stats)
-
-                        # Do not count container nodes in dir count
-                        if not child_node.is_container_node():
-                            if child_node.get_trashed_status() != TrashStatus.NOT_TRASHED:
-                                dir_stats.trashed_dir_count += 1
-                            else:
-                                dir_stats.dir_count += 1
-                    else:
-                        dir_stats.add_file_node(child_node)
+            dir_stats = self._build_dir_stats_from_children(node, dir_stats_dict.__getitem__)
 
             # remember, identifier type is dependent on tree type
             identifier = self.extract_id(node)
@@ -109,6 +97,113 @@ class BaseTree(Generic[IdentifierT, NodeT], ABC):
         logger.debug(f'[{tree_id}] {stats_sw} Generated stats for tree ("{subtree_root_node}") with {len(dir_stats_dict)} entries')
         return dir_stats_dict
 
+    def _build_dir_stats_from_children(self, node: NodeT, get_child_dir_stats_func: Callable[[IdentifierT], DirStats]) -> DirStats:
+        """Sums the stats of the direct children of the given dir node. Stats for child dirs are obtained from get_child_dir_stats_func"""
+        dir_stats = DirStats()
+
+        child_list = self.get_child_list_for_node(node)
+        if child_list:
+            for child in child_list:
+                child_node = self.extract_node_func(child)
+                if child_node.is_dir():
+                    child_stats = get_child_dir_stats_func(self.extract_id(child))
+                    dir_stats.add_dir_stats(child_stats)
+
+                    # Do not count container nodes in dir count
+                    if not child_node.is_container_node():
+                        if child_node.get_trashed_status() != TrashStatus.NOT_TRASHED:
+                            dir_stats.trashed_dir_count += 1
+                        else:
+                            dir_stats.dir_count += 1
+                else:
+                    dir_stats.add_file_node(child_node)
+
+        return dir_stats
+
+    def update_dir_stats(self, tree_id: TreeID, dir_stats_dict: Dict[IdentifierT, DirStats], changed_dir_identifier_list: Iterable[IdentifierT],
+                         subtree_root_identifier: IdentifierT):
+        """Incremental alternative to generate_dir_stats(). Updates dir_stats_dict (which must have previously been populated by
+        generate_dir_stats() for the subtree at subtree_root_identifier) in place, given a list of dirs whose direct children have been
+        upserted or removed since.
+
+        Each changed dir's stats are rebuilt from its direct children, and the difference from its old stats is then added to each of
+        its ancestors (up to the subtree root), so the cost is proportional to (children + depth) per changed dir rather than to the size of
+        the whole subtree. Dirs which are new to the subtree get their stats generated from scratch.
+
+        The DirStats objects already in dir_stats_dict are never modified: each one which needs to change is replaced with a new object.
+        This is because they may have already been handed out (e.g. attached to nodes, or sent to clients) and be read by other threads."""
+        stats_sw = Stopwatch()
+        updated_count = 0
+        replaced_identifier_set: Set[IdentifierT] = set()
+        """Dirs whose DirStats were created by this call, and so can be modified"""
+        may_have_stale_stats = False
+
+        def _get_child_dir_stats(child_identifier: IdentifierT) -> DirStats:
+            nonlocal may_have_stale_stats
+            child_stats = dir_stats_dict.get(child_identifier)
+            if child_stats is None:
+                # New dir, possibly with children of its own. It may have replaced a removed dir with the same dir count (e.g. a renamed dir),
+                # so its parent's dir count will not show that a dir was removed
+                may_have_stale_stats = True
+                child_node = self.get_node_for_identifier(child_identifier)
+                dir_stats_dict.update(self.generate_dir_stats(tree_id, child_node))
+                child_stats = dir_stats_dict[child_identifier]
+            return child_stats
+
+        for identifier in changed_dir_identifier_list:
+            node = self.get_node_for_identifier(identifier)
+            if not node or not self.extract_node_func(node).is_dir():
+                # Dir was removed (or replaced). Its parent will also have been changed, and will stop counting it
+                dir_stats_dict.pop(identifier, None)
+                continue
+
+            parent_list = [] if identifier == subtree_root_identifier else self.get_parent_list_for_dir_stats(node)
+            old_stats = dir_stats_dict.get(identifier)
+            if old_stats is None and not any(self.extract_id(parent) in dir_stats_dict for parent in parent_list):
+                if TRACE_ENABLED:
+                    logger.debug(f'[{tree_id}] Skipping stats update for dir {identifier}: it is not in subtree {subtree_root_identifier}')
+                continue
+
+            new_stats = self._build_dir_stats_from_children(node, _get_child_dir_stats)
+            dir_stats_dict[identifier] = new_stats
+            replaced_identifier_set.add(identifier)
+            updated_count += 1
+
+            delta = DirStats()
+            delta.add_dir_stats(new_stats)
+            if old_stats is not None:
+                delta.subtract_dir_stats(old_stats)
+                if delta.dir_count + delta.trashed_dir_count < 0:
+                    may_have_stale_stats = True
+
+            # Propagate the difference up through each chain of ancestors within the subtree:
+            ancestor_queue: Deque[NodeT] = deque(parent_list)
+            while len(ancestor_queue) > 0:
+                ancestor = ancestor_queue.popleft()
+                ancestor_identifier = self.extract_id(ancestor)
+                ancestor_stats = dir_stats_dict.get(ancestor_identifier)
+                if ancestor_stats is None:
+                    # outside the subtree
+                    continue
+                if ancestor_identifier not in replaced_identifier_set:
+                    old_ancestor_stats = ancestor_stats
+                    ancestor_stats = DirStats()
+                    ancestor_stats.add_dir_stats(old_ancestor_stats)
+                    dir_stats_dict[ancestor_identifier] = ancestor_stats
+                    replaced_identifier_set.add(ancestor_identifier)
+                ancestor_stats.add_dir_stats(delta)
+                if ancestor_identifier != subtree_root_identifier:
+                    ancestor_queue.extend(self.get_parent_list_for_dir_stats(ancestor))
+
+        if may_have_stale_stats:
+            # Dirs may have been removed along with their descendants, which are not reported as changed. Drop the stats of any dir which is
+            # no longer in the tree, so that they are not mistaken for the stats of a new dir with the same identifier later on
+            missing_identifier_list = [identifier for identifier in dir_stats_dict if not self.get_node_for_identifier(identifier)]
+            for identifier in missing_identifier_list:
+                del dir_stats_dict[identifier]
+
+        logger.debug(f'[{tree_id}] {stats_sw} Updated stats for {updated_count} changed dirs (total entries: {len(dir_stats_dict)})')
+
     def for_each_node_breadth_first(self, action_func: Callable[[NodeT], None], subtree_root_identifier: Optional[IdentifierT] = None):
         dir_queue: Deque = deque()
         if subtree_root_identifier:
@@ -45,6 +45,13 @@ def is_normalized(path: str):
     return path == ROOT_PATH or not path.endswith('/')
 
 
+def is_in_subtree(full_path: str, subtree_root_path: str) -> bool:
+    """Equivalent to PurePosixPath(full_path).is_relative_to(subtree_root_path) for normalized paths, but much cheaper"""
+    if subtree_root_path == ROOT_PATH:
+        return full_path.startswith(ROOT_PATH)
+    return full_path == subtree_root_path or full_path.startswith(subtree_root_path + '/')
+
+
 def get_resource_path(rel_path: str, resolve_symlinks=False) -> str:
     """Returns the absolute path from the given relative path (relative to the project dir)"""
 
@@ -39,7 +39,7 @@ class HoldOffTimer:
                 self._finished = threading.Event()
                 global counter
                 counter = counter + 1
-                self._thread = threading.Thread(target=self._run, name=f'HoldOffTimer-{counter}', args=self.args, kwargs=self.kwargs, daemon=True)
+                self._thread = threading.Thread(target=self._run, name=f'HoldOffTimer-{counter}', args=(self._finished,), daemon=True)
                 logger.debug(f'Starting new timer "{self._thread.name}" for {self._initial_delay_sec}s...')
                 self._thread.start()
             elif TRACE_ENABLED:
@@ -51,23 +51,28 @@ class HoldOffTimer:
         logger.debug(f'Cancelling timer')
         self._finished.set()
 
-    def _run(self):
+    def _run(self, finished: threading.Event):
+        """Waits on the Event of its own run, so that once cancelled it exits at once, and cannot touch a timer started after it"""
+        thread_name = threading.current_thread().name
         while True:
             with self._lock:
                 # Disallow delay less than zero:
                 additional_delay = max(self._sleep_util_time_sec - float(time.time()), 0)
 
             if additional_delay:
-                logger.debug(f'{self._thread.name} sleeping for {"{0:.3f}".format(additional_delay)}s...')
-                self._finished.wait(additional_delay)
+                logger.debug(f'{thread_name} sleeping for {"{0:.3f}".format(additional_delay)}s...')
+                if finished.wait(additional_delay):
+                    # Cancelled
+                    break
             else:
                 break
 
         with self._lock:
-            if not self._finished.is_set():
-                logger.debug(f'{self._thread.name} Executing timer task: {self.function.__name__}')
+            if not finished.is_set():
+                logger.debug(f'{thread_name} Executing timer task: {self.function.__name__}')
                 self.function(*self.args, **self.kwargs)
 
-            logger.debug(f'{self._thread.name} finished')
-            self._finished.set()
-            self._thread = None
+            logger.debug(f'{thread_name} finished')
+            finished.set()
+            if self._thread is threading.current_thread():
+                self._thread = None
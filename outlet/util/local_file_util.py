@@ -8,6 +8,7 @@ import subprocess
 from datetime import datetime
 from typing import List, Optional
 
+from be.sqlite.content_meta_db import ContentMeta
 from constants import ENABLE_MACOS_FINDER_JUNK_FILE_WORKAROUND, IS_MACOS, IS_WINDOWS, MAC_FINDER_JUNK_FILE_NAME, MACOS_SETFILE_DATETIME_FMT
 from error import IdenticalFileExistsError
 from logging_constants import SUPER_DEBUG_ENABLED, TRACE_ENABLED
@@ -32,13 +33,22 @@ class LocalFileUtil:
 
         return node_with_signatures
 
-    def ensure_up_to_date(self, node: LocalFileNode) -> LocalFileNode:
-        """Returns either a LocalFileNode with a signature, or raises an error."""
+    def ensure_up_to_date(self, node: LocalFileNode, require_signature: bool = True) -> LocalFileNode:
+        """Returns either a LocalFileNode with a signature, or raises an error.
+        If require_signature is false and the node does not have a signature yet, just returns a freshly built node without one (for callers
+        which are about to read the whole file anyway and can calculate it then)."""
         if TRACE_ENABLED:
-            logger.debug(f'ensure_up_to_date() called for {node}')
+            logger.debug(f'ensure_up_to_date() called for {node} (require_signature={require_signature})')
 
         # First, make sure node has a signature:
         if not node.has_signature():
+            if not require_signature:
+                fresh_node: LocalFileNode = self.cacheman.build_local_file_node(full_path=node.get_single_path(), must_scan_signature=False,
+                                                                                is_live=True)
+                if not fresh_node:
+                    raise RuntimeError(f'File missing: {node.get_single_path()}')
+                return fresh_node
+
             # This can happen if the node was just added but lazy sig scan hasn't gotten to it yet. Just compute it ourselves here
             return self.try_calculating_signature(node)
         assert node.has_signature()
@@ -65,16 +75,20 @@ class LocalFileUtil:
             # TODO: maybe allow this?
             raise RuntimeError(f'File meta has unexpectedly changed: {node.node_identifier}; expected: {node}, found: {node_with_signatures}')
 
-    def copy_file_new(self, src_node: LocalFileNode, dst_node: LocalFileNode, staging_path: str, verify: bool, copy_meta_also: bool):
+    def copy_file_new(self, src_node: LocalFileNode, dst_node: LocalFileNode, staging_path: str, verify: bool, copy_meta_also: bool) \
+            -> LocalFileNode:
         """Copies the src (src_path) to the destination path (dst_path), by first doing the copy to an
         intermediary location (staging_path) and then moving it to the destination once its signature
         has been verified.
 
-        Raises an error if a file is already present at the destination."""
+        Raises an error if a file is already present at the destination.
+        Returns src_node, with its signature filled in if it did not have one (see copy_to_staging())."""
         assert not dst_node.is_live(), f'Should not be live: {dst_node}'
         dst_path = dst_node.get_single_path()
         # dst node actually exists? (this implies our cached copy is not accurate):
         if os.path.exists(dst_path):
+            if not src_node.has_signature():
+                src_node = self.try_calculating_signature(src_node)
             existing_dst_node = self.try_calculating_signature(dst_node)
             if existing_dst_node and existing_dst_node.is_signature_equal(src_node):
                 msg = f'File with identical content already exists at dst: {dst_path}'
@@ -94,22 +108,28 @@ class LocalFileUtil:
                 logger.debug(f'Throwing FileExistsError: {msg}')
                 raise FileExistsError(msg)
 
-        self.copy_to_staging(src_node, staging_path, verify)
+        src_node = self.copy_to_staging(src_node, staging_path, verify)
 
         file_util.move_to_dst(staging_path, dst_path, replace=False)
 
         if copy_meta_also:
             self.copy_meta(src_node, dst_path)
 
+        return src_node
+
     def copy_file_update(self, src_node: LocalFileNode, dst_node: LocalFileNode, staging_path: str,
-                         verify: bool, update_meta_also: bool):
+                         verify: bool, update_meta_also: bool) -> LocalFileNode:
         """Copies the src (src_path) to the destination path (dst_path) via a staging dir, but first
-        verifying that a file already exists there and it has the expected MD5; failing otherwise"""
+        verifying that a file already exists there and it has the expected MD5; failing otherwise.
+        Returns src_node, with its signature filled in if it did not have one."""
     
         dst_path = dst_node.get_single_path()
         if not os.path.exists(dst_path):
             raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), dst_path)
 
+        if not src_node.has_signature():
+            # Need this now in order to compare with dst
+            src_node = self.try_calculating_signature(src_node)
         dst_node = self.try_calculating_signature(dst_node)
         if not dst_node:
             raise RuntimeError(f'Failed to calculate signature for: {dst_path}')
@@ -129,14 +149,19 @@ class LocalFileUtil:
             logger.debug(f'Throwing FileExistsError: {msg}')
             raise FileExistsError(msg)
 
-        self.copy_to_staging(src_node, staging_path, verify)
+        src_node = self.copy_to_staging(src_node, staging_path, verify)
     
         file_util.move_to_dst(staging_path, dst_path, replace=True)
     
         if update_meta_also:
             self.copy_meta(src_node, dst_path)
 
-    def copy_to_staging(self, src_node: LocalFileNode, staging_path, verify: bool):
+        return src_node
+
+    def copy_to_staging(self, src_node: LocalFileNode, staging_path, verify: bool) -> LocalFileNode:
+        """Copies the file for src_node to staging_path. If verify==true, or if src_node does not yet have a signature, the file content is
+        hashed while it is being copied and (if src_node has a signature) checked against it, so that neither file needs to be read a second
+        time. Returns src_node, or a copy of it with the calculated signature if it did not have one."""
         # (Staging) make parent directories if not exist
         staging_parent, staging_file = os.path.split(staging_path)
         try:
@@ -146,19 +171,50 @@ class LocalFileUtil:
             raise
     
         src_path: str = src_node.get_single_path()
+        must_hash = verify or not src_node.has_signature()
+        if os.path.islink(src_path) or not must_hash:
+            # Either we want to copy the link itself, or there is nothing to hash: let shutil use the fastest copy the OS offers
+            try:
+                shutil.copyfile(src_path, dst=staging_path, follow_symlinks=False)
+            except Exception as err:
+                logger.error(f'Exception while copying file to staging: {src_path}: {repr(err)}')
+                raise
+
+            if verify:
+                staging_node: LocalFileNode = self.cacheman.build_local_file_node(full_path=staging_path, must_scan_signature=True, is_live=True)
+                if not staging_node:
+                    raise RuntimeError(f'Failed to calculate signature for staging file: "{staging_path}"')
+                if not staging_node.is_signature_equal(src_node):
+                    raise RuntimeError(f'Signature of copied file does not match: src_path="{src_path}", '
+                                       f'src_md5={src_node.md5}, staging_file="{staging_path}", staging_md5={staging_node.md5}')
+            return src_node
+
         try:
-            shutil.copyfile(src_path, dst=staging_path, follow_symlinks=False)
+            content_meta: ContentMeta = self.cacheman.copy_local_file_and_calculate_signature(src_node.device_uid, src_path, staging_path)
         except Exception as err:
             logger.error(f'Exception while copying file to staging: {src_path}: {repr(err)}')
             raise
-    
-        if verify:
-            staging_node: LocalFileNode = self.cacheman.build_local_file_node(full_path=staging_path, must_scan_signature=True, is_live=True)
-            if not staging_node:
-                raise RuntimeError(f'Failed to calculate signature for staging file: "{staging_path}"')
-            if not staging_node.is_signature_equal(src_node):
-                raise RuntimeError(f'Signature of copied file does not match: src_path="{src_path}", '
-                                   f'src_md5={src_node.md5}, staging_file="{staging_path}", staging_md5={staging_node.md5}')
+
+        if not src_node.has_signature():
+            # By-product of the copy: src now has a signature
+            if SUPER_DEBUG_ENABLED:
+                logger.debug(f'Calculated signature for src while copying: {src_path} (MD5={content_meta.md5})')
+            src_node_with_signature: LocalFileNode = copy.deepcopy(src_node)
+            src_node_with_signature.content_meta = content_meta
+            return src_node_with_signature
+
+        if not self._is_signature_equal(src_node, content_meta):
+            raise RuntimeError(f'Signature of copied file does not match: src_path="{src_path}", '
+                               f'src_md5={src_node.md5}, staging_file="{staging_path}", staging_md5={content_meta.md5}')
+        return src_node
+
+    @staticmethod
+    def _is_signature_equal(node: LocalFileNode, content_meta: ContentMeta) -> bool:
+        if node.md5 and content_meta.md5:
+            return node.md5 == content_meta.md5
+        if node.sha256 and content_meta.sha256:
+            return node.sha256 == content_meta.sha256
+        raise RuntimeError(f'Cannot not compare signatures: need either MD5 or SHA256 from both node ({node}) and content ({content_meta})')
     
     def copy_meta(self, src_node: TNode, dst_path: str) -> LocalNode:
         """Sets create_ts, modify_ts (and access_ts) for dst_path, using the values found in src_node.
@@ -20,7 +20,9 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
     def __init__(self, extract_identifier_func: Callable[[NodeT], IdentifierT] = None, extract_node_func: Callable = None):
         BaseTree.__init__(self, extract_identifier_func, extract_node_func)
         self._node_dict: Dict[IdentifierT, NodeT] = {}
-        self._parent_child_list_dict: Dict[IdentifierT, List[NodeT]] = {}
+        self._parent_child_dict: Dict[IdentifierT, Dict[IdentifierT, NodeT]] = {}
+        """Parent identifier -> {child identifier -> child}. Dicts preserve insertion order, so child lists come out in the order the children
+        were added, while lookup, replacement and removal of a single child are O(1) even in very wide dirs"""
         self._child_parent_dict: Dict[IdentifierT, NodeT] = {}
         """Really need this to efficiently execute remove_node()"""
         self._root_node: Optional[NodeT] = None
@@ -49,10 +51,11 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
             raise NodeNotPresentError(f'Cannot add node ({node_identifier}): parent "{self.extract_id(parent)}" not found in tree!')
         else:
             parent_identifier = self.extract_id(parent)
-            child_list: List[NodeT] = self._parent_child_list_dict.get(parent_identifier, [])
-            if not child_list:
-                self._parent_child_list_dict[parent_identifier] = child_list
-            child_list.append(node)
+            child_dict: Dict[IdentifierT, NodeT] = self._parent_child_dict.get(parent_identifier, None)
+            if child_dict is None:
+                child_dict = {}
+                self._parent_child_dict[parent_identifier] = child_dict
+            child_dict[node_identifier] = node
             self._child_parent_dict[node_identifier] = parent
 
         self._node_dict[node_identifier] = node
@@ -77,29 +80,21 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
                 raise RuntimeError(f'Bad state: node is not root but has no parent: {existing_node}')
         else:
             parent_identifier = self.extract_id(parent)
-            sibling_list: List[NodeT] = self._parent_child_list_dict.get(parent_identifier, [])
-            if not sibling_list:
+            sibling_dict: Dict[IdentifierT, NodeT] = self._parent_child_dict.get(parent_identifier, None)
+            if not sibling_dict:
                 raise RuntimeError(f'Bad state: no children for parent node: {parent_identifier}')
-            for index, sibling in enumerate(sibling_list):
-                if sibling == existing_node:
-                    sibling_list[index] = node
-                    return existing_node
-            # should not get here
-            raise RuntimeError(f'Bad state: no children for parent node: {parent_identifier}')
-
-    def _remove_node_with_identifier(self, node_list: List[NodeT], identifier: IdentifierT):
-        for node in node_list:
-            if self.extract_id(node) == identifier:
-                node_list.remove(node)
-                return node
-        return None
+            if node_identifier not in sibling_dict:
+                raise RuntimeError(f'Bad state: node {node_identifier} not found in children of its parent: {parent_identifier}')
+            # Assigning to an existing key keeps its position
+            sibling_dict[node_identifier] = node
+            return existing_node
 
     def remove_node(self, identifier: IdentifierT) -> int:
         if self._root_node and self.extract_id(self._root_node) == identifier:
             self._root_node = None
             count_removed: int = len(self._node_dict)
             self._node_dict.clear()
-            self._parent_child_list_dict.clear()
+            self._parent_child_dict.clear()
             self._child_parent_dict.clear()
             return count_removed
 
@@ -113,9 +108,12 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
         # Remove target node from parent's child list
         parent = self.get_parent(identifier)
         if parent:
-            child_list: List[NodeT] = self._parent_child_list_dict.get(self.extract_id(parent), None)
-            if child_list:
-                self._remove_node_with_identifier(child_list, identifier)
+            parent_identifier = self.extract_id(parent)
+            sibling_dict: Dict[IdentifierT, NodeT] = self._parent_child_dict.get(parent_identifier, None)
+            if sibling_dict:
+                sibling_dict.pop(identifier, None)
+                if not sibling_dict:
+                    del self._parent_child_dict[parent_identifier]
 
         # Now loop and remove target node and all its descendants:
         count_removed = 0
@@ -125,11 +123,11 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
             removed_node = self._node_dict.pop(identifier, None)
             if not removed_node:
                 raise NodeNotPresentError(f'Cannot remove node: it is not present in tree: {identifier}')
+            self._child_parent_dict.pop(identifier, None)
 
-            child_list: List[NodeT] = self._parent_child_list_dict.pop(identifier, None)
-            if child_list:
-                for child in child_list:
-                    nid_queue.append(child.identifier)
+            child_dict: Dict[IdentifierT, NodeT] = self._parent_child_dict.pop(identifier, None)
+            if child_dict:
+                nid_queue.extend(child_dict.keys())
 
         return count_removed
 
@@ -175,11 +173,18 @@ class SimpleTree(Generic[IdentifierT, NodeT], BaseTree[IdentifierT, NodeT]):
     def get_child_list_for_identifier(self, parent_identifier: IdentifierT) -> List[NodeT]:
         if parent_identifier not in self._node_dict:
             raise NodeNotPresentError(f'Cannot get children: parent "{parent_identifier}" is not in the tree!')
-        return self._parent_child_list_dict.get(parent_identifier, [])
+        child_dict: Dict[IdentifierT, NodeT] = self._parent_child_dict.get(parent_identifier, None)
+        if child_dict:
+            return list(child_dict.values())
+        return []
 
     def get_parent(self, child_identfier: IdentifierT) -> Optional[NodeT]:
         return self._child_parent_dict.get(child_identfier, None)
 
+    def get_parent_list_for_dir_stats(self, node: NodeT) -> List[NodeT]:
+        parent = self.get_parent(self.extract_id(node))
+        return [parent] if parent else []
+
     def contains(self, identifier: IdentifierT) -> bool:
         return identifier in self._node_dict
 
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from be.content_meta_manager import ContentMetaManager
+from be.sqlite.content_meta_db import ContentMeta, ContentMetaDatabase
+from test.benchmark.fake_backend import FakeBackend
+
+class _PerRowContentMetaManager(ContentMetaManager):
+    """Writes each new ContentMeta the way ContentMetaManager did before it batched them"""
+    def get_or_create_content_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None) -> ContentMeta:
+        meta = super().get_or_create_content_meta_for(size_bytes, md5, sha256)
+        self.flush_pending_inserts()
+        return meta
+
+
+def _run(manager_class, db_path: str, meta_count: int) -> float:
+    manager = manager_class(FakeBackend(), db_path)
+    manager.start()
+    try:
+        start = time.perf_counter()
+        for i in range(1, meta_count + 1):
+            manager.get_or_create_content_meta_for(i, md5=f'{i:032x}')
+        manager.flush_pending_inserts()
+        elapsed_sec = time.perf_counter() - start
+    finally:
+        manager.shutdown()
+
+    db = ContentMetaDatabase(FakeBackend(), db_path)
+    try:
+        persisted_count = len(db.get_all())
+    finally:
+        db.close()
+    assert persisted_count == meta_count, f'Expected {meta_count} ContentMetas on disk but found {persisted_count}'
+    return elapsed_sec
+
+
+def main(meta_count: int):
+    """Throughput of creating new ContentMetas via get_or_create_content_meta_for(), as in a full signature pass over a fresh library, comparing
+    one SQLite transaction per new ContentMeta (as before batching) with batches of cache.content_meta.insert_batch_size. Every ContentMeta
+    must be on disk once flush_pending_inserts() returns, or the run fails."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for desc, manager_class in (('per-row', _PerRowContentMetaManager), ('batched', ContentMetaManager)):
+            elapsed_sec = _run(manager_class, os.path.join(tmp_dir, f'{desc}.db'), meta_count)
+            print(f'{desc:>8}: {meta_count:n} new ContentMetas in {elapsed_sec:.2f}s = {meta_count / elapsed_sec:,.0f}/s')
+
+
+if __name__ == '__main__':
+    main(meta_count=int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
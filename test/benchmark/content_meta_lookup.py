@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from be.content_meta_manager import ContentMetaManager
+from be.sqlite.content_meta_db import ContentMeta
+from test.benchmark.fake_backend import FakeBackend
+
+class _ScanningContentMetaManager(ContentMetaManager):
+    """Looks up signatures the way ContentMetaManager did before it had indexes"""
+    def get_or_create_content_meta_for(self, size_bytes: int, md5: Optional[str] = None, sha256: Optional[str] = None) -> ContentMeta:
+        with self._struct_lock:
+            if md5:
+                for meta in self.meta_dict.values():
+                    if meta.md5 == md5:
+                        return meta
+            elif sha256:
+                for meta in self.meta_dict.values():
+                    if meta.sha256 == sha256:
+                        return meta
+            return self._insert_new_content_meta(size_bytes, md5, sha256)
+
+
+def _md5(i: int) -> str:
+    return f'{i:032x}'
+
+
+def _sha256(i: int) -> str:
+    return f'{i:064x}'
+
+
+def _run(manager_class, db_path: str, meta_count: int, op_count: int):
+    manager = manager_class(FakeBackend(last_uid=meta_count), db_path)
+    manager.start()
+    try:
+        rnd = random.Random(0)
+        found_index_list = [rnd.randint(1, meta_count) for _ in range(op_count)]
+        start = time.perf_counter()
+        for i in found_index_list:
+            if i % 2:
+                meta = manager.get_or_create_content_meta_for(i, md5=_md5(i))
+            else:
+                meta = manager.get_or_create_content_meta_for(i, sha256=_sha256(i))
+            assert meta.size_bytes == i, f'Found wrong ContentMeta for {i}: {meta}'
+        lookup_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(meta_count + 1, meta_count + 1 + op_count):
+            manager.get_or_create_content_meta_for(i, md5=_md5(i), sha256=_sha256(i))
+        assert len(manager.meta_dict) == meta_count + op_count
+        manager.flush_pending_inserts()
+        insert_sec = time.perf_counter() - start
+    finally:
+        manager.shutdown()
+    return lookup_sec, insert_sec
+
+
+def main(meta_count: int, op_count: int):
+    """Cost of get_or_create_content_meta_for() with N ContentMetas loaded, for signatures which are found (lookups) and which are not
+    (inserts), comparing the MD5 / SHA-256 indexes with a scan of every ContentMeta, as before the indexes. Inserts also write the new rows to
+    SQLite, which costs the same on both sides."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        template_db_path = os.path.join(tmp_dir, 'template.db')
+        manager = ContentMetaManager(FakeBackend(), template_db_path)
+        manager.start()
+        manager.content_meta_db.table_content.insert_many([ContentMeta(i, _md5(i), _sha256(i) if i % 2 == 0 else None, i).to_tuple()
+                                                           for i in range(1, meta_count + 1)])
+        manager.shutdown()
+
+        result_dict = {}
+        for desc, manager_class in (('scan', _ScanningContentMetaManager), ('indexed', ContentMetaManager)):
+            db_path = os.path.join(tmp_dir, f'{desc}.db')
+            with open(template_db_path, 'rb') as src, open(db_path, 'wb') as dst:
+                dst.write(src.read())
+            result_dict[desc] = _run(manager_class, db_path, meta_count, op_count)
+
+    for desc, (lookup_sec, insert_sec) in result_dict.items():
+        print(f'{desc:>8}: {meta_count:n} ContentMetas: lookup {lookup_sec / op_count * 1_000_000:.1f} µs/op, '
+              f'insert {insert_sec / op_count * 1_000_000:.1f} µs/op')
+
+
+if __name__ == '__main__':
+    main(meta_count=int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, op_count=int(sys.argv[2]) if len(sys.argv) > 2 else 500)
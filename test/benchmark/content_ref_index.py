@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from be.content_meta_manager import ContentMetaManager
+from be.sqlite.content_meta_db import ContentMeta
+from be.sqlite.local_db import LocalDiskDatabase
+from constants import TrashStatus
+from model.node.locald_node import LocalFileNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from test.benchmark.fake_backend import FakeBackend, FakeCacheman
+
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/Users/me/Documents'
+DUPLICATE_EVERY = 5
+SYNC_TS = 1_600_000_000_000
+
+def _build_file_nodes(node_count: int, manager: ContentMetaManager) -> List[LocalFileNode]:
+    rnd = random.Random(0)
+    node_list: List[LocalFileNode] = []
+    meta_list: List[ContentMeta] = []
+    for uid in range(ROOT_UID + 1, ROOT_UID + 1 + node_count):
+        if meta_list and rnd.randrange(DUPLICATE_EVERY) == 0:
+            content_meta = rnd.choice(meta_list)
+        else:
+            content_meta = manager.get_or_create_content_meta_for(uid, md5=f'{uid:032x}')
+            meta_list.append(content_meta)
+        node_list.append(LocalFileNode(LocalNodeIdentifier(UID(uid), DEVICE_UID, f'{ROOT_PATH}/file{uid}.txt'), ROOT_UID, content_meta,
+                                       content_meta.size_bytes, SYNC_TS, SYNC_TS, SYNC_TS, SYNC_TS, TrashStatus.NOT_TRASHED, True))
+    return node_list
+
+
+def _write_file_nodes(manager: ContentMetaManager, db: LocalDiskDatabase, node_list: List[LocalFileNode]):
+    """As a cache write op does: one update of the content ref index for all the nodes, then the write to the cache"""
+    manager.update_content_refs(DEVICE_UID, node_list)
+    db.insert_local_files(node_list, overwrite=False, commit=True)
+
+
+def _scan_for_duplicates(db: LocalDiskDatabase) -> Dict[UID, List[Tuple[UID, UID]]]:
+    ref_list_by_content: Dict[UID, List[Tuple[UID, UID]]] = defaultdict(list)
+    for node_uid, content_uid in db.get_content_ref_list():
+        ref_list_by_content[content_uid].append((DEVICE_UID, node_uid))
+    return {content_uid: ref_list for content_uid, ref_list in ref_list_by_content.items() if len(ref_list) > 1}
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(node_count: int, lookup_count: int):
+    """Finding the file nodes which share content via the content ref index vs by scanning the file rows of every cache (the only way before the
+    index), for both a full duplicate report and single-content lookups. The cache is one LocalDiskDatabase of synthetic file nodes, roughly
+    one in DUPLICATE_EVERY sharing its content with another, with the index updated as a cache write op updates it. Both sides must find
+    the same nodes, or the run fails."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backend = FakeBackend(last_uid=ROOT_UID + node_count)
+        manager = ContentMetaManager(backend, os.path.join(tmp_dir, 'content_meta.db'))
+        manager.start()
+        backend.cacheman = FakeCacheman({ROOT_PATH: ROOT_UID}, content_meta_manager=manager)
+        try:
+            node_list = _build_file_nodes(node_count, manager)
+            with LocalDiskDatabase(os.path.join(tmp_dir, 'local_cache.db'), backend, DEVICE_UID) as db:
+                _, write_sec = _timed(lambda: _write_file_nodes(manager, db, node_list))
+
+                scan_dict, scan_report_sec = _timed(lambda: _scan_for_duplicates(db))
+                group_list, index_report_sec = _timed(lambda: manager.get_duplicate_content_group_list())
+                assert {group.content_meta.uid: sorted(group.node_ref_list) for group in group_list} == \
+                       {content_uid: sorted(ref_list) for content_uid, ref_list in scan_dict.items()}, 'Duplicate reports differ'
+
+                rnd = random.Random(1)
+                content_uid_list = [rnd.choice(node_list).content_meta_uid for _ in range(lookup_count)]
+                scan_result_list, scan_lookup_sec = _timed(lambda: [sorted((DEVICE_UID, n.uid) for n in db.get_all_files_with_content(c))
+                                                                    for c in content_uid_list])
+                index_result_list, index_lookup_sec = _timed(lambda: [sorted(manager.get_content_refs_for_content_uid(c))
+                                                                      for c in content_uid_list])
+                assert scan_result_list == index_result_list, 'Lookups differ'
+        finally:
+            manager.shutdown()
+
+    wasted_mib = sum(group.get_wasted_bytes() for group in group_list) / 1024 / 1024
+    print(f'{node_count:n} file nodes written in {write_sec:.2f}s (incl. index); {len(group_list):n} duplicated contents, '
+          f'{wasted_mib:.1f} MiB wasted')
+    print(f'  duplicate report: scan {scan_report_sec:.2f}s, index {index_report_sec:.2f}s')
+    print(f'  lookup by content: scan {scan_lookup_sec / lookup_count * 1000:.2f} ms/op, '
+          f'index {index_lookup_sec / lookup_count * 1000:.3f} ms/op')
+
+
+if __name__ == '__main__':
+    main(node_count=int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, lookup_count=int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -0,0 +1,110 @@
+import random
+import sys
+import time
+from typing import List
+from unittest import mock
+
+from be.tree_store.locald.ld_tree import LocalDiskTree
+from constants import TrashStatus
+from model.node.locald_node import LocalDirNode, LocalFileNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+
+DEVICE_UID = UID(2)
+TREE_ID = 'bench_tree'
+
+
+class _TreeBuilder:
+    def __init__(self):
+        self.next_uid = 100
+        self.tree = LocalDiskTree(mock.Mock())
+        self.dir_list = []
+
+    def _next_uid(self) -> UID:
+        self.next_uid += 1
+        return UID(self.next_uid)
+
+    def add_dir(self, parent, full_path: str) -> LocalDirNode:
+        node = LocalDirNode(LocalNodeIdentifier(uid=self._next_uid(), device_uid=DEVICE_UID, full_path=full_path),
+                            parent_uid=parent.uid if parent else UID(1), trashed=TrashStatus.NOT_TRASHED, is_live=True, sync_ts=0, create_ts=0,
+                            modify_ts=0, change_ts=0, all_children_fetched=True)
+        self.tree.add_node(node, parent)
+        self.dir_list.append(node)
+        return node
+
+    def add_file(self, parent, full_path: str, size_bytes: int) -> LocalFileNode:
+        node = LocalFileNode(LocalNodeIdentifier(uid=self._next_uid(), device_uid=DEVICE_UID, full_path=full_path), parent_uid=parent.uid,
+                             content_meta=None, size_bytes=size_bytes, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                             trashed=TrashStatus.NOT_TRASHED, is_live=True)
+        self.tree.add_node(node, parent)
+        return node
+
+    def build(self, dirs_per_level: int, depth: int, files_per_dir: int):
+        root = self.add_dir(None, '/bench')
+        level = [root]
+        for _ in range(depth):
+            next_level = []
+            for parent in level:
+                for d in range(dirs_per_level):
+                    next_level.append(self.add_dir(parent, f'{parent.get_single_path()}/d{d}'))
+            level = next_level
+        for dir_node in list(self.dir_list):
+            for f in range(files_per_dir):
+                self.add_file(dir_node, f'{dir_node.get_single_path()}/f{f}', size_bytes=f * 100)
+        return root
+
+
+def _apply_random_event(builder: _TreeBuilder, rnd: random.Random) -> List[UID]:
+    """Adds or removes a file in a random dir (or occasionally adds a new dir containing a file); returns the UIDs of the changed dirs"""
+    dir_node = rnd.choice(builder.dir_list)
+    child_file_list = [c for c in builder.tree.get_child_list_for_node(dir_node) if not c.is_dir()]
+    roll = rnd.random()
+    if roll < 0.05:
+        new_dir = builder.add_dir(dir_node, f'{dir_node.get_single_path()}/newdir{builder.next_uid}')
+        builder.add_file(new_dir, f'{new_dir.get_single_path()}/f0', size_bytes=rnd.randint(0, 10000))
+        return [dir_node.uid, new_dir.uid]
+    elif child_file_list and roll < 0.5:
+        builder.tree.remove_node(rnd.choice(child_file_list).uid)
+    else:
+        builder.add_file(dir_node, f'{dir_node.get_single_path()}/new{builder.next_uid}', size_bytes=rnd.randint(0, 10000))
+    return [dir_node.uid]
+
+
+def main(dirs_per_level: int, depth: int, files_per_dir: int, event_count: int):
+    """Per-event cost of keeping a display tree's DirStats up to date: full regeneration (BaseTree.generate_dir_stats(), which ActiveTreeManager
+    used to call for every batch of changes) vs the incremental BaseTree.update_dir_stats(). Each event adds or removes a file in a random dir,
+    or occasionally adds a dir; at the end, the incremental stats must match a full regeneration."""
+    builder = _TreeBuilder()
+    root = builder.build(dirs_per_level, depth, files_per_dir)
+    print(f'Tree: {len(builder.tree)} nodes ({len(builder.dir_list)} dirs); {event_count} events')
+
+    rnd = random.Random(42)
+    full_sec = 0.0
+    for _ in range(event_count):
+        _apply_random_event(builder, rnd)
+        start = time.perf_counter()
+        builder.tree.generate_dir_stats(TREE_ID, root)
+        full_sec += time.perf_counter() - start
+
+    dir_stats_dict = builder.tree.generate_dir_stats(TREE_ID, root)
+    incremental_sec = 0.0
+    for _ in range(event_count):
+        changed_dir_uid_list = _apply_random_event(builder, rnd)
+        start = time.perf_counter()
+        builder.tree.update_dir_stats(TREE_ID, dir_stats_dict, changed_dir_uid_list, root.uid)
+        incremental_sec += time.perf_counter() - start
+
+    expected_dict = builder.tree.generate_dir_stats(TREE_ID, root)
+    assert set(expected_dict.keys()) == set(dir_stats_dict.keys())
+    for uid, expected in expected_dict.items():
+        assert repr(expected) == repr(dir_stats_dict[uid]), f'Mismatch for dir {uid}: expected {expected}, got {dir_stats_dict[uid]}'
+
+    print(f'       full regeneration: {full_sec / event_count * 1000:9.3f} ms/event')
+    print(f'      incremental update: {incremental_sec / event_count * 1000:9.3f} ms/event')
+    print(f'                 speedup: {full_sec / incremental_sec:9.1f}x (results verified identical)')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    defaults = [8, 4, 10, 50]
+    main(*(args + defaults[len(args):]))
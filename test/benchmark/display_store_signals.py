@@ -0,0 +1,100 @@
+import random
+import sys
+import time
+from functools import partial
+from types import SimpleNamespace
+from typing import Dict, List
+
+from fe.gtk.tree.display_store import DisplayStore
+from model.node.node import SPIDNodePair
+from test.benchmark.dir_stats_update import _TreeBuilder
+
+COL_NUM_NAME = 0
+COL_NUM_DATA = 1
+
+
+def _build_display_store() -> DisplayStore:
+    controller = SimpleNamespace(tree_id='bench_tree')
+    treeview_meta = SimpleNamespace(col_types=[str, object], col_num_name=COL_NUM_NAME, col_num_data=COL_NUM_DATA)
+    return DisplayStore(controller, treeview_meta)
+
+
+def _populate(ds: DisplayStore, builder: _TreeBuilder, parent_iter, parent_node):
+    for child in builder.tree.get_child_list_for_node(parent_node):
+        sn = SPIDNodePair(child.node_identifier, child)
+        child_iter = ds.append_node(parent_iter, [child.name, sn])
+        if child.is_dir():
+            _populate(ds, builder, child_iter, child)
+
+
+def _scan_for_guid(ds: DisplayStore, guid):
+    return ds.find_in_tree(partial(DisplayStore._guid_equals_func, guid))
+
+
+def _apply_signals(ds: DisplayStore, sn_list: List[SPIDNodePair], parent_sn_by_guid: Dict, use_index: bool):
+    """For each SN: find its parent's row, then its own row under the parent, and update it (as for NODE_UPSERTED). Every 10th SN is
+    removed and re-appended instead (as for NODE_REMOVED followed by NODE_UPSERTED)."""
+    for i, sn in enumerate(sn_list):
+        parent_sn = parent_sn_by_guid[sn.spid.guid]
+        if use_index:
+            parent_iter = ds.find_guid_in_tree(parent_sn.spid.guid)
+            child_iter = ds.find_guid_in_children(sn.spid.guid, parent_iter)
+        else:
+            parent_iter = _scan_for_guid(ds, parent_sn.spid.guid)
+            child_iter = ds.find_in_children(parent_iter, partial(DisplayStore._guid_equals_func, sn.spid.guid))
+        assert child_iter, f'Row not found: {sn.spid}'
+
+        if i % 10 == 0:
+            if use_index:
+                ds.remove_node(sn.spid.guid)
+            else:
+                ds.model.remove(child_iter)
+            ds.append_node(parent_iter, [sn.node.name, sn])
+        else:
+            ds.model.set_value(child_iter, COL_NUM_NAME, f'{sn.node.name}*')
+
+
+def main(dirs_per_level: int, depth: int, files_per_dir: int, signal_count: int):
+    """Cost of applying node upserted/removed signals to a fully expanded display tree as DisplayMutator does, comparing the old recursive scan
+    of the Gtk.TreeStore (find_in_tree()) with the GUID-to-row index behind find_guid_in_tree(). Headless: the Gtk.TreeStore is never
+    attached to a TreeView, so only PyGObject & GTK 3 are needed."""
+    builder = _TreeBuilder()
+    root = builder.build(dirs_per_level, depth, files_per_dir)
+
+    parent_sn_by_guid = {}
+    file_sn_list = []
+    for dir_node in builder.dir_list:
+        dir_sn = SPIDNodePair(dir_node.node_identifier, dir_node)
+        for child in builder.tree.get_child_list_for_node(dir_node):
+            if not child.is_dir():
+                child_sn = SPIDNodePair(child.node_identifier, child)
+                parent_sn_by_guid[child_sn.spid.guid] = dir_sn
+                file_sn_list.append(child_sn)
+
+    signal_sn_list = random.Random(signal_count).choices(file_sn_list, k=signal_count)
+
+    for use_index in (False, True):
+        ds = _build_display_store()
+        _populate(ds, builder, None, root)
+        row_count = len(ds.displayed_guid_dict)
+
+        start = time.perf_counter()
+        _apply_signals(ds, signal_sn_list, parent_sn_by_guid, use_index)
+        elapsed = time.perf_counter() - start
+
+        if use_index:
+            # The index must agree with a full scan for every displayed row:
+            for guid in ds.displayed_guid_dict.keys():
+                index_path = ds.model.get_path(ds.find_guid_in_tree(guid))
+                assert index_path == ds.model.get_path(_scan_for_guid(ds, guid)), f'Index is stale for {guid}'
+
+        mode = 'row index' if use_index else 'tree scan'
+        print(f'{mode}: {row_count} displayed rows; {signal_count} signals in {elapsed:.3f}s '
+              f'({elapsed / signal_count * 1_000_000:.1f}µs/signal)')
+
+
+if __name__ == '__main__':
+    main(dirs_per_level=int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+         depth=int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+         files_per_dir=int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+         signal_count=int(sys.argv[4]) if len(sys.argv) > 4 else 2000)
@@ -0,0 +1,65 @@
+import logging
+from typing import Any, Dict, Optional
+
+from be.content_meta_manager import ContentMetaManager
+from be.sqlite.content_meta_db import ContentMeta
+from be.uid.uid_generator import SimpleUidGenerator
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DICT = {
+    'cache.content_meta.insert_batch_size': 1000,
+    'cache.content_meta.insert_holdoff_ms': 1000,
+}
+
+
+class FakeCacheman:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS CacheManager
+
+    Just the calls made by the SQLite cache DBs. Each path maps to the UID it was first read with (or the one given in path_uid_dict). If given
+    a ContentMetaManager, ContentMeta calls are forwarded to it as the CacheManager does; otherwise ContentMetas are looked up in
+    content_meta_dict, which the caller fills in (a content UID of 0 or None gives None, as with ContentMetaManager).
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, path_uid_dict: Optional[Dict[str, UID]] = None, content_meta_manager: Optional[ContentMetaManager] = None):
+        self.path_uid_dict: Dict[str, UID] = dict(path_uid_dict) if path_uid_dict else {}
+        self.content_meta_dict: Dict[UID, ContentMeta] = {}
+        self.content_meta_manager: Optional[ContentMetaManager] = content_meta_manager
+
+    def get_uid_for_local_path(self, full_path: str, uid_suggestion: Optional[UID] = None) -> UID:
+        uid = self.path_uid_dict.get(full_path)
+        if not uid:
+            uid = self.path_uid_dict[full_path] = UID(uid_suggestion)
+        return uid
+
+    def get_content_meta_for_uid(self, content_uid: UID) -> Optional[ContentMeta]:
+        if self.content_meta_manager:
+            return self.content_meta_manager.get_content_meta_for_uid(content_uid)
+        if not content_uid:
+            return None
+        return self.content_meta_dict[content_uid]
+
+    def flush_content_meta_inserts(self):
+        if self.content_meta_manager:
+            self.content_meta_manager.flush_pending_inserts()
+
+
+class FakeBackend:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS OutletBackend
+
+    Config comes from CONFIG_DICT with any overrides in config_dict, falling back to the default given by the caller. UIDs are issued after
+    last_uid, so that they never collide with the UIDs of nodes which a benchmark builds itself.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, last_uid: int = 0, cacheman: Optional[FakeCacheman] = None, config_dict: Optional[Dict[str, Any]] = None):
+        self.uid_generator = SimpleUidGenerator(initial_value=last_uid)
+        self.cacheman: Optional[FakeCacheman] = cacheman
+        self.config_dict: Dict[str, Any] = {**CONFIG_DICT, **config_dict} if config_dict else CONFIG_DICT
+
+    def get_config(self, config_key: str, default_val=None, required: bool = True):
+        return self.config_dict.get(config_key, default_val)
@@ -0,0 +1,197 @@
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from be.tree_store.gdrive.client.partitioned_query import PARTITION_START_TS_SEC, PartitionedQueryFetcher
+from constants import MIME_TYPE_FOLDER, QUERY_NON_FOLDERS_ONLY
+
+PAGE_SIZE = 1000
+MAX_BUFFERED_PAGES = 8
+
+_MODIFIED_TIME_REGEX = re.compile(r"modifiedTime (>=|<) '([^']+)'")
+
+
+class _FakeDriveService:
+    """Just enough of the Drive v3 API to serve files().list().execute() for the queries which GDriveClient sends for the initial load.
+    Thread-safe, so that a single instance can be shared by all the fetcher threads."""
+    def __init__(self, item_list: List[Dict], latency_sec: float):
+        self._item_list: List[Dict] = sorted(item_list, key=lambda i: i['id'])
+        self._latency_sec: float = latency_sec
+        self._lock = threading.Lock()
+        self._token_dict: Dict[str, Tuple[str, int]] = {}
+        self._match_list_dict: Dict[str, List[Dict]] = {}
+        self.request_count: int = 0
+
+    def files(self):
+        return self
+
+    def list(self, q: str, pageSize: int, pageToken: Optional[str] = None, **kwargs):
+        return _FakeRequest(self, q, pageSize, pageToken)
+
+    def _execute(self, query: str, page_size: int, page_token: Optional[str]) -> Dict:
+        time.sleep(self._latency_sec)
+        with self._lock:
+            self.request_count += 1
+            if page_token:
+                # Like real page tokens, these can be reused (e.g. when resuming from a page which was already prefetched):
+                token_query, offset = self._token_dict[page_token]
+                assert token_query == query, f'Page token is for a different query: "{token_query}"'
+            else:
+                offset = 0
+
+        match_list = self._match_list_dict.get(query)
+        if match_list is None:
+            is_folder_query = QUERY_NON_FOLDERS_ONLY not in query
+            range_list = _MODIFIED_TIME_REGEX.findall(query)
+            match_list = [item for item in self._item_list if _FakeDriveService._matches(is_folder_query, range_list, item)]
+            with self._lock:
+                self._match_list_dict[query] = match_list
+        response = {'files': match_list[offset:offset + page_size], 'incompleteSearch': False}
+        if offset + page_size < len(match_list):
+            next_token = uuid.uuid4().hex
+            with self._lock:
+                self._token_dict[next_token] = (query, offset + page_size)
+            response['nextPageToken'] = next_token
+        return response
+
+    @staticmethod
+    def _matches(is_folder_query: bool, range_list: List[Tuple[str, str]], item: Dict) -> bool:
+        if (item['mimeType'] == MIME_TYPE_FOLDER) != is_folder_query:
+            return False
+        for op, value in range_list:
+            if (item['modifiedTime'] >= value) != (op == '>='):
+                return False
+        return True
+
+
+class _FakeRequest:
+    def __init__(self, service: _FakeDriveService, query: str, page_size: int, page_token: Optional[str]):
+        self._service = service
+        self._args = query, page_size, page_token
+
+    def execute(self) -> Dict:
+        return self._service._execute(*self._args)
+
+
+def _build_item_list(item_count: int) -> List[Dict]:
+    """Items' modify times are skewed towards the present, as in most drives. Some precede the start of the partitioned time range."""
+    rnd = random.Random(item_count)
+    now_sec = int(time.time())
+    item_list = []
+    for i in range(item_count):
+        modify_ts_sec = int(now_sec - (now_sec - PARTITION_START_TS_SEC) * rnd.random() ** 3 * 1.05)
+        mime_type = MIME_TYPE_FOLDER if i % 10 == 0 else 'text/plain'
+        item_list.append({'id': f'goog_{i:08d}', 'name': f'item{i}', 'mimeType': mime_type,
+                          'modifiedTime': datetime.fromtimestamp(modify_ts_sec, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')})
+    return item_list
+
+
+def _fetch_serially(service: _FakeDriveService) -> List[str]:
+    """The way GDriveClient._execute_files_query() pages through a query"""
+    id_list = []
+    page_token = None
+    while True:
+        results = service.files().list(q=QUERY_NON_FOLDERS_ONLY, pageSize=PAGE_SIZE, pageToken=page_token).execute()
+        id_list += [item['id'] for item in results.get('files', [])]
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return id_list
+
+
+def _build_fetcher(service: _FakeDriveService, max_concurrent_requests: int) -> PartitionedQueryFetcher:
+    def request_page(query: str, page_token: Optional[str]) -> dict:
+        return service.files().list(q=query, pageSize=PAGE_SIZE, pageToken=page_token).execute()
+    return PartitionedQueryFetcher(QUERY_NON_FOLDERS_ONLY, request_page, max_concurrent_requests, MAX_BUFFERED_PAGES)
+
+
+def _fetch_partitioned(service: _FakeDriveService, max_concurrent_requests: int, partition_count: int) -> List[str]:
+    id_list = []
+
+    def on_page_received(results: dict, resume_token: Optional[str]):
+        id_list.extend(item['id'] for item in results.get('files', []))
+
+    _build_fetcher(service, max_concurrent_requests).fetch_all(None, int(time.time()), partition_count, on_page_received)
+    return id_list
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _fetch_with_interruption(service: _FakeDriveService, max_concurrent_requests: int, partition_count: int, interrupt_after_pages: int) \
+        -> List[str]:
+    """Stops the download after the given number of pages, then resumes it from the last token saved (as the GDrive loader would)"""
+    id_list = []
+    saved_token: List[Optional[str]] = [None]
+
+    def on_page_received(results: dict, resume_token: Optional[str]):
+        if len(saved_token) > interrupt_after_pages:
+            raise _Interrupted()
+        id_list.extend(item['id'] for item in results.get('files', []))
+        saved_token.append(resume_token)
+
+    try:
+        _build_fetcher(service, max_concurrent_requests).fetch_all(None, int(time.time()), partition_count, on_page_received)
+        raise RuntimeError('Download was not interrupted!')
+    except _Interrupted:
+        pass
+
+    resume_token = saved_token[-1]
+    assert PartitionedQueryFetcher.is_resume_token(resume_token), f'Not a resume token: {resume_token}'
+    saved_token.clear()  # no more interruptions
+
+    def on_page_received_after_resume(results: dict, _resume_token: Optional[str]):
+        id_list.extend(item['id'] for item in results.get('files', []))
+
+    _build_fetcher(service, max_concurrent_requests).fetch_all(resume_token, 0, 0, on_page_received_after_resume)
+    return id_list
+
+
+def _check_id_list(id_list: List[str], expected_id_set: set, desc: str):
+    duplicate_list = [goog_id for goog_id, count in Counter(id_list).items() if count > 1]
+    assert not duplicate_list, f'{desc}: {len(duplicate_list)} items returned more than once (e.g. {duplicate_list[0]})'
+    assert set(id_list) == expected_id_set, f'{desc}: expected {len(expected_id_set)} items but got {len(set(id_list))}'
+
+
+def main(item_count: int, latency_ms: int, max_concurrent_requests: int, partition_count: int):
+    """Time to list every non-dir item in a Google Drive with the old single query (each page requested only after the previous one returns
+    its nextPageToken) vs. PartitionedQueryFetcher, which splits the query by modifiedTime and pages through the partitions concurrently.
+    Runs against a local fake of files().list() which simulates the latency of each request. Afterwards, an interrupted partitioned download
+    is resumed from its last resume token, to check that every item is returned exactly once."""
+    item_list = _build_item_list(item_count)
+    expected_id_set = {item['id'] for item in item_list if item['mimeType'] != MIME_TYPE_FOLDER}
+    print(f'{len(expected_id_set)} non-dir items (page size {PAGE_SIZE}), {latency_ms}ms per request')
+
+    service = _FakeDriveService(item_list, latency_ms / 1000)
+    start = time.perf_counter()
+    id_list = _fetch_serially(service)
+    elapsed = time.perf_counter() - start
+    _check_id_list(id_list, expected_id_set, 'serial')
+    print(f'     serial: {elapsed:.3f}s ({service.request_count} requests)')
+
+    service = _FakeDriveService(item_list, latency_ms / 1000)
+    start = time.perf_counter()
+    id_list = _fetch_partitioned(service, max_concurrent_requests, partition_count)
+    elapsed = time.perf_counter() - start
+    _check_id_list(id_list, expected_id_set, 'partitioned')
+    print(f'partitioned: {elapsed:.3f}s ({service.request_count} requests, {partition_count} partitions, '
+          f'max {max_concurrent_requests} at once)')
+
+    service = _FakeDriveService(item_list, latency_ms / 1000)
+    id_list = _fetch_with_interruption(service, max_concurrent_requests, partition_count,
+                                       interrupt_after_pages=len(expected_id_set) // PAGE_SIZE // 3 + 1)
+    _check_id_list(id_list, expected_id_set, 'resumed')
+    print('    resumed: OK')
+
+
+if __name__ == '__main__':
+    main(item_count=int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         latency_ms=int(sys.argv[2]) if len(sys.argv) > 2 else 150,
+         max_concurrent_requests=int(sys.argv[3]) if len(sys.argv) > 3 else 4,
+         partition_count=int(sys.argv[4]) if len(sys.argv) > 4 else 16)
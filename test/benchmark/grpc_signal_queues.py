@@ -0,0 +1,196 @@
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from be.agent.grpc.generated.Outlet_pb2 import SignalMsg
+from be.agent.svr.client_signal_queue import ClientSignalQueue
+from constants import TreeLoadState
+from signal_constants import Signal
+
+TREE_ID = 'bench_tree'
+# Seconds per signal for each simulated client:
+CLIENT_DELAY_LIST = [0.0, 0.0002, 0.001]
+REMOVE_EVERY = 10
+STATS_EVERY = 200
+
+
+class _Tree:
+    """The producer's tree: node UID -> version"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.node_dict: Dict[int, int] = {}
+        self.status_msg: str = ''
+        self.resync_snapshot_dict: Dict[str, Dict[int, int]] = {}
+
+    def build_resync_signal_list(self) -> List[SignalMsg]:
+        with self.lock:
+            sender = f'{TREE_ID}:{len(self.resync_snapshot_dict)}'
+            self.resync_snapshot_dict[sender] = dict(self.node_dict)
+        return [SignalMsg(sig_int=Signal.DISPLAY_TREE_CHANGED, sender=sender)]
+
+
+class _SharedConditionQueues:
+    """The old scheme, as it was in OutletGRPCService"""
+    def __init__(self, client_count: int):
+        self.cv_has_signal = threading.Condition(threading.Lock())
+        self.queue_list: List[Deque[SignalMsg]] = [deque() for _ in range(client_count)]
+        self.max_len_seen: int = 0
+        self.wakeup_count: int = 0
+        self.is_closed: bool = False
+
+    def put(self, signal_msg: SignalMsg, coalesce_key=None):
+        with self.cv_has_signal:
+            for queue in self.queue_list:
+                queue.append(signal_msg)
+                self.max_len_seen = max(self.max_len_seen, len(queue))
+            self.cv_has_signal.notify_all()
+
+    def get(self, client_index: int) -> Optional[SignalMsg]:
+        with self.cv_has_signal:
+            queue = self.queue_list[client_index]
+            while not queue:
+                if self.is_closed:
+                    return None
+                self.cv_has_signal.wait()
+                self.wakeup_count += 1
+            return queue.popleft()
+
+    def close(self):
+        with self.cv_has_signal:
+            self.is_closed = True
+            self.cv_has_signal.notify_all()
+
+
+class _Client(threading.Thread):
+    def __init__(self, get_func, delay_sec: float, tree: _Tree):
+        threading.Thread.__init__(self, daemon=True)
+        self.get_func = get_func
+        self.delay_sec: float = delay_sec
+        self.tree: _Tree = tree
+        self.node_dict: Dict[int, int] = {}
+        self.status_msg: str = ''
+        self.received_count: int = 0
+        self.done_time: float = 0.0
+
+    def run(self):
+        while True:
+            signal = self.get_func()
+            if signal is None:
+                return
+            self.received_count += 1
+            if signal.sig_int == Signal.NODE_UPSERTED:
+                self.node_dict[signal.sn.spid.node_uid] = signal.sn.node.local_file_meta.modify_ts
+            elif signal.sig_int == Signal.NODE_REMOVED:
+                self.node_dict.pop(signal.sn.spid.node_uid, None)
+            elif signal.sig_int == Signal.TREE_LOAD_STATE_UPDATED:
+                self.status_msg = signal.tree_load_update.stats_update.status_msg
+            elif signal.sig_int == Signal.DISPLAY_TREE_CHANGED:
+                self.node_dict = dict(self.tree.resync_snapshot_dict[signal.sender])
+            self.done_time = time.perf_counter()
+            if self.delay_sec:
+                time.sleep(self.delay_sec)
+
+
+def _produce(tree: _Tree, put_func, signal_count: int, node_count: int):
+    rnd = random.Random(0)
+    for version in range(1, signal_count + 1):
+        with tree.lock:
+            if version % STATS_EVERY == 0:
+                tree.status_msg = f'{len(tree.node_dict)} nodes (v{version})'
+                signal = SignalMsg(sig_int=Signal.TREE_LOAD_STATE_UPDATED, sender=TREE_ID)
+                signal.tree_load_update.load_state_int = TreeLoadState.COMPLETELY_LOADED
+                signal.tree_load_update.stats_update.status_msg = tree.status_msg
+                put_func(signal, (Signal.TREE_LOAD_STATE_UPDATED, TREE_ID, TreeLoadState.COMPLETELY_LOADED))
+                continue
+
+            node_uid = rnd.randrange(1, node_count + 1)
+            if version % REMOVE_EVERY == 0:
+                tree.node_dict.pop(node_uid, None)
+                signal = SignalMsg(sig_int=Signal.NODE_REMOVED, sender=TREE_ID)
+                signal.sn.spid.node_uid = node_uid
+                put_func(signal, None)
+            else:
+                tree.node_dict[node_uid] = version
+                signal = SignalMsg(sig_int=Signal.NODE_UPSERTED, sender=TREE_ID)
+                signal.sn.spid.node_uid = node_uid
+                signal.sn.node.local_file_meta.modify_ts = version
+                put_func(signal, (Signal.NODE_UPSERTED, TREE_ID, node_uid))
+
+
+def _wait_until_drained(client_list: List[_Client], len_func_list) -> float:
+    start = time.perf_counter()
+    while any(len_func() for len_func in len_func_list):
+        time.sleep(0.005)
+    # Allow each client to finish applying the last signal it took:
+    time.sleep(max(CLIENT_DELAY_LIST) + 0.01)
+    return time.perf_counter() - start
+
+
+def _check_clients(desc: str, tree: _Tree, client_list: List[_Client]):
+    for client in client_list:
+        assert client.node_dict == tree.node_dict, f'{desc}: client with delay {client.delay_sec}s has a different tree from the producer'
+        assert client.status_msg == tree.status_msg, f'{desc}: client with delay {client.delay_sec}s has stale stats: "{client.status_msg}"'
+
+
+def _run_shared(signal_count: int, node_count: int):
+    tree = _Tree()
+    queues = _SharedConditionQueues(len(CLIENT_DELAY_LIST))
+    client_list = [_Client(lambda i=i: queues.get(i), delay_sec, tree) for i, delay_sec in enumerate(CLIENT_DELAY_LIST)]
+    for client in client_list:
+        client.start()
+
+    start = time.perf_counter()
+    _produce(tree, queues.put, signal_count, node_count)
+    produce_sec = time.perf_counter() - start
+    _wait_until_drained(client_list, [lambda q=q: len(q) for q in queues.queue_list])
+    queues.close()
+    for client in client_list:
+        client.join()
+    _check_clients('shared', tree, client_list)
+    return produce_sec, start, client_list, queues.max_len_seen, f'{queues.wakeup_count:n} wakeups'
+
+
+def _run_per_client(signal_count: int, node_count: int, max_queue_size: int):
+    tree = _Tree()
+    queue_list = [ClientSignalQueue(f'client{i}', max_queue_size, tree.build_resync_signal_list) for i in range(len(CLIENT_DELAY_LIST))]
+    client_list = [_Client(queue.get, delay_sec, tree) for queue, delay_sec in zip(queue_list, CLIENT_DELAY_LIST)]
+    for client in client_list:
+        client.start()
+
+    def put(signal_msg: SignalMsg, coalesce_key):
+        for queue in queue_list:
+            queue.put(signal_msg, coalesce_key)
+
+    start = time.perf_counter()
+    _produce(tree, put, signal_count, node_count)
+    produce_sec = time.perf_counter() - start
+    _wait_until_drained(client_list, [queue.__len__ for queue in queue_list])
+    for queue in queue_list:
+        queue.close()
+    for client in client_list:
+        client.join()
+    _check_clients('per-client', tree, client_list)
+    stats = ', '.join(f'{q.coalesced_count:n} coalesced/{q.overflow_count:n} overflows' for q in queue_list)
+    return produce_sec, start, client_list, max(q.max_len_seen for q in queue_list), stats
+
+
+def main(signal_count: int, node_count: int, max_queue_size: int):
+    """A burst of tree update signals streamed to several simulated gRPC clients (one fast, the others slow), comparing the old scheme (an
+    unbounded deque per client, all sharing one Condition notified for every signal) with a ClientSignalQueue per client. Each client is a
+    thread which takes signals as the server's streaming thread would, sleeps, and applies them to its own copy of the tree, which must match
+    the producer's after the burst. See test/client_signal_queue_test.py for the ordering checks."""
+    print(f'{signal_count:n} signals for {node_count:n} nodes; client delays (sec/signal): {CLIENT_DELAY_LIST}')
+    for desc, result in (('shared', _run_shared(signal_count, node_count)),
+                         ('per-client', _run_per_client(signal_count, node_count, max_queue_size))):
+        produce_sec, start, client_list, max_len_seen, stats = result
+        caught_up = ', '.join(f'{c.done_time - start:.2f}s ({c.received_count:n} msgs)' for c in client_list)
+        print(f'{desc:>10}: producer {produce_sec:.2f}s, max queue len {max_len_seen:n}, {stats}')
+        print(f'{"":>10}  each client caught up after: {caught_up}')
+
+
+if __name__ == '__main__':
+    main(signal_count=int(sys.argv[1]) if len(sys.argv) > 1 else 10_000, node_count=int(sys.argv[2]) if len(sys.argv) > 2 else 2_000,
+         max_queue_size=int(sys.argv[3]) if len(sys.argv) > 3 else 1_000)
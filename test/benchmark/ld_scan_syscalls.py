@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from unittest import mock
+
+from be.tree_store.locald.ld_fs_scanner import LocalDiskTreeScanner
+from be.tree_store.locald.locald import LocalDiskMasterStore
+from be.tree_store.tree_store import TreeStore
+from constants import TreeType
+from model.device import Device
+from model.uid import UID
+
+DEVICE_UID = UID(2)
+
+counter = Counter()
+
+
+class _DictUidMapper:
+    def __init__(self):
+        self._uid_dict = {}
+
+    def get_uid_for_path(self, full_path: str, uid_suggestion=None) -> UID:
+        uid = self._uid_dict.get(full_path)
+        if not uid:
+            uid = UID(len(self._uid_dict) + 100)
+            self._uid_dict[full_path] = uid
+        return uid
+
+
+class _CountingDirEntry:
+    """Wraps an os.DirEntry, counting calls to stat() (which is the only method of DirEntry which can hit the disk on Linux/macOS)"""
+    def __init__(self, entry: os.DirEntry):
+        self._entry = entry
+        self.path = entry.path
+        self.name = entry.name
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def is_dir(self):
+        return self._entry.is_dir()
+
+    def stat(self):
+        counter['DirEntry.stat'] += 1
+        return self._entry.stat()
+
+
+def _counting(name, func):
+    def _wrapper(*args, **kwargs):
+        counter[name] += 1
+        return func(*args, **kwargs)
+    return _wrapper
+
+
+def _build_store() -> LocalDiskMasterStore:
+    # Skip the real constructor, which would create the memstore & diskstore:
+    store = LocalDiskMasterStore.__new__(LocalDiskMasterStore)
+    TreeStore.__init__(store, Device(DEVICE_UID, 'bench', TreeType.LOCAL_DISK, 'Benchmark Disk'))
+    store.uid_path_mapper = _DictUidMapper()
+    store.backend = mock.Mock()
+    store.backend.cacheman.lazy_load_local_file_signatures = True
+    return store
+
+
+def _make_tree(root: str, num_dirs: int, files_per_dir: int):
+    for d in range(num_dirs):
+        dir_path = os.path.join(root, f'dir{d:05d}')
+        os.mkdir(dir_path)
+        for f in range(files_per_dir):
+            with open(os.path.join(dir_path, f'file{f:05d}.txt'), 'w') as fd:
+                fd.write('x' * f)
+
+
+def _scan(store: LocalDiskMasterStore, root: str, use_dir_entry: bool) -> int:
+    file_count = 0
+    dir_entry_list, _ = LocalDiskTreeScanner._list_dir_entries(root, skip_tree_path='/nonexistent')
+    for dir_entry in dir_entry_list:
+        _, file_entry_list = LocalDiskTreeScanner._list_dir_entries(dir_entry.path, skip_tree_path='/nonexistent')
+        for file_entry in file_entry_list:
+            if use_dir_entry:
+                node = store.build_local_file_node(file_entry.path, dir_entry=_CountingDirEntry(file_entry))
+            else:
+                node = store.build_local_file_node(file_entry.path)
+            assert node, f'Failed to build node for {file_entry.path}'
+            file_count += 1
+    return file_count
+
+
+def main(num_dirs: int, files_per_dir: int):
+    """Stat-family syscalls made per scanned file when building LocalFileNodes: the path-only mode (exists + isdir + islink + stat) vs the
+    DirEntry mode used by LocalDiskTreeScanner."""
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, num_dirs, files_per_dir)
+
+        for use_dir_entry in (False, True):
+            store = _build_store()
+            counter.clear()
+            start = time.perf_counter()
+            with mock.patch('os.stat', _counting('os.stat', os.stat)), mock.patch('os.lstat', _counting('os.lstat', os.lstat)):
+                file_count = _scan(store, root, use_dir_entry)
+            elapsed = time.perf_counter() - start
+
+            total_calls = sum(counter.values())
+            mode = 'DirEntry' if use_dir_entry else 'path-only'
+            print(f'{mode:>10}: {file_count} files in {elapsed:.3f}s; {total_calls / file_count:.2f} stat syscalls/file ({dict(counter)})')
+
+
+if __name__ == '__main__':
+    main(num_dirs=int(sys.argv[1]) if len(sys.argv) > 1 else 20, files_per_dir=int(sys.argv[2]) if len(sys.argv) > 2 else 500)
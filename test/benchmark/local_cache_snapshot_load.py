@@ -0,0 +1,145 @@
+import os
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Tuple
+
+from be.sqlite.base_db import Table
+from be.sqlite.content_meta_db import ContentMeta
+from be.sqlite.local_db import LocalDiskDatabase
+from be.tree_store.locald.ld_snapshot import LocalDiskSnapshot
+from constants import TrashStatus
+from model.node.locald_node import LocalDirNode, LocalFileNode
+from model.node.node import TNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from test.benchmark.fake_backend import FakeBackend, FakeCacheman
+
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/Users/me/Documents'
+FILES_PER_DIR = 9
+SYNC_TS = 1_600_000_000_000
+
+
+def _build_nodes(node_count: int, cacheman: FakeCacheman) -> List[TNode]:
+    node_list: List[TNode] = []
+    dir_list: List[LocalDirNode] = []
+    parent_uid, parent_path = ROOT_UID, ROOT_PATH
+    for uid in range(ROOT_UID + 1, ROOT_UID + 1 + node_count):
+        uid = UID(uid)
+        if len(node_list) % (FILES_PER_DIR + 1) == 0:
+            if dir_list:
+                grandparent = dir_list[(len(dir_list) - 1) // (FILES_PER_DIR + 1)]
+                grandparent_uid, grandparent_path = grandparent.uid, grandparent.get_single_path()
+            else:
+                grandparent_uid, grandparent_path = ROOT_UID, ROOT_PATH
+            dir_path = f'{grandparent_path}/dir{uid}'
+            node = LocalDirNode(LocalNodeIdentifier(uid, DEVICE_UID, dir_path), grandparent_uid, TrashStatus.NOT_TRASHED, is_live=True,
+                                sync_ts=SYNC_TS, create_ts=SYNC_TS, modify_ts=SYNC_TS, change_ts=SYNC_TS, all_children_fetched=True)
+            dir_list.append(node)
+            parent_uid, parent_path = uid, dir_path
+        else:
+            content_meta = ContentMeta(uid, md5=f'{uid:032x}', sha256=None, size_bytes=int(uid))
+            cacheman.content_meta_dict[uid] = content_meta
+            node = LocalFileNode(LocalNodeIdentifier(uid, DEVICE_UID, f'{parent_path}/file{uid}.txt'), parent_uid, content_meta,
+                                 size_bytes=int(uid), sync_ts=SYNC_TS, create_ts=SYNC_TS + uid, modify_ts=SYNC_TS + uid,
+                                 change_ts=SYNC_TS + uid, trashed=TrashStatus.NOT_TRASHED, is_live=True)
+        node_list.append(node)
+    return node_list
+
+
+def _read_rows_from_sqlite(db: LocalDiskDatabase) -> List[Tuple]:
+    return list(db.iter_local_dir_rows()) + list(db.iter_local_file_rows())
+
+
+def _iter_snapshot_chunks(db: LocalDiskDatabase, snapshot: LocalDiskSnapshot) -> Iterator[Tuple[Table, List[Tuple]]]:
+    cache_id, generation = db.get_cache_generation()
+    return snapshot.read(cache_id, generation, [LocalDiskDatabase.TABLE_LOCAL_DIR, LocalDiskDatabase.TABLE_LOCAL_FILE])
+
+
+def _read_rows_from_snapshot(db: LocalDiskDatabase, snapshot: LocalDiskSnapshot) -> List[Tuple]:
+    row_list: List[Tuple] = []
+    for _, chunk_row_list in _iter_snapshot_chunks(db, snapshot):
+        row_list += chunk_row_list
+    return row_list
+
+
+def _load_from_sqlite(db: LocalDiskDatabase) -> List[TNode]:
+    return list(db.iter_local_dirs()) + list(db.iter_local_files())
+
+
+def _load_from_snapshot(db: LocalDiskDatabase, snapshot: LocalDiskSnapshot, cacheman: FakeCacheman) -> List[TNode]:
+    node_list: List[TNode] = []
+    for table, row_list in _iter_snapshot_chunks(db, snapshot):
+        if table.name == LocalDiskDatabase.TABLE_LOCAL_DIR.name:
+            node_list += LocalDiskSnapshot.iter_dir_nodes(row_list, DEVICE_UID)
+        else:
+            node_list += LocalDiskSnapshot.iter_file_nodes(row_list, DEVICE_UID, cacheman.get_content_meta_for_uid)
+    return node_list
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def _assert_same(expected_list: List[TNode], actual_list: List[TNode]):
+    assert len(expected_list) == len(actual_list), f'Expected {len(expected_list)} nodes but got {len(actual_list)}'
+    for expected, actual in zip(expected_list, actual_list):
+        assert type(expected) == type(actual) and expected.to_tuple() == actual.to_tuple() \
+               and expected.node_identifier == actual.node_identifier, f'Loaded node differs: {actual} vs {expected}'
+
+
+def main(node_count: int):
+    """Times loading all the nodes of a synthetic local disk cache from its SQLite DB (as load_subtree() does with no current snapshot) vs from a
+    LocalDiskSnapshot of the same DB, streamed chunk by chunk. Each is timed reading just the rows, and reading the rows then building nodes;
+    both sides must yield the same rows & nodes. The UID mapper & ContentMeta lookups are dict-backed stand-ins, so the SQLite side is faster
+    here than in the app. Also checks that a no-op write keeps the snapshot current and a real write invalidates it."""
+    backend = FakeBackend(cacheman=FakeCacheman({ROOT_PATH: ROOT_UID}))
+    node_list = _build_nodes(node_count, backend.cacheman)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_location = os.path.join(tmp_dir, 'local_cache.db')
+        snapshot = LocalDiskSnapshot(LocalDiskSnapshot.get_file_path(cache_location), DEVICE_UID)
+
+        with LocalDiskDatabase(cache_location, backend, DEVICE_UID) as db:
+            db.insert_local_dirs([n for n in node_list if n.is_dir()], overwrite=False, commit=False)
+            db.insert_local_files([n for n in node_list if not n.is_dir()], overwrite=False, commit=True)
+            cache_id, generation = db.get_or_create_cache_generation()
+            _, write_sec = _timed(lambda: snapshot.write(cache_id, generation, [(LocalDiskDatabase.TABLE_LOCAL_DIR, db.iter_local_dir_rows()),
+                                                                                (LocalDiskDatabase.TABLE_LOCAL_FILE, db.iter_local_file_rows())]))
+
+        # Each load uses a freshly opened DB, as at startup:
+        with LocalDiskDatabase(cache_location, backend, DEVICE_UID) as db:
+            sqlite_row_list, sqlite_row_sec = _timed(lambda: _read_rows_from_sqlite(db))
+        with LocalDiskDatabase(cache_location, backend, DEVICE_UID) as db:
+            snapshot_row_list, snapshot_row_sec = _timed(lambda: _read_rows_from_snapshot(db, snapshot))
+            assert snapshot_row_list == sqlite_row_list, 'Rows read from snapshot differ from rows read from SQLite'
+        with LocalDiskDatabase(cache_location, backend, DEVICE_UID) as db:
+            sqlite_node_list, sqlite_sec = _timed(lambda: _load_from_sqlite(db))
+        with LocalDiskDatabase(cache_location, backend, DEVICE_UID) as db:
+            snapshot_node_list, snapshot_sec = _timed(lambda: _load_from_snapshot(db, snapshot, backend.cacheman))
+
+            expected_list = [n for n in node_list if n.is_dir()] + [n for n in node_list if not n.is_dir()]
+            _assert_same(expected_list, sqlite_node_list)
+            _assert_same(expected_list, snapshot_node_list)
+
+            # A write which changes nothing must not invalidate the snapshot, but any other write must:
+            db.upsert_local_file_list([])
+            assert snapshot.read_cache_generation() == db.get_cache_generation(), 'Snapshot was invalidated by a no-op write'
+            db.upsert_local_file(snapshot_node_list[-1])
+            cache_id, generation = db.get_cache_generation()
+            assert snapshot.read(cache_id, generation, [LocalDiskDatabase.TABLE_LOCAL_DIR, LocalDiskDatabase.TABLE_LOCAL_FILE]) is None, \
+                'Snapshot was not invalidated by a write'
+
+        db_mib = os.path.getsize(cache_location) / 1024 / 1024
+        snapshot_mib = os.path.getsize(snapshot.file_path) / 1024 / 1024
+
+    print(f'{node_count:n} nodes: SQLite {db_mib:.1f} MiB, snapshot {snapshot_mib:.1f} MiB (written in {write_sec:.2f}s)')
+    print(f'  rows only: SQLite {sqlite_row_sec:.2f}s, snapshot {snapshot_row_sec:.2f}s = {sqlite_row_sec / snapshot_row_sec:.1f}x faster')
+    print(f'  rows+nodes: SQLite {sqlite_sec:.2f}s, snapshot {snapshot_sec:.2f}s = {sqlite_sec / snapshot_sec:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main(node_count=int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
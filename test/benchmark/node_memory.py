@@ -0,0 +1,143 @@
+import gc
+import pickle
+import sys
+import tracemalloc
+from abc import ABC
+from typing import Dict, List
+
+from constants import TrashStatus
+from model.node.gdrive_node import GDriveFile, GDriveFolder
+from model.node.locald_node import LocalDirNode, LocalFileNode
+from model.node.node import TNode
+from model.node_identifier import GDriveIdentifier, LocalNodeIdentifier
+from model.uid import UID
+
+DEVICE_UID = UID(1)
+FILES_PER_DIR = 9
+SYNC_TS = 1_600_000_000_000
+
+_unslotted_class_dict: Dict[type, type] = {}
+
+
+def _get_unslotted_class(cls: type) -> type:
+    """Returns a copy of the given class (and of its bases which declare __slots__), minus the __slots__"""
+    if cls in (object, ABC) or '__slots__' not in vars(cls):
+        return cls
+    unslotted_class = _unslotted_class_dict.get(cls)
+    if not unslotted_class:
+        slot_set = set(cls.__slots__) | {'__slots__', '__dict__', '__weakref__'}
+        namespace = {k: v for k, v in vars(cls).items() if k not in slot_set}
+        bases = tuple(_get_unslotted_class(b) for b in cls.__bases__)
+        unslotted_class = type(cls)(cls.__name__, bases, namespace)
+        _unslotted_class_dict[cls] = unslotted_class
+    return unslotted_class
+
+
+def _get_slot_names(cls: type) -> List[str]:
+    return [slot for c in cls.__mro__ for slot in vars(c).get('__slots__', ())]
+
+
+def _to_unslotted(obj):
+    unslotted_obj = object.__new__(_get_unslotted_class(type(obj)))
+    for slot in _get_slot_names(type(obj)):
+        if hasattr(obj, slot):
+            setattr(unslotted_obj, slot, getattr(obj, slot))
+    return unslotted_obj
+
+
+def _build_local_tree(node_count: int) -> Dict[UID, TNode]:
+    uid_dict: Dict[UID, TNode] = {}
+    dir_list: List[LocalDirNode] = []
+    next_uid = 100
+    parent_uid = UID(next_uid)
+    parent_path = '/Users/me/Documents'
+    while len(uid_dict) < node_count:
+        if len(uid_dict) % (FILES_PER_DIR + 1) == 0:
+            # Each dir has FILES_PER_DIR files, and is a child of an earlier dir which has up to FILES_PER_DIR + 1 child dirs:
+            if dir_list:
+                grandparent = dir_list[(len(dir_list) - 1) // (FILES_PER_DIR + 1)]
+                grandparent_uid, grandparent_path = grandparent.uid, grandparent.get_single_path()
+            else:
+                grandparent_uid, grandparent_path = parent_uid, parent_path
+            dir_uid = UID(next_uid)
+            dir_path = f'{grandparent_path}/dir{next_uid}'
+            dir_node = LocalDirNode(LocalNodeIdentifier(dir_uid, DEVICE_UID, dir_path), grandparent_uid, TrashStatus.NOT_TRASHED,
+                                    is_live=True, sync_ts=SYNC_TS, create_ts=SYNC_TS, modify_ts=SYNC_TS, change_ts=SYNC_TS,
+                                    all_children_fetched=True)
+            uid_dict[dir_uid] = dir_node
+            dir_list.append(dir_node)
+            parent_uid, parent_path = dir_uid, dir_path
+        else:
+            file_uid = UID(next_uid)
+            uid_dict[file_uid] = LocalFileNode(LocalNodeIdentifier(file_uid, DEVICE_UID, f'{parent_path}/file{next_uid}.txt'), parent_uid,
+                                               content_meta=None, size_bytes=next_uid, sync_ts=SYNC_TS, create_ts=SYNC_TS + next_uid,
+                                               modify_ts=SYNC_TS + next_uid, change_ts=SYNC_TS + next_uid, trashed=TrashStatus.NOT_TRASHED,
+                                               is_live=True)
+        next_uid += 1
+    return uid_dict
+
+
+def _build_gdrive_tree(node_count: int) -> Dict[UID, TNode]:
+    uid_dict: Dict[UID, TNode] = {}
+    next_uid = 100
+    parent_uid = UID(next_uid)
+    while len(uid_dict) < node_count:
+        uid = UID(next_uid)
+        goog_id = f'1a2B3c4D5e6F7g8H9i0JkLmNoPqRsT{next_uid:010d}'
+        if len(uid_dict) % (FILES_PER_DIR + 1) == 0:
+            node = GDriveFolder(GDriveIdentifier(uid, DEVICE_UID, None), goog_id, f'folder{next_uid}', TrashStatus.NOT_TRASHED, SYNC_TS,
+                                SYNC_TS, owner_uid=None, drive_id=None, is_shared=False, shared_by_user_uid=None, sync_ts=SYNC_TS,
+                                all_children_fetched=True)
+        else:
+            node = GDriveFile(GDriveIdentifier(uid, DEVICE_UID, None), goog_id, f'file{next_uid}.txt', mime_type_uid=UID(5),
+                              trashed=TrashStatus.NOT_TRASHED, drive_id=None, version=1, content_meta=None, size_bytes=next_uid,
+                              is_shared=False, create_ts=SYNC_TS + next_uid, modify_ts=SYNC_TS + next_uid, owner_uid=None,
+                              shared_by_user_uid=None, sync_ts=SYNC_TS)
+        node.set_parent_uids(parent_uid)
+        uid_dict[uid] = node
+        if node.is_dir():
+            parent_uid = uid
+        next_uid += 1
+    return uid_dict
+
+
+def _check_pickle_round_trip(uid_dict: Dict[UID, TNode]):
+    for node in list(uid_dict.values())[:FILES_PER_DIR + 1]:
+        copy = pickle.loads(pickle.dumps(node))
+        assert type(copy) == type(node) and copy.to_tuple() == node.to_tuple() and copy.node_identifier == node.node_identifier \
+               and copy.get_parent_uids() == node.get_parent_uids(), f'Pickled copy differs: {copy} vs {node}'
+
+
+def _measure(desc: str, build_func, node_count: int):
+    gc.collect()
+    tracemalloc.start()
+    uid_dict = build_func(node_count)
+    gc.collect()
+    after_bytes = tracemalloc.get_traced_memory()[0]
+
+    _check_pickle_round_trip(uid_dict)
+
+    for uid, node in uid_dict.items():
+        unslotted_node = _to_unslotted(node)
+        unslotted_node.node_identifier = _to_unslotted(node.node_identifier)
+        uid_dict[uid] = unslotted_node
+    del node, unslotted_node
+    gc.collect()
+    before_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f'{desc:>6}: before {before_bytes / node_count:.0f} bytes/node, after {after_bytes / node_count:.0f} bytes/node '
+          f'({(before_bytes - after_bytes) / 1024 / 1024:.0f} MiB saved for {node_count:n} nodes)')
+
+
+def main(node_count: int):
+    """Memory per node of a synthetic local disk tree and a synthetic GDrive tree, each held in a UID -> node dict as the memstores hold them.
+    "after" is the tree as built, with __slots__ on the node & identifier classes. "before" is the same tree, with each node and identifier
+    replaced by an equivalent object which keeps its attributes in a __dict__. Both share the attribute values, so the difference is the
+    per-object overhead."""
+    _measure('local', _build_local_tree, node_count)
+    _measure('gdrive', _build_gdrive_tree, node_count)
+
+
+if __name__ == '__main__':
+    main(node_count=int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,129 @@
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from be.agent.grpc.conversion import GRPCConverter
+from be.agent.grpc.generated.Outlet_pb2 import SignalMsg
+from be.agent.svr.node_signal_batcher import NodeSignalBatcher
+from constants import TrashStatus
+from model.node.locald_node import LocalFileNode
+from model.node.node import SPIDNodePair
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from signal_constants import Signal
+
+TREE_ID = 'bench_tree'
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/Users/me/Documents'
+REMOVE_EVERY = 10
+SYNC_TS = 1_600_000_000_000
+MAX_BATCH_SIZE = 2000
+
+
+class _Stream:
+    """Stands in for the gRPC stream to a single client: holds each message as serialized bytes"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.msg_list: List[bytes] = []
+        self.encode_sec: float = 0.0
+
+    def send(self, signal_msg: SignalMsg, start: float):
+        msg_bytes = signal_msg.SerializeToString()
+        with self.lock:
+            self.msg_list.append(msg_bytes)
+            self.encode_sec += time.perf_counter() - start
+
+
+def _build_sn(node_uid: int, version: int) -> SPIDNodePair:
+    spid = LocalNodeIdentifier(UID(node_uid), DEVICE_UID, f'{ROOT_PATH}/file{node_uid}.txt', parent_guid=f'{DEVICE_UID}:{ROOT_UID}')
+    node = LocalFileNode(spid, ROOT_UID, None, version, SYNC_TS, SYNC_TS, version, SYNC_TS, TrashStatus.NOT_TRASHED, True)
+    return SPIDNodePair(spid, node)
+
+
+def _produce(add_upserted_func, add_removed_func, change_count: int, node_count: int) -> Dict[int, int]:
+    """Returns the producer's tree: node UID -> version"""
+    rnd = random.Random(0)
+    node_dict: Dict[int, int] = {}
+    for version in range(1, change_count + 1):
+        node_uid = rnd.randrange(ROOT_UID + 1, ROOT_UID + 1 + node_count)
+        if version % REMOVE_EVERY == 0:
+            node_dict.pop(node_uid, None)
+            add_removed_func(_build_sn(node_uid, version))
+        else:
+            node_dict[node_uid] = version
+            add_upserted_func(_build_sn(node_uid, version))
+    return node_dict
+
+
+def _run_per_node(converter: GRPCConverter, change_count: int, node_count: int):
+    stream = _Stream()
+
+    def send(sig: Signal, sn: SPIDNodePair):
+        start = time.perf_counter()
+        signal = SignalMsg(sig_int=sig, sender=TREE_ID)
+        converter.sn_to_grpc(sn, signal.sn)
+        stream.send(signal, start)
+
+    start = time.perf_counter()
+    node_dict = _produce(lambda sn: send(Signal.NODE_UPSERTED, sn), lambda sn: send(Signal.NODE_REMOVED, sn), change_count, node_count)
+    return node_dict, stream, time.perf_counter() - start
+
+
+def _run_batched(converter: GRPCConverter, change_count: int, node_count: int, window_ms: int):
+    stream = _Stream()
+    root_spid = LocalNodeIdentifier(ROOT_UID, DEVICE_UID, ROOT_PATH)
+
+    def send_batch(tree_id: str, upserted_sn_list: List[SPIDNodePair], removed_sn_list: List[SPIDNodePair]):
+        start = time.perf_counter()
+        signal = SignalMsg(sig_int=Signal.SUBTREE_NODES_CHANGED, sender=tree_id)
+        converter.node_identifier_to_grpc(root_spid, signal.subtree.subtree_root_spid)
+        converter.sn_list_to_grpc(upserted_sn_list, signal.subtree.upserted_sn_list)
+        converter.sn_list_to_grpc(removed_sn_list, signal.subtree.removed_sn_list)
+        stream.send(signal, start)
+
+    batcher = NodeSignalBatcher(window_ms, MAX_BATCH_SIZE, send_batch)
+    start = time.perf_counter()
+    node_dict = _produce(lambda sn: batcher.add_upserted(TREE_ID, sn), lambda sn: batcher.add_removed(TREE_ID, sn), change_count, node_count)
+    batcher.flush()
+    return node_dict, stream, time.perf_counter() - start
+
+
+def _apply_on_client(stream: _Stream) -> (Dict[int, int], float):
+    node_dict: Dict[int, int] = {}
+    start = time.perf_counter()
+    for msg_bytes in stream.msg_list:
+        signal = SignalMsg()
+        signal.ParseFromString(msg_bytes)
+        if signal.sig_int == Signal.NODE_UPSERTED:
+            node_dict[signal.sn.spid.node_uid] = signal.sn.node.local_file_meta.modify_ts
+        elif signal.sig_int == Signal.NODE_REMOVED:
+            node_dict.pop(signal.sn.spid.node_uid, None)
+        elif signal.sig_int == Signal.SUBTREE_NODES_CHANGED:
+            for grpc_sn in signal.subtree.removed_sn_list:
+                node_dict.pop(grpc_sn.spid.node_uid, None)
+            for grpc_sn in signal.subtree.upserted_sn_list:
+                node_dict[grpc_sn.spid.node_uid] = grpc_sn.node.local_file_meta.modify_ts
+    return node_dict, time.perf_counter() - start
+
+
+def main(change_count: int, node_count: int, window_ms: int):
+    """A burst of node upserts & removals in one display tree relayed to a gRPC client, comparing one NODE_UPSERTED / NODE_REMOVED SignalMsg
+    per node with a NodeSignalBatcher sending one SUBTREE_NODES_CHANGED per batch. Server cost is converting & serializing each message;
+    client cost is parsing each message and applying it to the client's copy of the tree, which must match the producer's after the burst."""
+    converter = GRPCConverter(outlet_backend=None)
+    print(f'{change_count:n} node changes for {node_count:n} nodes; batch window {window_ms}ms, max batch size {MAX_BATCH_SIZE:n}')
+    for desc, (node_dict, stream, produce_sec) in (('per-node', _run_per_node(converter, change_count, node_count)),
+                                                  ('batched', _run_batched(converter, change_count, node_count, window_ms))):
+        client_node_dict, apply_sec = _apply_on_client(stream)
+        assert client_node_dict == node_dict, f'{desc}: client has a different tree from the producer'
+        total_bytes = sum(len(msg_bytes) for msg_bytes in stream.msg_list)
+        print(f'{desc:>9}: {len(stream.msg_list):n} msgs ({total_bytes / 1024:,.0f} KiB), producer {produce_sec:.2f}s '
+              f'(of which convert+serialize {stream.encode_sec:.2f}s), client parse+apply {apply_sec:.2f}s')
+
+
+if __name__ == '__main__':
+    main(change_count=int(sys.argv[1]) if len(sys.argv) > 1 else 50_000, node_count=int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+         window_ms=int(sys.argv[3]) if len(sys.argv) > 3 else 50)
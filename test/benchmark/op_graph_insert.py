@@ -0,0 +1,182 @@
+import collections
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from be.exec.user_op.op_graph import OpGraph
+from be.exec.user_op.op_graph_node import DstOpNode, OpGraphNode, RmOpNode, SrcOpNode
+from constants import TrashStatus
+from logging_constants import OP_GRAPH_DEBUG_ENABLED
+from model.node.locald_node import LocalFileNode
+from model.node.node import TNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from model.user_op import UserOp, UserOpCode, UserOpResult, UserOpStatus
+from test.benchmark.dir_stats_update import DEVICE_UID, _TreeBuilder
+
+logger = logging.getLogger(__name__)
+
+BATCH_UID = UID(1)
+
+
+class _ScanningOpGraph(OpGraph):
+    """OpGraph with the old implementations of _find_ogn_list_for_children_of(), which visits every node queue in the graph, and of
+    _try_get(), which visits every child of root"""
+    def _find_ogn_list_for_children_of(self, potential_parent: TNode) -> List[OpGraphNode]:
+        ogn_child_list = []
+        for node_dict in self._node_ogn_q_dict.values():
+            for node_queue in node_dict.values():
+                if node_queue:
+                    existing_ogn = node_queue[-1]
+                    if potential_parent.is_parent_of(existing_ogn.get_tgt_node()):
+                        ogn_child_list.append(existing_ogn)
+        return ogn_child_list
+
+    def _try_get(self) -> Optional[UserOp]:
+        for ogn in self.root.get_child_list():
+            if OP_GRAPH_DEBUG_ENABLED:
+                logger.debug(f'[{self.name}] TryGet(): Examining {ogn}')
+            if self._is_ogn_ready(ogn):
+                self._add_outstanding_op(ogn.op)
+                return ogn.op
+        return None
+
+
+class _OgnFactory:
+    def __init__(self):
+        self._next_uid = 10_000_000
+        self._parent_by_uid: Dict[UID, UID] = {}
+
+    def next_uid(self) -> UID:
+        self._next_uid += 1
+        return UID(self._next_uid)
+
+    def register(self, node: TNode):
+        self._parent_by_uid[node.uid] = node.get_single_parent_uid()
+
+    def _ancestor_uid_list(self, node: TNode) -> List[UID]:
+        ancestor_list = []
+        parent_uid = node.get_single_parent_uid()
+        while parent_uid in self._parent_by_uid:
+            ancestor_list.append(parent_uid)
+            parent_uid = self._parent_by_uid[parent_uid]
+        ancestor_list.append(parent_uid)
+        return ancestor_list
+
+    def build_rm(self, node: TNode) -> List[OpGraphNode]:
+        op = UserOp(self.next_uid(), BATCH_UID, UserOpCode.RM, src_node=node)
+        return [RmOpNode(self.next_uid(), op, self._ancestor_uid_list(node))]
+
+    def build_cp(self, src_node: TNode, dst_node: TNode) -> List[OpGraphNode]:
+        op = UserOp(self.next_uid(), BATCH_UID, UserOpCode.CP, src_node=src_node, dst_node=dst_node)
+        return [SrcOpNode(self.next_uid(), op, self._ancestor_uid_list(src_node)),
+                DstOpNode(self.next_uid(), op, self._ancestor_uid_list(dst_node))]
+
+
+def _build_ogn_lists(dirs_per_level: int, depth: int, files_per_dir: int) -> Tuple[List[OpGraphNode], List[OpGraphNode]]:
+    builder = _TreeBuilder()
+    factory = _OgnFactory()
+
+    root = builder.build(dirs_per_level, depth, files_per_dir)
+    cp_src_root, *rm_root_list = builder.tree.get_child_list_for_node(root)
+    dst_dir = builder.add_dir(root, '/bench/dst')
+    for dir_node in builder.dir_list:
+        factory.register(dir_node)
+
+    cp_ogn_list = []
+    for src_node in _post_order(builder, cp_src_root):
+        if not src_node.is_dir():
+            dst_node = LocalFileNode(LocalNodeIdentifier(uid=factory.next_uid(), device_uid=DEVICE_UID,
+                                                         full_path=f'{dst_dir.get_single_path()}/{src_node.uid}_{src_node.name}'),
+                                     parent_uid=dst_dir.uid, content_meta=None, size_bytes=src_node.get_size_bytes(), sync_ts=0, create_ts=0,
+                                     modify_ts=0, change_ts=0, trashed=TrashStatus.NOT_TRASHED, is_live=False)
+            cp_ogn_list += factory.build_cp(src_node, dst_node)
+
+    rm_ogn_list = []
+    for rm_root in rm_root_list:
+        for node in _post_order(builder, rm_root):
+            rm_ogn_list += factory.build_rm(node)
+
+    return cp_ogn_list, rm_ogn_list
+
+
+def _post_order(builder: _TreeBuilder, node: TNode) -> List[TNode]:
+    node_list = []
+    for child in builder.tree.get_child_list_for_node(node):
+        node_list += _post_order(builder, child)
+    node_list.append(node)
+    return node_list
+
+
+def _get_structure(graph: OpGraph) -> Dict[Tuple[UID, bool], List[Tuple[UID, bool]]]:
+    """op_uid & is_src of each OGN -> those of its parents, so that graphs built from different OGN copies can be compared"""
+    structure = {}
+    for ogn in graph.root.get_subgraph_bfs_list():
+        if not ogn.is_root():
+            structure[(ogn.op.op_uid, ogn.is_src())] = sorted((p.op.op_uid, p.is_src()) if not p.is_root() else (UID(0), False)
+                                                              for p in ogn.get_parent_list())
+    return structure
+
+
+def _drain(graph: OpGraph, max_outstanding: int) -> List[UserOp]:
+    """Keeps up to max_outstanding ops checked out at a time (as several executors would), completing the oldest each time the limit is
+    reached or no more ops are ready"""
+    op_list = []
+    outstanding_op_queue = collections.deque()
+    while True:
+        op = graph.get_next_op_nowait() if len(outstanding_op_queue) < max_outstanding else None
+        if op:
+            outstanding_op_queue.append(op)
+        elif outstanding_op_queue:
+            op = outstanding_op_queue.popleft()
+            op.result = UserOpResult(status=UserOpStatus.COMPLETED_OK)
+            graph.pop_completed_op(op.op_uid)
+            op_list.append(op)
+        else:
+            return op_list
+
+
+def main(dirs_per_level: int, depth: int, files_per_dir: int, max_outstanding: int):
+    """Cost of inserting a large CP batch and then an RM batch into an OpGraph and draining it, with the old scans (of every node queue in the
+    graph for each RM insert, and of every child of root for each op fetched) vs. the index of queued nodes by parent and the ready queue.
+    The RM batch deletes each subtree but the first bottom-up; the graphs built each way must be identical. Draining keeps up to
+    max_outstanding ops checked out at once."""
+    cp_ogn_list, rm_ogn_list = _build_ogn_lists(dirs_per_level, depth, files_per_dir)
+    print(f'{len(cp_ogn_list)} CP OGNs, then {len(rm_ogn_list)} RM OGNs')
+
+    structure_list = []
+    for graph in (_ScanningOpGraph('Scan'), OpGraph('Index')):
+        start = time.perf_counter()
+        for ogn in cp_ogn_list:
+            graph.insert_ogn(ogn)
+        cp_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for ogn in rm_ogn_list:
+            graph.insert_ogn(ogn)
+        rm_sec = time.perf_counter() - start
+
+        graph.validate_internal_consistency()
+        structure_list.append(_get_structure(graph))
+
+        start = time.perf_counter()
+        drained_op_list = _drain(graph, max_outstanding)
+        drain_sec = time.perf_counter() - start
+        assert len(drained_op_list) == len({ogn.op.op_uid for ogn in cp_ogn_list + rm_ogn_list}), 'Graph was not fully drained!'
+        assert len(graph) == 0, f'Graph still has {len(graph)} OGNs'
+        for op in drained_op_list:
+            op.reset_result()
+
+        print(f'{graph.name:>6}: CP batch {cp_sec:.3f}s ({cp_sec / len(cp_ogn_list) * 1_000_000:.1f}µs/OGN), '
+              f'RM batch {rm_sec:.3f}s ({rm_sec / len(rm_ogn_list) * 1_000_000:.1f}µs/OGN), '
+              f'drain {drain_sec:.3f}s ({drain_sec / len(drained_op_list) * 1_000_000:.1f}µs/op)')
+
+    assert structure_list[0] == structure_list[1], 'Graphs differ!'
+
+
+if __name__ == '__main__':
+    main(dirs_per_level=int(sys.argv[1]) if len(sys.argv) > 1 else 6,
+         depth=int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+         files_per_dir=int(sys.argv[3]) if len(sys.argv) > 3 else 10,
+         max_outstanding=int(sys.argv[4]) if len(sys.argv) > 4 else 100)
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from be.tree_store.locald import sig_calc
+
+CHUNK_SIZE_LIST = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def _time_best_of(repeat_count: int, func) -> float:
+    best = None
+    for _ in range(repeat_count):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _md5_then_sha256(file_path: str, chunk_size: int):
+    """What the old code would have needed in order to get both signatures: two separate reads"""
+    with mock.patch.object(sig_calc, 'READ_CHUNK_SIZE', chunk_size):
+        sig_calc._compute_md5_in_python(file_path)
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+
+
+def main(file_size_mb: int, repeat_count: int):
+    """MD5-only hashing (_compute_md5_in_python) vs the single-pass compute_digests(), which gets MD5 + SHA-256 (and optionally the Dropbox
+    content hash) from one read of each file, at several values of READ_CHUNK_SIZE. The file is read once before timing, so both read from
+    the OS page cache; drop the caches between runs to measure cold reads."""
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        file_path = f.name
+        f.write(os.urandom(file_size_mb * 1024 * 1024))
+
+    try:
+        # Check correctness, and warm the page cache:
+        md5, sha256, dropbox_hash = sig_calc.compute_digests(file_path, include_dropbox_hash=True)
+        assert md5 == sig_calc._compute_md5_in_python(file_path)
+        assert dropbox_hash == sig_calc.compute_dropbox_hash(file_path)
+
+        print(f'File size: {file_size_mb} MB; best of {repeat_count} runs; throughput in MB/s')
+        print(f'{"chunk size":>12} {"MD5 only":>10} {"MD5,SHA256":>11} {"MD5+SHA256":>11} {"+Dropbox":>10}')
+        print(f'{"":>12} {"(current)":>10} {"(2 reads)":>11} {"(1 pass)":>11} {"(1 pass)":>10}')
+        for chunk_size in CHUNK_SIZE_LIST:
+            def _md5_only():
+                with mock.patch.object(sig_calc, 'READ_CHUNK_SIZE', chunk_size):
+                    sig_calc._compute_md5_in_python(file_path)
+
+            result_list = [
+                _time_best_of(repeat_count, _md5_only),
+                _time_best_of(repeat_count, lambda: _md5_then_sha256(file_path, chunk_size)),
+                _time_best_of(repeat_count, lambda: sig_calc.compute_digests(file_path, chunk_size=chunk_size)),
+                _time_best_of(repeat_count, lambda: sig_calc.compute_digests(file_path, include_dropbox_hash=True, chunk_size=chunk_size)),
+            ]
+            mb_per_sec_list = [file_size_mb / elapsed for elapsed in result_list]
+            print(f'{chunk_size // 1024:>10}KB {mb_per_sec_list[0]:>10.1f} {mb_per_sec_list[1]:>11.1f} {mb_per_sec_list[2]:>11.1f} '
+                  f'{mb_per_sec_list[3]:>10.1f}')
+    finally:
+        os.remove(file_path)
+
+
+if __name__ == '__main__':
+    main(file_size_mb=int(sys.argv[1]) if len(sys.argv) > 1 else 256, repeat_count=int(sys.argv[2]) if len(sys.argv) > 2 else 3)
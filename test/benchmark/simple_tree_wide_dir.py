@@ -0,0 +1,58 @@
+import random
+import sys
+import time
+from collections import namedtuple
+
+from util.simple_tree import SimpleTree
+
+_Node = namedtuple('_Node', 'identifier name')
+
+
+def _run(width: int):
+    tree = SimpleTree[int, _Node](extract_identifier_func=lambda n: n.identifier)
+    root = _Node(0, 'root')
+    tree.add_node(root, parent=None)
+
+    start = time.perf_counter()
+    for i in range(1, width + 1):
+        tree.add_node(_Node(i, f'child{i}'), parent=root)
+    add_sec = time.perf_counter() - start
+
+    identifier_list = list(range(1, width + 1))
+    random.Random(width).shuffle(identifier_list)
+
+    start = time.perf_counter()
+    for i in identifier_list:
+        tree.swap_with_existing_node(_Node(i, f'swapped{i}'))
+    swap_sec = time.perf_counter() - start
+
+    child_list = tree.get_child_list_for_identifier(0)
+    assert [c.identifier for c in child_list] == list(range(1, width + 1)), 'Child order was not preserved'
+    assert all(c.name.startswith('swapped') for c in child_list)
+
+    removed_list = identifier_list[:width // 2]
+    start = time.perf_counter()
+    for i in removed_list:
+        tree.remove_node(i)
+    remove_sec = time.perf_counter() - start
+
+    removed_set = set(removed_list)
+    assert [c.identifier for c in tree.get_child_list_for_identifier(0)] == [i for i in range(1, width + 1) if i not in removed_set]
+    assert len(tree) == width - len(removed_list) + 1
+
+    def _per_op(sec: float, count: int) -> str:
+        return f'{sec / count * 1_000_000:.2f}µs/op'
+
+    print(f'width={width:>7}: add {_per_op(add_sec, width)}, swap {_per_op(swap_sec, width)}, remove {_per_op(remove_sec, len(removed_list))}')
+
+
+def main(width_list):
+    """Cost of adding, swapping and removing children of one very wide dir in a SimpleTree (which LocalDiskTree and ChangeTree are built on).
+    With keyed child containers the per-op cost should stay flat as the dir gets wider; with the old list-backed children, swap & remove grew
+    linearly with its width."""
+    for width in width_list:
+        _run(width)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,99 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from be.sqlite.base_db import LiveTable, MetaDatabase, SqliteSettings, Table
+
+TABLE_NODE = Table(name='node', cols=OrderedDict([
+    ('uid', 'INTEGER PRIMARY KEY'),
+    ('parent_uid', 'INTEGER'),
+    ('md5', 'TEXT'),
+    ('size_bytes', 'INTEGER'),
+    ('sync_ts', 'INTEGER'),
+    ('full_path', 'TEXT')
+]))
+
+WRITE_BATCH_SIZE = 500
+RANGE_SCAN_SIZE = 50
+
+SETTINGS_BY_MODE = {
+    'legacy': SqliteSettings(journal_mode='DELETE', synchronous='FULL', cache_size_kb=2000, mmap_size_mb=0),
+    'wal': SqliteSettings(journal_mode='WAL', synchronous='NORMAL', cache_size_kb=65536, mmap_size_mb=256),
+}
+
+
+def _make_row(uid: int, rnd: random.Random):
+    return uid, uid // 100, f'{rnd.getrandbits(128):032x}', rnd.randint(0, 1 << 30), int(time.time() * 1000), f'/synthetic/dir{uid // 100}/file{uid}'
+
+
+def _populate(db_path: str, row_count: int):
+    rnd = random.Random(row_count)
+    with MetaDatabase(db_path, settings=SETTINGS_BY_MODE['legacy']) as db:
+        table = LiveTable(TABLE_NODE, db.conn)
+        table.create_table_if_not_exist()
+        table.insert_many([_make_row(uid, rnd) for uid in range(1, row_count + 1)])
+
+
+def _run(mode: str, db_path: str, row_count: int, reader_count: int, seconds: float):
+    db = MetaDatabase(db_path, settings=SETTINGS_BY_MODE[mode])
+    table = LiveTable(TABLE_NODE, db.conn)
+    stop_event = threading.Event()
+    write_count = [0]
+    read_count_list = [0] * reader_count
+    max_read_latency_list = [0.0] * reader_count
+
+    def _write():
+        rnd = random.Random(0)
+        while not stop_event.is_set():
+            start_uid = rnd.randint(1, row_count - WRITE_BATCH_SIZE)
+            table.upsert_many([_make_row(uid, rnd) for uid in range(start_uid, start_uid + WRITE_BATCH_SIZE)])
+            write_count[0] += WRITE_BATCH_SIZE
+
+    def _read(reader_index: int):
+        rnd = random.Random(reader_index + 1)
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            uid = rnd.randint(1, row_count - RANGE_SCAN_SIZE)
+            if rnd.random() < 0.5:
+                row = table.select_row_for_uid(uid)
+                assert row and row[0] == uid
+            else:
+                row_list = table.select(' WHERE uid >= ? AND uid < ?', (uid, uid + RANGE_SCAN_SIZE))
+                assert len(row_list) == RANGE_SCAN_SIZE
+            max_read_latency_list[reader_index] = max(max_read_latency_list[reader_index], time.perf_counter() - start)
+            read_count_list[reader_index] += 1
+
+    thread_list = [threading.Thread(target=_write, daemon=True)] + \
+                  [threading.Thread(target=_read, args=(i,), daemon=True) for i in range(reader_count)]
+    for thread in thread_list:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in thread_list:
+        thread.join()
+    db.close()
+
+    print(f'{mode:>7}: {sum(read_count_list) / seconds:>9.0f} reads/s, {write_count[0] / seconds:>8.0f} rows written/s, '
+          f'max read latency {max(max_read_latency_list) * 1000:.1f}ms')
+
+
+def main(row_count: int, reader_count: int, seconds: float):
+    """Read & write throughput of a synthetic node cache under concurrent load, with the old connection settings (rollback journal,
+    synchronous=FULL, default cache) vs. the node_cache role's (WAL, synchronous=NORMAL, bigger cache, mmap). One writer thread upserts
+    batches of rows while the reader threads look up single rows and scan small UID ranges, all through the single connection."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'synthetic_cache.db')
+        _populate(db_path, row_count)
+        print(f'{row_count} rows, 1 writer, {reader_count} readers, {seconds}s per mode')
+        for mode in SETTINGS_BY_MODE.keys():
+            _run(mode, db_path, row_count, reader_count, seconds)
+
+
+if __name__ == '__main__':
+    main(row_count=int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         reader_count=int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+         seconds=float(sys.argv[3]) if len(sys.argv) > 3 else 5.0)
@@ -0,0 +1,191 @@
+import logging
+import random
+import threading
+import unittest
+from typing import Dict, List, Optional
+
+from be.agent.grpc.generated.Outlet_pb2 import SignalMsg
+from be.agent.svr.client_signal_queue import ClientSignalQueue
+from signal_constants import Signal
+
+logger = logging.getLogger(__name__)
+
+TREE_ID = 'test_tree'
+ROOT_UID = 1
+DTC_KEY = (Signal.DISPLAY_TREE_CHANGED, TREE_ID)
+
+
+class Producer:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS Producer
+
+    Owns a tree of node UID -> parent UID, and puts a signal in the queue for each change to it, as OutletGRPCService does. Each
+    DISPLAY_TREE_CHANGED (including those built for a resync) carries a copy of the whole tree, for the client to replace its own with.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, max_size: int, seed: int):
+        self.lock = threading.Lock()
+        self.rnd = random.Random(seed)
+        self.parent_dict: Dict[int, int] = {ROOT_UID: 0}
+        self.next_uid: int = ROOT_UID + 1
+        # SignalMsgs can't carry a dict, so tree copies are looked up by the identity of the signal which carries them:
+        self.tree_copy_dict: Dict[int, Dict[int, int]] = {}
+        self.msg_list: List[SignalMsg] = []
+        self.queue = ClientSignalQueue('test_client', max_size, self.build_resync_signal_list)
+
+    def _build_tree_changed_signal(self) -> SignalMsg:
+        signal = SignalMsg(sig_int=Signal.DISPLAY_TREE_CHANGED, sender=TREE_ID)
+        self.tree_copy_dict[id(signal)] = dict(self.parent_dict)
+        self.msg_list.append(signal)  # keep it alive, so that its id is not reused
+        return signal
+
+    def build_resync_signal_list(self) -> List[SignalMsg]:
+        with self.lock:
+            return [self._build_tree_changed_signal()]
+
+    def change_tree(self):
+        with self.lock:
+            choice = self.rnd.random()
+            if choice < 0.05:
+                self.queue.put(self._build_tree_changed_signal(), coalesce_key=DTC_KEY)
+                return
+
+            leaf_set = set(self.parent_dict.keys()) - set(self.parent_dict.values()) - {ROOT_UID}
+            if choice < 0.35 and leaf_set:
+                node_uid = self.rnd.choice(sorted(leaf_set))
+                del self.parent_dict[node_uid]
+                signal = SignalMsg(sig_int=Signal.NODE_REMOVED, sender=TREE_ID)
+            else:
+                node_uid = self.next_uid
+                self.next_uid += 1
+                self.parent_dict[node_uid] = self.rnd.choice(sorted(self.parent_dict.keys()))
+                signal = SignalMsg(sig_int=Signal.NODE_UPSERTED, sender=TREE_ID)
+                signal.sn.spid.spid_meta.parent_guid = str(self.parent_dict[node_uid])
+            signal.sn.spid.node_uid = node_uid
+            self.queue.put(signal)
+
+
+class Client:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS Client
+
+    Applies the signals it gets from the producer's queue to its own copy of the tree. If strict, fails if it is ever sent a node before
+    the node's parent, or the removal of a node before the removal of its children.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, producer: Producer, is_strict: bool):
+        self.producer = producer
+        self.is_strict = is_strict
+        self.parent_dict: Dict[int, int] = {ROOT_UID: 0}
+
+    def apply(self, signal: SignalMsg):
+        node_uid = signal.sn.spid.node_uid
+        if signal.sig_int == Signal.DISPLAY_TREE_CHANGED:
+            self.parent_dict = dict(self.producer.tree_copy_dict[id(signal)])
+        elif signal.sig_int == Signal.NODE_UPSERTED:
+            parent_uid = int(signal.sn.spid.spid_meta.parent_guid)
+            if self.is_strict:
+                assert parent_uid in self.parent_dict, f'Got node {node_uid} before its parent {parent_uid}'
+            self.parent_dict[node_uid] = parent_uid
+        elif signal.sig_int == Signal.NODE_REMOVED:
+            if self.is_strict:
+                assert node_uid in self.parent_dict, f'Got removal of node {node_uid}, which it does not have'
+                assert node_uid not in self.parent_dict.values(), f'Got removal of node {node_uid} before removal of its children'
+            self.parent_dict.pop(node_uid, None)
+
+    def get_and_apply(self) -> Optional[SignalMsg]:
+        signal = self.producer.queue.get()
+        if signal is not None and signal.sig_int != Signal.SHUTDOWN_APP:
+            self.apply(signal)
+        return signal
+
+    def drain(self):
+        """Gets & applies signals until the queue is empty, including any resync it still owes"""
+        self.producer.queue.put(SignalMsg(sig_int=Signal.SHUTDOWN_APP, sender=TREE_ID))
+        while self.get_and_apply().sig_int != Signal.SHUTDOWN_APP:
+            pass
+
+
+class ClientSignalQueueTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS ClientSignalQueueTest
+
+    Checks that a client which applies everything it gets from its ClientSignalQueue ends up with the producer's tree, whether or not
+    signals are coalesced or the queue overflows, and that it never gets a child before its parent.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def test_coalesced_signal_moves_after_children(self):
+        producer = Producer(max_size=100, seed=0)
+        client = Client(producer, is_strict=True)
+        producer.queue.put(producer._build_tree_changed_signal(), coalesce_key=DTC_KEY)
+        # A parent & child are added after the first tree copy was taken, but before the second:
+        for node_uid, parent_uid in ((2, ROOT_UID), (3, 2)):
+            producer.parent_dict[node_uid] = parent_uid
+            signal = SignalMsg(sig_int=Signal.NODE_UPSERTED, sender=TREE_ID)
+            signal.sn.spid.node_uid = node_uid
+            signal.sn.spid.spid_meta.parent_guid = str(parent_uid)
+            producer.queue.put(signal)
+        # Remove both, then replace the tree: the old copy must not be applied after the nodes which it does not have
+        del producer.parent_dict[3]
+        del producer.parent_dict[2]
+        producer.queue.put(producer._build_tree_changed_signal(), coalesce_key=DTC_KEY)
+
+        self.assertEqual(1, producer.queue.coalesced_count)
+        self.assertEqual([Signal.NODE_UPSERTED, Signal.NODE_UPSERTED, Signal.DISPLAY_TREE_CHANGED],
+                         [client.get_and_apply().sig_int for _ in range(3)])
+        self.assertEqual(producer.parent_dict, client.parent_dict)
+
+    def test_interleaved_converges(self):
+        """Producer & client take turns at random, so that every ordering is checked (strictly) without depending on thread timing.
+        The client falls behind, so that the queue both coalesces & overflows."""
+        overflow_count = 0
+        coalesced_count = 0
+        for seed in range(20):
+            producer = Producer(max_size=20, seed=seed)
+            client = Client(producer, is_strict=True)
+            for _ in range(1000):
+                producer.change_tree()
+                if producer.rnd.random() < 0.1:
+                    for _ in range(min(len(producer.queue), producer.rnd.randrange(1, 10))):
+                        client.get_and_apply()
+            client.drain()
+
+            self.assertEqual(producer.parent_dict, client.parent_dict, f'Client tree differs from producer (seed={seed})')
+            overflow_count += producer.queue.overflow_count
+            coalesced_count += producer.queue.coalesced_count
+
+        self.assertGreater(overflow_count, 0)
+        self.assertGreater(coalesced_count, 0)
+
+    def test_concurrent_converges(self):
+        """A resync built while the producer is still running can include changes which are then also sent after it, so here the client
+        only needs to end up with the producer's tree"""
+        producer = Producer(max_size=50, seed=0)
+        client = Client(producer, is_strict=False)
+
+        def consume():
+            while client.get_and_apply().sig_int != Signal.SHUTDOWN_APP:
+                pass
+
+        consumer_thread = threading.Thread(target=consume, daemon=True)
+        consumer_thread.start()
+        for _ in range(5000):
+            producer.change_tree()
+        producer.queue.put(SignalMsg(sig_int=Signal.SHUTDOWN_APP, sender=TREE_ID))
+        consumer_thread.join(timeout=60)
+
+        self.assertFalse(consumer_thread.is_alive())
+        self.assertEqual(producer.parent_dict, client.parent_dict)
+
+    def test_close_wakes_consumer(self):
+        producer = Producer(max_size=10, seed=0)
+        result_list = []
+        consumer_thread = threading.Thread(target=lambda: result_list.append(producer.queue.get()), daemon=True)
+        consumer_thread.start()
+        producer.queue.close()
+        consumer_thread.join(timeout=10)
+        self.assertEqual([None], result_list)
@@ -0,0 +1,140 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from typing import Dict, List
+
+from be.content_meta_manager import ContentMetaManager
+from be.sqlite.content_meta_db import ContentMeta, ContentMetaDatabase
+from test.benchmark.fake_backend import FakeBackend
+
+logger = logging.getLogger(__name__)
+
+THREAD_COUNT = 8
+META_PER_THREAD = 300
+# Small, so that batches are written by many different threads while others are still creating ContentMetas:
+INSERT_BATCH_SIZE = 25
+# Long enough that the timer never fires during a test which does not wait for it:
+LONG_HOLDOFF_MS = 60_000
+
+
+def _md5(i: int) -> str:
+    return f'{i:032x}'
+
+
+def _sha256(i: int) -> str:
+    return f'{i:064x}'
+
+
+class ContentMetaManagerTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS ContentMetaManagerTest
+
+    Checks that ContentMetas which are buffered & written in batches are each persisted exactly once, and can be looked up before they are.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_path = os.path.join(tmp_dir.name, 'content_meta.db')
+
+    def _start_manager(self, insert_batch_size: int, insert_holdoff_ms: int) -> ContentMetaManager:
+        self.backend = FakeBackend(config_dict={'cache.content_meta.insert_batch_size': insert_batch_size,
+                                                'cache.content_meta.insert_holdoff_ms': insert_holdoff_ms})
+        manager = ContentMetaManager(self.backend, self.db_path)
+        manager.start()
+        self.addCleanup(manager.shutdown)
+        return manager
+
+    def _read_persisted(self) -> List[ContentMeta]:
+        """Reads what has been committed, through a connection of its own"""
+        db = ContentMetaDatabase(self.backend, self.db_path)
+        try:
+            return db.get_all()
+        finally:
+            db.close()
+
+    def test_concurrent_inserts_persisted_once(self):
+        manager = self._start_manager(INSERT_BATCH_SIZE, LONG_HOLDOFF_MS)
+        result_dict_list: List[Dict[int, ContentMeta]] = [{} for _ in range(THREAD_COUNT)]
+        error_list: List[Exception] = []
+        start_barrier = threading.Barrier(THREAD_COUNT)
+
+        def _create_metas(thread_index: int):
+            try:
+                start_barrier.wait()
+                # Each signature is also requested by the next thread along, so that threads race to create the same ContentMeta:
+                for i in range(thread_index * META_PER_THREAD // 2, thread_index * META_PER_THREAD // 2 + META_PER_THREAD):
+                    if i % 2:
+                        meta = manager.get_or_create_content_meta_for(i, md5=_md5(i))
+                    else:
+                        meta = manager.get_or_create_content_meta_for(i, sha256=_sha256(i))
+                    result_dict_list[thread_index][i] = meta
+            except Exception as err:
+                error_list.append(err)
+
+        thread_list = [threading.Thread(target=_create_metas, args=(thread_index,)) for thread_index in range(THREAD_COUNT)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join(timeout=30)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual([], error_list)
+
+        # Every thread got the same ContentMeta for the same signature:
+        meta_by_size: Dict[int, ContentMeta] = {}
+        for result_dict in result_dict_list:
+            for i, meta in result_dict.items():
+                self.assertIs(meta_by_size.setdefault(i, meta), meta, f'Got two ContentMetas for signature #{i}')
+        expected_count = (THREAD_COUNT + 1) * META_PER_THREAD // 2
+        self.assertEqual(expected_count, len(meta_by_size))
+
+        manager.flush_pending_inserts()
+        persisted_list = self._read_persisted()
+        self.assertEqual(expected_count, len(persisted_list), 'Some ContentMetas were lost or written more than once')
+        self.assertEqual(sorted(meta.to_tuple() for meta in meta_by_size.values()), sorted(meta.to_tuple() for meta in persisted_list))
+
+        # Nothing left to write:
+        manager.flush_pending_inserts()
+        self.assertEqual(expected_count, len(self._read_persisted()))
+
+    def test_lookup_before_timer_fires(self):
+        manager = self._start_manager(insert_batch_size=1000, insert_holdoff_ms=LONG_HOLDOFF_MS)
+        md5_meta = manager.get_or_create_content_meta_for(1, md5=_md5(1))
+        sha256_meta = manager.get_or_create_content_meta_for(2, sha256=_sha256(2))
+        self.assertEqual([], self._read_persisted())
+
+        # Still pending, but found by signature & by UID, and not created again:
+        self.assertIs(md5_meta, manager.get_or_create_content_meta_for(1, md5=_md5(1)))
+        self.assertIs(sha256_meta, manager.get_or_create_content_meta_for(2, sha256=_sha256(2)))
+        self.assertIs(md5_meta, manager.get_content_meta_for_uid(md5_meta.uid))
+        self.assertIs(sha256_meta, manager.get_content_meta_for_uid(sha256_meta.uid))
+        self.assertEqual([], self._read_persisted())
+
+        manager.flush_pending_inserts()
+        self.assertEqual(sorted([md5_meta.to_tuple(), sha256_meta.to_tuple()]), sorted(meta.to_tuple() for meta in self._read_persisted()))
+
+    def test_written_after_holdoff(self):
+        manager = self._start_manager(insert_batch_size=1000, insert_holdoff_ms=50)
+        meta = manager.get_or_create_content_meta_for(1, md5=_md5(1))
+
+        deadline = time.monotonic() + 10
+        while not self._read_persisted() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual([meta.to_tuple()], [persisted.to_tuple() for persisted in self._read_persisted()])
+
+    def test_shutdown_stops_timer(self):
+        """Pending ContentMetas are written at shutdown, and the timer's thread exits then, rather than waiting out the holdoff"""
+        manager = self._start_manager(insert_batch_size=1000, insert_holdoff_ms=LONG_HOLDOFF_MS)
+        meta = manager.get_or_create_content_meta_for(1, md5=_md5(1))
+        timer_thread = manager._insert_timer._thread
+        self.assertTrue(timer_thread.is_alive())
+
+        manager.shutdown()
+        timer_thread.join(timeout=2)
+        self.assertFalse(timer_thread.is_alive())
+        self.assertEqual([meta.to_tuple()], [persisted.to_tuple() for persisted in self._read_persisted()])
@@ -0,0 +1,167 @@
+import logging
+import random
+import unittest
+from collections import deque
+from typing import Dict, List, Tuple
+
+from be.tree_store.locald.ld_tree import LocalDiskTree
+from constants import TrashStatus
+from model.node.dir_stats import DirStats
+from model.node.locald_node import LocalDirNode, LocalFileNode, LocalNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(2)
+TREE_ID = 'test_tree'
+
+
+class TreeBuilder:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS TreeBuilder
+
+    Builds & changes a LocalDiskTree under /test. Each change returns the UIDs of the dirs whose direct children changed, as
+    ActiveTreeManager would report them.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self):
+        self._last_uid = 100
+        self.tree = LocalDiskTree(backend=None)
+        self.root = self.add_dir(None, 'test')
+
+    def next_uid(self) -> UID:
+        self._last_uid += 1
+        return UID(self._last_uid)
+
+    def add_dir(self, parent, name: str, uid: UID = None) -> LocalDirNode:
+        full_path = f'{parent.get_single_path()}/{name}' if parent else f'/{name}'
+        node = LocalDirNode(LocalNodeIdentifier(uid=uid or self.next_uid(), device_uid=DEVICE_UID, full_path=full_path),
+                            parent_uid=parent.uid if parent else UID(1), trashed=TrashStatus.NOT_TRASHED, is_live=True, sync_ts=0, create_ts=0,
+                            modify_ts=0, change_ts=0, all_children_fetched=True)
+        self.tree.add_node(node, parent)
+        return node
+
+    def add_file(self, parent: LocalDirNode, name: str, size_bytes: int, trashed: TrashStatus = TrashStatus.NOT_TRASHED) -> LocalFileNode:
+        node = LocalFileNode(LocalNodeIdentifier(uid=self.next_uid(), device_uid=DEVICE_UID, full_path=f'{parent.get_single_path()}/{name}'),
+                             parent_uid=parent.uid, content_meta=None, size_bytes=size_bytes, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                             trashed=trashed, is_live=True)
+        self.tree.add_node(node, parent)
+        return node
+
+    def get_dir_list(self) -> List[LocalNode]:
+        return [node for node in self.tree.get_subtree_bfs_node_list(self.root.uid) if node.is_dir()]
+
+    def remove(self, node: LocalNode) -> List[UID]:
+        parent_uid = self.tree.get_parent(node.uid).uid
+        self.tree.remove_node(node.uid)
+        return [parent_uid]
+
+    def move_dir(self, dir_node: LocalDirNode, new_parent: LocalDirNode) -> List[UID]:
+        """Moves the dir with all its descendants, keeping their UIDs (as a GDrive move does)"""
+        old_parent_uid = self.tree.get_parent(dir_node.uid).uid
+        moved_list: List[Tuple[LocalNode, LocalNode]] = []
+        queue = deque([(dir_node, new_parent)])
+        while queue:
+            node, parent = queue.popleft()
+            moved_list.append((node, parent))
+            queue.extend((child, node) for child in self.tree.get_child_list_for_node(node))
+
+        self.tree.remove_node(dir_node.uid)
+        for node, parent in moved_list:
+            self.tree.add_node(node, parent)
+        return [old_parent_uid, new_parent.uid]
+
+    def apply_random_change(self, rnd: random.Random) -> List[UID]:
+        dir_list = self.get_dir_list()
+        dir_node = rnd.choice(dir_list)
+        child_list = self.tree.get_child_list_for_node(dir_node)
+        roll = rnd.random()
+        if roll < 0.15:
+            new_dir = self.add_dir(dir_node, f'd{self._last_uid}')
+            for i in range(rnd.randint(0, 3)):
+                self.add_file(new_dir, f'f{i}', size_bytes=rnd.randint(0, 1000))
+            return [dir_node.uid]
+        elif roll < 0.25 and dir_node.uid != self.root.uid:
+            return self.remove(dir_node)
+        elif roll < 0.35 and dir_node.uid != self.root.uid:
+            # Never move a dir into its own subtree:
+            subtree_uid_set = {node.uid for node in self.tree.get_subtree_bfs_node_list(dir_node.uid)}
+            new_parent = rnd.choice([d for d in dir_list if d.uid not in subtree_uid_set])
+            return self.move_dir(dir_node, new_parent)
+        elif roll < 0.6 and child_list:
+            return self.remove(rnd.choice(child_list))
+        else:
+            trashed = TrashStatus.EXPLICITLY_TRASHED if roll > 0.9 else TrashStatus.NOT_TRASHED
+            self.add_file(dir_node, f'f{self._last_uid}', size_bytes=rnd.randint(0, 1000), trashed=trashed)
+            return [dir_node.uid]
+
+
+def _to_repr_dict(dir_stats_dict: Dict[UID, DirStats]) -> Dict[UID, str]:
+    return {uid: repr(dir_stats) for uid, dir_stats in dir_stats_dict.items()}
+
+
+class DirStatsUpdateTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS DirStatsUpdateTest
+
+    Checks that BaseTree.update_dir_stats() always gives the same result as generate_dir_stats(), and that it never modifies the DirStats
+    it was given.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        self.builder = TreeBuilder()
+        for d in range(3):
+            dir_node = self.builder.add_dir(self.builder.root, f'd{d}')
+            for f in range(3):
+                self.builder.add_file(dir_node, f'f{f}', size_bytes=f * 100)
+            self.builder.add_dir(dir_node, 'sub')
+
+    def _update_and_check(self, dir_stats_dict: Dict[UID, DirStats], changed_dir_uid_list: List[UID]):
+        old_repr_dict = _to_repr_dict(dir_stats_dict)
+        old_object_dict = dict(dir_stats_dict)
+        self.builder.tree.update_dir_stats(TREE_ID, dir_stats_dict, changed_dir_uid_list, self.builder.root.uid)
+
+        for uid, old_stats in old_object_dict.items():
+            self.assertEqual(old_repr_dict[uid], repr(old_stats), f'DirStats of dir {uid} were modified in place')
+        self.assertEqual(_to_repr_dict(self.builder.tree.generate_dir_stats(TREE_ID, self.builder.root)), _to_repr_dict(dir_stats_dict))
+
+    def test_add_remove_move(self):
+        dir_stats_dict = self.builder.tree.generate_dir_stats(TREE_ID, self.builder.root)
+        d0, d1, d2 = self.builder.tree.get_child_list_for_node(self.builder.root)
+
+        new_dir = self.builder.add_dir(d0, 'new')
+        self.builder.add_file(new_dir, 'f', size_bytes=50)
+        self._update_and_check(dir_stats_dict, [d0.uid])
+
+        self._update_and_check(dir_stats_dict, self.builder.remove(d1))
+
+        self._update_and_check(dir_stats_dict, self.builder.move_dir(d0, d2))
+
+        d2_sub = [n for n in self.builder.tree.get_child_list_for_node(d2) if n.get_single_path() == f'{d2.get_single_path()}/sub'][0]
+        self._update_and_check(dir_stats_dict, self.builder.move_dir(d2_sub, self.builder.root))
+
+    def test_removed_dir_replaced_by_new_dir(self):
+        """A dir which is removed then re-added with the same UID (e.g. a local dir recreated at the same path) must not get its old stats"""
+        dir_stats_dict = self.builder.tree.generate_dir_stats(TREE_ID, self.builder.root)
+        d0 = self.builder.tree.get_child_list_for_node(self.builder.root)[0]
+
+        # Renamed, so that the root's dir count does not change:
+        self.builder.remove(d0)
+        self.builder.add_dir(self.builder.root, 'renamed')
+        self._update_and_check(dir_stats_dict, [self.builder.root.uid])
+
+        self.builder.add_dir(self.builder.root, 'd0', uid=d0.uid)
+        self._update_and_check(dir_stats_dict, [self.builder.root.uid])
+
+    def test_random_changes(self):
+        rnd = random.Random(7)
+        dir_stats_dict = self.builder.tree.generate_dir_stats(TREE_ID, self.builder.root)
+        for _ in range(200):
+            changed_dir_uid_list = []
+            for _ in range(rnd.randint(1, 4)):
+                changed_dir_uid_list += self.builder.apply_random_change(rnd)
+            self._update_and_check(dir_stats_dict, changed_dir_uid_list)
@@ -0,0 +1,115 @@
+import logging
+import unittest
+from typing import List, Optional, Tuple
+from unittest.mock import patch
+
+import pytest
+
+# The GTK frontend can't be imported without PyGObject:
+pytest.importorskip('gi')
+
+from constants import TrashStatus
+from fe.gtk.tree.display_mutator import DisplayMutator
+from fe.gtk.tree.display_store import DisplayStore
+from gi.repository import Gtk
+from model.node.locald_node import LocalFileNode
+from model.node.node import SPIDNodePair
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+TREE_ID = 'test_tree'
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/test'
+SYNC_TS = 1_600_000_000_000
+
+
+def _build_sn(node_uid: int) -> SPIDNodePair:
+    spid = LocalNodeIdentifier(UID(node_uid), DEVICE_UID, f'{ROOT_PATH}/file{node_uid}.txt', parent_guid=f'{DEVICE_UID}:{ROOT_UID}')
+    node = LocalFileNode(spid, ROOT_UID, None, 1, SYNC_TS, SYNC_TS, SYNC_TS, SYNC_TS, TrashStatus.NOT_TRASHED, True)
+    return SPIDNodePair(spid, node)
+
+
+class MockTreeViewMeta:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS TreeViewMeta
+
+    Just enough for a DisplayStore: a model with a single column, which holds the name
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    col_types = [str]
+    col_num_name = 0
+
+
+class MockController:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS Controller
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self):
+        self.tree_id = TREE_ID
+        self.display_store = DisplayStore(self, MockTreeViewMeta())
+
+
+class DisplayMutatorBatchTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS DisplayMutatorBatchTest
+
+    Covers the path by which the GTK client applies a SUBTREE_NODES_CHANGED batch. The per-node helpers it calls are replaced with ones
+    which record each call, so that no TreeView is needed.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        self.con = MockController()
+        self.mutator = DisplayMutator(self.con)
+        self.mutator._enable_node_signals = True
+        self.call_list: List[Tuple[str, int, Optional[int]]] = []
+        """Each is (helper name, node UID, sort column of the model at the time of the call)"""
+        self.mutator._upsert_node_in_ui = lambda sn: self._record('upsert', sn)
+        self.mutator._remove_node_from_ui = lambda sn: self._record('remove', sn)
+        self.idle_func_list = []
+
+    def _record(self, helper_name: str, sn: SPIDNodePair):
+        assert self.mutator._lock.locked(), f'{helper_name} called without holding the mutator lock'
+        sort_column_id, _ = self.con.display_store.model.get_sort_column_id()
+        self.call_list.append((helper_name, sn.spid.node_uid, sort_column_id))
+
+    def _send_batch(self, sender: str, upserted_uid_list: List[int], removed_uid_list: List[int]):
+        with patch('fe.gtk.tree.display_mutator.GLib.idle_add', side_effect=self.idle_func_list.append):
+            self.mutator._on_subtree_nodes_changed(sender, _build_sn(ROOT_UID).spid, [_build_sn(uid) for uid in upserted_uid_list],
+                                                   [_build_sn(uid) for uid in removed_uid_list])
+
+    def test_batch_applied_in_one_idle_callback(self):
+        self._send_batch(TREE_ID, upserted_uid_list=[1, 2], removed_uid_list=[3])
+        self.assertEqual(1, len(self.idle_func_list))
+        self.assertEqual([], self.call_list)
+
+        self.idle_func_list[0]()
+        # Removals first, then upserts in the order given (so that a dir comes before its children), all with the model unsorted:
+        self.assertEqual([('remove', 3, None), ('upsert', 1, None), ('upsert', 2, None)], self.call_list)
+        self.assertEqual((MockTreeViewMeta.col_num_name, Gtk.SortType.ASCENDING), self.con.display_store.model.get_sort_column_id())
+
+    def test_batch_for_other_tree_ignored(self):
+        self._send_batch('other_tree', upserted_uid_list=[1], removed_uid_list=[])
+        self.assertEqual([], self.idle_func_list)
+
+    def test_batch_ignored_while_node_signals_disabled(self):
+        self.mutator._enable_node_signals = False
+        self._send_batch(TREE_ID, upserted_uid_list=[1], removed_uid_list=[])
+        self.assertEqual([], self.idle_func_list)
+
+    def test_sorting_suspended_sorts_once_on_exit(self):
+        model = self.con.display_store.model
+        with self.con.display_store.sorting_suspended():
+            for name in ('b', 'c', 'a'):
+                model.append(None, [name])
+            self.assertEqual(['b', 'c', 'a'], [row[0] for row in model])
+
+        self.assertEqual(['a', 'b', 'c'], [row[0] for row in model])
+        self.assertEqual((MockTreeViewMeta.col_num_name, Gtk.SortType.ASCENDING), model.get_sort_column_id())
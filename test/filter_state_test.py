@@ -0,0 +1,199 @@
+import logging
+import random
+import unittest
+from typing import Dict, List, Optional, Set, Tuple
+
+from be.disp_tree.filter_state import FilterState, NAME_INDEX_MAX_MATCH_RATIO
+from be.tree_store.locald.ld_tree import LocalDiskTree
+from be.tree_store.name_index import NodeNameIndex
+from constants import TrashStatus
+from model.disp_tree.filter_criteria import FilterCriteria, Ternary
+from model.node.locald_node import LocalDirNode, LocalFileNode, LocalNode
+from model.node.node import SPIDNodePair
+from model.node_identifier import GUID, LocalNodeIdentifier
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(2)
+ROOT_PATH = '/test'
+
+
+class TreeBuilder:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS TreeBuilder
+
+    Builds & randomly changes a LocalDiskTree under /test, with short random names so that search queries match some of them.
+    Each change is reported to the given FilterStates in the same way as ActiveTreeManager does.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, seed: int):
+        self.rnd = random.Random(seed)
+        self._last_uid = 100
+        self.tree = LocalDiskTree(backend=None)
+        self.name_index = NodeNameIndex(DEVICE_UID)
+        self.root = self._build_dir(ROOT_PATH, parent_uid=UID(1))
+        self.tree.add_node(self.root, None)
+        self.root_sn = SPIDNodePair(self.root.node_identifier, self.root)
+
+    def _next_uid(self) -> UID:
+        self._last_uid += 1
+        return UID(self._last_uid)
+
+    def _random_name(self) -> str:
+        return ''.join(self.rnd.choice('abcAB') for _ in range(self.rnd.randint(2, 5))) + str(self._last_uid)
+
+    def _build_dir(self, full_path: str, parent_uid: UID) -> LocalDirNode:
+        return LocalDirNode(LocalNodeIdentifier(uid=self._next_uid(), device_uid=DEVICE_UID, full_path=full_path), parent_uid=parent_uid,
+                            trashed=TrashStatus.NOT_TRASHED, is_live=True, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                            all_children_fetched=True)
+
+    def _build_file(self, parent: LocalNode, trashed: TrashStatus, uid: Optional[UID] = None, full_path: Optional[str] = None) \
+            -> LocalFileNode:
+        full_path = full_path or f'{parent.get_single_path()}/{self._random_name()}'
+        return LocalFileNode(LocalNodeIdentifier(uid=uid or self._next_uid(), device_uid=DEVICE_UID, full_path=full_path),
+                             parent_uid=parent.uid, content_meta=None, size_bytes=self.rnd.randint(0, 1000), sync_ts=0, create_ts=0,
+                             modify_ts=0, change_ts=0, trashed=trashed, is_live=True)
+
+    def _random_trashed(self) -> TrashStatus:
+        return TrashStatus.EXPLICITLY_TRASHED if self.rnd.random() < 0.2 else TrashStatus.NOT_TRASHED
+
+    def get_dir_list(self) -> List[LocalNode]:
+        return [node for node in self.tree.get_subtree_bfs_node_list(self.root.uid) if node.is_dir()]
+
+    @staticmethod
+    def _to_signal_sn(node: LocalNode, parent: LocalNode) -> Tuple[SPIDNodePair, SPIDNodePair]:
+        """Returns (sn, parent_sn) as ActiveTreeManager would build them for a signal"""
+        parent_sn = SPIDNodePair(parent.node_identifier, parent)
+        spid = LocalNodeIdentifier(uid=node.uid, device_uid=DEVICE_UID, full_path=node.get_single_path(), parent_guid=parent_sn.spid.guid)
+        return SPIDNodePair(spid, node), parent_sn
+
+    def build(self, dir_count: int, file_count: int):
+        for _ in range(dir_count):
+            parent = self.rnd.choice(self.get_dir_list())
+            node = self._build_dir(f'{parent.get_single_path()}/{self._random_name()}', parent.uid)
+            self.tree.add_node(node, parent)
+            self.name_index.upsert_node(node)
+        dir_list = self.get_dir_list()
+        for _ in range(file_count):
+            parent = self.rnd.choice(dir_list)
+            node = self._build_file(parent, self._random_trashed())
+            self.tree.add_node(node, parent)
+            self.name_index.upsert_node(node)
+
+    def apply_random_change(self, filter_state_list: List[FilterState]):
+        parent = self.rnd.choice(self.get_dir_list())
+        child_list = self.tree.get_child_list_for_node(parent)
+        roll = self.rnd.random()
+        if roll < 0.3 or not child_list:
+            if roll < 0.1:
+                node = self._build_dir(f'{parent.get_single_path()}/{self._random_name()}', parent.uid)
+            else:
+                node = self._build_file(parent, self._random_trashed())
+            self.tree.add_node(node, parent)
+            self.name_index.upsert_node(node)
+            sn, parent_sn = self._to_signal_sn(node, parent)
+            for filter_state in filter_state_list:
+                filter_state.on_node_upserted(sn, parent_sn, self.tree.get_parent_for_sn)
+        elif roll < 0.6:
+            node = self.rnd.choice(child_list)
+            for removed_node in self.tree.get_subtree_bfs_node_list(node.uid):
+                self.name_index.remove_node(removed_node)
+            self.tree.remove_node(node.uid)
+            sn, parent_sn = self._to_signal_sn(node, parent)
+            for filter_state in filter_state_list:
+                filter_state.on_node_removed(sn, parent_sn, self.tree.get_parent_for_sn)
+        else:
+            # Update an existing file, possibly changing whether it is trashed:
+            file_list = [child for child in child_list if not child.is_dir()]
+            if not file_list:
+                return
+            old_node = self.rnd.choice(file_list)
+            node = self._build_file(parent, self._random_trashed(), uid=old_node.uid, full_path=old_node.get_single_path())
+            self.tree.swap_with_existing_node(node)
+            sn, parent_sn = self._to_signal_sn(node, parent)
+            for filter_state in filter_state_list:
+                filter_state.on_node_upserted(sn, parent_sn, self.tree.get_parent_for_sn)
+
+
+def _build_filter_state(root_sn: SPIDNodePair, search_query: str = '', is_trashed: Ternary = Ternary.NOT_SPECIFIED,
+                        ignore_case: bool = False, show_ancestors_of_matches: bool = True) -> FilterState:
+    filter_criteria = FilterCriteria(search_query=search_query, is_trashed=is_trashed)
+    filter_criteria.ignore_case = ignore_case
+    filter_criteria.show_ancestors_of_matches = show_ancestors_of_matches
+    return FilterState(filter_criteria, root_sn)
+
+
+def _to_comparable(filter_state: FilterState, dir_guid_set: Set[GUID]) -> Tuple[Dict[GUID, List[UID]], Dict[GUID, str]]:
+    """Returns (GUID -> sorted UIDs of filtered children, GUID -> repr of DirStats). Only the stats of dirs which are still in the tree
+    are included, and only if they are not empty, since stats for dirs without any matches are not needed"""
+    child_dict = {guid: sorted(sn.spid.node_uid for sn in sn_list) for guid, sn_list in filter_state.cached_node_dict.items()}
+    dir_stats_dict = {guid: repr(dir_stats) for guid, dir_stats in filter_state.cached_dir_stats.items()
+                      if guid in dir_guid_set and guid in filter_state.cached_node_dict}
+    return child_dict, dir_stats_dict
+
+
+class FilterStateTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS FilterStateTest
+
+    Checks that a FilterState cache which is patched for each upserted/removed node (and one which is built from the name index's matches)
+    is always the same as one rebuilt from scratch by walking the tree.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    CRITERIA_LIST = [
+        dict(search_query='ab'),
+        dict(search_query='ab', show_ancestors_of_matches=False),
+        dict(search_query='Ab', ignore_case=True),
+        dict(search_query='a', is_trashed=Ternary.FALSE),
+        dict(is_trashed=Ternary.TRUE),
+        dict(is_trashed=Ternary.TRUE, show_ancestors_of_matches=False),
+    ]
+
+    def _assert_same_as_rebuilt(self, builder: TreeBuilder, filter_state: FilterState, criteria: Dict, use_name_index: bool = False):
+        expected = _build_filter_state(builder.root_sn, **criteria)
+        expected.rebuild_cache(builder.tree)
+        dir_guid_set = {node.node_identifier.guid for node in builder.get_dir_list()}
+        self.assertEqual(_to_comparable(expected, dir_guid_set), _to_comparable(filter_state, dir_guid_set),
+                         f'Mismatch for {criteria} (use_name_index={use_name_index})')
+
+    def test_patched_cache_same_as_rebuilt(self):
+        for seed in range(3):
+            builder = TreeBuilder(seed)
+            builder.build(dir_count=30, file_count=150)
+            filter_state_list = []
+            for criteria in self.CRITERIA_LIST:
+                filter_state = _build_filter_state(builder.root_sn, **criteria)
+                filter_state.rebuild_cache(builder.tree)
+                filter_state_list.append(filter_state)
+
+            for _ in range(150):
+                builder.apply_random_change(filter_state_list)
+                for criteria, filter_state in zip(self.CRITERIA_LIST, filter_state_list):
+                    self._assert_same_as_rebuilt(builder, filter_state, criteria)
+
+    def test_name_index_cache_same_as_rebuilt(self):
+        builder = TreeBuilder(seed=0)
+        builder.build(dir_count=30, file_count=150)
+        for criteria in (dict(search_query='abc'), dict(search_query='abc', show_ancestors_of_matches=False),
+                         dict(search_query='AbA', ignore_case=True), dict(search_query='Ba', is_trashed=Ternary.FALSE)):
+            filter_state = _build_filter_state(builder.root_sn, **criteria)
+            # The index must match few enough nodes for it to be used:
+            self.assertLess(len(builder.name_index.search(criteria['search_query'], criteria.get('ignore_case', False))),
+                            builder.name_index.get_node_count() * NAME_INDEX_MAX_MATCH_RATIO)
+            filter_state.rebuild_cache(builder.tree, builder.name_index)
+            self._assert_same_as_rebuilt(builder, filter_state, criteria, use_name_index=True)
+
+    def test_patch_ignored_until_cache_built(self):
+        builder = TreeBuilder(seed=0)
+        builder.build(dir_count=5, file_count=20)
+        criteria = dict(search_query='ab')
+        filter_state = _build_filter_state(builder.root_sn, **criteria)
+        builder.apply_random_change([filter_state])
+        self.assertEqual({}, filter_state.cached_node_dict)
+
+        filter_state.ensure_cache_populated(builder.tree)
+        self._assert_same_as_rebuilt(builder, filter_state, criteria)
@@ -0,0 +1,208 @@
+import logging
+import re
+import threading
+import time
+import unittest
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from be.tree_store.gdrive.client.partitioned_query import PARTITION_START_TS_SEC, PartitionedQueryFetcher
+
+logger = logging.getLogger(__name__)
+
+BASE_QUERY = "mimeType != 'application/vnd.google-apps.folder'"
+PAGE_SIZE = 10
+END_TS_SEC = int(datetime(2021, 1, 1, tzinfo=timezone.utc).timestamp())
+
+_MODIFIED_TIME_REGEX = re.compile(r"modifiedTime (>=|<) '([^']+)'")
+
+
+class FakeDriveService:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS FakeDriveService
+
+    Serves pages of a files().list() query over a fixed list of items, filtering them by the query's modifiedTime range. Page tokens are
+    "<query>|<offset>". Thread-safe, and records every request & the max number of requests in flight at once.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, item_list: List[Dict], latency_sec: float = 0.0):
+        self.item_list: List[Dict] = item_list
+        self.latency_sec: float = latency_sec
+        self.fail_on_query_substring: Optional[str] = None
+        self._lock = threading.Lock()
+        self.request_list: List[Tuple[str, Optional[str]]] = []
+        self._in_flight_count: int = 0
+        self.max_in_flight_count: int = 0
+
+    def request_page(self, query: str, page_token: Optional[str]) -> dict:
+        with self._lock:
+            self.request_list.append((query, page_token))
+            self._in_flight_count += 1
+            self.max_in_flight_count = max(self.max_in_flight_count, self._in_flight_count)
+        try:
+            time.sleep(self.latency_sec)
+            if self.fail_on_query_substring and self.fail_on_query_substring in query:
+                raise ConnectionError(f'Simulated failure for query: {query}')
+
+            offset = 0
+            if page_token:
+                token_query, offset = page_token.rsplit('|', 1)
+                assert token_query == query, f'Page token is for a different query: "{token_query}"'
+                offset = int(offset)
+
+            range_list = _MODIFIED_TIME_REGEX.findall(query)
+            match_list = [item for item in self.item_list if all((item['modifiedTime'] >= value) == (op == '>=') for op, value in range_list)]
+            response = {'files': [dict(item) for item in match_list[offset:offset + PAGE_SIZE]]}
+            if offset + PAGE_SIZE < len(match_list):
+                response['nextPageToken'] = f'{query}|{offset + PAGE_SIZE}'
+            return response
+        finally:
+            with self._lock:
+                self._in_flight_count -= 1
+
+
+class Interrupted(Exception):
+    pass
+
+
+def build_item_list(item_count: int) -> List[Dict]:
+    """Spread evenly from a bit before PARTITION_START_TS_SEC (which all land in the first partition) to END_TS_SEC"""
+    start_ts_sec = PARTITION_START_TS_SEC - 86400 * 30
+    item_list = []
+    for i in range(item_count):
+        modify_ts_sec = start_ts_sec + (END_TS_SEC - start_ts_sec) * i // item_count
+        modified_time = datetime.fromtimestamp(modify_ts_sec, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        item_list.append({'id': f'goog_{i:05d}', 'modifiedTime': modified_time})
+    return item_list
+
+
+class PartitionedQueryFetcherTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS PartitionedQueryFetcherTest
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def setUp(self) -> None:
+        self.item_list = build_item_list(500)
+        self.expected_id_list = sorted(item['id'] for item in self.item_list)
+        self.service = FakeDriveService(self.item_list)
+
+    def _build_fetcher(self, max_concurrent_requests: int = 3, max_buffered_pages: int = 4) -> PartitionedQueryFetcher:
+        return PartitionedQueryFetcher(BASE_QUERY, self.service.request_page, max_concurrent_requests, max_buffered_pages)
+
+    def _fetch_all(self, fetcher: PartitionedQueryFetcher, resume_token: Optional[str] = None, partition_count: int = 8) \
+            -> List[Tuple[List[str], Optional[str]]]:
+        """Returns the goog_ids of each page, with the resume token passed with it"""
+        page_list = []
+        fetcher.fetch_all(resume_token, END_TS_SEC, partition_count,
+                          lambda results, token: page_list.append(([item['id'] for item in results.get('files', [])], token)))
+        return page_list
+
+    def _assert_no_page_requested_twice(self):
+        duplicate_list = [request for request, count in Counter(self.service.request_list).items() if count > 1]
+        self.assertEqual([], duplicate_list)
+
+    def test_boundaries_split_time_range_into_disjoint_partitions(self):
+        for partition_count in (1, 2, 7, 16):
+            boundary_list = PartitionedQueryFetcher.build_boundary_list(END_TS_SEC, partition_count)
+            self.assertEqual(partition_count - 1, len(boundary_list))
+            self.assertEqual(sorted(set(boundary_list)), boundary_list)
+            self.assertTrue(all(PARTITION_START_TS_SEC <= b < END_TS_SEC for b in boundary_list))
+
+            fetcher = self._build_fetcher()
+            fetcher._boundary_list = boundary_list
+            id_list = []
+            for partition_index in range(partition_count):
+                query = fetcher.get_partition_query(partition_index)
+                self.assertTrue(query.startswith(f'({BASE_QUERY})'))
+                page_token = None
+                while True:
+                    results = self.service.request_page(query, page_token)
+                    id_list += [item['id'] for item in results['files']]
+                    page_token = results.get('nextPageToken')
+                    if not page_token:
+                        break
+            self.assertEqual(self.expected_id_list, sorted(id_list), f'partition_count={partition_count}')
+
+    def test_fetch_all_returns_each_item_once(self):
+        self.service.latency_sec = 0.002
+        page_list = self._fetch_all(self._build_fetcher(max_concurrent_requests=3))
+
+        self.assertEqual(self.expected_id_list, sorted(goog_id for id_list, _ in page_list for goog_id in id_list))
+        self.assertIsNone(page_list[-1][1])
+        self.assertTrue(all(PartitionedQueryFetcher.is_resume_token(token) for _, token in page_list[:-1]))
+        self.assertLessEqual(self.service.max_in_flight_count, 3)
+        self._assert_no_page_requested_twice()
+
+    def test_item_returned_by_two_partitions_is_passed_on_once(self):
+        # As when an item is modified during the download and moves to a later partition:
+        moved_item = dict(self.item_list[0])
+        moved_item['modifiedTime'] = self.item_list[-1]['modifiedTime']
+        self.service.item_list = self.item_list + [moved_item]
+
+        page_list = self._fetch_all(self._build_fetcher())
+        self.assertEqual(self.expected_id_list, sorted(goog_id for id_list, _ in page_list for goog_id in id_list))
+
+    def test_resume_after_interruption_fetches_only_remaining_pages(self):
+        for interrupt_after_pages in (1, 5, 20):
+            self.service.request_list.clear()
+            id_list = []
+            saved_token_list = []
+
+            def on_page_received(results: dict, resume_token: Optional[str]):
+                if len(saved_token_list) == interrupt_after_pages:
+                    raise Interrupted()
+                id_list.extend(item['id'] for item in results['files'])
+                saved_token_list.append(resume_token)
+
+            with self.assertRaises(Interrupted):
+                self._build_fetcher().fetch_all(None, END_TS_SEC, 8, on_page_received)
+
+            # Pages which were prefetched but not passed on before the interruption are requested again. Pages which were passed on are not:
+            requests_before_resume = len(self.service.request_list)
+            page_list = self._fetch_all(self._build_fetcher(), resume_token=saved_token_list[-1], partition_count=0)
+            id_list += [goog_id for page_id_list, _ in page_list for goog_id in page_id_list]
+            self.assertEqual(self.expected_id_list, sorted(id_list), f'interrupt_after_pages={interrupt_after_pages}')
+            self.assertEqual(interrupt_after_pages + len(page_list), len(set(self.service.request_list)))
+            self.assertLessEqual(len(page_list), len(self.service.request_list) - requests_before_resume)
+
+    def test_resume_from_token_with_all_partitions_done(self):
+        fetcher = self._build_fetcher()
+        fetcher._boundary_list = [END_TS_SEC - 1000]
+        fetcher._state_list = [True, True]
+
+        page_list = self._fetch_all(self._build_fetcher(), resume_token=fetcher._encode_resume_token())
+        self.assertEqual([([], None)], page_list)
+        self.assertEqual([], self.service.request_list)
+
+    def test_invalid_resume_token_raises(self):
+        for resume_token in ('partitioned:not json', 'partitioned:{"boundaries": [1, 2]}', 'partitioned:{"boundaries": [1], "states": [null]}'):
+            with self.assertRaises(RuntimeError):
+                self._fetch_all(self._build_fetcher(), resume_token=resume_token)
+
+    def test_request_error_is_raised_to_caller(self):
+        self.service.fail_on_query_substring = "modifiedTime >= '"  # fails every partition but the first
+        id_list = []
+
+        with self.assertRaises(ConnectionError):
+            self._build_fetcher().fetch_all(None, END_TS_SEC, 8, lambda results, token: id_list.extend(item['id'] for item in results['files']))
+
+        self.assertTrue(set(id_list) <= set(self.expected_id_list))
+
+    def test_error_in_page_func_stops_workers(self):
+        self.service.latency_sec = 0.005
+
+        def on_page_received(results: dict, resume_token: Optional[str]):
+            raise Interrupted()
+
+        with self.assertRaises(Interrupted):
+            self._build_fetcher(max_concurrent_requests=2, max_buffered_pages=1).fetch_all(None, END_TS_SEC, 8, on_page_received)
+
+        # Workers see the stop flag after their current request at the latest, so the request count settles quickly:
+        time.sleep(0.1)
+        request_count = len(self.service.request_list)
+        time.sleep(0.1)
+        self.assertEqual(request_count, len(self.service.request_list))
+        self.assertLess(request_count, 500 // PAGE_SIZE)
@@ -0,0 +1,227 @@
+import logging
+import os
+import tempfile
+import unittest
+from typing import Iterable, List, Optional, Tuple
+
+from be.sqlite.content_meta_db import ContentMeta
+from be.sqlite.local_db import LocalDiskDatabase
+from be.tree_store.locald.ld_diskstore import LocalDiskDiskStore
+from be.tree_store.locald.ld_snapshot import LocalDiskSnapshot
+from constants import TrashStatus
+from model.cache_info import CacheInfoEntry, PersistedCacheInfo
+from model.node.locald_node import LocalDirNode, LocalFileNode, LocalNode
+from model.node.node import TNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from test.benchmark.fake_backend import FakeBackend, FakeCacheman
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/test'
+TREE_ID = 'test_tree'
+SYNC_TS = 1_600_000_000_000
+TABLE_LIST = [LocalDiskDatabase.TABLE_LOCAL_DIR, LocalDiskDatabase.TABLE_LOCAL_FILE]
+
+
+class MockCacheman(FakeCacheman):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS CacheManager
+
+    Adds the one call which LocalDiskDiskStore.load_subtree() makes besides those of the DB: building the tree's root node
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def build_local_dir_node(self, full_path: str, is_live: bool = True, all_children_fetched: bool = False, dir_entry=None) -> LocalDirNode:
+        return LocalDirNode(LocalNodeIdentifier(self.get_uid_for_local_path(full_path), DEVICE_UID, full_path), UID(1), TrashStatus.NOT_TRASHED,
+                            is_live, SYNC_TS, SYNC_TS, SYNC_TS, SYNC_TS, all_children_fetched)
+
+
+class MockUidPathMapper:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    MOCK CLASS UidPathMapper
+
+    Adds each mapping it is given to the MockCacheman, as the real mapper backs CacheManager.get_uid_for_local_path(). Also records them:
+    only the snapshot load path calls this, so that shows whether a load used the snapshot.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, cacheman: MockCacheman):
+        self.cacheman: MockCacheman = cacheman
+        self.mapping_list: List[Tuple[UID, str]] = []
+
+    def ensure_mapping_list(self, mapping_list: Iterable[Tuple[UID, str]]):
+        for uid, full_path in mapping_list:
+            self.mapping_list.append((uid, full_path))
+            self.cacheman.get_uid_for_local_path(full_path, uid)
+
+
+def _build_dir(uid: int, full_path: str, parent_uid: UID) -> LocalDirNode:
+    return LocalDirNode(LocalNodeIdentifier(UID(uid), DEVICE_UID, full_path), parent_uid, TrashStatus.NOT_TRASHED, is_live=True,
+                        sync_ts=SYNC_TS, create_ts=SYNC_TS, modify_ts=SYNC_TS, change_ts=SYNC_TS, all_children_fetched=True)
+
+
+def _build_file(uid: int, full_path: str, parent_uid: UID, content_meta: Optional[ContentMeta]) -> LocalFileNode:
+    size_bytes = content_meta.size_bytes if content_meta else None
+    return LocalFileNode(LocalNodeIdentifier(UID(uid), DEVICE_UID, full_path), parent_uid, content_meta, size_bytes, SYNC_TS, SYNC_TS,
+                         SYNC_TS + uid, SYNC_TS + uid, TrashStatus.NOT_TRASHED, is_live=True)
+
+
+def _to_comparable(node_list: Iterable[TNode]) -> List[Tuple]:
+    return sorted((type(node).__name__, node.node_identifier.get_single_path(), node.to_tuple()) for node in node_list)
+
+
+class LocalDiskSnapshotTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS LocalDiskSnapshotTest
+
+    Checks that a LocalDiskSnapshot gives back exactly what its LocalDiskDatabase holds, that it is only ever used for the generation of the
+    DB which it was taken of, and that a damaged snapshot makes load_subtree() fall back to the DB.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_location = os.path.join(tmp_dir.name, 'local_cache.db')
+        self.snapshot = LocalDiskSnapshot(LocalDiskSnapshot.get_file_path(self.cache_location), DEVICE_UID)
+
+        self.cacheman = MockCacheman({ROOT_PATH: ROOT_UID})
+        self.backend = FakeBackend(cacheman=self.cacheman, config_dict={'cache.local_disk.snapshot.enabled': True})
+
+        d1 = _build_dir(101, f'{ROOT_PATH}/d1', ROOT_UID)
+        d2 = _build_dir(102, f'{ROOT_PATH}/d1/d2', d1.uid)
+        self.dir_list: List[LocalDirNode] = [d1, d2]
+        self.file_list: List[LocalFileNode] = []
+        for uid, parent in ((103, None), (104, d1), (105, d2), (106, d2)):
+            content_meta = ContentMeta(UID(uid + 1000), md5=f'{uid:032x}', sha256=None, size_bytes=uid)
+            self.cacheman.content_meta_dict[content_meta.uid] = content_meta
+            parent_uid, parent_path = (parent.uid, parent.get_single_path()) if parent else (ROOT_UID, ROOT_PATH)
+            self.file_list.append(_build_file(uid, f'{parent_path}/f{uid}.txt', parent_uid, content_meta))
+        # Not yet scanned: its NULL content UID & size must survive the round trip
+        self.file_list.append(_build_file(107, f'{ROOT_PATH}/d1/unscanned.txt', d1.uid, content_meta=None))
+
+        with self._open_db() as db:
+            db.insert_local_dirs(self.dir_list, overwrite=False, commit=False)
+            db.insert_local_files(self.file_list, overwrite=False, commit=True)
+
+    def _open_db(self) -> LocalDiskDatabase:
+        return LocalDiskDatabase(self.cache_location, self.backend, DEVICE_UID)
+
+    def _write_snapshot(self) -> Tuple[str, int]:
+        with self._open_db() as db:
+            cache_id, generation = db.get_or_create_cache_generation()
+            self.snapshot.write(cache_id, generation, [(LocalDiskDatabase.TABLE_LOCAL_DIR, db.iter_local_dir_rows()),
+                                                       (LocalDiskDatabase.TABLE_LOCAL_FILE, db.iter_local_file_rows())])
+        return cache_id, generation
+
+    def _read_nodes_from_snapshot(self, cache_id: str, generation: int) -> List[LocalNode]:
+        node_list: List[LocalNode] = []
+        for table, row_list in self.snapshot.read(cache_id, generation, TABLE_LIST):
+            if table.name == LocalDiskDatabase.TABLE_LOCAL_DIR.name:
+                node_list += LocalDiskSnapshot.iter_dir_nodes(row_list, DEVICE_UID)
+            else:
+                node_list += LocalDiskSnapshot.iter_file_nodes(row_list, DEVICE_UID, self.cacheman.get_content_meta_for_uid)
+        return node_list
+
+    def _load_subtree(self) -> List[LocalNode]:
+        """Loads the cache as at startup, returning every node in the tree except its root"""
+        self.uid_path_mapper = MockUidPathMapper(self.cacheman)
+        diskstore = LocalDiskDiskStore(self.backend, DEVICE_UID, self.uid_path_mapper)
+        diskstore.start()
+        try:
+            cache_info = PersistedCacheInfo(CacheInfoEntry(self.cache_location, LocalNodeIdentifier(ROOT_UID, DEVICE_UID, ROOT_PATH),
+                                                           sync_ts=SYNC_TS, is_complete=True))
+            tree = diskstore.load_subtree(cache_info, TREE_ID)
+        finally:
+            diskstore.shutdown()
+        return [node for node in tree.get_subtree_bfs_node_list(ROOT_UID) if node.uid != ROOT_UID]
+
+    def test_round_trip(self):
+        cache_id, generation = self._write_snapshot()
+
+        with self._open_db() as db:
+            expected_row_list = list(db.iter_local_dir_rows()) + list(db.iter_local_file_rows())
+        actual_row_list = [row for _, row_list in self.snapshot.read(cache_id, generation, TABLE_LIST) for row in row_list]
+        self.assertEqual(expected_row_list, actual_row_list)
+
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._read_nodes_from_snapshot(cache_id, generation)))
+
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._load_subtree()))
+        self.assertEqual(len(self.dir_list) + len(self.file_list), len(self.uid_path_mapper.mapping_list), 'Snapshot was not used')
+
+    def test_stale_generation_rejected(self):
+        cache_id, generation = self._write_snapshot()
+
+        with self._open_db() as db:
+            # A write which changes nothing does not make the snapshot stale:
+            db.upsert_local_file_list([])
+            self.assertEqual((cache_id, generation), db.get_cache_generation())
+
+            changed_file = self.file_list[0]
+            changed_file.modify_ts += 1
+            db.upsert_local_file(changed_file)
+            new_cache_id, new_generation = db.get_cache_generation()
+        self.assertEqual(cache_id, new_cache_id)
+        self.assertEqual(generation + 1, new_generation)
+        self.assertIsNone(self.snapshot.read(new_cache_id, new_generation, TABLE_LIST))
+
+        # Loaded from the DB instead, so the change is seen; the snapshot is then rewritten at shutdown:
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._load_subtree()))
+        self.assertEqual([], self.uid_path_mapper.mapping_list)
+        self.assertEqual((new_cache_id, new_generation), self.snapshot.read_cache_generation())
+
+    def test_foreign_cache_id_rejected(self):
+        cache_id, generation = self._write_snapshot()
+
+        self.assertIsNone(self.snapshot.read('some-other-cache-id', generation, TABLE_LIST))
+        # Nor is it read for another device:
+        self.assertIsNone(LocalDiskSnapshot(self.snapshot.file_path, UID(2)).read(cache_id, generation, TABLE_LIST))
+
+        # A snapshot of another DB (e.g. left over from a cache which was deleted & rebuilt) is never used:
+        other_snapshot_path = os.path.join(os.path.dirname(self.cache_location), 'other.snapshot')
+        LocalDiskSnapshot(other_snapshot_path, DEVICE_UID).write('some-other-cache-id', generation,
+                                                                 [(table, []) for table in TABLE_LIST])
+        os.replace(other_snapshot_path, self.snapshot.file_path)
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._load_subtree()))
+        self.assertEqual([], self.uid_path_mapper.mapping_list)
+
+    def _check_falls_back_to_db(self, cache_id: str, generation: int):
+        chunk_iter = self.snapshot.read(cache_id, generation, TABLE_LIST)
+        self.assertIsNotNone(chunk_iter)
+        with self.assertRaises(ValueError):
+            list(chunk_iter)
+
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._load_subtree()))
+        # The bad snapshot was deleted, and a good one written at shutdown:
+        self.assertEqual((cache_id, generation), self.snapshot.read_cache_generation())
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._read_nodes_from_snapshot(cache_id, generation)))
+
+    def test_truncated_snapshot_falls_back_to_db(self):
+        cache_id, generation = self._write_snapshot()
+        with open(self.snapshot.file_path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.snapshot.file_path) - 10)
+
+        self._check_falls_back_to_db(cache_id, generation)
+
+    def test_corrupt_snapshot_falls_back_to_db(self):
+        cache_id, generation = self._write_snapshot()
+        with open(self.snapshot.file_path, 'r+b') as f:
+            # Overwrite some of the table data, past the header:
+            f.seek(os.path.getsize(self.snapshot.file_path) // 2)
+            f.write(b'\xff' * 8)
+
+        self._check_falls_back_to_db(cache_id, generation)
+
+    def test_corrupt_header_ignored(self):
+        cache_id, generation = self._write_snapshot()
+        with open(self.snapshot.file_path, 'r+b') as f:
+            f.write(b'NOTASNAP')
+
+        self.assertIsNone(self.snapshot.read_cache_generation())
+        self.assertIsNone(self.snapshot.read(cache_id, generation, TABLE_LIST))
+        self.assertEqual(_to_comparable(self.dir_list + self.file_list), _to_comparable(self._load_subtree()))
+        self.assertEqual([], self.uid_path_mapper.mapping_list)
@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+import tempfile
+import unittest
+from typing import Dict, List, Set
+
+from be.tree_store.name_index import NodeNameIndex
+from constants import TrashStatus
+from model.node.locald_node import LocalFileNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(2)
+PARENT_UID = UID(100)
+ROOT_PATH = '/test'
+
+
+def _build_node(uid: int, name: str) -> LocalFileNode:
+    return LocalFileNode(LocalNodeIdentifier(uid=UID(uid), device_uid=DEVICE_UID, full_path=f'{ROOT_PATH}/{name}'), parent_uid=PARENT_UID,
+                         content_meta=None, size_bytes=0, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                         trashed=TrashStatus.NOT_TRASHED, is_live=True)
+
+
+class NodeNameIndexTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS NodeNameIndexTest
+
+    Checks that NodeNameIndex.search() always finds exactly the nodes which a brute-force substring test (as done by FilterState) would.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        self.rnd = random.Random(3)
+        self.index = NodeNameIndex(DEVICE_UID)
+        self.name_by_uid: Dict[int, str] = {}
+        """Expected contents of the index"""
+        for uid in range(1, 301):
+            self._upsert(uid, self._random_name())
+
+    def _random_name(self) -> str:
+        # Few distinct letters, so that names share trigrams & some names are repeated:
+        return ''.join(self.rnd.choice('abcAB.') for _ in range(self.rnd.randint(1, 8)))
+
+    def _upsert(self, uid: int, name: str):
+        self.name_by_uid[uid] = name
+        self.index.upsert_node(_build_node(uid, name))
+
+    def _remove(self, uid: int):
+        self.index.remove_node(_build_node(uid, self.name_by_uid.pop(uid)))
+
+    def _search_brute_force(self, query: str, ignore_case: bool) -> Set[UID]:
+        if ignore_case:
+            return {UID(uid) for uid, name in self.name_by_uid.items() if query.lower() in name.lower()}
+        return {UID(uid) for uid, name in self.name_by_uid.items() if query in name}
+
+    def _build_query_list(self) -> List[str]:
+        query_set = set()
+        for query_len in range(1, 5):
+            for _ in range(15):
+                query_set.add(''.join(self.rnd.choice('abcAB.') for _ in range(query_len)))
+        return sorted(query_set)
+
+    def _assert_search_same_as_brute_force(self, index: NodeNameIndex):
+        self.assertEqual(len(self.name_by_uid), index.get_node_count())
+        for query in self._build_query_list():
+            for ignore_case in (False, True):
+                self.assertEqual(self._search_brute_force(query, ignore_case), index.search(query, ignore_case),
+                                 f'Mismatch for query "{query}" (ignore_case={ignore_case})')
+
+    def test_search(self):
+        self._assert_search_same_as_brute_force(self.index)
+        with self.assertRaises(RuntimeError):
+            self.index.search('', ignore_case=False)
+
+    def test_search_after_rename_and_remove(self):
+        for uid in self.rnd.sample(sorted(self.name_by_uid.keys()), 100):
+            self._upsert(uid, self._random_name())
+        for uid in self.rnd.sample(sorted(self.name_by_uid.keys()), 100):
+            self._remove(uid)
+        self._assert_search_same_as_brute_force(self.index)
+
+        # Names no longer used by any node must not linger in the index:
+        for uid in list(self.name_by_uid.keys()):
+            self._remove(uid)
+        self.assertEqual(set(), self.index.search('a', ignore_case=True))
+        self.assertEqual('NodeNameIndex(device_uid=2 nodes=0 names=0 ngrams=0 in_sync=False)', repr(self.index))
+
+    def test_ensure_in_sync(self):
+        """Changes made behind the index's back are picked up after it is marked out of sync"""
+        self.index.ensure_in_sync(self._for_each_node)
+        for uid in range(1, 101):
+            self.name_by_uid[uid] = self._random_name()
+        for uid in range(101, 151):
+            self.name_by_uid.pop(uid)
+        for uid in range(1000, 1060):
+            self.name_by_uid[uid] = self._random_name()
+
+        # Ignored while the index thinks it is in sync:
+        self.index.ensure_in_sync(self._for_each_node)
+        self.assertNotEqual(len(self.name_by_uid), self.index.get_node_count())
+
+        self.index.mark_out_of_sync()
+        self.index.ensure_in_sync(self._for_each_node)
+        self._assert_search_same_as_brute_force(self.index)
+
+    def _for_each_node(self, func):
+        for uid, name in self.name_by_uid.items():
+            func(_build_node(uid, name))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as cache_dir_path:
+            file_path = self.index.get_file_path(cache_dir_path)
+            self.index.save_to_file(file_path)
+            self.assertFalse(os.path.exists(f'{file_path}.tmp'))
+
+            loaded_index = NodeNameIndex(DEVICE_UID)
+            self.assertTrue(loaded_index.load_from_file(file_path))
+            self._assert_search_same_as_brute_force(loaded_index)
+
+            # Always reconciled against the tree before use, since the tree may have changed since the index was saved:
+            self.assertIn('in_sync=False', repr(loaded_index))
+
+    def test_load_rejects_bad_file(self):
+        with tempfile.TemporaryDirectory() as cache_dir_path:
+            file_path = self.index.get_file_path(cache_dir_path)
+            other_index = NodeNameIndex(UID(3))
+            self.assertFalse(other_index.load_from_file(file_path))
+
+            self.index.save_to_file(file_path)
+            self.assertFalse(other_index.load_from_file(file_path))
+            self.assertEqual(0, other_index.get_node_count())
+
+            with open(file_path, 'wb') as f:
+                f.write(b'not a pickle')
+            self.assertFalse(NodeNameIndex(DEVICE_UID).load_from_file(file_path))
@@ -0,0 +1,180 @@
+import logging
+import threading
+import unittest
+from typing import List, Tuple
+
+from be.agent.svr.node_signal_batcher import NodeSignalBatcher
+from constants import TrashStatus
+from model.node.locald_node import LocalFileNode
+from model.node.node import SPIDNodePair
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(1)
+ROOT_UID = UID(100)
+ROOT_PATH = '/test'
+TREE_A = 'tree_a'
+TREE_B = 'tree_b'
+SYNC_TS = 1_600_000_000_000
+# Long enough that the timer never fires during a test which does not wait for it:
+LONG_WINDOW_MS = 60_000
+
+
+def _build_sn(node_uid: int, version: int = 1) -> SPIDNodePair:
+    spid = LocalNodeIdentifier(UID(node_uid), DEVICE_UID, f'{ROOT_PATH}/file{node_uid}.txt', parent_guid=f'{DEVICE_UID}:{ROOT_UID}')
+    node = LocalFileNode(spid, ROOT_UID, None, version, SYNC_TS, SYNC_TS, version, SYNC_TS, TrashStatus.NOT_TRASHED, True)
+    return SPIDNodePair(spid, node)
+
+
+class NodeSignalBatcherTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS NodeSignalBatcherTest
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+
+    def setUp(self):
+        self.batch_list: List[Tuple[str, List[int], List[int]]] = []
+        """Each is (tree_id, upserted node UIDs, removed node UIDs)"""
+        self.upserted_sn_list: List[SPIDNodePair] = []
+        self.batch_sent = threading.Event()
+
+    def _build_batcher(self, window_ms: int = LONG_WINDOW_MS, max_batch_size: int = 1000) -> NodeSignalBatcher:
+        batcher = NodeSignalBatcher(window_ms, max_batch_size, self._on_batch)
+        self.addCleanup(batcher.shutdown)
+        return batcher
+
+    def _on_batch(self, tree_id: str, upserted_sn_list: List[SPIDNodePair], removed_sn_list: List[SPIDNodePair]):
+        self.upserted_sn_list.extend(upserted_sn_list)
+        self.batch_list.append((tree_id, [sn.spid.node_uid for sn in upserted_sn_list], [sn.spid.node_uid for sn in removed_sn_list]))
+        self.batch_sent.set()
+
+    def test_nothing_sent_until_flush(self):
+        batcher = self._build_batcher()
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        self.assertEqual([], self.batch_list)
+
+        batcher.flush()
+        self.assertEqual([(TREE_A, [1], [])], self.batch_list)
+
+        # Nothing left to send:
+        batcher.flush()
+        self.assertEqual(1, len(self.batch_list))
+
+    def test_repeated_upserts_sent_once_as_latest(self):
+        batcher = self._build_batcher()
+        for version in range(1, 4):
+            batcher.add_upserted(TREE_A, _build_sn(1, version))
+        batcher.flush()
+
+        self.assertEqual([(TREE_A, [1], [])], self.batch_list)
+        self.assertEqual(3, self.upserted_sn_list[0].node.modify_ts)
+
+    def test_upsert_then_remove_flips(self):
+        batcher = self._build_batcher()
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.add_removed(TREE_A, _build_sn(1))
+        batcher.add_removed(TREE_A, _build_sn(2))
+        batcher.add_upserted(TREE_A, _build_sn(2))
+        batcher.flush()
+
+        self.assertEqual([(TREE_A, [2], [1])], self.batch_list)
+
+    def test_upsert_order_kept(self):
+        """A dir must be upserted before its children, so nodes are sent in the order in which they were first upserted"""
+        batcher = self._build_batcher()
+        for node_uid in (3, 1, 2):
+            batcher.add_upserted(TREE_A, _build_sn(node_uid))
+        batcher.add_upserted(TREE_A, _build_sn(3, version=2))
+        batcher.flush()
+
+        self.assertEqual([(TREE_A, [3, 1, 2], [])], self.batch_list)
+
+    def test_batch_per_tree(self):
+        batcher = self._build_batcher()
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.add_removed(TREE_B, _build_sn(1))
+        batcher.flush()
+
+        self.assertEqual([(TREE_A, [1], []), (TREE_B, [], [1])], self.batch_list)
+
+    def test_flush_orders_batches(self):
+        """Changes before & after a flush go in separate batches, in order, as they would around another signal"""
+        batcher = self._build_batcher()
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.flush()
+        batcher.add_removed(TREE_A, _build_sn(1))
+        batcher.flush()
+
+        self.assertEqual([(TREE_A, [1], []), (TREE_A, [], [1])], self.batch_list)
+
+    def test_early_flush_at_max_size(self):
+        batcher = self._build_batcher(max_batch_size=3)
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.add_upserted(TREE_B, _build_sn(2))
+        # Changing a node which is already in the batch does not grow it:
+        batcher.add_removed(TREE_A, _build_sn(1))
+        self.assertEqual([], self.batch_list)
+
+        batcher.add_upserted(TREE_A, _build_sn(3))
+        self.assertEqual([(TREE_A, [3], [1]), (TREE_B, [2], [])], self.batch_list)
+
+    def test_zero_window_sends_each_change(self):
+        batcher = self._build_batcher(window_ms=0)
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.add_removed(TREE_A, _build_sn(1))
+
+        self.assertEqual([(TREE_A, [1], []), (TREE_A, [], [1])], self.batch_list)
+
+    def test_sent_after_window(self):
+        batcher = self._build_batcher(window_ms=50)
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.add_upserted(TREE_A, _build_sn(2))
+
+        self.assertTrue(self.batch_sent.wait(timeout=10))
+        self.assertEqual([(TREE_A, [1, 2], [])], self.batch_list)
+
+    def test_shutdown_discards(self):
+        batcher = self._build_batcher(window_ms=50)
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        batcher.shutdown()
+
+        self.assertFalse(self.batch_sent.wait(timeout=0.2))
+        batcher.flush()
+        self.assertEqual([], self.batch_list)
+
+    def test_add_not_blocked_while_timed_batch_sent(self):
+        """The timer sends its batch without holding any lock which a producer needs, so changes can still be added while it is sending"""
+        sending = threading.Event()
+        can_finish_send = threading.Event()
+
+        def _on_slow_batch(tree_id: str, upserted_sn_list: List[SPIDNodePair], removed_sn_list: List[SPIDNodePair]):
+            sending.set()
+            self.assertTrue(can_finish_send.wait(timeout=10))
+            self._on_batch(tree_id, upserted_sn_list, removed_sn_list)
+
+        batcher = NodeSignalBatcher(50, 1000, _on_slow_batch)
+        self.addCleanup(batcher.shutdown)
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        self.assertTrue(sending.wait(timeout=10))
+
+        producer = threading.Thread(target=batcher.add_upserted, args=(TREE_A, _build_sn(2)), daemon=True)
+        producer.start()
+        producer.join(timeout=2)
+        self.assertFalse(producer.is_alive(), 'add_upserted() was blocked by the batch being sent')
+
+        can_finish_send.set()
+        batcher.flush()
+        self.assertEqual([(TREE_A, [1], []), (TREE_A, [2], [])], self.batch_list)
+
+    def test_timer_only_started_with_pending_changes(self):
+        batcher = self._build_batcher()
+        batcher.flush()
+        self.assertIsNone(batcher._timer)
+
+        batcher.add_upserted(TREE_A, _build_sn(1))
+        self.assertTrue(batcher._timer.is_alive())
+        batcher.flush()
+        self.assertIsNone(batcher._timer)
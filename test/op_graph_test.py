@@ -0,0 +1,287 @@
+import logging
+import unittest
+from typing import List, Optional
+
+from be.exec.user_op.op_graph import OpGraph
+from be.exec.user_op.op_graph_node import DstOpNode, OpGraphNode, RmOpNode, RootNode, SrcOpNode
+from constants import TrashStatus, TreeType
+from error import InvalidInsertOpGraphError, UnsuccessfulBatchInsertError
+from model.node.locald_node import LocalDirNode, LocalFileNode
+from model.node.node import TNode
+from model.node_identifier import LocalNodeIdentifier
+from model.uid import UID
+from model.user_op import UserOp, UserOpCode, UserOpResult, UserOpStatus
+
+logger = logging.getLogger(__name__)
+
+DEVICE_UID = UID(2)
+BATCH_UID = UID(1)
+ROOT_DIR_UID = UID(10)
+
+
+class OpFactory:
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS OpFactory
+
+    Builds local nodes under /test, and the OGNs of UserOps for them. Op UIDs increase in the order in which ops are built.
+    Factories used together need separate UID ranges (see last_uid).
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def __init__(self, device_uid: UID = DEVICE_UID, last_uid: int = 100):
+        self.device_uid = device_uid
+        self._last_uid = last_uid
+        self.root_dir = LocalDirNode(LocalNodeIdentifier(uid=ROOT_DIR_UID, device_uid=device_uid, full_path='/test'), parent_uid=UID(1),
+                                     trashed=TrashStatus.NOT_TRASHED, is_live=True, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                                     all_children_fetched=True)
+
+    def next_uid(self) -> UID:
+        self._last_uid += 1
+        return UID(self._last_uid)
+
+    def dir(self, parent: LocalDirNode, name: str) -> LocalDirNode:
+        return LocalDirNode(LocalNodeIdentifier(uid=self.next_uid(), device_uid=self.device_uid, full_path=f'{parent.get_single_path()}/{name}'),
+                            parent_uid=parent.uid, trashed=TrashStatus.NOT_TRASHED, is_live=True, sync_ts=0, create_ts=0, modify_ts=0,
+                            change_ts=0, all_children_fetched=True)
+
+    def file(self, parent: LocalDirNode, name: str) -> LocalFileNode:
+        return LocalFileNode(LocalNodeIdentifier(uid=self.next_uid(), device_uid=self.device_uid, full_path=f'{parent.get_single_path()}/{name}'),
+                             parent_uid=parent.uid, content_meta=None, size_bytes=100, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                             trashed=TrashStatus.NOT_TRASHED, is_live=True)
+
+    def rm(self, node: TNode) -> RmOpNode:
+        op = UserOp(self.next_uid(), BATCH_UID, UserOpCode.RM, src_node=node)
+        return RmOpNode(self.next_uid(), op, [node.get_single_parent_uid()])
+
+    def cp(self, src_node: TNode, dst_node: TNode) -> List[OpGraphNode]:
+        op = UserOp(self.next_uid(), BATCH_UID, UserOpCode.CP, src_node=src_node, dst_node=dst_node)
+        return [SrcOpNode(self.next_uid(), op, [src_node.get_single_parent_uid()]),
+                DstOpNode(self.next_uid(), op, [dst_node.get_single_parent_uid()])]
+
+
+def drain(graph: OpGraph) -> List[UserOp]:
+    """Fetches each op as soon as it is ready and completes it right away. Returns the ops in the order in which they were fetched"""
+    op_list = []
+    while True:
+        op: Optional[UserOp] = graph.get_next_op_nowait()
+        if not op:
+            return op_list
+        op.result = UserOpResult(status=UserOpStatus.COMPLETED_OK)
+        graph.pop_completed_op(op.op_uid)
+        op_list.append(op)
+
+
+class OpGraphParentIndexTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS OpGraphParentIndexTest
+
+    Covers the index of queued nodes by parent, which _find_ogn_list_for_children_of() uses when inserting an RM.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def setUp(self) -> None:
+        self.factory = OpFactory()
+        self.graph = OpGraph('Test')
+
+    def tearDown(self) -> None:
+        self.graph.shutdown()
+
+    def _assert_index_empty(self):
+        self.assertEqual({}, self.graph._queued_child_uid_dict)
+        self.assertEqual({}, self.graph._queued_parent_uid_dict)
+
+    def test_rm_dir_waits_for_rm_of_each_child(self):
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        child_ogn_list = [self.factory.rm(self.factory.file(dir_a, f'f{i}')) for i in range(3)]
+        for ogn in child_ogn_list:
+            self.graph.insert_ogn(ogn)
+
+        rm_dir_ogn = self.factory.rm(dir_a)
+        self.graph.insert_ogn(rm_dir_ogn)
+        self.graph.validate_internal_consistency()
+
+        self.assertEqual({ogn.op.src_node.uid for ogn in child_ogn_list}, self.graph._queued_child_uid_dict[(DEVICE_UID, dir_a.uid)])
+        self.assertEqual({dir_a.uid}, self.graph._queued_child_uid_dict[(DEVICE_UID, ROOT_DIR_UID)])
+        inserted_dir_ogn = self.graph._get_last_pending_ogn_for_node(DEVICE_UID, dir_a.uid)
+        self.assertEqual(sorted(ogn.op.op_uid for ogn in child_ogn_list), sorted(p.op.op_uid for p in inserted_dir_ogn.get_parent_list()))
+
+        op_list = drain(self.graph)
+        self.assertEqual(rm_dir_ogn.op.op_uid, op_list[-1].op_uid)
+        self.assertEqual(4, len(op_list))
+        self.assertEqual(0, len(self.graph))
+        self._assert_index_empty()
+
+    def test_rm_dir_ignores_queued_nodes_of_other_dirs(self):
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        dir_b = self.factory.dir(self.factory.root_dir, 'b')
+        self.graph.insert_ogn(self.factory.rm(self.factory.file(dir_b, 'f0')))
+
+        rm_dir_ogn = self.factory.rm(dir_a)
+        self.graph.insert_ogn(rm_dir_ogn)
+
+        inserted_dir_ogn = self.graph._get_last_pending_ogn_for_node(DEVICE_UID, dir_a.uid)
+        self.assertTrue(inserted_dir_ogn.is_child_of_root())
+        self.assertNotIn((DEVICE_UID, dir_a.uid), self.graph._queued_child_uid_dict)
+
+    def test_rm_dir_with_child_still_being_copied_in_is_rejected(self):
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        src_file = self.factory.file(self.factory.root_dir, 'src')
+        for ogn in self.factory.cp(src_file, self.factory.file(dir_a, 'dst')):
+            self.graph.insert_ogn(ogn)
+
+        with self.assertRaises(InvalidInsertOpGraphError):
+            self.graph.insert_ogn(self.factory.rm(dir_a))
+
+    def test_index_keeps_all_parents_of_a_node_until_its_queue_is_empty(self):
+        # A node whose later OGN names a different parent (as when it is moved) stays indexed under both until its last OGN is done:
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        dir_b = self.factory.dir(self.factory.root_dir, 'b')
+        src_file = self.factory.file(dir_a, 'f0')
+        moved_file = LocalFileNode(LocalNodeIdentifier(uid=src_file.uid, device_uid=DEVICE_UID, full_path=f'{dir_b.get_single_path()}/f0'),
+                                   parent_uid=dir_b.uid, content_meta=None, size_bytes=100, sync_ts=0, create_ts=0, modify_ts=0, change_ts=0,
+                                   trashed=TrashStatus.NOT_TRASHED, is_live=True)
+        for ogn in self.factory.cp(self.factory.file(self.factory.root_dir, 'src'), src_file):
+            self.graph.insert_ogn(ogn)
+        self.graph.insert_ogn(self.factory.rm(moved_file))
+
+        self.assertEqual({dir_a.uid, dir_b.uid}, self.graph._queued_parent_uid_dict[(DEVICE_UID, src_file.uid)])
+        self.assertEqual({src_file.uid}, self.graph._queued_child_uid_dict[(DEVICE_UID, dir_a.uid)])
+        self.assertEqual({src_file.uid}, self.graph._queued_child_uid_dict[(DEVICE_UID, dir_b.uid)])
+
+        drain(self.graph)
+        self._assert_index_empty()
+
+
+class OpGraphReadyQueueTest(unittest.TestCase):
+    """
+    ▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼▼
+    CLASS OpGraphReadyQueueTest
+
+    Covers the ready queue from which _try_get() takes the next op.
+    ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼ ▼
+    """
+    def setUp(self) -> None:
+        self.factory = OpFactory()
+        self.graph = OpGraph('Test')
+
+    def tearDown(self) -> None:
+        self.graph.shutdown()
+
+    def _assert_ready_queue_consistent(self):
+        # Each OGN in _ready_ogn_dict is either on the heap or held back for exactly one device:
+        queued_node_uid_list = [node_uid for _, node_uid in self.graph._ready_ogn_heap]
+        for held_back_ogn_list in self.graph._held_back_ogn_dict.values():
+            queued_node_uid_list += [ogn.node_uid for ogn in held_back_ogn_list]
+        self.assertEqual(len(self.graph._ready_ogn_dict), len(queued_node_uid_list))
+        self.assertEqual(set(self.graph._ready_ogn_dict.keys()), set(queued_node_uid_list))
+
+    def _complete(self, op: UserOp, status: UserOpStatus = UserOpStatus.COMPLETED_OK):
+        op.result = UserOpResult(status=status)
+        self.graph.pop_completed_op(op.op_uid)
+
+    def test_ops_are_returned_in_op_order_as_they_become_ready(self):
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        file_x = self.factory.file(dir_a, 'x')
+        file_y = self.factory.file(dir_a, 'y')
+        cp_x_ogn_list = self.factory.cp(self.factory.file(self.factory.root_dir, 'src'), file_x)
+        rm_y_ogn = self.factory.rm(file_y)
+        rm_x_ogn = self.factory.rm(file_x)
+        for ogn in cp_x_ogn_list + [rm_y_ogn, rm_x_ogn]:
+            self.graph.insert_ogn(ogn)
+        self._assert_ready_queue_consistent()
+
+        # The RM of x is queued behind the CP to x, so is not ready until that is done:
+        cp_x_op = self.graph.get_next_op_nowait()
+        self.assertEqual(cp_x_ogn_list[0].op.op_uid, cp_x_op.op_uid)
+        rm_y_op = self.graph.get_next_op_nowait()
+        self.assertEqual(rm_y_ogn.op.op_uid, rm_y_op.op_uid)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+
+        self._complete(cp_x_op)
+        self.assertEqual(rm_x_ogn.op.op_uid, self.graph.get_next_op_nowait().op_uid)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+        self._assert_ready_queue_consistent()
+
+    def test_ops_over_device_limit_are_held_back_until_device_has_room(self):
+        self.graph = OpGraph('Test', {TreeType.LOCAL_DISK: 1})
+        other_factory = OpFactory(device_uid=UID(3), last_uid=10_000)
+        rm_ogn_list = [self.factory.rm(self.factory.file(self.factory.root_dir, f'f{i}')) for i in range(3)]
+        other_rm_ogn = other_factory.rm(other_factory.file(other_factory.root_dir, 'f0'))
+        for ogn in rm_ogn_list + [other_rm_ogn]:
+            self.graph.insert_ogn(ogn)
+
+        # Ops on the other device are not held up by those on the first:
+        first_op = self.graph.get_next_op_nowait()
+        self.assertEqual(rm_ogn_list[0].op.op_uid, first_op.op_uid)
+        self.assertEqual(other_rm_ogn.op.op_uid, self.graph.get_next_op_nowait().op_uid)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+        self.assertEqual([], self.graph._ready_ogn_heap)
+        self.assertEqual([ogn.node_uid for ogn in rm_ogn_list[1:]], [ogn.node_uid for ogn in self.graph._held_back_ogn_dict[DEVICE_UID]])
+        self._assert_ready_queue_consistent()
+
+        # Completing an op on the device releases the rest, still in op order:
+        self._complete(first_op)
+        self.assertEqual({}, self.graph._held_back_ogn_dict)
+        second_op = self.graph.get_next_op_nowait()
+        self.assertEqual(rm_ogn_list[1].op.op_uid, second_op.op_uid)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+        self._complete(second_op)
+        self.assertEqual(rm_ogn_list[2].op.op_uid, self.graph.get_next_op_nowait().op_uid)
+        self._assert_ready_queue_consistent()
+
+    def test_op_spanning_two_devices_waits_for_both(self):
+        self.graph = OpGraph('Test', {TreeType.LOCAL_DISK: 1})
+        other_factory = OpFactory(device_uid=UID(3), last_uid=10_000)
+        rm_ogn = self.factory.rm(self.factory.file(self.factory.root_dir, 'f0'))
+        cp_ogn_list = self.factory.cp(self.factory.file(self.factory.root_dir, 'src'), other_factory.file(other_factory.root_dir, 'dst'))
+        other_rm_ogn = other_factory.rm(other_factory.file(other_factory.root_dir, 'f0'))
+        for ogn in [rm_ogn] + cp_ogn_list + [other_rm_ogn]:
+            self.graph.insert_ogn(ogn)
+
+        # The CP is held back for the first device, so the later RM on the other device can run ahead of it:
+        rm_op = self.graph.get_next_op_nowait()
+        self.assertEqual(rm_ogn.op.op_uid, rm_op.op_uid)
+        other_rm_op = self.graph.get_next_op_nowait()
+        self.assertEqual(other_rm_ogn.op.op_uid, other_rm_op.op_uid)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+
+        # Room on the first device isn't enough while the other is still full:
+        self._complete(rm_op)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+        self.assertEqual({cp_ogn_list[0].op.op_uid}, {ogn.op.op_uid for ogn in self.graph._held_back_ogn_dict[other_factory.device_uid]})
+        self._assert_ready_queue_consistent()
+        self._complete(other_rm_op)
+        self.assertEqual(cp_ogn_list[0].op.op_uid, self.graph.get_next_op_nowait().op_uid)
+        self._assert_ready_queue_consistent()
+
+    def test_retried_op_is_queued_again(self):
+        file_x = self.factory.file(self.factory.root_dir, 'x')
+        rm_x_ogn = self.factory.rm(file_x)
+        self.graph.insert_ogn(rm_x_ogn)
+
+        op = self.graph.get_next_op_nowait()
+        self._complete(op, UserOpStatus.STOPPED_ON_ERROR)
+        self.assertIsNone(self.graph.get_next_op_nowait())
+
+        self.graph.retry_failed_op(op.op_uid)
+        self._assert_ready_queue_consistent()
+        self.assertEqual([rm_x_ogn.op.op_uid], [op.op_uid for op in drain(self.graph)])
+
+    def test_rolled_back_batch_leaves_nothing_in_ready_queue(self):
+        dir_a = self.factory.dir(self.factory.root_dir, 'a')
+        dir_b = self.factory.dir(self.factory.root_dir, 'b')
+        cp_ogn_list = self.factory.cp(self.factory.file(self.factory.root_dir, 'src'), self.factory.file(dir_a, 'dst'))
+        for ogn in cp_ogn_list:
+            self.graph.insert_ogn(ogn)
+
+        # The batch's first OGN is ready as soon as it is inserted. Its second cannot be inserted while dir_a is being copied into:
+        batch_root = RootNode()
+        batch_root.link_child(self.factory.rm(self.factory.file(dir_b, 'f0')))
+        batch_root.link_child(self.factory.rm(dir_a))
+        with self.assertRaises(UnsuccessfulBatchInsertError):
+            self.graph.insert_batch_graph(batch_root)
+
+        self._assert_ready_queue_consistent()
+        self.assertEqual({ogn.node_uid for ogn in cp_ogn_list if ogn.is_child_of_root()}, set(self.graph._ready_ogn_dict.keys()))
+        self.graph.validate_internal_consistency()
+        self.assertEqual([cp_ogn_list[0].op.op_uid], [op.op_uid for op in drain(self.graph)])
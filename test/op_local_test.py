@@ -578,6 +578,104 @@ class OpLocalTest(OpTestBase):
         self.do_and_verify(delete, count_expected_cmds=12, wait_for_left=True, wait_for_right=False,
                            expected_left=final_tree_left, expected_right=INITIAL_LOCAL_TREE_RIGHT)
 
+    def test_large_batch_cp_serial(self):
+        logger.info('Testing large batch of copies in both directions, executing one op at a time')
+        self._do_large_batch_cp(max_concurrent_ops=1)
+
+    def test_large_batch_cp_parallel(self):
+        logger.info('Testing large batch of copies in both directions, executing independent ops concurrently')
+        # Must produce the same trees as test_large_batch_cp_serial():
+        self._do_large_batch_cp(max_concurrent_ops=4)
+
+    def _do_large_batch_cp(self, max_concurrent_ops: int):
+        self.backend.executor.set_max_concurrent_user_ops(max_concurrent_ops)
+
+        self.expand_visible_node(self.left_con, 'Art')
+
+        left_sn_list = [
+            self.find_node_by_name_in_left_tree('Modern'),
+            self.find_node_by_name_in_left_tree('Art')
+        ]
+        right_sn_list = []
+        for num in range(0, len(INITIAL_LOCAL_TREE_RIGHT)):
+            sn: SPIDNodePair = self.right_con.display_store.get_node_data(Gtk.TreePath.new_from_string(f'{num}'))
+            self.assertIsNotNone(sn, f'Expected to find node at index {num}')
+            right_sn_list.append(sn)
+
+        dd_data_left_to_right = DragAndDropData(dd_uid=UID(100), src_treecon=self.left_con, sn_list=left_sn_list)
+        dd_data_right_to_left = DragAndDropData(dd_uid=UID(101), src_treecon=self.right_con, sn_list=right_sn_list)
+        dst_tree_path = Gtk.TreePath.new_from_string('1')
+
+        def drop():
+            logger.info('Submitting drag & drop signal: left to right')
+            dispatcher.send(signal=Signal.DRAG_AND_DROP_DIRECT, sender=ID_RIGHT_TREE, drag_data=dd_data_left_to_right, tree_path=dst_tree_path,
+                            is_into=False)
+            logger.info('Submitting drag & drop signal: right to left')
+            dispatcher.send(signal=Signal.DRAG_AND_DROP_DIRECT, sender=ID_LEFT_TREE, drag_data=dd_data_right_to_left, tree_path=dst_tree_path,
+                            is_into=False)
+
+        final_tree_left = [
+            FNode('American_Gothic.jpg', 2061397),
+            FNode('Angry-Clown.jpg', 824641),
+            DNode('Art', (88259 + 652220 + 239739 + 44487 + 479124) + (147975 + 275771 + 8098 + 247023 + 36344), [
+                FNode('Dark-Art.png', 147975),
+                FNode('Hokusai_Great-Wave.jpg', 275771),
+                DNode('Modern', (88259 + 652220 + 239739 + 44487 + 479124), [
+                    FNode('1923-art.jpeg', 88259),
+                    FNode('43548-forbidden_planet.jpg', 652220),
+                    FNode('Dunno.jpg', 239739),
+                    FNode('felix-the-cat.jpg', 44487),
+                    FNode('Glow-Cat.png', 479124),
+                ]),
+                FNode('Mona-Lisa.jpeg', 8098),
+                FNode('william-shakespeare.jpg', 247023),
+                FNode('WTF.jpg', 36344),
+            ]),
+            FNode('Edvard-Munch-The-Scream.jpg', 114082),
+            FNode('Egypt.jpg', 154564),
+            FNode('George-Floyd.png', 27601),
+            FNode('Geriatric-Clown.jpg', 89182),
+            FNode('Keep-calm-and-carry-on.jpg', 745698),
+            FNode('M83.jpg', 17329),
+            FNode('oak-tree-sunset.jpg', 386888),
+            FNode('Ocean-Wave.jpg', 83713),
+            FNode('Starry-Night.jpg', 91699),
+            FNode('we-can-do-it-poster.jpg', 390093),
+        ]
+
+        final_tree_right = [
+            DNode('Art', (88259 + 652220 + 239739 + 44487 + 479124) + (147975 + 275771 + 8098 + 247023 + 36344), [
+                FNode('Dark-Art.png', 147975),
+                FNode('Hokusai_Great-Wave.jpg', 275771),
+                DNode('Modern', (88259 + 652220 + 239739 + 44487 + 479124), [
+                    FNode('1923-art.jpeg', 88259),
+                    FNode('43548-forbidden_planet.jpg', 652220),
+                    FNode('Dunno.jpg', 239739),
+                    FNode('felix-the-cat.jpg', 44487),
+                    FNode('Glow-Cat.png', 479124),
+                ]),
+                FNode('Mona-Lisa.jpeg', 8098),
+                FNode('william-shakespeare.jpg', 247023),
+                FNode('WTF.jpg', 36344),
+            ]),
+            FNode('Edvard-Munch-The-Scream.jpg', 114082),
+            FNode('M83.jpg', 17329),
+            DNode('Modern', (88259 + 652220 + 239739 + 44487 + 479124), [
+                FNode('1923-art.jpeg', 88259),
+                FNode('43548-forbidden_planet.jpg', 652220),
+                FNode('Dunno.jpg', 239739),
+                FNode('felix-the-cat.jpg', 44487),
+                FNode('Glow-Cat.png', 479124),
+            ]),
+            FNode('oak-tree-sunset.jpg', 386888),
+            FNode('Ocean-Wave.jpg', 83713),
+            FNode('Starry-Night.jpg', 91699),
+            FNode('we-can-do-it-poster.jpg', 390093),
+        ]
+
+        self.do_and_verify(drop, count_expected_cmds=18 + len(INITIAL_LOCAL_TREE_RIGHT), wait_for_left=True, wait_for_right=True,
+                           expected_left=final_tree_left, expected_right=final_tree_right)
+
     # TODO: Test: delete tree, then copy onto the deleted nodes
 
     # TODO: Test: Copy 3-level tree, then copy new version of 2 levels of that tree
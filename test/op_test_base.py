@@ -188,6 +188,7 @@ class OpTestBase(unittest.TestCase):
             app_config.write(root_path_config.make_root_uid_config_key(ID_RIGHT_TREE), self.right_tree_root_uid)
 
         backend = BackendIntegrated(app_config)
+        self.backend = backend
         self.app = OutletApplication(app_config, backend)
         # Disable execution so we can study the state of the OpGraph:
         self.backend.executor.enable_op_execution = False